@@ -9,18 +9,26 @@ sys.path.insert(0, ".")
 # ----------------------------------
 
 import streamlit as st
-from datetime import datetime, timezone
 import json
 import uuid
+import pandas as pd
 from dotenv import load_dotenv
 
 # Now we can safely import from services because the path is fixed
 from services.gemini_client import analyze_image, analyze_text
 from services.web_scraper import scrape_url_text
+from services.image_ingest import spooled_uploads
 from workers.schema_validator import validate_review_doc
 from workers.firestore_real import save_review_to_firestore
 from workers.bigquery_real import insert_review_to_bigquery
-from workers.bq_mapper import map_doc_to_bq_row
+from workers.bq_mapper import map_doc_to_bq_row, map_doc_to_review_fact_rows
+from workers.doc_builder import build_firestore_doc
+from workers.object_store import store_images
+from services.metrics import maybe_start_metrics_server, request_timings
+from services.profiling import profile_request
+from services.analytics import VIEWS, AnalyticsService
+from services.cpu_pool import CPU_POOL_INLINE_REVIEWS, run_cpu
+from services.result_index import SORTS, build_review_index, select_reviews, sentiments_in
 
 # Load .env file
 load_dotenv()
@@ -28,34 +36,25 @@ load_dotenv()
 # -------- Configuration --------------------------------
 USE_REAL_GEMINI = os.environ.get("USE_REAL_GEMINI", "false").lower() == "true"
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", None)
+# Screenshots go to the GCS bucket (IMAGE_BUCKET) when true, else to examples/gcs_mock/
+USE_REAL_STORAGE = os.environ.get("USE_REAL_STORAGE", "false").lower() == "true"
+# Review expanders rendered per page of the result view
+REVIEWS_PER_PAGE = int(os.environ.get("REVIEWS_PER_PAGE", "25"))
 
 if USE_REAL_GEMINI and not GEMINI_API_KEY:
     st.error("CRITICAL: GEMINI_API_KEY is missing.")
     st.stop()
 
+# Prometheus-style /metrics endpoint (only when METRICS_PORT is set; started once per process)
+maybe_start_metrics_server()
+
 # ----------------- Helper functions --------------------------------
-def build_firestore_doc(gemini_result: dict, source_type: str):
-    now = datetime.now(timezone.utc).isoformat()
-    review_id = f"local-{uuid.uuid4().hex[:8]}"
-    analysis = gemini_result.get("analysis", {}) or {}
-    extracted_text = gemini_result.get("extracted_text") or ""
-    model = gemini_result.get("model", "mock")
-    doc = {
-        "review_id": review_id,
-        "source": source_type,
-        "user_id_hash": None,
-        "raw_text": extracted_text,
-        "extracted_text": extracted_text,
-        "analysis": analysis,
-        "image_gcs_path": None,
-        "language": "en",
-        "model": model,
-        "processing_latency_ms": gemini_result.get("processing_latency_ms", None),
-        "created_at": now,
-        "processed_at": now,
-        "metadata": {"upload_method": "local_ui"}
-    }
-    return doc
+def request_headers() -> dict:
+    # Lets a caller opt a single request into profiling (X-Profile-Request: 1)
+    try:
+        return dict(st.context.headers)
+    except Exception:
+        return {}
 
 def save_local_doc(doc: dict, dirpath: str) -> str:
     fname = f"{doc['review_id']}.json"
@@ -64,6 +63,33 @@ def save_local_doc(doc: dict, dirpath: str) -> str:
         json.dump(doc, fh, indent=2, ensure_ascii=False)
     return path
 
+def derived_for_result(result: dict, source_type: str) -> dict:
+    """
+    Document, validation and review sort index of the current result, built once and
+    kept in session state until the next analysis (or a change of source type), so
+    reruns do not mint a new review_id or re-validate.
+    """
+    key = (st.session_state.get("request_id"), source_type)
+    derived = st.session_state.get("derived_result")
+    if derived is None or derived["key"] != key:
+        doc = build_firestore_doc(result, source_type)
+        derived = {
+            "key": key,
+            "doc": doc,
+            # Documents with many reviews are validated in the CPU pool
+            "validation": run_cpu(validate_review_doc, doc, stage="schema_validation",
+                                  size=len((result.get("analysis") or {}).get("rich_reviews") or []),
+                                  inline_below=CPU_POOL_INLINE_REVIEWS),
+            "index": build_review_index((result.get("analysis") or {}).get("rich_reviews") or []),
+        }
+        st.session_state["derived_result"] = derived
+    return derived
+
+@st.cache_resource
+def analytics_service() -> AnalyticsService:
+    # One cache per process, shared by every session
+    return AnalyticsService.from_env()
+
 # ----------------- UI --------------------------------
 st.set_page_config(page_title="Consumer Sense AI", layout="wide")
 
@@ -127,12 +153,35 @@ with col2:
         st.subheader("Strategic Analysis")
         if "overall_summary" in analysis and analysis["overall_summary"]:
             st.info(f"**Executive Summary:** {analysis['overall_summary']}")
+        diff = r.get("scrape_diff")
+        if diff and diff.get("previous_fetched_at"):
+            st.caption(f"🔎 Re-scrape: {diff['new']} new, {diff['changed']} changed, {diff['removed']} removed; "
+                       f"{diff['unchanged']} unchanged review(s) reused from the last snapshot.")
 
         rich_reviews = analysis.get("rich_reviews", [])
+        source_map = {"Screenshot (image)": "mobile_app_screenshot", "Raw text": "manual_text", "Web URL": "web_scrape"}
+        derived = derived_for_result(r, source_map.get(mode, "manual"))
 
         if rich_reviews:
             st.write(f"**Detected {len(rich_reviews)} distinct review(s)**")
-            for idx, item in enumerate(rich_reviews):
+            index = derived["index"]
+            f1, f2, f3 = st.columns([2, 2, 3])
+            sort = f1.selectbox("Sort", SORTS, key="review_sort")
+            sentiments = f2.multiselect("Sentiment", sentiments_in(index), key="review_sentiments")
+            query = f3.text_input("Search", key="review_query", placeholder="battery, shipping, @name...")
+            # Back to the first page whenever the result or the selection changes
+            selection = (derived["key"], sort, tuple(sentiments), query)
+            if st.session_state.get("review_selection") != selection:
+                st.session_state["review_selection"] = selection
+                st.session_state["review_page"] = 1
+            view = select_reviews(index, sort, sentiments, query.lstrip("@"),
+                                  page=st.session_state.get("review_page", 1), page_size=REVIEWS_PER_PAGE)
+            if view["pages"] > 1:
+                st.number_input(f"Page (of {view['pages']})", min_value=1, max_value=view["pages"], key="review_page")
+            st.caption(f"Showing {len(view['positions'])} of {view['matches']} matching review(s)")
+
+            for idx in view["positions"]:
+                item = rich_reviews[idx]
                 meta = item.get("metadata", {})
                 anl = item.get("analysis", {})
                 
@@ -146,7 +195,7 @@ with col2:
                 if meta.get("username"): label += f" | 👤 {meta['username']}"
                 if meta.get("rating"): label += f" | ⭐ {meta['rating']}"
                 
-                with st.expander(label, expanded=(idx==0)):
+                with st.expander(label, expanded=(idx == view["positions"][0])):
                     if anl.get("actionable_advice"):
                         st.markdown(f"💡 **Actionable Advice:** :green-background[{anl['actionable_advice']}]")
                     
@@ -183,31 +232,80 @@ with col2:
 
         st.divider()
         st.subheader("Pipeline Integration")
-        source_map = {"Screenshot (image)": "mobile_app_screenshot", "Raw text": "manual_text", "Web URL": "web_scrape"}
-        firestore_doc = build_firestore_doc(r, source_map.get(mode, "manual"))
-        ok, errs = validate_review_doc(firestore_doc)
+        firestore_doc = derived["doc"]
+        ok, errs = derived["validation"]
         if ok:
             c_a, c_b, c_c = st.columns(3)
+            request_id = st.session_state.get("request_id", firestore_doc["review_id"])
             if c_a.button("💾 Save JSON"):
                 save_local_doc(firestore_doc, storage_dir); st.toast("Saved!")
             if c_b.button("🔥 Save Firestore"):
-                st.write(save_review_to_firestore(firestore_doc, test_mode=True))
+                with profile_request(request_id, headers=request_headers(), phase="firestore"):
+                    st.write(save_review_to_firestore(firestore_doc, test_mode=True))
             if c_c.button("📊 Save BigQuery"):
                 from workers.bigquery_store import insert_review_to_bigquery as insert_bq_mock
-                st.write(insert_bq_mock(map_doc_to_bq_row(firestore_doc), test_mode=True))
+                from workers.bigquery_store import insert_review_facts_to_bigquery as insert_facts_mock
+                with profile_request(request_id, headers=request_headers(), phase="bigquery"):
+                    st.write(insert_bq_mock(map_doc_to_bq_row(firestore_doc), test_mode=True))
+                    # One row per extracted review in the child fact table
+                    fact_rows = map_doc_to_review_fact_rows(firestore_doc)
+                    if fact_rows:
+                        st.write(insert_facts_mock(fact_rows, test_mode=True))
+                analytics_service().invalidate()
         else:
             st.error(f"Schema Validation Failed: {errs}")
     else:
         st.info("👈 Select an input source to begin.")
 
+# ----------------- Trends --------------------------------
+with st.expander("📈 Review trends"):
+    try:
+        analytics = analytics_service()
+        days = st.select_slider("Window", options=[7, 30, 90], value=30, format_func=lambda d: f"Last {d} days")
+        tab_trend, tab_themes, tab_latency = st.tabs(
+            [VIEWS[v]["title"] for v in ("sentiment_trend", "top_themes", "latency_by_model")])
+        with tab_trend:
+            rows = analytics.get("sentiment_trend", days=days)
+            if rows:
+                st.line_chart(pd.DataFrame(rows).pivot_table(index="day", columns="sentiment",
+                                                             values="reviews", fill_value=0))
+            else:
+                st.caption("No analysed reviews in this window yet.")
+        with tab_themes:
+            rows = analytics.get("top_themes", days=days)
+            if rows:
+                st.bar_chart(pd.DataFrame(rows).set_index("theme")["mentions"])
+            else:
+                st.caption("No themes in this window yet.")
+        with tab_latency:
+            rows = analytics.get("latency_by_model", days=days)
+            if rows:
+                st.dataframe(pd.DataFrame(rows), hide_index=True)
+            else:
+                st.caption("No timed runs in this window yet.")
+    except Exception as e:
+        st.caption(f"Trends unavailable: {e}")
+
 if analyze_clicked:
     st.session_state["last_result"] = None
-    with st.spinner("🤖 Gemini 2.5 is analyzing product feedback..."):
+    st.session_state["request_id"] = f"req-{uuid.uuid4().hex[:8]}"
+    profiler = profile_request(st.session_state["request_id"], headers=request_headers(), phase="analyze")
+    with st.spinner("🤖 Gemini 2.5 is analyzing product feedback..."), request_timings() as timings, profiler:
         try:
             if mode == "Screenshot (image)":
                 if uploaded_files:
-                    image_data_list = [f.read() for f in uploaded_files]
-                    st.session_state["last_result"] = analyze_image(image_data_list, test_mode=False)
+                    # Spool to temp files; images are decoded one at a time downstream
+                    with spooled_uploads(uploaded_files) as images:
+                        try:
+                            # Stored once per content hash; the document keeps the gs:// URI
+                            stored = store_images(images, test_mode=not USE_REAL_STORAGE)
+                        except Exception as e:
+                            st.warning(f"Could not store screenshots: {e}")
+                            stored = []
+                        result = analyze_image(images, test_mode=False)
+                        if result is not None and stored:
+                            result["image_uris"] = [s["uri"] for s in stored]
+                        st.session_state["last_result"] = result
                 else:
                     st.warning("Please upload at least one image.")
             elif mode == "Raw text":
@@ -219,11 +317,13 @@ if analyze_clicked:
                 if url_input.strip():
                     scraped = scrape_url_text(url_input)
                     if not scraped: st.error("Could not extract text.")
-                    else: st.session_state["last_result"] = analyze_text(scraped, test_mode=False)
+                    else: st.session_state["last_result"] = analyze_text(scraped, test_mode=False, source_url=url_input)
                 else:
                     st.warning("Please enter a URL.")
             
             if st.session_state["last_result"]:
+                # includes scraping, which happens outside analyze_text
+                st.session_state["last_result"]["stage_timings_ms"] = dict(timings)
                 st.rerun()
         except Exception as e:
             st.error(f"Pipeline Error: {e}")
\ No newline at end of file
@@ -0,0 +1,39 @@
+-- infra/create_bigquery_review_facts_table.sql
+-- Child fact table: one row per review extracted from an analysis run (analysis.rich_reviews).
+-- Rows are produced by workers/bq_mapper.map_doc_to_review_fact_rows and join to
+-- consumer_reviews on review_id.
+-- Table: e-pulsar-478805-s9.consumer_sense_ai.consumer_review_facts
+
+CREATE TABLE IF NOT EXISTS `e-pulsar-478805-s9.consumer_sense_ai.consumer_review_facts` (
+  review_id STRING,              -- parent consumer_reviews.review_id
+  review_index INT64,            -- position within the run
+  review_hash STRING,            -- sha256 of the normalized text (services/review_store.py)
+  username STRING,
+  rating INT64,                  -- whole stars on a 5-point scale, NULL when unreadable
+  rating_text STRING,            -- rating as shown on the page ("4/5", "8 out of 10", ...)
+  review_date DATE,              -- date shown on the review
+  review_date_inferred BOOL,     -- TRUE when review_date fell back to DATE(processed_at)
+  text STRING,
+  sentiment STRING,
+  pain_points ARRAY<STRING>,
+  feature_requests ARRAY<STRING>,
+  actionable_advice STRING,
+  source STRING,
+  model STRING,
+  prompt_version STRING,
+  processed_at TIMESTAMP
+)
+PARTITION BY review_date
+-- FLOAT64 cannot be clustered; rating is stored as INT64 for that reason.
+CLUSTER BY sentiment, rating
+OPTIONS (
+  -- Every query must name a review_date range, so only the matching partitions are scanned.
+  require_partition_filter = TRUE,
+  description="Consumer Sense AI per-review facts (created via infra/create_bigquery_review_facts_table.sql)"
+);
+
+-- Example: negative low-rated reviews of one month (scans 31 partitions, clustered blocks only)
+-- SELECT username, rating, text, pain_points
+-- FROM `e-pulsar-478805-s9.consumer_sense_ai.consumer_review_facts`
+-- WHERE review_date BETWEEN '2025-03-01' AND '2025-03-31'
+--   AND sentiment = 'Negative' AND rating <= 2;
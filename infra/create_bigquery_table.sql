@@ -16,10 +16,20 @@ CREATE TABLE IF NOT EXISTS `e-pulsar-478805-s9.consumer_sense_ai.consumer_review
   created_at TIMESTAMP,
   processed_at TIMESTAMP,
   processing_latency_ms INT64,
+  -- gs:// URI of the first stored screenshot (workers/object_store.py), NULL for text sources
+  image_gcs_path STRING,
   metadata STRUCT<
     app_version STRING,
     region STRING,
     upload_method STRING
+  >,
+  -- per-stage wall time of the analysis run (services/metrics.py stage names); validation and
+  -- the store writes happen after the row is built and are only in the stage_latency_ms histogram
+  stage_timings_ms STRUCT<
+    scrape INT64,
+    image_decode INT64,
+    model_wait INT64,
+    json_parse INT64
   >
 )
 PARTITION BY DATE(processed_at)
@@ -28,3 +38,15 @@ CLUSTER BY sentiment, model
 OPTIONS (
   description="Consumer Sense AI processed reviews for analytics (created via infra/create_bigquery_table.sql)"
 );
+
+-- Existing tables: add the stage timing column in place.
+ALTER TABLE `e-pulsar-478805-s9.consumer_sense_ai.consumer_reviews`
+  ADD COLUMN IF NOT EXISTS stage_timings_ms STRUCT<
+    scrape INT64,
+    image_decode INT64,
+    model_wait INT64,
+    json_parse INT64
+  >;
+
+ALTER TABLE `e-pulsar-478805-s9.consumer_sense_ai.consumer_reviews`
+  ADD COLUMN IF NOT EXISTS image_gcs_path STRING;
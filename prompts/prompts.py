@@ -42,3 +42,22 @@ def analysis_prompt():
         "\"themes\":[\"checkout\",\"crash\"],\"intent\":\"complaint\","
         "\"action_items\":[\"Investigate logs\",\"Add retry\"],\"confidence\":0.92}\n"
     )
+
+
+def build_compact_review_prompt():
+    """
+    Product-manager prompt for GeminiREST when the compact response schema is enforced
+    (see services/response_schema.py). Key names are declared by the schema, so the
+    prompt only explains their meaning instead of spelling out a JSON template.
+    """
+    return (
+        "You are a Senior Product Manager. Extract strategic insights from user feedback "
+        "(text or screenshots).\n"
+        "If you see multiple reviews (separated by lines, spacing or different usernames), "
+        "extract EACH ONE SEPARATELY into r. If there are no user reviews, leave r empty and "
+        "analyze the product claims (SWOT) in o.\n"
+        "Keys: r=reviews; u=username, rt=rating, d=date, t=review text, s=sentiment, "
+        "p=pain points, f=feature requests, a=actionable advice; "
+        "sum=executive summary of ALL feedback; o=overall (top 3 p and f, strategic a).\n"
+        "Sentiment codes: P=positive, N=negative, U=neutral, M=mixed. Be concise."
+    )
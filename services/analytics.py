@@ -0,0 +1,277 @@
+# services/analytics.py
+"""
+Cached analytics views over the consumer_reviews table, for the dashboard in app/app.py.
+
+Each view is a named aggregation over a window of processed_at days. Results are cached
+per (view, window) and recomputed when either
+  - the entry is older than the TTL, or
+  - a partition inside the window has landed or changed since the result was computed.
+Partition state comes from INFORMATION_SCHEMA.PARTITIONS (BigQuery) or the local
+warehouse's partitions table: one cheap metadata query per check interval, shared by
+all views, instead of an aggregation scan per page load.
+
+Usage:
+    from services.analytics import AnalyticsService
+
+    analytics = AnalyticsService.from_env()
+    analytics.get("sentiment_trend", days=30)   # [{"day", "sentiment", "reviews", "avg_score"}]
+    analytics.get("top_themes", days=7)         # [{"theme", "mentions"}]
+    analytics.get("latency_by_model", days=7)   # [{"model", "runs", "avg_ms", "p50_ms", "p95_ms"}]
+    analytics.invalidate()                      # drop every cached result now
+    analytics.get_stats()
+
+Config:
+    ANALYTICS_BACKEND             local (default, workers/local_warehouse.py) | bigquery (BQ_TABLE)
+    ANALYTICS_CACHE_TTL_S         max age of a cached result (default 600)
+    ANALYTICS_PARTITION_CHECK_S   min seconds between partition metadata queries (default 30)
+
+Notes:
+- Windows end today (UTC) unless `end` is given, so a new day starts a new cache entry.
+- Rows streamed into BigQuery sit in the __UNPARTITIONED__ partition until the buffer is
+  flushed; its changes count as changes to today's partition, so windows that include
+  today are recomputed.
+- The metadata query runs outside the service lock, one at a time: while it is in flight
+  other readers use the previous partition state (or wait, before the first read).
+- The BigQuery latency percentiles are APPROX_QUANTILES; the local backend computes
+  exact ones.
+"""
+
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.metrics import inc
+
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "local").lower()
+ANALYTICS_CACHE_TTL_S = float(os.getenv("ANALYTICS_CACHE_TTL_S", "600"))
+ANALYTICS_PARTITION_CHECK_S = float(os.getenv("ANALYTICS_PARTITION_CHECK_S", "30"))
+
+# BigQuery's partition_id for the streaming buffer
+STREAMING_PARTITION = "__UNPARTITIONED__"
+
+
+def _latency_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Local backend: per-run latencies -> per-model summary (same shape as the BigQuery view)
+    by_model: Dict[str, List[int]] = {}
+    for row in rows:
+        by_model.setdefault(row["model"], []).append(row["latency_ms"])
+    out = []
+    for model, values in by_model.items():
+        arr = np.asarray(values, dtype=float)
+        p50, p95 = np.percentile(arr, [50, 95])
+        out.append({"model": model, "runs": len(values), "avg_ms": round(float(arr.mean()), 1),
+                    "p50_ms": int(p50), "p95_ms": int(p95)})
+    return sorted(out, key=lambda r: (-r["runs"], r["model"]))
+
+
+# name -> {"title", "bigquery": SQL ({table}, @start, @end), "local": SQL (?, ?), "reduce": local post-processing}
+VIEWS: Dict[str, Dict[str, Any]] = {
+    "sentiment_trend": {
+        "title": "Sentiment trend",
+        "bigquery": """
+            SELECT FORMAT_DATE('%Y-%m-%d', DATE(processed_at)) AS day, INITCAP(sentiment) AS sentiment,
+                   COUNT(*) AS reviews, ROUND(AVG(score), 3) AS avg_score
+            FROM `{table}`
+            WHERE DATE(processed_at) BETWEEN @start AND @end
+            GROUP BY day, sentiment
+            ORDER BY day, sentiment""",
+        "local": """
+            SELECT _partition_date AS day,
+                   upper(substr(sentiment, 1, 1)) || lower(substr(sentiment, 2)) AS sentiment,
+                   COUNT(*) AS reviews, ROUND(AVG(score), 3) AS avg_score
+            FROM consumer_reviews
+            WHERE _partition_date BETWEEN ? AND ?
+            GROUP BY day, 2
+            ORDER BY day, 2""",
+    },
+    "top_themes": {
+        "title": "Top themes",
+        "bigquery": """
+            SELECT theme, COUNT(*) AS mentions
+            FROM `{table}`, UNNEST(themes) AS theme
+            WHERE DATE(processed_at) BETWEEN @start AND @end
+            GROUP BY theme
+            ORDER BY mentions DESC, theme
+            LIMIT 10""",
+        "local": """
+            SELECT t.value AS theme, COUNT(*) AS mentions
+            FROM consumer_reviews, json_each(consumer_reviews.themes) AS t
+            WHERE _partition_date BETWEEN ? AND ?
+            GROUP BY theme
+            ORDER BY mentions DESC, theme
+            LIMIT 10""",
+    },
+    "latency_by_model": {
+        "title": "Latency by model",
+        "bigquery": """
+            SELECT model, COUNT(*) AS runs, ROUND(AVG(processing_latency_ms), 1) AS avg_ms,
+                   APPROX_QUANTILES(processing_latency_ms, 100)[OFFSET(50)] AS p50_ms,
+                   APPROX_QUANTILES(processing_latency_ms, 100)[OFFSET(95)] AS p95_ms
+            FROM `{table}`
+            WHERE DATE(processed_at) BETWEEN @start AND @end AND processing_latency_ms IS NOT NULL
+            GROUP BY model
+            ORDER BY runs DESC, model""",
+        "local": """
+            SELECT model, processing_latency_ms AS latency_ms
+            FROM consumer_reviews
+            WHERE _partition_date BETWEEN ? AND ? AND processing_latency_ms IS NOT NULL""",
+        "reduce": _latency_rows,
+    },
+}
+
+
+class LocalBackend:
+    """Views over workers/local_warehouse.py."""
+    name = "local"
+
+    def __init__(self, warehouse=None):
+        if warehouse is None:
+            from workers.local_warehouse import LocalWarehouse
+            warehouse = LocalWarehouse()
+        self.warehouse = warehouse
+
+    def run(self, view: Dict[str, Any], start: date, end: date) -> List[Dict[str, Any]]:
+        rows = self.warehouse.query(view["local"], (start.isoformat(), end.isoformat()))
+        return view["reduce"](rows) if view.get("reduce") else rows
+
+    def partitions(self) -> Dict[str, str]:
+        return {p["partition_id"]: p["last_modified_time"] for p in self.warehouse.partitions("consumer_reviews")}
+
+
+class BigQueryBackend:
+    """Views over the BQ_TABLE table (requires google-cloud-bigquery and credentials)."""
+    name = "bigquery"
+
+    def __init__(self, table_id: Optional[str] = None, client=None):
+        table_id = table_id or os.getenv("BQ_TABLE")
+        if not table_id:
+            raise RuntimeError("Environment variable BQ_TABLE is required for the bigquery analytics backend.")
+        try:
+            from google.cloud import bigquery
+        except Exception as e:
+            raise RuntimeError(
+                "google-cloud-bigquery is required for the bigquery analytics backend. "
+                "Install with: pip install google-cloud-bigquery"
+            ) from e
+        self._bq = bigquery
+        self.table_id = table_id
+        self.client = client or bigquery.Client()
+
+    def run(self, view: Dict[str, Any], start: date, end: date) -> List[Dict[str, Any]]:
+        config = self._bq.QueryJobConfig(query_parameters=[
+            self._bq.ScalarQueryParameter("start", "DATE", start),
+            self._bq.ScalarQueryParameter("end", "DATE", end),
+        ])
+        job = self.client.query(view["bigquery"].format(table=self.table_id), job_config=config)
+        return [dict(row.items()) for row in job.result()]
+
+    def partitions(self) -> Dict[str, str]:
+        dataset, table = self.table_id.rsplit(".", 1)
+        job = self.client.query(
+            f"SELECT partition_id, last_modified_time, total_rows FROM `{dataset}.INFORMATION_SCHEMA.PARTITIONS` "
+            f"WHERE table_name = @table",
+            job_config=self._bq.QueryJobConfig(query_parameters=[
+                self._bq.ScalarQueryParameter("table", "STRING", table),
+            ]),
+        )
+        # total_rows too: the streaming buffer grows between last_modified_time updates
+        return {row["partition_id"]: f"{row['last_modified_time']}/{row['total_rows']}" for row in job.result()}
+
+
+class AnalyticsService:
+    def __init__(self, backend, ttl_s: float = ANALYTICS_CACHE_TTL_S,
+                 partition_check_s: float = ANALYTICS_PARTITION_CHECK_S,
+                 clock: Callable[[], float] = time.monotonic):
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self.partition_check_s = partition_check_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (view, start, end) -> (rows, computed_at, partition fingerprint of the window)
+        self._cache: Dict[Tuple[str, str, str], Tuple[List[Dict[str, Any]], float, Dict[str, str]]] = {}
+        self._partitions: Optional[Dict[str, str]] = None
+        self._partitions_at = 0.0
+        self._refreshing = False
+        self._partitions_ready = threading.Condition(self._lock)
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "partition_changes": 0, "partition_checks": 0}
+
+    @classmethod
+    def from_env(cls) -> "AnalyticsService":
+        if ANALYTICS_BACKEND == "bigquery":
+            return cls(BigQueryBackend())
+        return cls(LocalBackend())
+
+    def _current_partitions(self) -> Dict[str, str]:
+        # One metadata query per check interval, run outside the lock by a single thread
+        with self._lock:
+            while True:
+                fresh = self._partitions is not None and self._clock() - self._partitions_at < self.partition_check_s
+                if fresh or (self._refreshing and self._partitions is not None):
+                    return self._partitions
+                if not self._refreshing:
+                    break
+                self._partitions_ready.wait()  # first read still in flight
+            self._refreshing = True
+        partitions = None
+        try:
+            partitions = self.backend.partitions()
+            return partitions
+        finally:
+            with self._lock:
+                self._refreshing = False
+                if partitions is not None:
+                    self._partitions, self._partitions_at = partitions, self._clock()
+                    self._stats["partition_checks"] += 1
+                self._partitions_ready.notify_all()
+
+    @staticmethod
+    def _window(partitions: Dict[str, str], start: date, end: date,
+                today: Optional[date] = None) -> Dict[str, str]:
+        lo, hi = start.strftime("%Y%m%d"), end.strftime("%Y%m%d")
+        today_id = (today or datetime.now(timezone.utc).date()).strftime("%Y%m%d")
+        return {pid: modified for pid, modified in partitions.items()
+                if lo <= (today_id if pid == STREAMING_PARTITION else pid) <= hi}
+
+    def get(self, view: str, days: int = 30, end: Optional[date] = None) -> List[Dict[str, Any]]:
+        if view not in VIEWS:
+            raise ValueError(f"Unknown analytics view {view!r} ({' | '.join(VIEWS)})")
+        end = end or datetime.now(timezone.utc).date()
+        start = end - timedelta(days=max(days, 1) - 1)
+        key = (view, start.isoformat(), end.isoformat())
+        fingerprint = self._window(self._current_partitions(), start, end)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                rows, computed_at, seen = cached
+                if self._clock() - computed_at >= self.ttl_s:
+                    outcome = "expired"
+                elif seen != fingerprint:
+                    outcome = "partition_changes"
+                else:
+                    self._stats["hits"] += 1
+                    inc("analytics_cache_total", outcome="hit", view=view)
+                    return rows
+            else:
+                outcome = "misses"
+            self._stats[outcome] += 1
+        inc("analytics_cache_total", outcome=outcome, view=view)
+
+        rows = self.backend.run(VIEWS[view], start, end)
+        with self._lock:
+            self._cache[key] = (rows, self._clock(), fingerprint)
+        return rows
+
+    def invalidate(self, view: Optional[str] = None):
+        """Drop cached results (of one view, or all) and re-read partition state on next use."""
+        with self._lock:
+            for key in [k for k in self._cache if view is None or k[0] == view]:
+                del self._cache[key]
+            self._partitions = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, backend=self.backend.name, cached=len(self._cache))
@@ -0,0 +1,289 @@
+# services/batch_planner.py
+"""
+Adaptive batching for multi-screenshot analysis.
+
+Decides whether a set of images goes to Gemini as one request, as a few packed requests,
+or fanned out one image per request in parallel, then merges the partial results back
+into a single analyze_content()-shaped result.
+
+The decision uses:
+- image count and pixel budget: per-request caps on images and (downscaled) pixels;
+- observed latency: a linear model ms = base + per_token * image_tokens, refit from the
+  latencies of executed requests, predicts the wall time of each candidate plan.
+The plan with the lowest predicted wall time wins; a plan with fewer requests is preferred
+when it is within BATCH_SLACK of the best, since every request pays the fixed prompt cost.
+
+Usage:
+    from services.batch_planner import BatchPlanner, run_batched
+
+    planner = BatchPlanner.from_env()
+    result = run_batched(client.analyze_content, images, planner)
+    result["reviews"], result["overall_summary"], result["batch"]   # batch = plan summary
+
+Config:
+    BATCH_MAX_IMAGES          images per request (default 8)
+    BATCH_MAX_MEGAPIXELS      downscaled megapixels per request (default 24)
+    BATCH_MAX_PARALLEL        concurrent requests (default 4)
+    BATCH_SLACK               prefer fewer requests within this fraction of the best (0.10)
+    BATCH_BASE_MS             prior fixed latency per request (default 4000)
+    BATCH_MS_PER_1K_TOKENS    prior latency per 1k image tokens (default 1200)
+"""
+
+import contextvars
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from services.image_ingest import IMAGE_MAX_SIDE, ImageSource, open_image
+from services.metrics import inc
+
+# Gemini bills images in 768x768 tiles of 258 tokens (one tile if both sides <= 384)
+TOKENS_PER_TILE = 258
+TILE_SIDE = 768
+
+
+def estimate_image(source: ImageSource, max_side: int = IMAGE_MAX_SIDE) -> Dict[str, int]:
+    """Downscaled pixel count and image-token estimate, from the header only."""
+    try:
+        with open_image(source) as image:
+            width, height = image.size
+    except Exception:
+        return {"pixels": 0, "tokens": 0}
+    scale = min(1.0, max_side / float(max(width, height, 1)))
+    width, height = max(1, int(width * scale)), max(1, int(height * scale))
+    if width <= 384 and height <= 384:
+        tiles = 1
+    else:
+        tiles = math.ceil(width / TILE_SIDE) * math.ceil(height / TILE_SIDE)
+    return {"pixels": width * height, "tokens": tiles * TOKENS_PER_TILE}
+
+
+class LatencyModel:
+    """Online least-squares fit of request latency against image tokens."""
+
+    def __init__(self, base_ms: float, ms_per_token: float, window: int = 200, min_samples: int = 5):
+        self.prior = (base_ms, ms_per_token)
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.min_samples = min_samples
+
+    def record(self, tokens: int, elapsed_ms: float):
+        with self._lock:
+            self._samples.append((float(tokens), float(elapsed_ms)))
+
+    def coefficients(self) -> Tuple[float, float]:
+        with self._lock:
+            samples = list(self._samples)
+        if len(samples) < self.min_samples:
+            return self.prior
+        n = len(samples)
+        mean_x = sum(x for x, _ in samples) / n
+        mean_y = sum(y for _, y in samples) / n
+        var_x = sum((x - mean_x) ** 2 for x, _ in samples)
+        if var_x <= 0:
+            # All requests the same size: keep the prior slope, refit the intercept
+            slope = self.prior[1]
+        else:
+            slope = max(0.0, sum((x - mean_x) * (y - mean_y) for x, y in samples) / var_x)
+        return max(0.0, mean_y - slope * mean_x), slope
+
+    def predict(self, tokens: int) -> float:
+        base, slope = self.coefficients()
+        return base + slope * tokens
+
+
+class BatchPlanner:
+    def __init__(self, max_images: int = 8, max_pixels: int = 24_000_000, max_parallel: int = 4,
+                 slack: float = 0.10, base_ms: float = 4000.0, ms_per_1k_tokens: float = 1200.0):
+        self.max_images = max(1, max_images)
+        self.max_pixels = max(1, max_pixels)
+        self.max_parallel = max(1, max_parallel)
+        self.slack = slack
+        self.latency = LatencyModel(base_ms, ms_per_1k_tokens / 1000.0)
+
+    @classmethod
+    def from_env(cls) -> "BatchPlanner":
+        return cls(
+            max_images=int(os.getenv("BATCH_MAX_IMAGES", "8")),
+            max_pixels=int(float(os.getenv("BATCH_MAX_MEGAPIXELS", "24")) * 1_000_000),
+            max_parallel=int(os.getenv("BATCH_MAX_PARALLEL", "4")),
+            slack=float(os.getenv("BATCH_SLACK", "0.10")),
+            base_ms=float(os.getenv("BATCH_BASE_MS", "4000")),
+            ms_per_1k_tokens=float(os.getenv("BATCH_MS_PER_1K_TOKENS", "1200")),
+        )
+
+    def _partition(self, estimates: List[Dict[str, int]], groups: int) -> Optional[List[List[int]]]:
+        """Contiguous groups (reading order preserved) balanced by tokens, or None if caps are violated."""
+        total = sum(e["tokens"] for e in estimates) or len(estimates)
+        target = total / groups
+        out: List[List[int]] = [[]]
+        acc = 0.0
+        for i, est in enumerate(estimates):
+            remaining_items = len(estimates) - i
+            remaining_groups = groups - len(out)
+            # Start a new group once this one reached its share, leaving an item per later group
+            if out[-1] and remaining_groups > 0 and (acc >= target * len(out) or remaining_items <= remaining_groups):
+                out.append([])
+            out[-1].append(i)
+            acc += est["tokens"] or 1
+        if len(out) != groups:
+            return None
+        for group in out:
+            if len(group) > self.max_images and len(group) > 1:
+                return None
+            if sum(estimates[i]["pixels"] for i in group) > self.max_pixels and len(group) > 1:
+                return None
+        return out
+
+    def _predict_wall_ms(self, estimates: List[Dict[str, int]], groups: List[List[int]]) -> float:
+        # Groups are dispatched in waves of max_parallel; each wave takes as long as its slowest request
+        costs = sorted((self.latency.predict(sum(estimates[i]["tokens"] for i in g)) for g in groups), reverse=True)
+        return sum(costs[i] for i in range(0, len(costs), self.max_parallel))
+
+    def plan(self, images: Sequence[ImageSource]) -> Dict[str, Any]:
+        estimates = [estimate_image(img) for img in images]
+        n = len(estimates)
+        if n <= 1:
+            return {"strategy": "single", "groups": [list(range(n))], "predicted_ms": None, "estimates": estimates}
+
+        candidates = []
+        for g in range(1, n + 1):
+            groups = self._partition(estimates, g)
+            if groups is not None:
+                candidates.append((self._predict_wall_ms(estimates, groups), g, groups))
+        best_ms = min(ms for ms, _, _ in candidates)
+        # Fewest requests whose predicted wall time is close enough to the best
+        ms, g, groups = min((c for c in candidates if c[0] <= best_ms * (1 + self.slack)), key=lambda c: c[1])
+        strategy = "single" if g == 1 else ("fanout" if g == n else "packed")
+        return {"strategy": strategy, "groups": groups, "predicted_ms": round(ms), "estimates": estimates}
+
+
+def _review_key(review: Dict[str, Any]) -> Tuple[str, str]:
+    meta = review.get("metadata") or {}
+    text = re.sub(r"\W+", " ", (review.get("text") or "").lower()).strip()
+    return (meta.get("username") or "").strip().lower(), text[:120]
+
+
+def ranked_union(lists: List[List[str]], limit: int = 5) -> List[str]:
+    """Items ordered by how many parts mention them, first mention breaking ties."""
+    counts: Dict[str, int] = {}
+    first: Dict[str, int] = {}
+    labels: Dict[str, str] = {}
+    for items in lists:
+        for item in items or []:
+            key = str(item).strip().lower()
+            if not key:
+                continue
+            counts[key] = counts.get(key, 0) + 1
+            first.setdefault(key, len(first))
+            labels.setdefault(key, str(item).strip())
+    ranked = sorted(counts, key=lambda k: (-counts[k], first[k]))
+    return [labels[k] for k in ranked[:limit]]
+
+
+def mixed_sentiment(labels: List[str]) -> str:
+    """Majority label if it holds two thirds of the labelled items, else "Mixed"."""
+    counted = {s: labels.count(s) for s in set(labels) if s}
+    if not counted:
+        return "Neutral"
+    top = max(counted, key=counted.get)
+    return top if counted[top] * 3 >= 2 * sum(counted.values()) else "Mixed"
+
+
+def merge_results(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge analyze_content() results from several requests (in image order) into one:
+    reviews concatenated and de-duplicated (a review visible on two screenshots appears once),
+    overall sentiment from the review mix, ranked pains/requests, joined summaries.
+    """
+    ok = [p for p in parts if not p.get("error")]
+    failed = [p for p in parts if p.get("error")]
+    if not ok:
+        return {"reviews": [], "overall_summary": f"Error processing request: {failed[0]['error']}",
+                "error": failed[0]["error"]} if failed else {"reviews": [], "overall_summary": ""}
+    if len(ok) == 1 and not failed:
+        return ok[0]
+
+    reviews, seen = [], set()
+    for part in ok:
+        for review in part.get("reviews") or []:
+            key = _review_key(review)
+            if key in seen:
+                continue
+            seen.add(key)
+            reviews.append(review)
+
+    sentiments = [((r.get("analysis") or {}).get("sentiment") or "") for r in reviews]
+    if not any(sentiments):
+        sentiments = [(p.get("analysis") or {}).get("sentiment") or "" for p in ok]
+    sentiment = mixed_sentiment(sentiments)
+
+    summaries = []
+    for part in ok:
+        summary = (part.get("overall_summary") or "").strip()
+        if summary and summary not in summaries:
+            summaries.append(summary)
+    blocks = [p.get("analysis") or {} for p in ok]
+    # Advice from the part that covered the most reviews
+    lead = max(ok, key=lambda p: len(p.get("reviews") or []))
+
+    merged = {
+        "reviews": reviews,
+        "overall_summary": " ".join(summaries),
+        "analysis": {
+            "sentiment": sentiment,
+            "pain_points": ranked_union([b.get("pain_points") for b in blocks]),
+            "feature_requests": ranked_union([b.get("feature_requests") for b in blocks]),
+            "actionable_advice": (lead.get("analysis") or {}).get("actionable_advice") or "",
+        },
+    }
+    if failed or any(p.get("partial") for p in ok):
+        merged["partial"] = True
+    return merged
+
+
+def run_batched(analyze: Callable[..., Dict[str, Any]], images: Sequence[ImageSource],
+                planner: BatchPlanner, text_input: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Plan, execute (groups in parallel, each with the caller's context/deadline) and merge.
+    `analyze` is GeminiREST.analyze_content-compatible: analyze(images=[...], text_input=...).
+    """
+    plan = planner.plan(images)
+    groups = plan["groups"]
+    inc("batch_plans_total", strategy=plan["strategy"])
+    print(f"🧩 Batch plan: {plan['strategy']} ({len(groups)} request(s) for {len(images)} image(s))")
+
+    def run_group(group: List[int]) -> Dict[str, Any]:
+        tokens = sum(plan["estimates"][i]["tokens"] for i in group)
+        start = time.perf_counter()
+        result = analyze(images=[images[i] for i in group], text_input=text_input)
+        if not result.get("error"):
+            planner.latency.record(tokens, (time.perf_counter() - start) * 1000)
+        return result
+
+    if len(groups) == 1:
+        parts = [run_group(groups[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(planner.max_parallel, len(groups)),
+                                thread_name_prefix="batch") as pool:
+            futures = [pool.submit(contextvars.copy_context().run, run_group, g) for g in groups]
+            parts = []
+            for fut in futures:
+                try:
+                    parts.append(fut.result())
+                except Exception as e:
+                    parts.append({"reviews": [], "error": str(e)})
+
+    merged = merge_results(parts)
+    merged["batch"] = {
+        "strategy": plan["strategy"],
+        "groups": [len(g) for g in groups],
+        "predicted_ms": plan["predicted_ms"],
+        "failed_groups": sum(1 for p in parts if p.get("error")),
+    }
+    return merged
@@ -0,0 +1,206 @@
+# services/cpu_pool.py
+"""
+Shared process pool for CPU-bound stages (image decode/resize, HTML parsing, schema
+validation), so they run off the thread that waits on the network.
+
+Pixels and parse trees are built under the GIL; on the request thread, one large
+screenshot or page stalls every other session served by the same process. Tasks sent
+here run in worker processes instead. Small inputs run inline, where pickling and IPC
+would cost more than the work itself.
+
+Usage:
+    from services.cpu_pool import run_cpu, map_cpu
+
+    text = run_cpu(extract_main_text, html, size=len(html), inline_below=CPU_POOL_INLINE_HTML_CHARS)
+    prepared = map_cpu(prepare_image, images, sizes=[decode_pixels(i) for i in images],
+                       inline_below=CPU_POOL_INLINE_PIXELS)     # results (or exceptions) in order
+
+Config:
+    CPU_POOL_WORKERS           worker processes (default: CPUs - 1, at least 1; 0 = always inline)
+    CPU_POOL_MAX_PENDING       tasks queued or running before callers wait (default 4 per worker)
+    CPU_POOL_START_METHOD      multiprocessing start method (default spawn: safe with threads)
+    CPU_POOL_INLINE_PIXELS     images decoding fewer pixels run inline (default 2000000)
+    CPU_POOL_INLINE_HTML_CHARS pages shorter than this are parsed inline (default 50000)
+    CPU_POOL_INLINE_REVIEWS    documents with fewer rich_reviews are validated inline (default 200)
+
+Notes:
+- Task functions must be module-level and their arguments picklable. A SpooledImage
+  crosses as its temp-file path; the worker reads the file itself.
+- IMAGE_MEMORY_BUDGET_MB is split evenly across the workers (each gets budget / workers for
+  its decodes), so the pool as a whole stays within one budget. The parent keeps its own
+  budget for the small images it decodes inline.
+- Stage timers inside a task run in the worker; pass stage= to record the stage here.
+- If a worker dies (e.g. killed for memory), the pool is rebuilt and the task re-runs inline.
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from services.image_ingest import IMAGE_MEMORY_BUDGET_MB
+from services.metrics import inc, timed
+
+
+def _cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(max(1, _cpu_count() - 1))))
+CPU_POOL_MAX_PENDING = int(os.getenv("CPU_POOL_MAX_PENDING", "0")) or max(1, CPU_POOL_WORKERS * 4)
+CPU_POOL_START_METHOD = os.getenv("CPU_POOL_START_METHOD", "spawn")
+CPU_POOL_INLINE_PIXELS = int(os.getenv("CPU_POOL_INLINE_PIXELS", "2000000"))
+CPU_POOL_INLINE_HTML_CHARS = int(os.getenv("CPU_POOL_INLINE_HTML_CHARS", "50000"))
+CPU_POOL_INLINE_REVIEWS = int(os.getenv("CPU_POOL_INLINE_REVIEWS", "200"))
+
+
+def _init_worker(decode_budget_bytes: int):
+    # Runs once per worker: pay the heavy imports before the first task arrives, and
+    # shrink this process's decode budget to its share
+    import bs4  # noqa: F401
+    import PIL.Image  # noqa: F401
+    from services.image_ingest import DECODE_BUDGET
+
+    DECODE_BUDGET.limit = max(1, decode_budget_bytes)
+
+
+def _inline(fn: Callable, args: tuple) -> Future:
+    future: Future = Future()
+    try:
+        future.set_result(fn(*args))
+    except BaseException as e:
+        future.set_exception(e)
+    return future
+
+
+class CpuPool:
+    def __init__(self, workers: int = CPU_POOL_WORKERS, max_pending: int = CPU_POOL_MAX_PENDING,
+                 start_method: str = CPU_POOL_START_METHOD):
+        self.workers = workers
+        self.start_method = start_method
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._stats = {"pool": 0, "inline": 0, "fallbacks": 0, "restarts": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                    initargs=(IMAGE_MEMORY_BUDGET_MB * 1024 * 1024 // self.workers,),
+                )
+            return self._executor
+
+    def _bump(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _reset(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self._stats["restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn: Callable, *args, size: Optional[int] = None, inline_below: int = 0) -> Future:
+        """
+        Future for fn(*args): completed already when run inline (pool disabled, or
+        size < inline_below), else running in a worker. Blocks while max_pending tasks
+        are in flight.
+        """
+        name = getattr(fn, "__name__", "task")
+        if not self.enabled or (size is not None and size < inline_below):
+            self._bump("inline")
+            inc("cpu_pool_tasks_total", mode="inline", task=name)
+            return _inline(fn, args)
+
+        self._slots.acquire()
+        executor = None
+        try:
+            executor = self._pool()
+            future = executor.submit(fn, *args)
+        except (BrokenProcessPool, RuntimeError, OSError) as e:
+            self._slots.release()
+            if executor is not None:
+                self._reset(executor)
+            self._bump("fallbacks")
+            print(f"⚠️ CPU pool unavailable ({e}); running {name} inline")
+            return _inline(fn, args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        future.executor = executor  # for _resolve: which pool to rebuild if it broke
+        self._bump("pool")
+        inc("cpu_pool_tasks_total", mode="pool", task=name)
+        return future
+
+    def _resolve(self, future: Future, fn: Callable, args: tuple) -> Any:
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            self._reset(future.executor)
+            self._bump("fallbacks")
+            return fn(*args)
+
+    def run(self, fn: Callable, *args, size: Optional[int] = None, inline_below: int = 0,
+            stage: Optional[str] = None) -> Any:
+        """fn(*args), in a worker unless the input is small; exceptions propagate as if inline."""
+        future = self.submit(fn, *args, size=size, inline_below=inline_below)
+        offloaded = hasattr(future, "executor")
+        with timed(stage) if stage and offloaded else nullcontext():
+            return self._resolve(future, fn, args)
+
+    def map(self, fn: Callable, items: Sequence[Any], sizes: Optional[Sequence[int]] = None,
+            inline_below: int = 0) -> List[Any]:
+        """
+        fn(item) for every item, spread over the workers; results in input order. A
+        failing item yields its exception object in its slot instead of raising.
+        """
+        sizes = sizes if sizes is not None else [None] * len(items)
+        futures = [self.submit(fn, item, size=size, inline_below=inline_below) for item, size in zip(items, sizes)]
+        results = []
+        for future, item in zip(futures, items):
+            try:
+                results.append(self._resolve(future, fn, (item,)))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, workers=self.workers, start_method=self.start_method)
+
+
+CPU_POOL = CpuPool()
+atexit.register(CPU_POOL.shutdown)
+
+
+def run_cpu(fn: Callable, *args, size: Optional[int] = None, inline_below: int = 0,
+            stage: Optional[str] = None) -> Any:
+    return CPU_POOL.run(fn, *args, size=size, inline_below=inline_below, stage=stage)
+
+
+def map_cpu(fn: Callable, items: Sequence[Any], sizes: Optional[Sequence[int]] = None,
+            inline_below: int = 0) -> List[Any]:
+    return CPU_POOL.map(fn, items, sizes=sizes, inline_below=inline_below)
@@ -0,0 +1,65 @@
+# services/deadline.py
+"""
+Per-request deadlines that propagate from the entry point down to the Gemini call.
+
+The deadline lives in a ContextVar, so nested calls see the tightest enclosing deadline
+without threading a parameter through every function. Worker threads must be started
+with contextvars.copy_context().run(...) to inherit it (stage_pipeline and hedging do).
+
+Usage:
+    from services.deadline import deadline_scope, remaining, check_deadline
+
+    with deadline_scope(30):          # entry point (UI, API handler, batch item)
+        ...
+        left = remaining()            # seconds left, or None if no deadline
+        check_deadline()              # raises DeadlineExceeded once expired
+
+Config:
+    ANALYSIS_DEADLINE_S  default deadline used by gemini_client entry points (default 90)
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+DEFAULT_DEADLINE_S = float(os.getenv("ANALYSIS_DEADLINE_S", "90"))
+
+_deadline: ContextVar[Optional[float]] = ContextVar("analysis_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the request deadline has passed."""
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    Set a deadline `seconds` from now for the enclosed block. An enclosing, earlier
+    deadline always wins. seconds=None (or <= 0) keeps the current deadline.
+    """
+    current = _deadline.get()
+    new = current
+    if seconds is not None and seconds > 0:
+        candidate = time.monotonic() + seconds
+        new = candidate if current is None else min(current, candidate)
+    token = _deadline.set(new)
+    try:
+        yield new
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds until the current deadline (may be negative), or None without a deadline."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline():
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded by {-left:.2f}s")
@@ -0,0 +1,177 @@
+# services/gemini_cache.py
+"""
+Gemini context caching for the static analysis prompt.
+
+The review prompt is identical on every analyze_content() call. It is sent as the
+request's system instruction rather than as the first content part and, when it is
+large enough for explicit caching, registered once with caches.create(); requests then
+carry only the cache name (cachedContent) and the model reuses the cached prefill.
+
+Usage:
+    from services.gemini_cache import PromptCache
+
+    cache = PromptCache(genai_client)
+    config = cache.config_for(model, prompt, config)     # cached_content=... or system_instruction=prompt
+    ...
+    retry = cache.fallback(config, error)                  # inline config if `error` came from a dead cache
+    cache.get_stats()
+
+Config:
+    GEMINI_PROMPT_CACHE             auto (default) | off (system instruction only, never cached)
+    GEMINI_PROMPT_CACHE_TTL_S       lifetime requested for a cache (default 3600)
+    GEMINI_PROMPT_CACHE_REFRESH_S   extend the TTL when less than this remains (default 300)
+    GEMINI_PROMPT_CACHE_MIN_TOKENS  smallest prompt worth caching (default 1024, the API minimum
+                                    for 2.5 Flash); shorter prompts stay inline
+    GEMINI_PROMPT_CACHE_RETRY_S     after a failed caches.create, stay inline this long (default 600)
+
+Notes:
+- One cache per (model, prompt text); editing the prompt creates a new one, the old one
+  simply expires.
+- Token counts are estimated from the prompt length (4 chars per token); the API is the
+  final judge, and a rejected create falls back inline until the retry interval passes.
+- A request whose cache has expired or was deleted server-side is retried once inline.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from google.genai import types
+
+from services.metrics import inc, timed
+
+GEMINI_PROMPT_CACHE = os.getenv("GEMINI_PROMPT_CACHE", "auto").lower()
+GEMINI_PROMPT_CACHE_TTL_S = float(os.getenv("GEMINI_PROMPT_CACHE_TTL_S", "3600"))
+GEMINI_PROMPT_CACHE_REFRESH_S = float(os.getenv("GEMINI_PROMPT_CACHE_REFRESH_S", "300"))
+GEMINI_PROMPT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_PROMPT_CACHE_MIN_TOKENS", "1024"))
+GEMINI_PROMPT_CACHE_RETRY_S = float(os.getenv("GEMINI_PROMPT_CACHE_RETRY_S", "600"))
+
+CHARS_PER_TOKEN = 4
+
+
+def is_cache_error(error: BaseException) -> bool:
+    """Did this request fail because its cachedContent is gone (expired, deleted, unknown)?"""
+    text = str(error).lower()
+    return "cachedcontent" in text or "cached content" in text or "cached_content" in text
+
+
+class PromptCache:
+    def __init__(self, client, mode: str = GEMINI_PROMPT_CACHE, ttl_s: float = GEMINI_PROMPT_CACHE_TTL_S,
+                 refresh_margin_s: float = GEMINI_PROMPT_CACHE_REFRESH_S,
+                 min_tokens: int = GEMINI_PROMPT_CACHE_MIN_TOKENS, retry_s: float = GEMINI_PROMPT_CACHE_RETRY_S,
+                 clock: Callable[[], float] = time.time):
+        self.client = client
+        self.mode = mode
+        self.ttl_s = ttl_s
+        self.refresh_margin_s = refresh_margin_s
+        self.min_tokens = min_tokens
+        self.retry_s = retry_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}   # (model, prompt sha) -> {"name", "expires_at"}
+        self._prompts: Dict[str, str] = {}                          # cache name -> prompt, for the inline fallback
+        self._failed_until: Dict[Tuple[str, str], float] = {}
+        self.stats = {"cached": 0, "inline": 0, "creates": 0, "refreshes": 0, "create_failures": 0, "fallbacks": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def _bump(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+        inc("gemini_prompt_cache_total", outcome=name)
+
+    def config_for(self, model: str, prompt: str, config: types.GenerateContentConfig) -> types.GenerateContentConfig:
+        """`config` carrying the prompt: by cache reference when possible, else as system instruction."""
+        name = self._cache_name(model, prompt) if self.enabled else None
+        if name:
+            self._bump("cached")
+            return config.model_copy(update={"cached_content": name})
+        self._bump("inline")
+        return config.model_copy(update={"system_instruction": prompt})
+
+    def fallback(self, config: types.GenerateContentConfig,
+                 error: BaseException) -> Optional[types.GenerateContentConfig]:
+        """The inline version of a cached `config` if `error` says its cache is gone; else None."""
+        name = getattr(config, "cached_content", None)
+        if not name or not is_cache_error(error):
+            return None
+        with self._lock:
+            prompt = self._prompts.pop(name, None)
+            for key in [k for k, entry in self._entries.items() if entry["name"] == name]:
+                del self._entries[key]
+        if prompt is None:
+            return None
+        print(f"♻️ Prompt cache {name} unavailable ({str(error)[:80]}); sending the prompt inline")
+        self._bump("fallbacks")
+        return config.model_copy(update={"cached_content": None, "system_instruction": prompt})
+
+    def _key_lock(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _cache_name(self, model: str, prompt: str) -> Optional[str]:
+        if len(prompt) // CHARS_PER_TOKEN < self.min_tokens:
+            return None
+        key = (model, hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        # One create / refresh per prompt at a time; other prompts are not blocked
+        with self._key_lock(key):
+            now = self._clock()
+            with self._lock:
+                entry = self._entries.get(key)
+                failed_until = self._failed_until.get(key, 0.0)
+            if entry and entry["expires_at"] - now > self.refresh_margin_s:
+                return entry["name"]
+            if entry and entry["expires_at"] > now and self._refresh(key, entry):
+                return entry["name"]
+            if now < failed_until:
+                return None
+            return self._create(key, model, prompt)
+
+    def _expiry(self, cached) -> float:
+        expire_time = getattr(cached, "expire_time", None)
+        return expire_time.timestamp() if expire_time else self._clock() + self.ttl_s
+
+    def _refresh(self, key: Tuple[str, str], entry: Dict[str, Any]) -> bool:
+        try:
+            with timed("prompt_cache_refresh"):
+                cached = self.client.caches.update(
+                    name=entry["name"], config=types.UpdateCachedContentConfig(ttl=f"{int(self.ttl_s)}s"))
+        except Exception as e:
+            print(f"⚠️ Prompt cache refresh failed ({e}); creating a new one")
+            with self._lock:
+                self._entries.pop(key, None)
+                self._prompts.pop(entry["name"], None)
+            return False
+        with self._lock:
+            entry["expires_at"] = self._expiry(cached)
+        self._bump("refreshes")
+        return True
+
+    def _create(self, key: Tuple[str, str], model: str, prompt: str) -> Optional[str]:
+        try:
+            with timed("prompt_cache_create"):
+                cached = self.client.caches.create(model=model, config=types.CreateCachedContentConfig(
+                    system_instruction=prompt, ttl=f"{int(self.ttl_s)}s", display_name=f"review-prompt-{key[1][:12]}"))
+        except Exception as e:
+            print(f"⚠️ Prompt cache create failed ({str(e)[:120]}); prompt stays inline "
+                  f"for {self.retry_s:.0f}s")
+            with self._lock:
+                self._failed_until[key] = self._clock() + self.retry_s
+            self._bump("create_failures")
+            return None
+        with self._lock:
+            self._entries[key] = {"name": cached.name, "expires_at": self._expiry(cached)}
+            self._prompts[cached.name] = prompt
+            self._failed_until.pop(key, None)
+        self._bump("creates")
+        print(f"🧊 Prompt cached as {cached.name}")
+        return cached.name
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, mode=self.mode, live=len(self._entries))
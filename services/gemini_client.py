@@ -1,8 +1,13 @@
 import os
+import threading
 import time
 from typing import Dict, Optional, List, Union
 from dotenv import load_dotenv # Import dotenv
+from services.deadline import DEFAULT_DEADLINE_S, deadline_scope
 from services.gemini_rest import GeminiREST
+from services.image_ingest import ImageSource
+from services.local_engine import analyze_text_local, analyze_images_local
+from services.metrics import inc, request_timings
 
 # FORCE LOAD .env here to ensure this module sees the keys
 load_dotenv()
@@ -13,7 +18,16 @@ API_KEY = os.environ.get("GEMINI_API_KEY", None)
 # DEBUG PRINT: This will show up in your terminal when you start the app
 print(f"🔌 GeminiClient Init: USE_REAL={USE_REAL}, Key Found={'Yes' if API_KEY else 'No'}")
 
+# Degraded mode: "auto" switches to the offline engine when Gemini is overloaded/down,
+# "force" always uses it, "off" surfaces Gemini errors as before.
+DEGRADED_MODE = os.environ.get("DEGRADED_MODE", "auto").lower()
+OVERLOAD_FAILURE_THRESHOLD = int(os.environ.get("OVERLOAD_FAILURE_THRESHOLD", "3"))
+OVERLOAD_COOLDOWN_S = float(os.environ.get("OVERLOAD_COOLDOWN_S", "60"))
+QUOTA_ERROR_MARKERS = ("429", "resource_exhausted", "quota", "rate limit")
+
 _gemini_client: Optional[GeminiREST] = None
+_overload_lock = threading.Lock()
+_overload = {"failures": 0, "open_until": 0.0}
 
 def _get_gemini():
     global _gemini_client
@@ -24,24 +38,98 @@ def _get_gemini():
         _gemini_client = GeminiREST(API_KEY)
     return _gemini_client
 
+def set_gemini_client(client: Optional[GeminiREST]):
+    """
+    Route real-mode calls through `client`, e.g. one pointed at the local stand-in server
+    (tests/fake_gemini_server.py). None restores the env-configured behaviour.
+    """
+    global _gemini_client, USE_REAL
+    _gemini_client = client
+    USE_REAL = client is not None or os.environ.get("USE_REAL_GEMINI", "false").lower() == "true"
+
+# -------------------------
+# overload routing
+# -------------------------
+def _degraded_reason() -> Optional[str]:
+    """Reason to skip Gemini entirely for this request, or None."""
+    if DEGRADED_MODE == "force":
+        inc("degraded_requests_total", reason="forced")
+        return "forced"
+    if DEGRADED_MODE != "auto":
+        return None
+    with _overload_lock:
+        if time.time() < _overload["open_until"]:
+            inc("degraded_requests_total", reason="gemini_overloaded")
+            return "gemini_overloaded"
+    return None
+
+def reset_overload():
+    with _overload_lock:
+        _overload.update(failures=0, open_until=0.0)
+
+def _record_gemini_outcome(error: Optional[str]) -> bool:
+    """
+    Track consecutive Gemini failures. Quota errors open the breaker immediately,
+    other errors after OVERLOAD_FAILURE_THRESHOLD in a row.
+    Returns True when this failed request should be served by the offline engine.
+    """
+    with _overload_lock:
+        if not error:
+            _overload["failures"] = 0
+            return False
+        inc("gemini_failures_total")
+        _overload["failures"] += 1
+        quota = any(m in error.lower() for m in QUOTA_ERROR_MARKERS)
+        if quota or _overload["failures"] >= OVERLOAD_FAILURE_THRESHOLD:
+            _overload["open_until"] = time.time() + OVERLOAD_COOLDOWN_S
+            print(f"🚧 Gemini overloaded ({error[:80]}); offline engine for {OVERLOAD_COOLDOWN_S:.0f}s")
+    return DEGRADED_MODE == "auto"
+
+def _with_timings(result: Dict, timings: Dict[str, int]) -> Dict:
+    # Per-stage breakdown (model_wait, json_parse, ...) ends up in doc["metadata"]
+    if timings:
+        result["stage_timings_ms"] = dict(timings)
+    return result
+
+def _model_label(resp: Dict, default: str) -> str:
+    # Inputs answered by the local prefilter never reached Gemini; label them as such
+    model = resp.get("model") or ""
+    return model if model.startswith("local-") else default
+
 # -------------------------
 # analyze_image
 # -------------------------
-def analyze_image(images: Union[bytes, List[bytes]], test_mode: bool = False) -> Dict:
+def analyze_image(images: Union[ImageSource, List[ImageSource]], test_mode: bool = False,
+                  deadline_s: Optional[float] = None) -> Dict:
+    with request_timings() as timings:
+        result = _analyze_image(images, test_mode, deadline_s)
+    return _with_timings(result, timings)
+
+def _analyze_image(images, test_mode: bool, deadline_s: Optional[float]) -> Dict:
     if USE_REAL and not test_mode:
+        image_list = images if isinstance(images, list) else [images]
+        reason = _degraded_reason()
+        if reason:
+            return analyze_images_local(len(image_list), reason=reason)
+
         client = _get_gemini()
         print("📸 Sending Image to Gemini...")
         start = time.time()
-        
-        image_list = images if isinstance(images, list) else [images]
-        resp = client.analyze_review(images=image_list)
-        
+
+        # The deadline propagates down to the Gemini HTTP call (see services/deadline.py)
+        with deadline_scope(deadline_s or DEFAULT_DEADLINE_S):
+            resp = client.analyze_review(images=image_list)
+        if _record_gemini_outcome(resp.get("error")):
+            return analyze_images_local(len(image_list), reason=resp["error"])
+
         return {
             "input_text": resp.get("input_text"),
             "extracted_text": resp.get("extracted_text"),
             "analysis": resp.get("analysis"),
-            "model": "gemini-2.5-flash (real)",
-            "processing_latency_ms": int((time.time() - start) * 1000)
+            "model": _model_label(resp, "gemini-2.5-flash (real)"),
+            "processing_latency_ms": int((time.time() - start) * 1000),
+            "error": resp.get("error"),
+            "prompt_version": resp.get("prompt_version"),
         }
 
     return {"input_text": "Mock", "extracted_text": "Mock", "analysis": {}, "model": "mock", "processing_latency_ms": 5}
@@ -49,7 +137,14 @@ def analyze_image(images: Union[bytes, List[bytes]], test_mode: bool = False) ->
 # -------------------------
 # analyze_text
 # -------------------------
-def analyze_text(text: str, test_mode: bool = False) -> Dict:
+def analyze_text(text: str, test_mode: bool = False, deadline_s: Optional[float] = None,
+                 source_url: Optional[str] = None) -> Dict:
+    """source_url: page the text was scraped from; re-scrapes then only analyse what changed."""
+    with request_timings() as timings:
+        result = _analyze_text(text, test_mode, deadline_s, source_url)
+    return _with_timings(result, timings)
+
+def _analyze_text(text: str, test_mode: bool, deadline_s: Optional[float], source_url: Optional[str] = None) -> Dict:
     # Debug print to check logic
     if USE_REAL:
         print("✅ Text Analysis: Real Mode Active")
@@ -57,20 +152,38 @@ def analyze_text(text: str, test_mode: bool = False) -> Dict:
         print("❌ Text Analysis: Real Mode INACTIVE (Using Mock)")
 
     if USE_REAL and not test_mode:
+        reason = _degraded_reason()
+        if reason:
+            print(f"🛟 Offline analysis engine ({reason})")
+            return analyze_text_local(text, reason=reason)
+
         client = _get_gemini()
         print("📝 Sending Text/URL Content to Gemini...")
         start = time.time()
-        
-        resp = client.analyze_review(text=text)
-        
+
+        with deadline_scope(deadline_s or DEFAULT_DEADLINE_S):
+            if source_url:
+                resp = client.analyze_scrape(source_url, text)
+            else:
+                resp = client.analyze_review(text=text)
+        if _record_gemini_outcome(resp.get("error")):
+            print("🛟 Gemini call failed; using offline analysis engine")
+            local = analyze_text_local(text, reason=resp["error"])
+            local["processing_latency_ms"] = int((time.time() - start) * 1000)
+            return local
+
         print(f"   ✅ Received keys: {list(resp.get('analysis', {}).keys())}")
         
         return {
             "input_text": resp.get("input_text"),
+            "raw_text": text,
             "extracted_text": resp.get("extracted_text"),
             "analysis": resp.get("analysis"),
-            "model": "gemini-2.5-pro (real)",
-            "processing_latency_ms": int((time.time() - start) * 1000)
+            "model": _model_label(resp, "gemini-2.5-pro (real)"),
+            "processing_latency_ms": int((time.time() - start) * 1000),
+            "error": resp.get("error"),
+            "prompt_version": resp.get("prompt_version"),
+            "scrape_diff": resp.get("scrape_diff"),
         }
     
     print("⚠️ Warning: Returning Mock Data")
@@ -0,0 +1,125 @@
+# services/gemini_files.py
+"""
+Reuse of Gemini Files API uploads, so repeat analyses of the same screenshot send a
+file URI instead of the image bytes.
+
+Images are keyed by content hash (see services/image_ingest.content_hash). Once an image
+has a live file reference, every later request for it (retries, re-analyses, backfills)
+carries Part.from_uri(...) and skips decoding and inline transfer entirely.
+
+Usage:
+    from services.gemini_files import GeminiFileCache
+
+    files = GeminiFileCache(genai_client)
+    part = files.lookup(key) or files.part_for(key, data, mime)
+
+Config:
+    GEMINI_FILES_MODE       off | repeat | always (default repeat)
+                            repeat: inline the first time an image is seen, upload on the
+                            second sighting and reference the URI from then on
+    GEMINI_FILES_REFRESH_S  re-upload this long before a file expires (default 3600)
+
+Notes:
+- Files API uploads expire after 48 hours; an expiring reference is dropped and
+  re-uploaded on next use.
+- A failed upload falls back to inline bytes for that request.
+- References live in process memory (bounded LRU), so they do not survive a restart.
+"""
+
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from google.genai import types
+
+from services.metrics import inc, timed
+
+GEMINI_FILES_MODE = os.getenv("GEMINI_FILES_MODE", "repeat").lower()
+GEMINI_FILES_REFRESH_S = float(os.getenv("GEMINI_FILES_REFRESH_S", "3600"))
+FILE_TTL_S = 48 * 3600
+
+
+class GeminiFileCache:
+    def __init__(self, client, mode: str = GEMINI_FILES_MODE, refresh_margin_s: float = GEMINI_FILES_REFRESH_S,
+                 max_entries: int = 2048):
+        self.client = client
+        self.mode = mode
+        self.refresh_margin_s = refresh_margin_s
+        self.max_entries = max_entries
+        self._refs: OrderedDict = OrderedDict()  # key -> (uri, mime, expires_at)
+        self._seen: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self.stats = {"inline": 0, "uploads": 0, "reuses": 0, "upload_failures": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("repeat", "always")
+
+    def _bump(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+        inc("gemini_file_parts_total", kind=name)
+
+    def lookup(self, key: str) -> Optional[types.Part]:
+        """A Part referencing a live upload of this image, or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            ref = self._refs.get(key)
+            if ref is None:
+                return None
+            uri, mime, expires_at = ref
+            if expires_at - time.time() <= self.refresh_margin_s:
+                del self._refs[key]
+                return None
+            self._refs.move_to_end(key)
+        self._bump("reuses")
+        return types.Part.from_uri(file_uri=uri, mime_type=mime)
+
+    def part_for(self, key: str, data: bytes, mime: str) -> types.Part:
+        """Inline bytes or an uploaded-file reference, depending on mode and history."""
+        if self.enabled:
+            with self._lock:
+                seen = self._seen.get(key, 0) + 1
+                self._seen[key] = seen
+                self._seen.move_to_end(key)
+                while len(self._seen) > self.max_entries:
+                    self._seen.popitem(last=False)
+                key_lock = self._key_locks.setdefault(key, threading.Lock())
+            if self.mode == "always" or seen >= 2:
+                with key_lock:
+                    part = self.lookup(key) or self._upload(key, data, mime)
+                with self._lock:
+                    self._key_locks.pop(key, None)
+                if part is not None:
+                    return part
+        self._bump("inline")
+        return types.Part.from_bytes(data=data, mime_type=mime)
+
+    def _upload(self, key: str, data: bytes, mime: str) -> Optional[types.Part]:
+        try:
+            with timed("gemini_file_upload"):
+                uploaded = self.client.files.upload(
+                    file=io.BytesIO(data),
+                    config=types.UploadFileConfig(mime_type=mime, display_name=key[:64]),
+                )
+        except Exception as e:
+            print(f"⚠️ File upload failed, sending inline: {e}")
+            self._bump("upload_failures")
+            return None
+        expires = getattr(uploaded, "expiration_time", None)
+        expires_at = expires.timestamp() if expires else time.time() + FILE_TTL_S
+        with self._lock:
+            self._refs[key] = (uploaded.uri, mime, expires_at)
+            while len(self._refs) > self.max_entries:
+                self._refs.popitem(last=False)
+        self._bump("uploads")
+        return types.Part.from_uri(file_uri=uploaded.uri, mime_type=mime)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, live_refs=len(self._refs), mode=self.mode)
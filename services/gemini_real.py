@@ -13,8 +13,11 @@ Notes:
 
 import os
 import time
-import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+
+from services.deadline import check_deadline, deadline_scope
+from services.response_schema import parse_json_response
+from services.stage_pipeline import run_two_stage
 
 # Try import; if missing, raise helpful error
 try:
@@ -26,6 +29,11 @@ except Exception as e:
 DEFAULT_VISION_MODEL = os.getenv("VISION_MODEL", "gemini-2.0-flash")
 DEFAULT_TEXT_MODEL = os.getenv("TEXT_MODEL", "gemini-2.0-pro")
 
+# Per-stage concurrency for batched image analysis (see analyze_images_real)
+DEFAULT_VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", "2"))
+DEFAULT_TEXT_CONCURRENCY = int(os.getenv("TEXT_CONCURRENCY", "2"))
+DEFAULT_PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
 def _init_client_from_env():
     key = os.getenv("GEMINI_API_KEY")
     if not key:
@@ -59,20 +67,11 @@ def analyze_text_real(text: str, model: str = None) -> Dict[str, Any]:
     raw = response.text or ""
     latency = int((time.time() - start) * 1000)
 
-    # Attempt to parse JSON from the response (robustly)
-    parsed = None
-    try:
-        # The model should return strict JSON; try to parse directly.
-        parsed = json.loads(raw)
-    except Exception:
-        # Try to extract first JSON-looking substring
-        import re
-        m = re.search(r'(\{.*\})', raw, flags=re.DOTALL)
-        if m:
-            try:
-                parsed = json.loads(m.group(1))
-            except Exception:
-                parsed = None
+    # Attempt to parse JSON from the response (robustly): strict JSON first,
+    # then the first decodable JSON object in the text
+    parsed = parse_json_response(raw)
+    if not isinstance(parsed, dict):
+        parsed = None
 
     if parsed is None:
         # As a fallback, return a minimal structure noting failure
@@ -108,14 +107,20 @@ def analyze_text_real(text: str, model: str = None) -> Dict[str, Any]:
         "processing_latency_ms": latency,
     }
 
-def analyze_image_real(image_bytes: bytes, model: Optional[str] = None) -> Dict[str, Any]:
+def extract_text_real(image_bytes: bytes, model: Optional[str] = None) -> Dict[str, Any]:
     """
-    For Vision, we send binary image to the multimodal generate endpoint.
+    Vision stage: ask the multimodal model for the review text visible in a screenshot.
     The google.generativeai client supports input image bytes; use generate_image_labeling/vision features.
     This is a best-effort example — if the library API differs, adapt accordingly.
+
+    Returns {"extracted_text", "model", "processing_latency_ms"} plus "error" when the call failed.
     """
     model = model or DEFAULT_VISION_MODEL
     start = time.time()
+    try:
+        check_deadline()
+    except Exception as e:
+        return {"extracted_text": "", "error": str(e), "model": model, "processing_latency_ms": 0}
     _init_client_from_env()
 
     # The API offers multimodal generate; here we ask the model to extract the review text only.
@@ -139,18 +144,10 @@ def analyze_image_real(image_bytes: bytes, model: Optional[str] = None) -> Dict[
         )
         raw = response.text or ""
     except Exception as e:
-        # If the library does not support images that way, use a fallback prompt or raise
+        # If the library does not support images that way, report it to the caller
         return {
             "extracted_text": "",
-            "analysis": {
-                "sentiment": "neutral",
-                "score": 0.0,
-                "themes": [],
-                "intent": "other",
-                "action_items": [],
-                "confidence": 0.0,
-                "error": str(e)
-            },
+            "error": str(e),
             "model": model,
             "processing_latency_ms": int((time.time() - start) * 1000)
         }
@@ -158,31 +155,87 @@ def analyze_image_real(image_bytes: bytes, model: Optional[str] = None) -> Dict[
     latency = int((time.time() - start) * 1000)
 
     # Try to parse JSON for extracted text
-    import re
-    parsed_txt = None
-    try:
-        parsed_txt = json.loads(raw)
-    except Exception:
-        m = re.search(r'(\{.*\})', raw, flags=re.DOTALL)
-        if m:
-            try:
-                parsed_txt = json.loads(m.group(1))
-            except Exception:
-                parsed_txt = None
+    parsed_txt = parse_json_response(raw)
+    if not isinstance(parsed_txt, dict):
+        parsed_txt = None
 
     extracted = parsed_txt.get("extracted_text") if parsed_txt else raw.strip()
+    return {"extracted_text": extracted, "model": model, "processing_latency_ms": latency}
+
+def _vision_failure(extraction: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "extracted_text": "",
+        "analysis": {
+            "sentiment": "neutral",
+            "score": 0.0,
+            "themes": [],
+            "intent": "other",
+            "action_items": [],
+            "confidence": 0.0,
+            "error": extraction.get("error")
+        },
+        "model": extraction.get("model"),
+        "processing_latency_ms": extraction.get("processing_latency_ms")
+    }
+
+def _analyze_extraction(extraction: Dict[str, Any]) -> Dict[str, Any]:
+    """Text stage: run text analysis on a vision-stage result and combine both."""
+    if extraction.get("error"):
+        return _vision_failure(extraction)
+    # Raises DeadlineExceeded; run_two_stage records it as this item's error
+    check_deadline()
 
-    # Run text analysis on the extracted text
-    analysis_result = analyze_text_real(extracted, model=DEFAULT_TEXT_MODEL)
+    analysis_result = analyze_text_real(extraction["extracted_text"], model=DEFAULT_TEXT_MODEL)
 
     # Combine results: use extracted_text and analysis from text model
-    result = {
-        "extracted_text": extracted,
+    return {
+        "extracted_text": extraction["extracted_text"],
         "analysis": analysis_result.get("analysis"),
-        "model": f"{model}+{DEFAULT_TEXT_MODEL}",
-        "processing_latency_ms": latency
+        "model": f"{extraction['model']}+{DEFAULT_TEXT_MODEL}",
+        "processing_latency_ms": extraction["processing_latency_ms"],
+        "stage_latency_ms": {
+            "vision": extraction["processing_latency_ms"],
+            "analysis": analysis_result.get("processing_latency_ms"),
+        },
     }
-    return result
+
+def analyze_image_real(image_bytes: bytes, model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    For Vision, we send binary image to the multimodal generate endpoint,
+    then run text analysis on the extracted text.
+    """
+    return _analyze_extraction(extract_text_real(image_bytes, model=model))
+
+def analyze_images_real(
+    images: List[bytes],
+    model: Optional[str] = None,
+    vision_workers: Optional[int] = None,
+    text_workers: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    deadline_s: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Pipelined batch version of analyze_image_real.
+
+    Vision and text analysis run as separate worker pools joined by a bounded queue, so OCR
+    for image N+1 overlaps analysis for image N. Concurrency per stage comes from the args or
+    VISION_CONCURRENCY / TEXT_CONCURRENCY / PIPELINE_QUEUE_SIZE env vars.
+    deadline_s bounds the whole batch; images not started in time fail with a deadline error.
+
+    Returns {"results": [...one per image, input order...], "stage_latency": {...}, "wall_ms": int}
+    """
+    with deadline_scope(deadline_s):
+        out = run_two_stage(
+            images,
+            lambda img: extract_text_real(img, model=model),
+            _analyze_extraction,
+            first_workers=vision_workers or DEFAULT_VISION_CONCURRENCY,
+            second_workers=text_workers or DEFAULT_TEXT_CONCURRENCY,
+            queue_size=queue_size or DEFAULT_PIPELINE_QUEUE_SIZE,
+            stage_names=("vision", "analysis"),
+        )
+    print(f"📊 Pipeline stages: {out['stage_latency']}")
+    return out
 
 # Public API for the app to import
 def analyze_text(text: str, test_mode: bool = True) -> Dict[str, Any]:
@@ -198,3 +251,9 @@ def analyze_image(image_bytes: bytes, test_mode: bool = True) -> Dict[str, Any]:
         from services.gemini_client import analyze_image as mock_image
         return mock_image(image_bytes, test_mode=True)
     return analyze_image_real(image_bytes)
+
+def analyze_images(images: List[bytes], test_mode: bool = True) -> List[Dict[str, Any]]:
+    if test_mode:
+        from services.gemini_client import analyze_image as mock_image
+        return [mock_image(img, test_mode=True) for img in images]
+    return analyze_images_real(images)["results"]
@@ -1,21 +1,117 @@
 import os
 import json
+import hashlib
 from google import genai
 from google.genai import types
-from PIL import Image
-import io
+import threading
+
+from prompts.prompts import build_compact_review_prompt
+from services.batch_planner import BatchPlanner, merge_results, run_batched
+from services.deadline import DeadlineExceeded, check_deadline, remaining
+from services.hedging import HedgePolicy, LatencyTracker, hedged_call
+from services.gemini_cache import PromptCache
+from services.gemini_files import GeminiFileCache
+from services.cpu_pool import CPU_POOL_INLINE_PIXELS, map_cpu
+from services.image_ingest import IMAGE_MAX_SIDE, content_hash, decode_pixels, prepare_image
+from services.json_repair import recover_partial
+from services.local_engine import split_reviews
+from services.metrics import inc, timed
+from services.prefilter import prefilter_input, ROUTE_MODEL
+from services.response_schema import COMPACT_RESPONSE_SCHEMA, expand_compact
+from services.review_store import ReviewStore, residual_text, stored_result, text_hash
+from services.scrape_snapshots import (SCRAPE_SNAPSHOTS_ENABLED, SnapshotStore, build_snapshot, diff_page,
+                                       merge_reviews, page_boilerplate, snapshot_entries)
+from workers.records import Analysis, RichReview
+
+# Constrain output to the compact schema (short keys + enum codes). Set to "false" to use
+# the original free-form JSON prompt, e.g. to compare parse-failure / output-token metrics.
+COMPACT_SCHEMA = os.environ.get("GEMINI_COMPACT_SCHEMA", "true").lower() == "true"
+# How many follow-up calls may be made to fetch the remainder of a truncated response
+MAX_CONTINUATIONS = int(os.environ.get("GEMINI_MAX_CONTINUATIONS", "2"))
+# Point the client at another endpoint, e.g. the local stand-in (tests/fake_gemini_server.py)
+BASE_URL = os.environ.get("GEMINI_BASE_URL") or None
+
+def prompt_version(compact: bool = COMPACT_SCHEMA) -> str:
+    """GeminiREST.prompt_version without a client (e.g. to select stale documents for a backfill)."""
+    if compact:
+        source = build_compact_review_prompt() + json.dumps(COMPACT_RESPONSE_SCHEMA, sort_keys=True)
+    else:
+        source = GeminiREST._verbose_prompt()
+    return f"{'c' if compact else 'v'}-{hashlib.sha256(source.encode('utf-8')).hexdigest()[:12]}"
 
 class GeminiREST:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, base_url: str = None):
         self.api_key = api_key or os.environ.get("GEMINI_API_KEY")
         if not self.api_key:
             print("⚠️ Warning: GEMINI_API_KEY not found in env. Ensure it is set.")
 
-        self.client = genai.Client(api_key=self.api_key)
+        base_url = base_url or BASE_URL
+        http_options = types.HttpOptions(base_url=base_url) if base_url else None
+        self.client = genai.Client(api_key=self.api_key, http_options=http_options)
         self.model_flash = "gemini-2.5-flash"
+        self.compact_schema = COMPACT_SCHEMA
 
-    def analyze_content(self, images: list = None, text_input: str = None):
-        prompt = (
+        # Tail-latency control: observed call latencies drive optional hedged requests
+        self.latency = LatencyTracker()
+        self.hedge_policy = HedgePolicy.from_env()
+        # Packs or fans out multi-screenshot requests based on size and observed latency
+        self.batch_planner = BatchPlanner.from_env()
+        # Repeat analyses of the same screenshot reference a Files API upload instead of re-sending bytes
+        self.files = GeminiFileCache(self.client)
+        # The static prompt goes out as a system instruction, by cache reference once registered
+        self.prompt_cache = PromptCache(self.client)
+        # Reviews already analysed with the same prompt and model are served from the store
+        self.review_store = ReviewStore.from_env()
+        # Re-scrapes of a URL only send reviews that are new or changed since its last snapshot
+        self.snapshots = SnapshotStore() if SCRAPE_SNAPSHOTS_ENABLED else None
+
+        # Per output mode: calls, JSON parse failures and output tokens (before/after comparison)
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            mode: {"calls": 0, "parse_failures": 0, "output_tokens": 0,
+                   "recovered_reviews": 0, "continuations": 0}
+            for mode in ("compact", "verbose")
+        }
+
+    def _record_call(self, mode: str, response, parse_failed: bool):
+        usage = getattr(response, "usage_metadata", None)
+        tokens = getattr(usage, "candidates_token_count", None) or 0
+        inc("gemini_calls_total", mode=mode)
+        inc("gemini_output_tokens_total", tokens, mode=mode)
+        if parse_failed:
+            inc("gemini_parse_failures_total", mode=mode)
+        with self._stats_lock:
+            entry = self.stats[mode]
+            entry["calls"] += 1
+            entry["output_tokens"] += tokens
+            if parse_failed:
+                entry["parse_failures"] += 1
+
+    def _bump(self, mode: str, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[mode][key] += amount
+
+    def get_stats(self):
+        """Snapshot of per-mode call metrics, with averages."""
+        with self._stats_lock:
+            out = {}
+            for mode, entry in self.stats.items():
+                calls = entry["calls"]
+                out[mode] = dict(
+                    entry,
+                    avg_output_tokens=round(entry["output_tokens"] / calls, 1) if calls else None,
+                    parse_failure_rate=round(entry["parse_failures"] / calls, 4) if calls else None,
+                )
+            return out
+
+    @property
+    def prompt_version(self) -> str:
+        """Fingerprint of the prompt and response schema in use; changes whenever either is edited."""
+        return prompt_version(self.compact_schema)
+
+    @staticmethod
+    def _verbose_prompt():
+        return (
             "You are a Senior Product Manager. Your goal is to extract strategic insights from user feedback.\n\n"
             "INPUT CONTEXT:\n"
             "The input is text or images (screenshots).\n\n"
@@ -48,67 +144,329 @@ class GeminiREST:
             "}"
         )
 
-        contents = [prompt]
+    def analyze_content(self, images: list = None, text_input: str = None):
+        compact = self.compact_schema
+        prompt = build_compact_review_prompt() if compact else self._verbose_prompt()
+
+        contents = []
 
         if images:
-            for img_bytes in images:
-                try:
-                    image = Image.open(io.BytesIO(img_bytes))
-                    contents.append(image)
-                except Exception as e:
-                    print(f"Skipping invalid image: {e}")
+            # Large images are decoded in the CPU pool (in parallel, each worker under its own
+            # budget); small ones inline. Only encoded bytes come back.
+            with timed("image_decode"):
+                keys, parts, pending = {}, {}, []
+                for i, source in enumerate(images):
+                    try:
+                        keys[i] = f"{content_hash(source)}:{IMAGE_MAX_SIDE}" if self.files.enabled else None
+                        part = self.files.lookup(keys[i]) if keys[i] else None
+                    except Exception as e:
+                        print(f"Skipping invalid image: {e}")
+                        continue
+                    if part is None:
+                        pending.append(i)
+                    else:
+                        parts[i] = part
+                prepared = map_cpu(prepare_image, [images[i] for i in pending],
+                                   sizes=[decode_pixels(images[i]) for i in pending],
+                                   inline_below=CPU_POOL_INLINE_PIXELS)
+                for i, out in zip(pending, prepared):
+                    if isinstance(out, Exception):
+                        print(f"Skipping invalid image: {out}")
+                        continue
+                    data, mime = out
+                    parts[i] = self.files.part_for(keys[i], data, mime) if keys[i] else \
+                        types.Part.from_bytes(data=data, mime_type=mime)
+                contents.extend(parts[i] for i in sorted(parts))
         
         if text_input:
             contents.append(f"User Input Text:\n{text_input}")
 
+        config = types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=COMPACT_RESPONSE_SCHEMA if compact else None
+        )
+        config = self.prompt_cache.config_for(self.model_flash, prompt, config)
+
+        mode = "compact" if compact else "verbose"
+        list_key = "r" if compact else "reviews"
+
         try:
-            response = self.client.models.generate_content(
-                model=self.model_flash,
-                contents=contents,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
-                )
-            )
-            return json.loads(response.text)
+            data = self._generate_json(contents, config, mode, list_key)
+            if data["truncated"] and data["items"]:
+                data = self._continue_truncated(contents, config, mode, list_key, data)
+            if not data["items"] and not any(v for k, v in data["data"].items() if k != list_key):
+                raise ValueError("Model output could not be parsed")
+            result = expand_compact(data["data"]) if compact else data["data"]
+            if data["truncated"]:
+                result["partial"] = True
+            return result
 
         except Exception as e:
             print(f"❌ Analysis Error: {e}")
             return {
                 "reviews": [],
-                "overall_summary": f"Error processing request: {str(e)}"
+                "overall_summary": f"Error processing request: {str(e)}",
+                "error": str(e)
             }
 
+    def _call_model(self, contents, config):
+        """
+        generate_content bounded by the current request deadline (services.deadline),
+        hedged when GEMINI_HEDGE is enabled.
+        """
+        check_deadline()
+        left = remaining()
+        if left is not None:
+            http_options = types.HttpOptions(timeout=max(1, int(left * 1000)))
+            config = config.model_copy(update={"http_options": http_options})
+
+        def call(config=config):
+            return self.client.models.generate_content(
+                model=self.model_flash,
+                contents=contents,
+                config=config
+            )
+
+        with timed("model_wait"):
+            try:
+                return hedged_call(call, self.latency, self.hedge_policy, timeout=left)
+            except Exception as e:
+                # Expired / deleted prompt cache: same request once more with the prompt inline
+                inline = self.prompt_cache.fallback(config, e)
+                if inline is None:
+                    raise
+                return hedged_call(lambda: call(inline), self.latency, self.hedge_policy, timeout=remaining())
+
+    def _generate_json(self, contents, config, mode: str, list_key: str):
+        """One model call. Returns recover_partial()-style {"data", "items", "truncated"}."""
+        response = self._call_model(contents, config)
+        raw = response.text or ""
+        with timed("json_parse"):
+            try:
+                parsed = json.loads(raw)
+            except Exception:
+                parsed = None
+            if isinstance(parsed, dict):
+                self._record_call(mode, response, parse_failed=False)
+                return {"data": parsed, "items": list(parsed.get(list_key) or []), "truncated": False}
+            self._record_call(mode, response, parse_failed=True)
+            recovered = recover_partial(raw, list_key=list_key)
+        self._bump(mode, "recovered_reviews", len(recovered["items"]))
+        print(f"🩹 Recovered {len(recovered['items'])} complete review(s) from malformed output "
+              f"(truncated={recovered['truncated']})")
+        return recovered
+
+    def _continue_truncated(self, contents, config, mode: str, list_key: str, first):
+        """
+        Ask only for the reviews that were not emitted before the output was cut off,
+        and merge them with what was already recovered.
+        """
+        items = list(first["items"])
+        data = dict(first["data"])
+        current = first
+        rounds = 0
+        while current["truncated"] and rounds < MAX_CONTINUATIONS:
+            rounds += 1
+            self._bump(mode, "continuations")
+            print(f"🔁 Requesting remainder after {len(items)} review(s) (round {rounds})")
+            note = self._continuation_note(items, list_key)
+            try:
+                current = self._generate_json(contents + [note], config, mode, list_key)
+            except DeadlineExceeded:
+                # Out of time: keep what was already recovered rather than failing the request
+                print("⏱️ Deadline reached; returning partial result")
+                break
+            items.extend(current["items"])
+            data.update({k: v for k, v in current["data"].items() if v and k != list_key})
+        data[list_key] = items
+        return {"data": data, "items": items, "truncated": current["truncated"]}
+
+    @staticmethod
+    def _continuation_note(items, list_key: str) -> str:
+        lines = []
+        for i, item in enumerate(items, 1):
+            meta = item.get("metadata") or {}
+            user = item.get("u") or meta.get("username") or "unknown"
+            text = (item.get("t") or item.get("text") or "")[:60]
+            lines.append(f"{i}. {user}: \"{text}\"")
+        return (
+            "CONTINUATION: your previous answer was cut off. These reviews were already extracted:\n"
+            + "\n".join(lines)
+            + f"\nReturn ONLY the remaining reviews in \"{list_key}\" (do not repeat the ones above), "
+            "plus the summary and overall analysis covering ALL the feedback."
+        )
+
     def analyze_review(self, images=None, text=None):
         image_list = images if isinstance(images, list) else ([images] if images else [])
+
+        # Answer empty / trivial / boilerplate inputs locally, without a Gemini call
+        decision = prefilter_input(text=text, images=image_list)
+        if decision["route"] == ROUTE_MODEL:
+            if len(decision["images"]) > 1:
+                # Single request, packed groups or per-image fan-out, merged back into one result
+                result = run_batched(self.analyze_content, decision["images"], self.batch_planner, text_input=text)
+            elif text and not decision["images"] and self.review_store is not None:
+                result = self._analyze_text_stored(text)
+            else:
+                result = self.analyze_content(images=decision["images"], text_input=text)
+            model = self.model_flash
+        else:
+            print(f"⚡ Prefilter absorbed input ({decision['reason']})")
+            result = decision["result"]
+            model = f"local-prefilter:{decision['route']}"
         
-        result = self.analyze_content(images=image_list, text_input=text)
-        
-        raw_reviews = result.get("reviews", [])
-        valid_reviews = []
-
-        # RELAXED FILTER: Show review if it has ANY meaningful text
-        for r in raw_reviews:
-            has_text = len(r.get("text", "") or "") > 5
-            if has_text:
-                valid_reviews.append(r)
-
-        analysis_block = result.get("analysis", {})
-
-        enhanced_analysis = {
-            "sentiment": analysis_block.get("sentiment", "Neutral"),
-            "themes": analysis_block.get("pain_points", []) + analysis_block.get("feature_requests", []),
-            "intent": "See actionable_advice",
-            "score": 0.9 if analysis_block.get("sentiment") == "Positive" else 0.5,
-            "confidence": 0.99,
-            "rich_reviews": valid_reviews,
-            "overall_summary": result.get("overall_summary") or "No summary generated.",
-            "top_level_advice": analysis_block.get("actionable_advice") or "No specific advice generated.",
-            "top_level_pains": analysis_block.get("pain_points", []),
-            "top_level_features": analysis_block.get("feature_requests", [])
-        }
+        response = build_review_response(result, text, image_list, model)
+        if decision["route"] == ROUTE_MODEL:
+            response["prompt_version"] = self.prompt_version
+        if "review_store" in result:
+            response["review_store"] = result["review_store"]
+        return response
+
+    def _analyze_text_stored(self, text: str) -> dict:
+        """
+        Resolve reviews seen before (same normalized text, prompt version and model) from the
+        review store and send only the rest of the input; fresh per-review results are stored
+        under the review text the model returned.
+        """
+        version, model = self.prompt_version, self.model_flash
+        whole = text_hash(text)
+        segments = {}
+        for segment in split_reviews(text):
+            segments.setdefault(text_hash(segment), segment)
+        try:
+            known = self.review_store.get_many([whole, *segments], version, model)
+        except Exception as e:
+            print(f"⚠️ Review store lookup failed: {e}")
+            known = {}
+
+        fresh = None
+        if whole in known:
+            # The whole input is one review analysed before
+            result = stored_result([known[whole]])
+            hits = 1
+        elif not known:
+            result = fresh = self.analyze_content(text_input=text)
+            hits = 0
+        else:
+            hits = len(known)
+            rest = residual_text(text, [segments[h] for h in known])
+            print(f"🗃️ Review store: {hits} known review(s); sending the rest of the input")
+            result = stored_result([known[h] for h in segments if h in known])
+            if rest:
+                fresh = self.analyze_content(text_input=rest)
+                result = merge_results([result, fresh])
+
+        misses = 0
+        if fresh and not fresh.get("error"):
+            reviews = [r for r in fresh.get("reviews") or [] if (r.get("text") or "").strip()]
+            misses = len(reviews)
+            items = [(text_hash(r["text"]), r) for r in reviews]
+            if fresh is result and len(reviews) == 1:
+                # A single review pasted as-is: also keyed on the input, in case the model cleaned its text
+                items.append((whole, reviews[0]))
+            try:
+                self.review_store.put_many(items, version, model)
+            except Exception as e:
+                print(f"⚠️ Review store write failed: {e}")
+        return dict(result, review_store={"hits": hits, "misses": misses})
+
+    def analyze_scrape(self, url: str, text: str) -> dict:
+        """
+        analyze_review() for scraped page text, incremental against the URL's last snapshot:
+        new and changed reviews are analysed, unchanged ones reuse their stored analysis,
+        and the summary is rebuilt over the merged set. Adds a "scrape_diff" block.
+        """
+        if self.snapshots is None:
+            return self.analyze_review(text=text)
+        decision = prefilter_input(text=text)
+        if decision["route"] != ROUTE_MODEL:
+            print(f"⚡ Prefilter absorbed input ({decision['reason']})")
+            return build_review_response(decision["result"], text, [], f"local-prefilter:{decision['route']}")
+
+        version, model = self.prompt_version, self.model_flash
+        previous = self.snapshots.load(url)
+        if previous and (previous.get("prompt_version"), previous.get("model")) != (version, model):
+            previous = None  # analysed with another prompt or model: start over
+        diff = diff_page(previous, text)
+
+        fresh = None
+        if previous is None:
+            # First scrape: the whole page, so the model sees reviews in context
+            fresh_text = text
+        else:
+            print(f"🔎 Re-scrape diff: {len(diff['unchanged'])} review(s) found unchanged, "
+                  f"{len(diff['removed'])} missing; {len(diff['residual'])} chars left to analyse")
+            fresh_text = diff["residual"]
+        if fresh_text:
+            if self.review_store is not None:
+                fresh = self._analyze_text_stored(fresh_text)
+            else:
+                fresh = self.analyze_content(text_input=fresh_text)
+        failed = bool(fresh and fresh.get("error"))
+
+        fresh_reviews = [] if failed or not fresh else fresh.get("reviews") or []
+        merged = merge_reviews(diff, fresh_reviews)
+        counts = {k: len(v) for k, v in merged.items()}
+        entries = snapshot_entries(text, merged)
+        boilerplate = list((previous or {}).get("boilerplate", [])) + page_boilerplate(fresh_text, fresh_reviews)
+        reviews = [e["review"] for e in entries if e.get("review")]
+        if failed and not reviews:
+            result = fresh
+        elif previous is None:
+            result = fresh
+            self.snapshots.save(url, build_snapshot(url, entries, version, model, fresh.get("overall_summary") or "",
+                                                    boilerplate))
+        else:
+            result = stored_result(reviews)
+            summary = (fresh.get("overall_summary") if fresh and not failed else None) \
+                or previous.get("overall_summary") or ""
+            result["overall_summary"] = (
+                f"{summary} (Since {previous.get('fetched_at', '')[:10]}: {counts['new']} new, "
+                f"{counts['changed']} changed, {counts['removed']} removed review(s); "
+                f"{counts['unchanged']} unchanged analyses reused.)"
+            ).strip()
+            if fresh and not failed and (fresh.get("analysis") or {}).get("actionable_advice"):
+                result["analysis"]["actionable_advice"] = fresh["analysis"]["actionable_advice"]
+            if failed:
+                result["partial"] = True
+            else:
+                # Only a fully analysed page becomes the next baseline
+                self.snapshots.save(url, build_snapshot(url, entries, version, model, summary, boilerplate))
+
+        response = build_review_response(result, text, [], model)
+        response["prompt_version"] = version
+        response["scrape_diff"] = dict(counts, previous_fetched_at=(previous or {}).get("fetched_at"))
+        return response
+
+
+def build_review_response(result: dict, text=None, image_list=None, model: str = None) -> dict:
+    """Shape an analyze_content() result into the analyze_review() response (pure, no I/O)."""
+    image_list = image_list or []
+    reviews = [RichReview.from_dict(r) for r in result.get("reviews", [])]
+
+    # RELAXED FILTER: Show review if it has ANY meaningful text
+    valid_reviews = [r for r in reviews if len(r.text or "") > 5]
+
+    analysis_block = result.get("analysis", {})
+
+    enhanced_analysis = Analysis(
+        sentiment=analysis_block.get("sentiment", "Neutral"),
+        themes=analysis_block.get("pain_points", []) + analysis_block.get("feature_requests", []),
+        intent="See actionable_advice",
+        score=0.9 if analysis_block.get("sentiment") == "Positive" else 0.5,
+        confidence=0.99,
+        rich_reviews=valid_reviews,
+        overall_summary=result.get("overall_summary") or "No summary generated.",
+        top_level_advice=analysis_block.get("actionable_advice") or "No specific advice generated.",
+        top_level_pains=analysis_block.get("pain_points", []),
+        top_level_features=analysis_block.get("feature_requests", []),
+    )
 
-        return {
-            "input_text": text or f"{len(image_list)} Images Processed",
-            "extracted_text": "Content processed by Gemini", 
-            "analysis": enhanced_analysis,
-        }
\ No newline at end of file
+    return {
+        "input_text": text or f"{len(image_list)} Images Processed",
+        "raw_text": text or None,  # what was submitted; kept on the document for backfills
+        "extracted_text": "Content processed by Gemini", 
+        "analysis": enhanced_analysis.to_dict(),
+        "model": model,
+        "error": result.get("error"),
+    }
@@ -0,0 +1,180 @@
+# services/hedging.py
+"""
+Hedged requests for tail latency.
+
+A call that is still running once it exceeds the observed p95 latency gets a duplicate
+("hedge") request; whichever response arrives first wins. Hedges are capped to a fraction
+of all calls so a global slowdown cannot double the load on Gemini.
+
+Usage:
+    from services.hedging import LatencyTracker, HedgePolicy, hedged_call
+
+    tracker, policy = LatencyTracker(), HedgePolicy(enabled=True)
+    response = hedged_call(lambda: client.models.generate_content(...), tracker, policy, timeout=20)
+
+Config (defaults for HedgePolicy.from_env):
+    GEMINI_HEDGE             enable hedging ("false")
+    GEMINI_HEDGE_PERCENTILE  latency percentile that triggers a hedge (95)
+    GEMINI_HEDGE_MAX_RATIO   max hedges / calls (0.05)
+    GEMINI_HEDGE_MIN_SAMPLES samples needed before hedging starts (20)
+    GEMINI_HEDGE_WORKERS     hedge attempts in flight at once, process-wide (16)
+
+Notes:
+- Without a hedge to race (hedging off, or too few samples yet) fn runs inline on the
+  caller's thread; the call's own HTTP timeout bounds it. Nothing caps how many calls run
+  at once, and no time is lost queueing for a worker.
+- With hedging, each attempt runs on its own thread. Only the duplicates are capped: a
+  hedge that finds all GEMINI_HEDGE_WORKERS slots busy is skipped, never queued.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, Optional
+
+from services.deadline import DeadlineExceeded
+
+_hedge_slots = threading.BoundedSemaphore(int(os.getenv("GEMINI_HEDGE_WORKERS", "16")))
+
+
+class LatencyTracker:
+    """Rolling window of call latencies (seconds)."""
+
+    def __init__(self, window: int = 500):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        k = max(0, min(len(ordered) - 1, int(round((pct / 100.0) * (len(ordered) - 1)))))
+        return ordered[k]
+
+
+class HedgePolicy:
+    def __init__(self, enabled: bool = False, percentile: float = 95.0,
+                 max_hedge_ratio: float = 0.05, min_samples: int = 20):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_env(cls) -> "HedgePolicy":
+        return cls(
+            enabled=os.getenv("GEMINI_HEDGE", "false").lower() == "true",
+            percentile=float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95")),
+            max_hedge_ratio=float(os.getenv("GEMINI_HEDGE_MAX_RATIO", "0.05")),
+            min_samples=int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20")),
+        )
+
+    def hedge_delay(self, tracker: LatencyTracker) -> Optional[float]:
+        """Seconds to wait before hedging, or None if hedging is off / not warmed up."""
+        if not self.enabled or tracker.count() < self.min_samples:
+            return None
+        return tracker.percentile(self.percentile)
+
+    def try_acquire_hedge(self) -> bool:
+        """Budget check: allow a hedge only while hedges/calls stays under the cap."""
+        with self._lock:
+            if (self.hedges + 1) > self.max_hedge_ratio * max(self.calls, 1):
+                return False
+            self.hedges += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"calls": self.calls, "hedges": self.hedges, "hedge_wins": self.hedge_wins,
+                    "hedge_rate": round(self.hedges / self.calls, 4) if self.calls else 0.0}
+
+
+def _start(fn: Callable[[], Any], on_done: Optional[Callable[[], None]] = None) -> Future:
+    """Run fn on a new daemon thread; the Future holds its outcome."""
+    future: Future = Future()
+    # copy_context so the callee sees the caller's deadline
+    ctx = contextvars.copy_context()
+
+    def run():
+        try:
+            future.set_result(ctx.run(fn))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            if on_done is not None:
+                on_done()
+
+    threading.Thread(target=run, name="gemini-call", daemon=True).start()
+    return future
+
+
+def hedged_call(fn: Callable[[], Any], tracker: LatencyTracker, policy: HedgePolicy,
+                timeout: Optional[float] = None) -> Any:
+    """
+    Run fn(); if it is slower than the policy's percentile, race a duplicate.
+    Raises DeadlineExceeded when no attempt finished within `timeout` seconds.
+    """
+    with policy._lock:
+        policy.calls += 1
+    start = time.monotonic()
+    delay = policy.hedge_delay(tracker)
+
+    if delay is None or (timeout is not None and delay >= timeout):
+        # Nothing to race: run inline, bounded by the call's own timeout
+        try:
+            result = fn()
+        except Exception as e:
+            if timeout is not None and time.monotonic() - start >= timeout:
+                raise DeadlineExceeded(f"Gemini call exceeded {timeout:.2f}s deadline") from e
+            raise
+        elapsed = time.monotonic() - start
+        tracker.record(elapsed)
+        if timeout is not None and elapsed > timeout:
+            raise DeadlineExceeded(f"Gemini call exceeded {timeout:.2f}s deadline")
+        return result
+
+    primary = _start(fn)
+    done, _ = wait([primary], timeout=delay)
+    attempts = [primary]
+    if not done and policy.try_acquire_hedge():
+        if _hedge_slots.acquire(blocking=False):
+            attempts.append(_start(fn, on_done=_hedge_slots.release))
+        else:
+            with policy._lock:
+                policy.hedges -= 1  # no slot free: the hedge was never sent
+
+    pending = set(attempts)
+    last_error: Optional[BaseException] = None
+    while pending:
+        left = None if timeout is None else timeout - (time.monotonic() - start)
+        if left is not None and left <= 0:
+            break
+        done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.exception() is None:
+                tracker.record(time.monotonic() - start)
+                if fut is not primary:
+                    with policy._lock:
+                        policy.hedge_wins += 1
+                return fut.result()
+            last_error = fut.exception()
+
+    if last_error is not None and not pending:
+        raise last_error
+    raise DeadlineExceeded(f"Gemini call exceeded {timeout:.2f}s deadline")
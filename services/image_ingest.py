@@ -0,0 +1,231 @@
+# services/image_ingest.py
+"""
+Bounded-memory image ingestion.
+
+Uploads are spilled to temp files as they arrive, and each image is then decoded,
+downscaled and re-encoded one at a time under a process-wide decode budget, so only
+compressed bytes are ever held for the whole batch.
+
+Usage:
+    from services.image_ingest import spooled_uploads, prepare_image
+
+    with spooled_uploads(st_uploaded_files) as images:   # temp files, removed on exit
+        for image in images:
+            data, mime = prepare_image(image)            # e.g. (b"\\x89PNG...", "image/png")
+
+Config:
+    IMAGE_MEMORY_BUDGET_MB  decoded-pixel bytes allowed in flight per process (default 256)
+    IMAGE_MAX_SIDE          longest side sent to Gemini, in pixels (default 2048)
+    IMAGE_SPOOL_DIR         where uploads are spooled (default: system temp dir)
+
+Notes:
+- JPEG/PNG/WEBP files already within IMAGE_MAX_SIDE are sent as-is, without decoding.
+- JPEGs are decoded at reduced scale via draft(), so a 12 MP photo never materialises
+  at full resolution.
+- An image larger than the whole budget is still processed, but only on its own.
+- GeminiREST hands large images to services/cpu_pool.py; each worker process decodes
+  under its own budget (decode_pixels() decides what is large).
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from PIL import Image
+
+IMAGE_MEMORY_BUDGET_MB = int(os.getenv("IMAGE_MEMORY_BUDGET_MB", "256"))
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "2048"))
+IMAGE_SPOOL_DIR = os.getenv("IMAGE_SPOOL_DIR") or None
+SPOOL_CHUNK_BYTES = 1 << 20
+
+# Formats Gemini accepts directly, with their MIME types
+PASSTHROUGH_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+# PIL keeps single-band modes at 1 byte per pixel and multi-band ones (RGB, RGBA, LA, ...) at 4
+_BYTES_PER_PIXEL = {"1": 1, "L": 1, "P": 1}
+
+
+class MemoryBudget:
+    """Blocking byte budget shared by everything that decodes pixels."""
+
+    def __init__(self, limit_bytes: int):
+        self.limit = max(1, int(limit_bytes))
+        self.in_use = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, nbytes: int) -> Iterator[int]:
+        # An oversized request waits until it can run alone instead of failing
+        nbytes = min(max(0, int(nbytes)), self.limit)
+        with self._cond:
+            while self.in_use + nbytes > self.limit:
+                self._cond.wait()
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+        try:
+            yield nbytes
+        finally:
+            with self._cond:
+                self.in_use -= nbytes
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {"limit_bytes": self.limit, "in_use_bytes": self.in_use, "peak_bytes": self.peak}
+
+
+DECODE_BUDGET = MemoryBudget(IMAGE_MEMORY_BUDGET_MB * 1024 * 1024)
+
+
+class SpooledImage:
+    """An uploaded image spilled to disk; only the path and size stay in memory."""
+
+    def __init__(self, path: str, size: int, name: Optional[str] = None, sha256: Optional[str] = None,
+                 owned: bool = True):
+        self.path = path
+        self.size = size
+        self.name = name or os.path.basename(path)
+        self._sha256 = sha256
+        # False for files this object merely points at (e.g. a stored original): never deleted
+        self.owned = owned
+
+    @classmethod
+    def from_file(cls, fileobj: BinaryIO, name: Optional[str] = None) -> "SpooledImage":
+        if hasattr(fileobj, "seek"):
+            fileobj.seek(0)
+        digest = hashlib.sha256()
+        fd, path = tempfile.mkstemp(prefix="upload-", suffix=".img", dir=IMAGE_SPOOL_DIR)
+        with os.fdopen(fd, "wb") as out:
+            # Hash while copying so the content key costs no extra pass
+            for chunk in iter(lambda: fileobj.read(SPOOL_CHUNK_BYTES), b""):
+                digest.update(chunk)
+                out.write(chunk)
+        return cls(path, os.path.getsize(path), name or getattr(fileobj, "name", None), digest.hexdigest())
+
+    @property
+    def sha256(self) -> str:
+        if self._sha256 is None:
+            digest = hashlib.sha256()
+            with open(self.path, "rb") as fh:
+                for chunk in iter(lambda: fh.read(SPOOL_CHUNK_BYTES), b""):
+                    digest.update(chunk)
+            self._sha256 = digest.hexdigest()
+        return self._sha256
+
+    @classmethod
+    def from_bytes(cls, data: bytes, name: Optional[str] = None) -> "SpooledImage":
+        return cls.from_file(io.BytesIO(data), name)
+
+    def read_bytes(self) -> bytes:
+        with open(self.path, "rb") as fh:
+            return fh.read()
+
+    def cleanup(self):
+        if not self.owned:
+            return
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __repr__(self) -> str:
+        return f"SpooledImage({self.name!r}, {self.size} bytes)"
+
+
+ImageSource = Union[bytes, SpooledImage]
+
+
+def spool_uploads(files: Iterable[BinaryIO]) -> List[SpooledImage]:
+    spooled = []
+    try:
+        for f in files:
+            spooled.append(SpooledImage.from_file(f))
+    except Exception:
+        for s in spooled:
+            s.cleanup()
+        raise
+    return spooled
+
+
+@contextmanager
+def spooled_uploads(files: Iterable[BinaryIO]) -> Iterator[List[SpooledImage]]:
+    spooled = spool_uploads(files)
+    try:
+        yield spooled
+    finally:
+        for s in spooled:
+            s.cleanup()
+
+
+def content_hash(source: ImageSource) -> str:
+    """sha256 hex digest of the original upload bytes."""
+    if isinstance(source, SpooledImage):
+        return source.sha256
+    return hashlib.sha256(source).hexdigest()
+
+
+def source_size(source: ImageSource) -> int:
+    return source.size if isinstance(source, SpooledImage) else len(source or b"")
+
+
+def open_image(source: ImageSource) -> Image.Image:
+    """Lazily open an image (header only) from bytes or a spooled file."""
+    if isinstance(source, SpooledImage):
+        return Image.open(source.path)
+    return Image.open(io.BytesIO(source))
+
+
+def _read_bytes(source: ImageSource) -> bytes:
+    return source.read_bytes() if isinstance(source, SpooledImage) else source
+
+
+def decoded_size(image: Image.Image, size: Optional[Tuple[int, int]] = None) -> int:
+    """Bytes PIL needs for the pixels at `size` (default: current, possibly drafted, size)."""
+    width, height = size or image.size
+    return width * height * _BYTES_PER_PIXEL.get(image.mode, 4)
+
+
+def decode_pixels(source: ImageSource, max_side: int = IMAGE_MAX_SIDE) -> int:
+    """Pixels prepare_image() would decode (header only): 0 for images sent as-is."""
+    try:
+        with open_image(source) as image:
+            if image.format in PASSTHROUGH_FORMATS and max(image.size) <= max_side:
+                return 0
+            return image.size[0] * image.size[1]
+    except Exception:
+        return 0  # unreadable: prepare_image raises the real error, inline
+
+
+def prepare_image(source: ImageSource, max_side: int = IMAGE_MAX_SIDE,
+                  budget: MemoryBudget = DECODE_BUDGET) -> Tuple[bytes, str]:
+    """
+    Return (encoded bytes, mime type) for one image, at most max_side pixels on its longest side.
+    Decoded pixels are released before this returns.
+    """
+    with open_image(source) as image:
+        fmt = image.format
+        if fmt in PASSTHROUGH_FORMATS and max(image.size) <= max_side:
+            return _read_bytes(source), PASSTHROUGH_FORMATS[fmt]
+
+        image.draft("RGB", (max_side, max_side))  # JPEG: decode at 1/2, 1/4 or 1/8 scale
+        scale = min(1.0, max_side / float(max(image.size)))
+        target = (max(1, int(image.size[0] * scale)), max(1, int(image.size[1] * scale)))
+        # Full decode plus the downscaled copy are alive at the same time
+        needed = decoded_size(image) + decoded_size(image, target)
+        with budget.reserve(needed):
+            image.thumbnail((max_side, max_side))
+            out = io.BytesIO()
+            if fmt == "JPEG":
+                image.convert("RGB").save(out, "JPEG", quality=90)
+                mime = "image/jpeg"
+            else:
+                # PNG keeps screenshot text crisp
+                if image.mode not in ("RGB", "RGBA", "L", "LA"):
+                    image = image.convert("RGBA")
+                image.save(out, "PNG")
+                mime = "image/png"
+    return out.getvalue(), mime
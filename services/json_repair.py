@@ -0,0 +1,183 @@
+# services/json_repair.py
+"""
+Tolerant JSON recovery for truncated or lightly malformed model output.
+
+When a large batch hits the output-token limit the response stops mid-object and
+json.loads() fails, even though most reviews were emitted completely. recover_partial()
+walks the text once, keeps every fully closed element of the reviews array, and repairs
+the rest of the document (code fences, trailing commas, unclosed brackets/strings) so the
+caller only has to ask the model for the missing remainder.
+
+Usage:
+    from services.json_repair import recover_partial
+
+    rec = recover_partial(response.text, list_key="r")
+    rec["items"]      # complete review objects, in order
+    rec["data"]       # best-effort repaired top-level object (list_key set to rec["items"])
+    rec["complete"]   # True if the text was valid JSON to begin with
+    rec["truncated"]  # True if the reviews array (or the document) was cut off
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _strip_fences(raw: str) -> str:
+    return _FENCE_RE.sub("", raw or "")
+
+
+def _drop_trailing_commas(text: str) -> str:
+    """Remove ',' directly before '}' or ']' (outside strings)."""
+    out: List[str] = []
+    in_str = esc = False
+    for ch in text:
+        if in_str:
+            out.append(ch)
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch in "}]":
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ",":
+                del out[j]
+        elif ch == '"':
+            in_str = True
+        out.append(ch)
+    return "".join(out)
+
+
+def _loads_lenient(text: str) -> Optional[Any]:
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return json.loads(_drop_trailing_commas(text))
+    except ValueError:
+        return None
+
+
+def repair_json(raw: str) -> Optional[Any]:
+    """
+    Best-effort parse of truncated JSON: cut back to the last point where a value closed
+    and append the missing closing brackets. Returns None if nothing usable is found.
+    """
+    text = _strip_fences(raw)
+    start = min([i for i in (text.find("{"), text.find("[")) if i != -1], default=-1)
+    if start == -1:
+        return None
+    text = text[start:]
+    parsed = _loads_lenient(text)
+    if parsed is not None:
+        return parsed
+
+    # Candidate cut points: right after a container closes, or right before a comma
+    stack: List[str] = []
+    cuts: List[Tuple[int, str]] = []
+    in_str = esc = False
+    for i, ch in enumerate(text):
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append(_CLOSERS[ch])
+            cuts.append((i + 1, "".join(reversed(stack))))
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            cuts.append((i + 1, "".join(reversed(stack))))
+        elif ch == ",":
+            cuts.append((i, "".join(reversed(stack))))
+
+    for cut, closers in reversed(cuts):
+        candidate = text[:cut].rstrip().rstrip(",")
+        parsed = _loads_lenient(candidate + closers)
+        if parsed is not None:
+            return parsed
+    return None
+
+
+def _array_start(text: str, list_key: str) -> int:
+    m = re.search(r'"%s"\s*:\s*\[' % re.escape(list_key), text)
+    return m.end() if m else -1
+
+
+def complete_array_items(text: str, list_key: str) -> Tuple[List[Any], bool]:
+    """
+    Return (items, closed): every fully closed element of the array under list_key,
+    and whether the array itself was closed.
+    """
+    pos = _array_start(text, list_key)
+    if pos == -1:
+        return [], False
+
+    items: List[Any] = []
+    depth = 0
+    elem_start = None
+    in_str = esc = False
+    for i in range(pos, len(text)):
+        ch = text[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+            if depth == 0 and elem_start is None:
+                elem_start = i
+        elif ch in "{[":
+            if depth == 0:
+                elem_start = i
+            depth += 1
+        elif ch in "}]":
+            if depth == 0:  # closing bracket of the array itself
+                return items, True
+            depth -= 1
+            if depth == 0 and elem_start is not None:
+                value = _loads_lenient(text[elem_start:i + 1])
+                if value is not None:
+                    items.append(value)
+                elem_start = None
+        elif ch == "," and depth == 0:
+            elem_start = None
+    return items, False
+
+
+def recover_partial(raw: str, list_key: str = "reviews") -> Dict[str, Any]:
+    """Recover complete list_key elements plus a repaired top-level object."""
+    text = _strip_fences(raw)
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return {"data": data, "items": list(data.get(list_key) or []), "complete": True, "truncated": False}
+    except ValueError:
+        pass
+
+    items, closed = complete_array_items(text, list_key)
+    data = repair_json(text)
+    if not isinstance(data, dict):
+        data = {}
+    data[list_key] = items
+    truncated = not closed or not text.rstrip().endswith("}")
+    return {"data": data, "items": items, "complete": False, "truncated": truncated}
@@ -0,0 +1,91 @@
+# services/lexicon.py
+"""
+Small vectorized sentiment lexicon.
+
+Scores many texts at once with NumPy: every text is tokenized, tokens are mapped to
+vocabulary indices, and per-text sums are computed with a single bincount over the
+flattened token array (no Python loop over weights).
+
+Usage:
+    from services.lexicon import DEFAULT_SCORER
+
+    scores, hits = DEFAULT_SCORER.score_batch(["good", "app keeps crashing"])
+    DEFAULT_SCORER.label(scores[0])   # -> "Positive"
+"""
+
+import re
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z][a-z']*")
+
+# Weights are in [-1, 1]. Kept intentionally small: it only needs to be right for
+# short, obvious inputs (the prefilter sends everything else to Gemini).
+SENTIMENT_LEXICON: Dict[str, float] = {
+    # positive
+    "good": 0.7, "great": 0.9, "excellent": 1.0, "awesome": 0.9, "amazing": 0.9,
+    "love": 0.9, "loved": 0.9, "nice": 0.6, "best": 0.9, "perfect": 1.0,
+    "fantastic": 0.9, "super": 0.7, "wonderful": 0.9, "helpful": 0.6, "recommended": 0.6,
+    "recommend": 0.6, "fast": 0.4, "easy": 0.5, "smooth": 0.5, "happy": 0.7,
+    "satisfied": 0.6, "worth": 0.5, "useful": 0.5, "ok": 0.2, "okay": 0.2, "fine": 0.3,
+    "thanks": 0.4, "thank": 0.4, "reliable": 0.6, "beautiful": 0.7, "solid": 0.5,
+    # negative
+    "bad": -0.7, "worst": -1.0, "terrible": -0.9, "awful": -0.9, "horrible": -0.9,
+    "poor": -0.7, "hate": -0.9, "useless": -0.8, "broken": -0.7, "crash": -0.7,
+    "crashes": -0.7, "crashed": -0.7, "crashing": -0.7, "bug": -0.5, "buggy": -0.6,
+    "slow": -0.5, "laggy": -0.6, "lag": -0.5, "freezes": -0.6, "freeze": -0.6,
+    "refund": -0.5, "scam": -1.0, "waste": -0.8, "disappointed": -0.7,
+    "disappointing": -0.7, "annoying": -0.6, "expensive": -0.4, "fake": -0.8,
+    "fail": -0.6, "fails": -0.6, "failed": -0.6, "error": -0.5, "errors": -0.5,
+    "problem": -0.4, "problems": -0.4, "issue": -0.3, "issues": -0.3, "missing": -0.3,
+    "defective": -0.8, "damaged": -0.7, "unusable": -0.9, "never": -0.2,
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall((text or "").lower())
+
+
+class LexiconScorer:
+    """Vectorized weighted-lexicon scorer."""
+
+    def __init__(self, lexicon: Dict[str, float]):
+        self.vocab = {word: idx for idx, word in enumerate(lexicon)}
+        self.weights = np.fromiter(lexicon.values(), dtype=np.float32, count=len(lexicon))
+
+    def token_indices(self, texts: Iterable[str]) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Flatten all known tokens of all texts into (vocab_idx, doc_idx) arrays."""
+        vocab = self.vocab
+        vocab_idx: List[int] = []
+        doc_idx: List[int] = []
+        n_docs = 0
+        for d, text in enumerate(texts):
+            n_docs += 1
+            for tok in tokenize(text):
+                i = vocab.get(tok)
+                if i is not None:
+                    vocab_idx.append(i)
+                    doc_idx.append(d)
+        return np.asarray(vocab_idx, dtype=np.int64), np.asarray(doc_idx, dtype=np.int64), n_docs
+
+    def score_batch(self, texts: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (scores, hits): scores in [-1, 1] per text, and number of lexicon hits per text.
+        """
+        vocab_idx, doc_idx, n_docs = self.token_indices(texts)
+        sums = np.bincount(doc_idx, weights=self.weights[vocab_idx], minlength=n_docs)
+        hits = np.bincount(doc_idx, minlength=n_docs)
+        scores = np.clip(sums / np.maximum(hits, 1), -1.0, 1.0)
+        return scores.astype(np.float32), hits
+
+    @staticmethod
+    def label(score: float, threshold: float = 0.15) -> str:
+        if score >= threshold:
+            return "Positive"
+        if score <= -threshold:
+            return "Negative"
+        return "Neutral"
+
+
+DEFAULT_SCORER = LexiconScorer(SENTIMENT_LEXICON)
@@ -0,0 +1,244 @@
+# services/local_engine.py
+"""
+Offline (degraded-mode) review analysis engine.
+
+Produces the same `analysis` shape as the Gemini pipeline (sentiment, score, themes, intent,
+confidence, plus rich_reviews / overall_summary / top_level_*), using a NumPy-vectorized
+unigram + bigram lexicon model. No network, no model weights: it is meant to keep ingestion
+running when Gemini quota is exhausted or the API is down. Results are marked for later
+LLM re-scoring.
+
+Usage:
+    from services.local_engine import analyze_text_local, score_reviews
+
+    result = analyze_text_local(text)          # gemini_client-compatible result dict
+    rows = score_reviews(["review 1", ...])    # per-review analysis, vectorized
+
+Model:
+    counts[d, v]  = occurrences of vocabulary entry v (unigram or bigram) in review d
+    sentiment     = counts @ w_sentiment            (negation handled by "not X" bigrams)
+    theme scores  = counts @ W_theme  -> top 3 themes
+    intent scores = counts @ W_intent -> argmax (or "other")
+"""
+
+import re
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from services.lexicon import SENTIMENT_LEXICON, LexiconScorer, tokenize
+
+LOCAL_MODEL_NAME = "local-lexicon-v1"
+
+NEGATORS = ["not", "no", "never", "don't", "dont", "isn't", "wasn't", "didn't", "doesn't", "cant", "can't"]
+NEGATION_FACTOR = -0.8
+
+THEME_KEYWORDS: Dict[str, List[str]] = {
+    "performance": ["slow", "lag", "laggy", "fast", "speed", "freeze", "freezes", "loading", "performance"],
+    "stability": ["crash", "crashes", "crashed", "crashing", "bug", "buggy", "error", "errors", "broken"],
+    "battery": ["battery", "charge", "charging", "charger", "drain", "power"],
+    "price": ["price", "expensive", "cheap", "cost", "value", "worth", "money", "refund"],
+    "delivery": ["delivery", "shipping", "delivered", "package", "arrived", "late"],
+    "customer support": ["support", "service", "customer service", "response", "helpful", "agent"],
+    "usability": ["easy", "intuitive", "confusing", "interface", "ui", "design", "navigation"],
+    "quality": ["quality", "build", "material", "durable", "defective", "damaged", "sturdy"],
+    "checkout": ["checkout", "cart", "payment", "pay", "order"],
+    "account": ["login", "log in", "account", "password", "sign in"],
+    "features": ["feature", "option", "setting", "settings", "missing", "add", "support for"],
+}
+
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "feature_request": ["please add", "wish", "would like", "should have", "feature", "add", "missing", "need"],
+    "question": ["how", "why", "what", "when", "where", "is there", "can i", "does it"],
+    "complaint": ["refund", "worst", "terrible", "broken", "crash", "not working", "disappointed", "waste"],
+    "praise": ["love", "great", "excellent", "best", "amazing", "perfect", "recommend"],
+}
+INTENTS = list(INTENT_KEYWORDS) + ["other"]
+
+CHUNK_SIZE = 4096   # reviews per dense count matrix
+
+
+def _ngrams(tokens: List[str]) -> List[str]:
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class LocalEngine:
+    """Vectorized unigram/bigram sentiment, theme and intent model."""
+
+    def __init__(self):
+        vocab: Dict[str, int] = {}
+
+        def idx(term: str) -> int:
+            if term not in vocab:
+                vocab[term] = len(vocab)
+            return vocab[term]
+
+        sentiment: Dict[int, float] = {}
+        for word, weight in SENTIMENT_LEXICON.items():
+            sentiment[idx(word)] = weight
+            # "not good": the unigram still fires, so the bigram carries the correction
+            for neg in NEGATORS:
+                sentiment[idx(f"{neg} {word}")] = (NEGATION_FACTOR - 1.0) * weight
+
+        themes = list(THEME_KEYWORDS)
+        theme_cells = [(idx(k), t) for t, name in enumerate(themes) for k in THEME_KEYWORDS[name]]
+        intent_cells = [(idx(k), i) for i, name in enumerate(INTENT_KEYWORDS) for k in INTENT_KEYWORDS[name]]
+
+        self.vocab = vocab
+        self.themes = themes
+        self.w_sentiment = np.zeros(len(vocab), dtype=np.float32)
+        for i, w in sentiment.items():
+            self.w_sentiment[i] = w
+        self.lexicon_mask = (self.w_sentiment != 0).astype(np.float32)
+        self.w_theme = np.zeros((len(vocab), len(themes)), dtype=np.float32)
+        for v, t in theme_cells:
+            self.w_theme[v, t] = 1.0
+        self.w_intent = np.zeros((len(vocab), len(INTENTS)), dtype=np.float32)
+        for v, i in intent_cells:
+            self.w_intent[v, i] = 1.0
+
+    def _counts(self, texts: Sequence[str]) -> np.ndarray:
+        vocab = self.vocab
+        rows: List[int] = []
+        cols: List[int] = []
+        for d, text in enumerate(texts):
+            for gram in _ngrams(tokenize(text)):
+                v = vocab.get(gram)
+                if v is not None:
+                    rows.append(d)
+                    cols.append(v)
+        counts = np.zeros((len(texts), len(vocab)), dtype=np.float32)
+        np.add.at(counts, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)), 1.0)
+        return counts
+
+    def score(self, texts: Sequence[str]) -> List[Dict[str, Any]]:
+        """Per-review analysis for many reviews; vectorized in chunks of CHUNK_SIZE."""
+        out: List[Dict[str, Any]] = []
+        for start in range(0, len(texts), CHUNK_SIZE):
+            chunk = texts[start:start + CHUNK_SIZE]
+            counts = self._counts(chunk)
+            hits = counts @ self.lexicon_mask
+            raw = counts @ self.w_sentiment
+            scores = np.clip(raw / np.maximum(hits, 1.0), -1.0, 1.0)
+            theme_scores = counts @ self.w_theme
+            intent_scores = counts @ self.w_intent
+            top_themes = np.argsort(-theme_scores, axis=1, kind="stable")[:, :3]
+            intents = np.where(intent_scores.max(axis=1) > 0, intent_scores.argmax(axis=1), len(INTENTS) - 1)
+            # Confidence grows with evidence but stays well below LLM-level certainty
+            confidence = np.round(0.3 + 0.4 * (1.0 - np.exp(-hits / 3.0)), 2)
+
+            for d in range(len(chunk)):
+                score = float(round(scores[d], 3))
+                out.append({
+                    "sentiment": LexiconScorer.label(score),
+                    "score": score,
+                    "themes": [self.themes[t] for t in top_themes[d] if theme_scores[d, t] > 0],
+                    "intent": INTENTS[intents[d]],
+                    "confidence": float(confidence[d]),
+                })
+        return out
+
+
+_engine = None
+
+
+def get_engine() -> LocalEngine:
+    global _engine
+    if _engine is None:
+        _engine = LocalEngine()
+    return _engine
+
+
+def score_reviews(texts: Sequence[str]) -> List[Dict[str, Any]]:
+    return get_engine().score(list(texts))
+
+
+def split_reviews(text: str) -> List[str]:
+    """Split bulk feedback into review-sized chunks (blank-line blocks, else lines)."""
+    text = (text or "").strip()
+    if not text:
+        return []
+    blocks = [b.strip() for b in re.split(r"\n\s*\n", text) if b.strip()]
+    if len(blocks) == 1:
+        blocks = [line.strip() for line in text.splitlines() if len(line.strip()) > 5] or blocks
+    return blocks
+
+
+def analyze_text_local(text: str, reason: str = "degraded_mode") -> Dict[str, Any]:
+    """
+    Full local analysis of a text input, in the gemini_client result shape.
+    The result carries needs_llm_rescore=True so it can be re-scored once Gemini is back.
+    """
+    reviews = split_reviews(text)
+    per_review = score_reviews(reviews)
+    overall = score_reviews([text or ""])[0]
+
+    rich_reviews = [
+        {
+            "metadata": {},
+            "text": review,
+            "analysis": {
+                "sentiment": anl["sentiment"],
+                "pain_points": anl["themes"] if anl["score"] < 0 else [],
+                "feature_requests": anl["themes"] if anl["intent"] == "feature_request" else [],
+                "actionable_advice": "",
+            },
+        }
+        for review, anl in zip(reviews, per_review)
+    ]
+    negative_themes = sorted({t for anl in per_review if anl["score"] < 0 for t in anl["themes"]})
+    requested = sorted({t for anl in per_review if anl["intent"] == "feature_request" for t in anl["themes"]})
+
+    analysis = {
+        "sentiment": overall["sentiment"],
+        "themes": overall["themes"],
+        "intent": overall["intent"],
+        "score": overall["score"],
+        "confidence": overall["confidence"],
+        "rich_reviews": rich_reviews if len(rich_reviews) > 1 else [],
+        "overall_summary": (
+            f"Offline analysis of {len(reviews)} review(s): overall {overall['sentiment'].lower()} "
+            f"(score {overall['score']}). Queued for full Gemini re-analysis."
+        ),
+        "top_level_advice": "Preliminary local scoring only; detailed insights pending Gemini re-analysis.",
+        "top_level_pains": negative_themes[:3],
+        "top_level_features": requested[:3],
+    }
+    return {
+        "input_text": text,
+        "extracted_text": text,
+        "analysis": analysis,
+        "model": LOCAL_MODEL_NAME,
+        "processing_latency_ms": None,
+        "needs_llm_rescore": True,
+        "degraded_reason": reason,
+    }
+
+
+def analyze_images_local(image_count: int, reason: str = "degraded_mode") -> Dict[str, Any]:
+    """
+    Screenshots cannot be read offline; return a placeholder marked for re-analysis.
+    The document keeps the stored screenshots (image_gcs_path / metadata.image_uris), which
+    `python -m workers.backfill --degraded` sends to Gemini once it is back.
+    """
+    return {
+        "input_text": f"{image_count} Images Processed",
+        "extracted_text": "",
+        "analysis": {
+            "sentiment": "Neutral",
+            "themes": [],
+            "intent": "other",
+            "score": 0.0,
+            "confidence": 0.0,
+            "rich_reviews": [],
+            "overall_summary": "Gemini is unavailable; the screenshots were not analysed.",
+            "top_level_advice": "Stored screenshots are re-analysed by a degraded backfill "
+                                "(python -m workers.backfill --degraded) once Gemini is back.",
+            "top_level_pains": [],
+            "top_level_features": [],
+        },
+        "model": LOCAL_MODEL_NAME,
+        "processing_latency_ms": None,
+        "needs_llm_rescore": True,
+        "degraded_reason": reason,
+    }
@@ -0,0 +1,260 @@
+# services/metrics.py
+"""
+Lightweight in-process instrumentation: stage timers, counters, gauges, HDR-style
+latency histograms and a Prometheus-compatible text endpoint.
+
+Usage:
+    from services.metrics import timed, inc, request_timings, render_prometheus
+
+    with request_timings() as timings:        # per-request stage breakdown
+        with timed("model_wait"):
+            call_gemini()
+    timings   # {"model_wait": 812}  -> written to doc["metadata"]["stage_timings_ms"]
+
+    inc("gemini_calls_total", mode="compact")
+    print(render_prometheus())
+
+Stages used by the pipeline:
+    scrape, image_decode, model_wait, json_parse      (also in stage_timings_ms)
+    schema_validation, firestore_write, bigquery_write (histograms only: they run
+                                                        after the document is built)
+
+Config:
+    METRICS_PORT  if set, maybe_start_metrics_server() serves GET /metrics on that port
+"""
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional, Tuple
+
+# Prometheus `le` bounds (ms) used when exporting histograms
+EXPORT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class HdrHistogram:
+    """
+    Log-linear histogram with bounded relative error (default 1%): bucket i covers
+    [base^i, base^(i+1)), so memory stays small no matter how many samples are recorded.
+    """
+
+    def __init__(self, relative_error: float = 0.01, min_value: float = 0.001):
+        self.base = 1.0 + 2.0 * relative_error
+        self.log_base = math.log(self.base)
+        self.min_value = min_value
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        return int(math.floor(math.log(max(value, self.min_value)) / self.log_base))
+
+    def record(self, value: float):
+        i = self._index(value)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.count:
+            return None
+        target = max(1, int(math.ceil(pct / 100.0 * self.count)))
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= target:
+                # midpoint of the bucket, capped at the true max
+                return min(self.base ** i * (1 + self.base) / 2, self.max)
+        return self.max
+
+    def count_le(self, bound: float) -> int:
+        """Samples <= bound (bucket resolution)."""
+        limit = self._index(bound)
+        return sum(c for i, c in self.counts.items() if i <= limit)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[LabelKey, float] = {}
+        self.gauges: Dict[LabelKey, float] = {}
+        self.histograms: Dict[LabelKey, HdrHistogram] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> LabelKey:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = HdrHistogram()
+            hist.record(value)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per-stage p50/p95/p99/max summary of the stage latency histograms."""
+        with self._lock:
+            out = {}
+            for (name, labels), hist in self.histograms.items():
+                label = dict(labels).get("stage", name)
+                out[label] = {
+                    "count": hist.count,
+                    "p50_ms": _round(hist.percentile(50)),
+                    "p95_ms": _round(hist.percentile(95)),
+                    "p99_ms": _round(hist.percentile(99)),
+                    "max_ms": _round(hist.max),
+                }
+            return out
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for kind, series in (("counter", self.counters), ("gauge", self.gauges)):
+                seen = set()
+                for (name, labels), value in sorted(series.items()):
+                    if name not in seen:
+                        lines.append(f"# TYPE {name} {kind}")
+                        seen.add(name)
+                    lines.append(f"{name}{_fmt_labels(labels)} {value}")
+            seen = set()
+            for (name, labels), hist in sorted(self.histograms.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} histogram")
+                    seen.add(name)
+                for bound in EXPORT_BUCKETS_MS:
+                    lines.append(f"{name}_bucket{_fmt_labels(labels + (('le', str(bound)),))} {hist.count_le(bound)}")
+                lines.append(f"{name}_bucket{_fmt_labels(labels + (('le', '+Inf'),))} {hist.count}")
+                lines.append(f"{name}_sum{_fmt_labels(labels)} {round(hist.total, 3)}")
+                lines.append(f"{name}_count{_fmt_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+def _fmt_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in labels)
+    return "{" + inner + "}"
+
+
+REGISTRY = MetricsRegistry()
+_request_timings: ContextVar[Optional[Dict[str, int]]] = ContextVar("request_timings", default=None)
+
+
+def inc(name: str, amount: float = 1, **labels):
+    REGISTRY.inc(name, amount, **labels)
+
+
+def set_gauge(name: str, value: float, **labels):
+    REGISTRY.set_gauge(name, value, **labels)
+
+
+def render_prometheus() -> str:
+    return REGISTRY.render_prometheus()
+
+
+def stage_summary() -> Dict[str, Dict]:
+    return REGISTRY.snapshot()
+
+
+def record_stage(stage: str, elapsed_ms: float):
+    """Record a stage duration in the global histogram and the current request's timings."""
+    REGISTRY.observe("stage_latency_ms", elapsed_ms, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0) + int(round(elapsed_ms))
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, (time.perf_counter() - start) * 1000)
+
+
+@contextmanager
+def request_timings() -> Iterator[Dict[str, int]]:
+    """Collect per-stage timings for one request. Nested scopes share the outer dict."""
+    current = _request_timings.get()
+    if current is not None:
+        yield current
+        return
+    timings: Dict[str, int] = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+# ----------------- exposition endpoint --------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve GET /metrics from a daemon thread. Idempotent per process."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, daemon=True, name="metrics").start()
+            print(f"📈 Metrics endpoint on :{_server.server_address[1]}/metrics")
+        return _server
+
+
+def maybe_start_metrics_server() -> Optional[ThreadingHTTPServer]:
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    try:
+        return start_metrics_server(int(port))
+    except OSError as e:
+        print(f"⚠️ Metrics endpoint not started: {e}")
+        return None
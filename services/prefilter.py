@@ -0,0 +1,247 @@
+# services/prefilter.py
+"""
+Cheap local classification stage that runs before Gemini.
+
+Inputs that do not need a model are answered locally:
+  - empty / blank screenshots, empty or symbol-only text   -> canned "no content" result
+  - one-to-three word reviews ("good", "bad", "great app") -> canned result scored by the lexicon
+  - boilerplate pages (cookie banners, login walls, nav)   -> local SWOT fallback (no reviews)
+Everything else goes to the model.
+
+Usage:
+    from services.prefilter import prefilter_input, prefilter_stats
+
+    decision = prefilter_input(text=text, images=image_list)
+    if decision["route"] != ROUTE_MODEL:
+        result = decision["result"]        # same shape as GeminiREST.analyze_content output
+    else:
+        images = decision["images"]        # blank screenshots already removed
+
+    prefilter_stats()  # {"total": .., "absorbed": .., "absorbed_fraction": .., "by_reason": {...}}
+
+Config:
+    PREFILTER_ENABLED (default "true")
+"""
+
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from services.cpu_pool import CPU_POOL_INLINE_PIXELS, run_cpu
+from services.image_ingest import DECODE_BUDGET, ImageSource, decoded_size, open_image, source_size
+from services.lexicon import DEFAULT_SCORER, tokenize
+from services.metrics import inc
+
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "true").lower() == "true"
+
+ROUTE_MODEL = "model"
+ROUTE_CANNED = "canned"
+ROUTE_SWOT = "swot"
+
+MIN_TEXT_CHARS = 5          # matches the post-model filter in GeminiREST.analyze_review
+SHORT_REVIEW_MAX_WORDS = 3
+MIN_ALPHA_RATIO = 0.3       # below this the "text" is mostly digits/symbols
+MIN_IMAGE_BYTES = 1024
+BLANK_IMAGE_STDDEV = 3.0    # grayscale stddev of a blank/solid screenshot
+BLANK_CHECK_SIDE = 128      # the blank check measures a thumbnail this size
+
+# Latin-script function words: if a short text has none of these and is not in the
+# lexicon we cannot judge it locally (could be another language) -> send to model.
+ENGLISH_HINTS = {
+    "the", "a", "an", "and", "or", "is", "it", "this", "i", "my", "to", "of", "in",
+    "for", "but", "was", "very", "app", "product",
+}
+# The unigram lexicon cannot handle "not good"; leave negated short reviews to the model
+NEGATORS = {"not", "no", "never", "dont", "don't", "isn't", "wasn't", "didn't", "cant", "can't"}
+
+BOILERPLATE_TERMS = [
+    "cookie", "cookies", "privacy policy", "terms of use", "terms of service", "sign in",
+    "log in", "login", "create account", "subscribe", "newsletter", "all rights reserved",
+    "javascript", "enable javascript", "captcha", "access denied", "robot", "add to cart",
+    "unable to extract meaningful content",
+]
+REVIEW_MARKERS = re.compile(
+    r"(out of 5|stars?\b|★|reviewed|verified purchase|\bi\b|\bmy\b|\bme\b|rating)", re.IGNORECASE
+)
+
+_lock = threading.Lock()
+_stats: Dict[str, Any] = {"total": 0, "absorbed": 0, "by_reason": {}}
+
+
+def _record(reason: str, absorbed: bool):
+    inc("prefilter_requests_total", reason=reason, absorbed=str(absorbed).lower())
+    with _lock:
+        _stats["total"] += 1
+        if absorbed:
+            _stats["absorbed"] += 1
+        _stats["by_reason"][reason] = _stats["by_reason"].get(reason, 0) + 1
+
+
+def prefilter_stats() -> Dict[str, Any]:
+    with _lock:
+        total = _stats["total"]
+        return {
+            "total": total,
+            "absorbed": _stats["absorbed"],
+            "absorbed_fraction": round(_stats["absorbed"] / total, 4) if total else 0.0,
+            "by_reason": dict(_stats["by_reason"]),
+        }
+
+
+def reset_prefilter_stats():
+    with _lock:
+        _stats.update({"total": 0, "absorbed": 0, "by_reason": {}})
+
+
+# ----------------- canned results --------------------------------
+def _empty_result(reason: str) -> Dict[str, Any]:
+    return {
+        "reviews": [],
+        "overall_summary": "No customer feedback detected in the input.",
+        "analysis": {
+            "sentiment": "Neutral",
+            "pain_points": [],
+            "feature_requests": [],
+            "actionable_advice": f"Nothing to analyze ({reason}). Provide review text, a screenshot or a product URL.",
+        },
+    }
+
+
+def _short_review_result(text: str, score: float) -> Dict[str, Any]:
+    sentiment = DEFAULT_SCORER.label(score)
+    analysis = {
+        "sentiment": sentiment,
+        "pain_points": [],
+        "feature_requests": [],
+        "actionable_advice": "Review is too short to extract specific product insights.",
+    }
+    return {
+        "reviews": [{"metadata": {}, "text": text.strip(), "analysis": dict(analysis)}],
+        "overall_summary": f"Single short {sentiment.lower()} review with no specific details.",
+        "analysis": analysis,
+    }
+
+
+def _swot_fallback_result(text: str) -> Dict[str, Any]:
+    lowered = text.lower()
+    found = [t for t in BOILERPLATE_TERMS if t in lowered][:3]
+    return {
+        "reviews": [],
+        "overall_summary": "Page contains only site boilerplate (navigation, consent or login text); "
+                           "no reviews or product claims were found.",
+        "analysis": {
+            "sentiment": "Neutral",
+            "pain_points": ["Content not accessible: " + ", ".join(found)] if found else [],
+            "feature_requests": [],
+            "actionable_advice": "Try a direct product or review page URL, or paste the reviews as text.",
+        },
+    }
+
+
+# ----------------- heuristics --------------------------------
+def _alpha_ratio(text: str) -> float:
+    visible = [c for c in text if not c.isspace()]
+    if not visible:
+        return 0.0
+    return sum(c.isalpha() for c in visible) / len(visible)
+
+
+def _boilerplate_hits(text: str) -> int:
+    lowered = text.lower()
+    return sum(lowered.count(t) for t in BOILERPLATE_TERMS)
+
+
+def classify_text(text: Optional[str]) -> Dict[str, Any]:
+    """
+    Returns {"route": model|canned|swot, "reason": str, "result": Optional[dict]}
+    """
+    stripped = (text or "").strip()
+    if len(stripped) < MIN_TEXT_CHARS and not tokenize(stripped):
+        return {"route": ROUTE_CANNED, "reason": "empty_text", "result": _empty_result("empty text")}
+
+    if _alpha_ratio(stripped) < MIN_ALPHA_RATIO:
+        return {"route": ROUTE_CANNED, "reason": "no_language", "result": _empty_result("no readable words")}
+
+    words = stripped.split()
+    if len(words) <= SHORT_REVIEW_MAX_WORDS:
+        tokens = tokenize(stripped)
+        scores, hits = DEFAULT_SCORER.score_batch([stripped])
+        known = int(hits[0])
+        latin = all(ord(c) < 0x250 for c in stripped if c.isalpha())
+        all_known = all(t in DEFAULT_SCORER.vocab or t in ENGLISH_HINTS for t in tokens)
+        if latin and tokens and known and all_known and not NEGATORS.intersection(tokens):
+            return {
+                "route": ROUTE_CANNED,
+                "reason": "short_review",
+                "result": _short_review_result(stripped, float(scores[0])),
+            }
+
+    # Boilerplate: dense in consent/login/nav phrases and no sign of a review
+    hits = _boilerplate_hits(stripped)
+    if hits and len(words) <= 400 and hits * 25 >= len(words) and not REVIEW_MARKERS.search(stripped):
+        return {"route": ROUTE_SWOT, "reason": "boilerplate", "result": _swot_fallback_result(stripped)}
+
+    return {"route": ROUTE_MODEL, "reason": "needs_model", "result": None}
+
+
+def image_stddev(image: ImageSource) -> float:
+    """Grayscale stddev of a BLANK_CHECK_SIDE thumbnail; JPEGs decode at reduced scale."""
+    from PIL import ImageStat
+    with open_image(image) as opened:
+        opened.draft("L", (BLANK_CHECK_SIDE, BLANK_CHECK_SIDE))
+        with DECODE_BUDGET.reserve(decoded_size(opened)):
+            opened.thumbnail((BLANK_CHECK_SIDE, BLANK_CHECK_SIDE))
+            return ImageStat.Stat(opened.convert("L")).stddev[0]
+
+
+def _blank_check_pixels(image: ImageSource) -> int:
+    # Header only: what image_stddev() decodes (JPEG draft decodes at down to 1/8 scale)
+    with open_image(image) as opened:
+        width, height = opened.size
+        return width * height // (64 if opened.format == "JPEG" else 1)
+
+
+def is_blank_image(image: ImageSource) -> bool:
+    """
+    True for tiny payloads and visually empty (solid colour) screenshots. Images that
+    cannot be decoded are not blank: the model gets them (and reports what it can read).
+    Large decodes run in the CPU pool, off the request thread.
+    """
+    if not image or source_size(image) < MIN_IMAGE_BYTES:
+        return True
+    try:
+        stddev = run_cpu(image_stddev, image, size=_blank_check_pixels(image),
+                         inline_below=CPU_POOL_INLINE_PIXELS, stage="image_decode")
+    except Exception:
+        inc("prefilter_undecodable_images_total")
+        return False
+    return stddev < BLANK_IMAGE_STDDEV
+
+
+def prefilter_input(text: Optional[str] = None, images: Optional[List[ImageSource]] = None) -> Dict[str, Any]:
+    """
+    Decide whether a request needs Gemini at all.
+
+    Returns {"route", "reason", "result", "images"} where "images" are the screenshots that
+    still need the model (blank ones removed).
+    """
+    images = list(images or [])
+    if not PREFILTER_ENABLED:
+        return {"route": ROUTE_MODEL, "reason": "disabled", "result": None, "images": images}
+
+    kept = [img for img in images if not is_blank_image(img)]
+    if kept:
+        # Screenshots carry the content; any text goes along with them
+        _record("needs_model", absorbed=False)
+        return {"route": ROUTE_MODEL, "reason": "needs_model", "result": None, "images": kept}
+
+    if images and not (text or "").strip():
+        _record("blank_images", absorbed=True)
+        return {"route": ROUTE_CANNED, "reason": "blank_images",
+                "result": _empty_result("blank screenshots"), "images": []}
+
+    decision = classify_text(text)
+    _record(decision["reason"], absorbed=decision["route"] != ROUTE_MODEL)
+    decision["images"] = []
+    return decision
@@ -0,0 +1,191 @@
+# services/profiling.py
+"""
+Opt-in, on-demand profiling of real pipeline requests.
+
+When a request is selected, profile_request() captures a cProfile CPU profile and a
+tracemalloc allocation snapshot for the wrapped block and writes them, named after the
+request ID, to a rotating local directory:
+
+    <PROFILE_DIR>/<utc-timestamp>-<request_id>-<phase>.prof         (pstats; snakeviz/pstats)
+    <PROFILE_DIR>/<utc-timestamp>-<request_id>-<phase>.tracemalloc  (tracemalloc.Snapshot.load)
+    <PROFILE_DIR>/<utc-timestamp>-<request_id>-<phase>.txt          (top functions / allocations)
+
+Usage:
+    from services.profiling import profile_request
+
+    with profile_request(request_id, headers=request_headers, phase="analyze"):
+        result = analyze_text(text)
+
+Selection (any of):
+    PROFILE_REQUESTS=true          profile every request
+    PROFILE_SAMPLE_RATE=0.01       profile a random 1% of requests
+    header X-Profile-Request: 1    profile this request (PROFILE_HEADER to rename)
+
+The decision is made once per request ID, on its first phase: every phase of a sampled
+request is profiled under the same timestamp, and none of an unsampled one.
+
+Other config:
+    PROFILE_DIR   output directory (default examples/profiles)
+    PROFILE_KEEP  number of profiled requests to keep (default 20; all phases of a
+                  request count as one)
+
+Notes:
+- Disabled is the default; the check is two attribute reads, so overhead is negligible.
+- cProfile covers the calling thread only; time spent waiting on worker threads
+  (hedged calls, stage pipeline) shows up as wait time in the caller.
+- tracemalloc is process-wide: overlapping profiled requests share one tracing session
+  (started by the first, stopped by the last), so their snapshots and peaks include each
+  other's allocations.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+PROFILE_ALWAYS = os.getenv("PROFILE_REQUESTS", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile-Request")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.getcwd(), "examples", "profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+_SAFE_ID = re.compile(r"[^A-Za-z0-9_.-]+")
+
+# Request ID -> timestamp of its profiles (None: not profiled); the newest _DECISIONS_MAX requests
+_DECISIONS_MAX = 1024
+_decisions: "OrderedDict[str, Optional[str]]" = OrderedDict()
+_decisions_lock = threading.Lock()
+
+# Profiled requests currently relying on tracemalloc, and whether we started it
+_trace_lock = threading.Lock()
+_trace_users = 0
+_trace_owned = False
+
+
+def _start_tracing():
+    global _trace_users, _trace_owned
+    with _trace_lock:
+        if _trace_users == 0:
+            _trace_owned = not tracemalloc.is_tracing()
+            if _trace_owned:
+                tracemalloc.start(10)
+            tracemalloc.reset_peak()
+        _trace_users += 1
+
+
+def _stop_tracing() -> Tuple[Optional[tracemalloc.Snapshot], int]:
+    """Snapshot and peak for one profiled request; the last one out stops tracing."""
+    global _trace_users, _trace_owned
+    with _trace_lock:
+        snapshot, peak = None, 0
+        if tracemalloc.is_tracing():  # someone else may have stopped it under us
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+        _trace_users -= 1
+        if _trace_users == 0 and _trace_owned:
+            tracemalloc.stop()
+            _trace_owned = False
+    return snapshot, peak
+
+
+def should_profile(headers: Optional[Dict[str, str]] = None) -> bool:
+    if PROFILE_ALWAYS:
+        return True
+    if headers:
+        value = headers.get(PROFILE_HEADER) or headers.get(PROFILE_HEADER.lower())
+        if value and str(value).lower() in ("1", "true", "yes"):
+            return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _request_stamp(request_id: str, headers: Optional[Dict[str, str]], force: bool) -> Optional[str]:
+    """Timestamp to profile this request under, or None; sampled on the request's first phase."""
+    with _decisions_lock:
+        stamp = _decisions.get(request_id)
+        if stamp is None and (force or request_id not in _decisions):
+            if force or should_profile(headers):
+                stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+            _decisions[request_id] = stamp
+            while len(_decisions) > _DECISIONS_MAX:
+                _decisions.popitem(last=False)
+        return stamp
+
+
+def _request_prefix(name: str) -> str:
+    # "<stamp>-<request_id>-<phase>.<ext>" -> "<stamp>-<request_id>" (phases hold no "-")
+    return name.rsplit(".", 1)[0].rsplit("-", 1)[0]
+
+
+def _rotate(directory: str, keep: int):
+    """Keep the newest `keep` requests (all files sharing a timestamp-request prefix)."""
+    groups: Dict[str, float] = {}
+    for name in os.listdir(directory):
+        prefix = _request_prefix(name)
+        path = os.path.join(directory, name)
+        groups[prefix] = max(groups.get(prefix, 0.0), os.path.getmtime(path))
+    stale = set(sorted(groups, key=groups.get, reverse=True)[keep:])
+    for name in os.listdir(directory):
+        if _request_prefix(name) in stale:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def _write_report(base: str, profiler: cProfile.Profile, snapshot: Optional[tracemalloc.Snapshot],
+                  elapsed_ms: int, peak_bytes: int):
+    profiler.dump_stats(base + ".prof")
+    if snapshot is not None:
+        snapshot.dump(base + ".tracemalloc")
+
+    buf = io.StringIO()
+    buf.write(f"wall_ms={elapsed_ms} tracemalloc_peak_bytes={peak_bytes}\n\n")
+    buf.write("== CPU: top 25 by cumulative time ==\n")
+    pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(25)
+    buf.write("\n== Memory: top 15 allocation sites ==\n")
+    for stat in snapshot.statistics("lineno")[:15] if snapshot is not None else []:
+        buf.write(f"{stat}\n")
+    with open(base + ".txt", "w", encoding="utf-8") as fh:
+        fh.write(buf.getvalue())
+
+
+@contextmanager
+def profile_request(request_id: str, headers: Optional[Dict[str, str]] = None,
+                    phase: str = "run", force: bool = False) -> Iterator[Optional[str]]:
+    """
+    Profile the enclosed block if this request is selected.
+    Yields the output path prefix when profiling, else None.
+    """
+    stamp = _request_stamp(request_id, headers, force)
+    if stamp is None:
+        yield None
+        return
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    phase = _SAFE_ID.sub("_", phase).replace("-", "_")
+    base = os.path.join(PROFILE_DIR, f"{stamp}-{_SAFE_ID.sub('_', request_id)}-{phase}")
+
+    _start_tracing()
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield base
+    finally:
+        profiler.disable()
+        elapsed_ms = int((time.perf_counter() - start) * 1000)
+        snapshot, peak = _stop_tracing()
+        try:
+            _write_report(base, profiler, snapshot, elapsed_ms, peak)
+            _rotate(PROFILE_DIR, PROFILE_KEEP)
+            print(f"🔬 Profile written: {base}.txt")
+        except Exception as e:
+            print(f"⚠️ Could not write profile for {request_id}: {e}")
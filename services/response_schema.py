@@ -0,0 +1,105 @@
+# services/response_schema.py
+"""
+Compact structured-output schema for GeminiREST.analyze_content.
+
+The model is constrained (response_schema) to a short-key JSON form with enum codes,
+which cuts output tokens; expand_compact() turns it back into the verbose
+{"reviews": [...], "overall_summary": ..., "analysis": {...}} structure that
+GeminiREST.analyze_review and the UI already consume.
+
+Compact form:
+    {
+      "r":   [{"u": username, "rt": rating, "d": date, "t": text,
+               "s": "P|N|U|M", "p": [pain points], "f": [feature requests], "a": advice}],
+      "sum": overall summary,
+      "o":   {"s": "P|N|U|M", "p": [top pains], "f": [top requests], "a": strategic advice}
+    }
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+SENTIMENT_CODES = {"P": "Positive", "N": "Negative", "U": "Neutral", "M": "Mixed"}
+
+_STR = {"type": "STRING"}
+_STR_LIST = {"type": "ARRAY", "items": {"type": "STRING"}}
+_SENTIMENT = {"type": "STRING", "enum": list(SENTIMENT_CODES)}
+
+COMPACT_RESPONSE_SCHEMA: Dict[str, Any] = {
+    "type": "OBJECT",
+    "properties": {
+        "r": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "u": _STR, "rt": _STR, "d": _STR, "t": _STR,
+                    "s": _SENTIMENT, "p": _STR_LIST, "f": _STR_LIST, "a": _STR,
+                },
+                "required": ["t", "s"],
+                "property_ordering": ["u", "rt", "d", "t", "s", "p", "f", "a"],
+            },
+        },
+        "sum": _STR,
+        "o": {
+            "type": "OBJECT",
+            "properties": {"s": _SENTIMENT, "p": _STR_LIST, "f": _STR_LIST, "a": _STR},
+            "required": ["s"],
+            "property_ordering": ["s", "p", "f", "a"],
+        },
+    },
+    "required": ["r", "sum", "o"],
+    # reviews first: if output is ever truncated, completed reviews are already emitted
+    "property_ordering": ["r", "sum", "o"],
+}
+
+
+def _sentiment(code: Optional[str]) -> str:
+    return SENTIMENT_CODES.get((code or "").strip().upper()[:1], "Neutral")
+
+
+def _expand_block(block: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "sentiment": _sentiment(block.get("s")),
+        "pain_points": list(block.get("p") or []),
+        "feature_requests": list(block.get("f") or []),
+        "actionable_advice": block.get("a") or "",
+    }
+
+
+def expand_review(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "metadata": {"username": item.get("u") or "", "rating": item.get("rt") or "", "date": item.get("d") or ""},
+        "text": item.get("t") or "",
+        "analysis": _expand_block(item),
+    }
+
+
+def expand_compact(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact model output -> verbose analyze_content structure."""
+    return {
+        "reviews": [expand_review(item) for item in data.get("r") or [] if isinstance(item, dict)],
+        "overall_summary": data.get("sum") or "",
+        "analysis": _expand_block(data.get("o") or {}),
+    }
+
+
+def parse_json_response(raw: str) -> Optional[Any]:
+    """
+    Parse model text as JSON. Falls back to the first decodable JSON object in the text
+    (instead of a greedy '{.*}' regex, which breaks on trailing braces/commentary).
+    """
+    raw = (raw or "").strip()
+    try:
+        return json.loads(raw)
+    except Exception:
+        pass
+    decoder = json.JSONDecoder()
+    pos = raw.find("{")
+    while pos != -1:
+        try:
+            obj, _ = decoder.raw_decode(raw, pos)
+            return obj
+        except ValueError:
+            pos = raw.find("{", pos + 1)
+    return None
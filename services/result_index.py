@@ -0,0 +1,89 @@
+# services/result_index.py
+"""
+Sort / filter / paging for the review list of one analysis result (app/app.py).
+
+The sort keys (rating, date, sentiment, lower-cased text) are extracted once per result
+by build_review_index(); every rerun after that only reorders small tuples and slices
+out the visible page, so rendering cost follows the page size, not the batch size.
+
+Usage:
+    from services.result_index import SORTS, build_review_index, select_reviews
+
+    index = build_review_index(analysis["rich_reviews"])           # once per result
+    page = select_reviews(index, sort="Rating: low to high", sentiments=["Negative"],
+                          query="battery", page=1, page_size=25)
+    page["positions"]   # indices into rich_reviews for this page
+    page["matches"], page["pages"], page["page"]
+"""
+
+import math
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from workers.bq_mapper import parse_rating, parse_review_date
+
+SORTS = ("Original order", "Rating: low to high", "Rating: high to low", "Newest first", "Oldest first",
+         "Most pain points")
+
+# Ordinal for reviews without a readable date
+_MISSING_DATE = date.min.toordinal()
+
+
+def build_review_index(reviews: Sequence[Dict[str, Any]], reference: Optional[date] = None) -> List[Dict[str, Any]]:
+    """One small record per review with everything sorting and filtering need."""
+    reference = reference or datetime.now(timezone.utc).date()
+    index = []
+    for position, review in enumerate(reviews):
+        meta = review.get("metadata") or {}
+        block = review.get("analysis") or {}
+        day = parse_review_date(meta.get("date"), reference)
+        index.append({
+            "position": position,
+            "sentiment": (block.get("sentiment") or "Neutral").capitalize(),
+            "rating": parse_rating(meta.get("rating")),
+            "day": day.toordinal() if day else _MISSING_DATE,
+            "pains": len(block.get("pain_points") or []),
+            "search": " ".join([review.get("text") or "", meta.get("username") or "",
+                                *(block.get("pain_points") or []), *(block.get("feature_requests") or [])]).lower(),
+        })
+    return index
+
+
+def sentiments_in(index: Sequence[Dict[str, Any]]) -> List[str]:
+    return sorted({entry["sentiment"] for entry in index})
+
+
+def select_reviews(index: Sequence[Dict[str, Any]], sort: str = SORTS[0], sentiments: Optional[Sequence[str]] = None,
+                   query: str = "", page: int = 1, page_size: int = 25) -> Dict[str, Any]:
+    """Filter, sort and slice the index; returns the review positions of one page."""
+    if sort not in SORTS:
+        raise ValueError(f"Unknown sort {sort!r}")
+    entries = list(index)
+    if sentiments:
+        wanted = set(sentiments)
+        entries = [e for e in entries if e["sentiment"] in wanted]
+    terms = query.lower().split()
+    if terms:
+        entries = [e for e in entries if all(t in e["search"] for t in terms)]
+
+    # Reviews without a rating or date go last in either direction
+    if sort == "Rating: low to high":
+        entries.sort(key=lambda e: (e["rating"] is None, e["rating"] or 0))
+    elif sort == "Rating: high to low":
+        entries.sort(key=lambda e: (e["rating"] is None, -(e["rating"] or 0)))
+    elif sort == "Newest first":
+        entries.sort(key=lambda e: (e["day"] == _MISSING_DATE, -e["day"]))
+    elif sort == "Oldest first":
+        entries.sort(key=lambda e: (e["day"] == _MISSING_DATE, e["day"]))
+    elif sort == "Most pain points":
+        entries.sort(key=lambda e: -e["pains"])
+
+    pages = max(1, math.ceil(len(entries) / page_size))
+    page = min(max(1, page), pages)
+    start = (page - 1) * page_size
+    return {
+        "positions": [e["position"] for e in entries[start:start + page_size]],
+        "matches": len(entries),
+        "page": page,
+        "pages": pages,
+    }
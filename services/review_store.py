@@ -0,0 +1,309 @@
+# services/review_store.py
+"""
+Persistent per-review result store.
+
+The same review shows up in a screenshot, a scrape and a ticket export, and recurs across
+days. Each analysed review is stored under (hash of its normalized text, prompt version,
+model), so a later request resolves known reviews locally and sends only unseen ones to
+Gemini.
+
+Keys are the review texts the model returned, never the input split by a heuristic: an
+input block or line is only answered from the store when it is a whole review seen
+before (or when the whole input is). Everything else goes to the model as it was
+written (residual_text), so a multi-line review is never cut into fragments.
+
+Usage:
+    from services.review_store import ReviewStore, text_hash
+
+    store = ReviewStore.from_env()
+    known = store.get_many([text_hash(t) for t in texts], prompt_version, model)  # {hash: review}
+    store.put_many([(text_hash(t), review), ...], prompt_version, model)
+    store.invalidate(keep_prompt_version=prompt_version, model=model)   # drop other versions now
+    store.stats()
+
+Config:
+    REVIEW_STORE_ENABLED      "true" (default) / "false"
+    REVIEW_STORE_PATH         sqlite file (default <system temp dir>/consumer_sense_ai/review_store.sqlite3;
+                              set it to a persistent volume in production)
+    REVIEW_STORE_MAX_ENTRIES  rows kept before eviction (default 100000)
+    REVIEW_STORE_TTL_DAYS     rows older than this are never served (default 30, 0 = no TTL)
+    REVIEW_STORE_EVICTION     lru (default) | lfu | fifo
+
+Notes:
+- The prompt version is derived from the prompt text and response schema (see
+  GeminiREST.prompt_version), so editing prompts/prompts.py or the prompt in
+  services/gemini_rest.py invalidates stored results without a manual bump. Rows of old
+  versions are never served; they age out through the TTL and eviction order, or
+  invalidate() drops them at once.
+- The sqlite file is opened on first use. The row count is read once then and kept up to
+  date by this process's writes, so eviction never counts the table; rows written by other
+  processes sharing the file are only seen on the next open.
+- Normalization folds case, Unicode forms, punctuation and whitespace: "Great app!!" and
+  "great  app" share one entry.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from services.batch_planner import mixed_sentiment, ranked_union
+from services.metrics import inc
+
+REVIEW_STORE_ENABLED = os.getenv("REVIEW_STORE_ENABLED", "true").lower() == "true"
+REVIEW_STORE_PATH = os.getenv("REVIEW_STORE_PATH") or os.path.join(tempfile.gettempdir(), "consumer_sense_ai",
+                                                                   "review_store.sqlite3")
+REVIEW_STORE_MAX_ENTRIES = int(os.getenv("REVIEW_STORE_MAX_ENTRIES", "100000"))
+REVIEW_STORE_TTL_DAYS = float(os.getenv("REVIEW_STORE_TTL_DAYS", "30"))
+REVIEW_STORE_EVICTION = os.getenv("REVIEW_STORE_EVICTION", "lru").lower()
+
+# Column that orders rows for eviction (smallest first)
+_EVICTION_ORDER = {"lru": "last_used_at", "lfu": "hits, last_used_at", "fifo": "created_at"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS review_results (
+    text_hash      TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    model          TEXT NOT NULL,
+    review         TEXT NOT NULL,
+    created_at     REAL NOT NULL,
+    last_used_at   REAL NOT NULL,
+    hits           INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (text_hash, prompt_version, model)
+);
+CREATE INDEX IF NOT EXISTS review_results_last_used ON review_results (last_used_at);
+CREATE INDEX IF NOT EXISTS review_results_created ON review_results (created_at);
+"""
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return re.sub(r"[\W_]+", " ", text).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def match_reviews(segments: Sequence[str], reviews: Sequence[Dict[str, Any]],
+                  threshold: float = 0.6) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Pair input segments with the reviews the model returned for them, by word overlap
+    (the model may trim or clean the text). Each segment and review is used at most once;
+    pairs below `threshold` are dropped rather than stored under the wrong key.
+    """
+    seg_words = [set(normalize_text(s).split()) for s in segments]
+    rev_words = [set(normalize_text(r.get("text") or "").split()) for r in reviews]
+    scored = []
+    for i, a in enumerate(seg_words):
+        for j, b in enumerate(rev_words):
+            if a and b:
+                overlap = len(a & b) / min(len(a), len(b))
+                if overlap >= threshold:
+                    scored.append((overlap, i, j))
+    pairs, used_seg, used_rev = [], set(), set()
+    for _, i, j in sorted(scored, key=lambda x: -x[0]):
+        if i not in used_seg and j not in used_rev:
+            used_seg.add(i)
+            used_rev.add(j)
+            pairs.append((segments[i], reviews[j]))
+    return pairs
+
+
+def residual_text(text: str, known: Iterable[str]) -> str:
+    """
+    `text` without the segments in `known` (split_reviews output), keeping the remaining
+    blocks / lines as they were, so consecutive lines of one review stay together.
+    """
+    known = set(known)
+    text = (text or "").strip()
+    blocks = [b.strip() for b in re.split(r"\n\s*\n", text) if b.strip()]
+    if len(blocks) > 1:
+        return "\n\n".join(b for b in blocks if b not in known)
+    return "\n".join(line for line in text.splitlines() if line.strip() not in known).strip()
+
+
+def stored_result(reviews: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """analyze_content()-shaped result for reviews served from the store (mergeable with merge_results)."""
+    blocks = [r.get("analysis") or {} for r in reviews]
+    return {
+        "reviews": reviews,
+        "overall_summary": f"Includes {len(reviews)} previously analyzed review(s).",
+        "analysis": {
+            "sentiment": mixed_sentiment([b.get("sentiment") or "" for b in blocks]),
+            "pain_points": ranked_union([b.get("pain_points") for b in blocks]),
+            "feature_requests": ranked_union([b.get("feature_requests") for b in blocks]),
+            "actionable_advice": next((b["actionable_advice"] for b in blocks if b.get("actionable_advice")), ""),
+        },
+    }
+
+
+class ReviewStore:
+    def __init__(self, path: str = REVIEW_STORE_PATH, max_entries: int = REVIEW_STORE_MAX_ENTRIES,
+                 ttl_days: float = REVIEW_STORE_TTL_DAYS, eviction: str = REVIEW_STORE_EVICTION):
+        if eviction not in _EVICTION_ORDER:
+            raise ValueError(f"Unknown eviction policy {eviction!r} (lru | lfu | fifo)")
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_s = ttl_days * 86400 if ttl_days > 0 else None
+        self.eviction = eviction
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._rows = 0  # rows in the table, counted when the file is opened
+        self._counts = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        # Called with self._lock held
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._rows = conn.execute("SELECT COUNT(*) FROM review_results").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    @classmethod
+    def from_env(cls) -> Optional["ReviewStore"]:
+        if not REVIEW_STORE_ENABLED:
+            return None
+        try:
+            return cls()
+        except Exception as e:
+            print(f"⚠️ Review store unavailable ({e}); every review goes to the model")
+            return None
+
+    def get_many(self, hashes: Iterable[str], prompt_version: str, model: str) -> Dict[str, Dict[str, Any]]:
+        hashes = list(dict.fromkeys(hashes))
+        if not hashes:
+            return {}
+        now = time.time()
+        min_created = now - self.ttl_s if self.ttl_s else 0.0
+        found: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for start in range(0, len(hashes), 500):  # stay under sqlite's bound-parameter limit
+                chunk = hashes[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._db().execute(
+                    f"SELECT text_hash, review FROM review_results WHERE prompt_version = ? AND model = ? "
+                    f"AND created_at >= ? AND text_hash IN ({marks})",
+                    [prompt_version, model, min_created, *chunk],
+                ).fetchall()
+                if rows:
+                    found.update((h, json.loads(review)) for h, review in rows)
+                    self._db().execute(
+                        f"UPDATE review_results SET hits = hits + 1, last_used_at = ? WHERE prompt_version = ? "
+                        f"AND model = ? AND text_hash IN ({','.join('?' * len(rows))})",
+                        [now, prompt_version, model, *(h for h, _ in rows)],
+                    )
+            self._counts["hits"] += len(found)
+            self._counts["misses"] += len(hashes) - len(found)
+        inc("review_store_lookups_total", len(found), outcome="hit")
+        inc("review_store_lookups_total", len(hashes) - len(found), outcome="miss")
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, Dict[str, Any]]], prompt_version: str, model: str) -> int:
+        now = time.time()
+        reviews = dict(items)
+        rows = [(h, prompt_version, model, json.dumps(review, ensure_ascii=False, separators=(",", ":")), now, now)
+                for h, review in reviews.items()]
+        if not rows:
+            return 0
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            try:
+                # Rows replaced in place do not change the row count (primary-key lookups only)
+                existing = 0
+                for start in range(0, len(rows), 500):
+                    chunk = [row[0] for row in rows[start:start + 500]]
+                    existing += db.execute(
+                        f"SELECT COUNT(*) FROM review_results WHERE prompt_version = ? AND model = ? "
+                        f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                        [prompt_version, model, *chunk],
+                    ).fetchone()[0]
+                db.executemany(
+                    "INSERT OR REPLACE INTO review_results "
+                    "(text_hash, prompt_version, model, review, created_at, last_used_at, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                    rows,
+                )
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+            self._rows += len(rows) - existing
+            self._counts["stored"] += len(rows)
+            self._evict_locked()
+        return len(rows)
+
+    def _evict_locked(self):
+        removed = 0
+        if self.ttl_s:
+            removed += self._db().execute(
+                "DELETE FROM review_results WHERE created_at < ?", (time.time() - self.ttl_s,)
+            ).rowcount
+        self._rows -= removed
+        excess = self._rows - self.max_entries
+        if excess > 0:
+            removed += self._db().execute(
+                f"DELETE FROM review_results WHERE rowid IN "
+                f"(SELECT rowid FROM review_results ORDER BY {_EVICTION_ORDER[self.eviction]} LIMIT ?)",
+                (excess,),
+            ).rowcount
+            self._rows = max(0, self._rows - excess)
+        if removed:
+            self._counts["evicted"] += removed
+            inc("review_store_evictions_total", removed)
+
+    def invalidate(self, prompt_version: Optional[str] = None, model: Optional[str] = None,
+                   keep_prompt_version: Optional[str] = None) -> int:
+        """
+        Delete stored results: those of `prompt_version` and/or `model`, or, with
+        keep_prompt_version, every other prompt version (optionally for one model only).
+        """
+        clauses, args = [], []
+        if prompt_version is not None:
+            clauses.append("prompt_version = ?")
+            args.append(prompt_version)
+        if keep_prompt_version is not None:
+            clauses.append("prompt_version != ?")
+            args.append(keep_prompt_version)
+        if model is not None:
+            clauses.append("model = ?")
+            args.append(model)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        with self._lock:
+            removed = self._db().execute(f"DELETE FROM review_results{where}", args).rowcount
+            self._rows -= removed
+        if removed:
+            print(f"🧹 Review store: invalidated {removed} stored result(s)")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT prompt_version, model, COUNT(*) FROM review_results GROUP BY prompt_version, model"
+            ).fetchall()
+            counts = dict(self._counts)
+        lookups = counts["hits"] + counts["misses"]
+        return dict(
+            counts,
+            hit_rate=round(counts["hits"] / lookups, 4) if lookups else None,
+            entries=sum(n for _, _, n in rows),
+            versions=[{"prompt_version": v, "model": m, "entries": n} for v, m, n in rows],
+        )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,202 @@
+# services/scrape_snapshots.py
+"""
+Per-URL snapshots of scraped review pages, for incremental re-analysis.
+
+Each analysed scrape is stored as a snapshot: the reviews the model returned (fingerprint,
+text, analysis) plus fingerprints of the page lines that belong to no review (titles,
+"Helpful" buttons, star labels, ...). Re-scraping the same URL finds each stored review in
+the new page text; found reviews reuse their stored analysis and are cut out, known
+boilerplate lines are dropped, and only what is left goes to the model. The overall
+summary is rebuilt from the merged set.
+
+Usage:
+    from services.scrape_snapshots import SnapshotStore, build_snapshot, diff_page, merge_reviews, snapshot_entries
+
+    store = SnapshotStore()
+    previous = store.load(url)                       # None on first scrape
+    diff = diff_page(previous, text)                 # {"unchanged", "removed", "residual"}
+    merged = merge_reviews(diff, fresh_reviews)      # {"new", "changed", "unchanged", "removed"}
+    entries = snapshot_entries(text, merged)
+    store.save(url, build_snapshot(url, entries, prompt_version, model, summary,
+                                   page_boilerplate(diff["residual"], fresh_reviews)))
+
+Config:
+    SCRAPE_SNAPSHOTS_ENABLED  "true" (default) / "false"
+    SCRAPE_SNAPSHOT_DIR       snapshot folder (default examples/scrape_snapshots)
+
+Notes:
+- The diff is on the reviews the model returned, not on lines or blocks of the page:
+  extract_main_text() output has no blank lines, and one review usually spans several.
+- A review is found when its words appear in order in the page, whatever the spacing,
+  punctuation or case, starting and ending on word boundaries. A review shorter than
+  MIN_INLINE_WORDS ("Good", "Not great") is only found as whole lines of its own, so it
+  is never cut out of the middle of a longer review.
+- A review the model cleaned or trimmed is not found; its lines are sent again and the
+  re-analysed review is paired with the stored one as "changed".
+- A line is only recorded as boilerplate when no returned review covers most of its words,
+  so a review the model paraphrased is never dropped on the next scrape.
+- A snapshot made with another prompt version or model (or by the older line-based
+  format) is not reused; the page is analysed in full and the snapshot replaced.
+"""
+
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from services.review_store import match_reviews, normalize_text, text_hash
+
+SCRAPE_SNAPSHOTS_ENABLED = os.getenv("SCRAPE_SNAPSHOTS_ENABLED", "true").lower() == "true"
+SCRAPE_SNAPSHOT_DIR = os.getenv("SCRAPE_SNAPSHOT_DIR") or os.path.join(os.getcwd(), "examples", "scrape_snapshots")
+
+# Word overlap above which a review that disappeared and one that appeared are the same review, edited;
+# also how much of a line a returned review must cover for the line to count as part of it
+CHANGED_OVERLAP = 0.6
+
+# Reviews with fewer words are matched against whole page lines only
+MIN_INLINE_WORDS = 3
+
+
+def canonical_url(url: str) -> str:
+    """Scheme/host lower-cased, fragment and trailing slash dropped."""
+    parts = urlsplit((url or "").strip())
+    path = re.sub(r"/+$", "", parts.path) or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+class SnapshotStore:
+    def __init__(self, directory: str = SCRAPE_SNAPSHOT_DIR):
+        self.directory = directory
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(canonical_url(url).encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as fh:
+                snapshot = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if snapshot.get("url") != canonical_url(url) or "reviews" not in snapshot:
+            return None  # hash collision, or a line-based snapshot from an older version
+        return snapshot
+
+    def save(self, url: str, snapshot: Dict[str, Any]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(url)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(snapshot, fh, ensure_ascii=False)
+        os.replace(tmp, path)
+        return path
+
+
+def _review_pattern(text: str) -> Optional[re.Pattern]:
+    words = normalize_text(text).split()
+    if not words:
+        return None
+    body = r"[\W_]+".join(re.escape(w) for w in words)
+    if len(words) < MIN_INLINE_WORDS:
+        return re.compile(rf"^[^\w\n]*{body}[^\w\n]*$", re.IGNORECASE | re.MULTILINE)
+    return re.compile(rf"(?<![^\W_]){body}(?![^\W_])", re.IGNORECASE)
+
+
+def _cut(text: str, review_texts: Sequence[str]) -> Tuple[str, List[bool]]:
+    """Cut each review out of `text` (replaced by a line break); returns (rest, found per review)."""
+    found = []
+    for review_text in review_texts:
+        pattern = _review_pattern(review_text)
+        match = pattern.search(text) if pattern else None
+        found.append(match is not None)
+        if match:
+            text = text[:match.start()] + "\n" + text[match.end():]
+    return text, found
+
+
+def _lines(text: str) -> List[str]:
+    return [line.strip() for line in (text or "").splitlines() if normalize_text(line)]
+
+
+def diff_page(previous: Optional[Dict[str, Any]], text: str) -> Dict[str, Any]:
+    """
+    Find the previous snapshot's reviews in the current page text.
+    Returns {"unchanged": [entry], "removed": [entry], "residual": text}, where entries are
+    previous snapshot entries ({"fp", "text", "review"}) and residual is the page without
+    the found reviews and the known boilerplate lines, in page order.
+    """
+    entries = (previous or {}).get("reviews", [])
+    rest, found = _cut(text or "", [e["text"] for e in entries])
+    boilerplate = set((previous or {}).get("boilerplate", []))
+    residual = "\n".join(line for line in _lines(rest) if text_hash(line) not in boilerplate)
+    return {
+        "unchanged": [e for e, ok in zip(entries, found) if ok],
+        "removed": [e for e, ok in zip(entries, found) if not ok],
+        "residual": residual,
+    }
+
+
+def merge_reviews(diff: Dict[str, Any], reviews: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Classify the reviews the model returned for the residual text: one that mostly shares
+    its words with a review that disappeared is that review, edited ("changed").
+    Returns {"new": [review], "changed": [review], "unchanged": [entry], "removed": [entry]}.
+    """
+    reviews = [r for r in reviews if (r.get("text") or "").strip()]
+    removed = diff["removed"]
+    pairs = match_reviews([e["text"] for e in removed], reviews, threshold=CHANGED_OVERLAP)
+    replaced = {text for text, _ in pairs}
+    changed = {id(r) for _, r in pairs}
+    return {
+        "new": [r for r in reviews if id(r) not in changed],
+        "changed": [r for r in reviews if id(r) in changed],
+        "unchanged": diff["unchanged"],
+        "removed": [e for e in removed if e["text"] not in replaced],
+    }
+
+
+def page_boilerplate(residual: str, reviews: Sequence[Dict[str, Any]]) -> List[str]:
+    """Fingerprints of residual lines that belong to none of the returned reviews."""
+    rest, _ = _cut(residual, [r.get("text") or "" for r in reviews])
+    review_words = [set(normalize_text(r.get("text") or "").split()) for r in reviews]
+    fps = []
+    for line in _lines(rest):
+        words = set(normalize_text(line).split())
+        if not any(len(words & w) / len(words) >= CHANGED_OVERLAP for w in review_words):
+            fps.append(text_hash(line))
+    return fps
+
+
+def build_snapshot(url: str, entries: List[Dict[str, Any]], prompt_version: str, model: str,
+                   overall_summary: str = "", boilerplate: Sequence[str] = ()) -> Dict[str, Any]:
+    return {
+        "url": canonical_url(url),
+        "fetched_at": datetime.now(timezone.utc).isoformat(),
+        "prompt_version": prompt_version,
+        "model": model,
+        "overall_summary": overall_summary,
+        "reviews": entries,
+        "boilerplate": sorted(set(boilerplate)),
+    }
+
+
+def snapshot_entries(text: str, merged: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Snapshot entries in page order: unchanged reviews keep their stored entry, new and
+    changed ones get an entry for the review the model just returned.
+    """
+    entries = list(merged["unchanged"]) + [
+        {"fp": text_hash(r["text"]), "text": r["text"], "review": r} for r in merged["new"] + merged["changed"]]
+    unique = {}
+    for entry in entries:
+        unique.setdefault(entry["fp"], entry)
+
+    def position(entry):
+        pattern = _review_pattern(entry["text"])
+        match = pattern.search(text or "") if pattern else None
+        return match.start() if match else len(text or "")
+
+    return sorted(unique.values(), key=position)
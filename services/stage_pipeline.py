@@ -0,0 +1,148 @@
+# services/stage_pipeline.py
+"""
+Two-stage pipelined executor.
+
+Runs a batch of items through two dependent stages (e.g. vision OCR -> text analysis)
+where each stage has its own worker pool and the stages are connected by a bounded queue.
+While the second stage is working on item N, the first stage is already working on item N+1.
+
+Usage:
+    from services.stage_pipeline import run_two_stage
+
+    out = run_two_stage(images, extract_fn, analyze_fn,
+                        first_workers=2, second_workers=2, queue_size=4,
+                        stage_names=("vision", "analysis"))
+    out["results"]       # one entry per input item, in input order
+    out["stage_latency"] # per-stage latency summary (count, p50/p95/max ms, errors)
+
+Notes:
+- second_stage receives the first stage output for the item.
+- A failing item does not stop the batch: its result slot holds {"error": ..., "stage": ...}.
+- Workers inherit the caller's contextvars (e.g. the services.deadline request deadline).
+- The bounded queue gives backpressure: if analysis falls behind, OCR workers block
+  instead of piling extracted text up in memory.
+"""
+
+import contextvars
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+_SENTINEL = object()
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round((pct / 100.0) * (len(ordered) - 1)))))
+    return round(ordered[k], 2)
+
+
+def _summarize(latencies: List[float], errors: int, workers: int) -> Dict[str, Any]:
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "workers": workers,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "max_ms": round(max(latencies), 2) if latencies else None,
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+    }
+
+
+def run_two_stage(
+    items: Sequence[Any],
+    first_stage: Callable[[Any], Any],
+    second_stage: Callable[[Any], Any],
+    first_workers: int = 2,
+    second_workers: int = 2,
+    queue_size: int = 4,
+    stage_names: Tuple[str, str] = ("first", "second"),
+) -> Dict[str, Any]:
+    """
+    Run every item through first_stage then second_stage with overlapping execution.
+
+    Returns:
+        {"results": [...], "stage_latency": {<first>: {...}, <second>: {...}, "queue_wait": {...}},
+         "wall_ms": int}
+    """
+    first_name, second_name = stage_names
+    first_workers = max(1, int(first_workers))
+    second_workers = max(1, int(second_workers))
+
+    results: List[Any] = [None] * len(items)
+    pending: "queue.Queue" = queue.Queue()
+    for idx, item in enumerate(items):
+        pending.put((idx, item))
+
+    handoff: "queue.Queue" = queue.Queue(maxsize=max(1, int(queue_size)))
+
+    lock = threading.Lock()
+    first_lat: List[float] = []
+    second_lat: List[float] = []
+    wait_lat: List[float] = []
+    errors = {first_name: 0, second_name: 0}
+
+    def first_worker():
+        while True:
+            try:
+                idx, item = pending.get_nowait()
+            except queue.Empty:
+                return
+            start = time.perf_counter()
+            try:
+                out = first_stage(item)
+            except Exception as e:
+                with lock:
+                    errors[first_name] += 1
+                    first_lat.append((time.perf_counter() - start) * 1000)
+                results[idx] = {"error": str(e), "stage": first_name}
+                continue
+            with lock:
+                first_lat.append((time.perf_counter() - start) * 1000)
+            # Blocks while the queue is full -> backpressure on the first stage
+            handoff.put((idx, out, time.perf_counter()))
+
+    def second_worker():
+        while True:
+            entry = handoff.get()
+            if entry is _SENTINEL:
+                return
+            idx, out, enqueued = entry
+            start = time.perf_counter()
+            try:
+                results[idx] = second_stage(out)
+            except Exception as e:
+                with lock:
+                    errors[second_name] += 1
+                results[idx] = {"error": str(e), "stage": second_name}
+            with lock:
+                wait_lat.append((start - enqueued) * 1000)
+                second_lat.append((time.perf_counter() - start) * 1000)
+
+    wall_start = time.perf_counter()
+    # Each worker runs in a copy of the caller's context so request deadlines propagate
+    firsts = [threading.Thread(target=contextvars.copy_context().run, args=(first_worker,), daemon=True)
+              for _ in range(first_workers)]
+    seconds = [threading.Thread(target=contextvars.copy_context().run, args=(second_worker,), daemon=True)
+               for _ in range(second_workers)]
+    for t in firsts + seconds:
+        t.start()
+    for t in firsts:
+        t.join()
+    for _ in seconds:
+        handoff.put(_SENTINEL)
+    for t in seconds:
+        t.join()
+
+    return {
+        "results": results,
+        "stage_latency": {
+            first_name: _summarize(first_lat, errors[first_name], first_workers),
+            second_name: _summarize(second_lat, errors[second_name], second_workers),
+            "queue_wait": _summarize(wait_lat, 0, 0),
+        },
+        "wall_ms": int((time.perf_counter() - wall_start) * 1000),
+    }
@@ -2,6 +2,10 @@ import requests
 from bs4 import BeautifulSoup
 import random
 
+from services.cpu_pool import CPU_POOL_INLINE_HTML_CHARS, run_cpu
+from services.metrics import timed
+
+@timed("scrape")
 def scrape_url_text(url: str) -> str:
     """
     Fetches a URL and returns the clean visible text.
@@ -30,56 +34,11 @@ def scrape_url_text(url: str) -> str:
     try:
         response = requests.get(url, headers=headers, timeout=15)
         response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        # 1. AGGRESSIVE CLEANING: Remove noise elements
-        # We explicitly remove footers, navs, sidebars, and popups
-        noise_selectors = [
-            "script", "style", "header", "footer", "nav", "noscript", "iframe",
-            ".footer", "#footer", ".nav", "#nav", ".navigation", 
-            ".sidebar", "#sidebar", ".cookie-banner", ".ad-container",
-            ".advertisement", ".menu", "#menu", ".search-bar"
-        ]
-        for selector in noise_selectors:
-            for element in soup.select(selector):
-                element.decompose() # Completely remove from tree
 
-        # 2. SMART TARGETING: Try to find the "Meat" of the page
-        # We look for common IDs/Classes for main content
-        content_candidates = [
-            # Amazon specific
-            "#productDescription", "#feature-bullets", "#centerCol", 
-            # News/Blog specific
-            "article", "main", ".post-content", ".article-body", ".entry-content",
-            "#content", ".content", ".main-content"
-        ]
-        
-        extracted_text = ""
-        
-        # Try to find the best candidate
-        for selector in content_candidates:
-            element = soup.select_one(selector)
-            if element:
-                extracted_text = element.get_text(separator="\n")
-                break # Stop once we find a good candidate
-        
-        # 3. FALLBACK: If no specific content area found, extract from Body (cleaned)
-        if not extracted_text or len(extracted_text) < 100:
-            body = soup.find("body")
-            if body:
-                extracted_text = body.get_text(separator="\n")
-            
-        # 4. CLEANUP: Normalize whitespace
-        clean_lines = []
-        for line in extracted_text.splitlines():
-            stripped = line.strip()
-            # Filter out short menu items or gibberish
-            if len(stripped) > 3: 
-                clean_lines.append(stripped)
-                
-        final_text = "\n".join(clean_lines)
-        
+        # Large pages are parsed in the CPU pool, off the request thread
+        html = response.text
+        final_text = run_cpu(extract_main_text, html, size=len(html), inline_below=CPU_POOL_INLINE_HTML_CHARS)
+
         if len(final_text) < 50:
             return "Error: Unable to extract meaningful content. The site might be blocking access."
 
@@ -87,4 +46,58 @@ def scrape_url_text(url: str) -> str:
 
     except Exception as e:
         print(f"Scrape Error: {e}")
-        return ""
\ No newline at end of file
+        return ""
+
+def extract_main_text(html: str) -> str:
+    """
+    Returns the clean visible text of an HTML page (no network).
+    Prioritizes 'Main Content' areas to avoid analyzing footers/nav bars.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+
+    # 1. AGGRESSIVE CLEANING: Remove noise elements
+    # We explicitly remove footers, navs, sidebars, and popups
+    noise_selectors = [
+        "script", "style", "header", "footer", "nav", "noscript", "iframe",
+        ".footer", "#footer", ".nav", "#nav", ".navigation", 
+        ".sidebar", "#sidebar", ".cookie-banner", ".ad-container",
+        ".advertisement", ".menu", "#menu", ".search-bar"
+    ]
+    for selector in noise_selectors:
+        for element in soup.select(selector):
+            element.decompose() # Completely remove from tree
+
+    # 2. SMART TARGETING: Try to find the "Meat" of the page
+    # We look for common IDs/Classes for main content
+    content_candidates = [
+        # Amazon specific
+        "#productDescription", "#feature-bullets", "#centerCol", 
+        # News/Blog specific
+        "article", "main", ".post-content", ".article-body", ".entry-content",
+        "#content", ".content", ".main-content"
+    ]
+    
+    extracted_text = ""
+    
+    # Try to find the best candidate
+    for selector in content_candidates:
+        element = soup.select_one(selector)
+        if element:
+            extracted_text = element.get_text(separator="\n")
+            break # Stop once we find a good candidate
+    
+    # 3. FALLBACK: If no specific content area found, extract from Body (cleaned)
+    if not extracted_text or len(extracted_text) < 100:
+        body = soup.find("body")
+        if body:
+            extracted_text = body.get_text(separator="\n")
+        
+    # 4. CLEANUP: Normalize whitespace
+    clean_lines = []
+    for line in extracted_text.splitlines():
+        stripped = line.strip()
+        # Filter out short menu items or gibberish
+        if len(stripped) > 3: 
+            clean_lines.append(stripped)
+            
+    return "\n".join(clean_lines)
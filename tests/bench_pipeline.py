@@ -0,0 +1,336 @@
+# tests/bench_pipeline.py
+"""
+CPU microbenchmarks for the local (non-network) stages of the pipeline.
+
+Every benchmark runs on a seeded synthetic corpus (tests/synthetic_corpus.py), so numbers
+are comparable between runs and machines differ only by hardware.
+
+Usage:
+    python tests/bench_pipeline.py                              # run all, print a table
+    python tests/bench_pipeline.py --output bench.json          # also write JSON results
+    python tests/bench_pipeline.py --baseline bench.json        # compare against a previous run
+    python tests/bench_pipeline.py --baseline bench.json --fail-on-regression
+    python tests/bench_pipeline.py --filter image --quick       # subset, fewer repeats
+
+Output JSON:
+    {"meta": {python, platform, git_rev, seed, ...},
+     "results": {name: {"median_us", "min_us", "ops_per_s", "repeats", "number"}}}
+
+Notes:
+- Not collected by pytest (no test_ prefix); run it by hand or in CI.
+- A benchmark is a regression when its median is more than --threshold (default 10%)
+  slower than the baseline median.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+# Add project root to path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from tests.synthetic_corpus import SyntheticCorpus
+
+SEED = 1234
+
+# name -> setup(corpus) returning the zero-arg callable to time
+BENCHMARKS: Dict[str, Callable[[SyntheticCorpus], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+# ----------------- benchmarks --------------------------------
+@benchmark("scrape.extract_main_text")
+def _bench_extract(corpus):
+    from services.web_scraper import extract_main_text
+    html = corpus.html_page(reviews=40)
+    return lambda: extract_main_text(html)
+
+
+@benchmark("image.open_load")
+def _bench_image_open(corpus):
+    import io
+    from PIL import Image
+    png = corpus.screenshot(800, 1200)
+
+    def run():
+        with Image.open(io.BytesIO(png)) as image:
+            image.load()
+    return run
+
+
+@benchmark("image.preprocess_for_request")
+def _bench_image_preprocess(corpus):
+    # Reference for the original path: the bytes were opened with PIL and the SDK re-encoded
+    # the PIL image as PNG (BytesIO images have no filename). Compare with image.prepare_image.
+    import io
+    from PIL import Image
+    png = corpus.screenshot(800, 1200)
+
+    def run():
+        image = Image.open(io.BytesIO(png))
+        buf = io.BytesIO()
+        image.save(buf, "PNG")
+        return buf.getvalue()
+    return run
+
+
+@benchmark("image.prepare_image")
+def _bench_prepare_image(corpus):
+    # Current path: screenshots within IMAGE_MAX_SIDE are passed through without decoding
+    from services.image_ingest import prepare_image
+    png = corpus.screenshot(800, 1200)
+    return lambda: prepare_image(png)
+
+
+@benchmark("image.prepare_image_downscale")
+def _bench_prepare_image_downscale(corpus):
+    from services.image_ingest import prepare_image
+    png = corpus.screenshot(1600, 4000)
+    return lambda: prepare_image(png)
+
+
+@benchmark("image.prepare_image_x8_inline")
+def _bench_prepare_batch_inline(corpus):
+    # Reference for image.prepare_image_x8_pool: the same eight downscales on this thread
+    from services.image_ingest import prepare_image
+    shots = [corpus.screenshot(1600, 4000) for _ in range(8)]
+    return lambda: [prepare_image(s) for s in shots]
+
+
+@benchmark("image.prepare_image_x8_pool")
+def _bench_prepare_batch_pool(corpus):
+    # One worker per CPU; speedup over the inline reference ~ min(CPUs, 8) minus IPC
+    from services.cpu_pool import CpuPool, _cpu_count
+    from services.image_ingest import prepare_image
+    shots = [corpus.screenshot(1600, 4000) for _ in range(8)]
+    pool = CpuPool(workers=_cpu_count(), max_pending=16)
+    pool.map(prepare_image, shots[:1])  # start the workers outside the timed region
+    return lambda: pool.map(prepare_image, shots)
+
+
+@benchmark("gemini.build_review_response")
+def _bench_review_response(corpus):
+    from services.gemini_rest import build_review_response
+    result = corpus.model_output(reviews=40)
+    return lambda: build_review_response(result, text="pasted text", model="gemini-2.5-flash")
+
+
+@benchmark("gemini.expand_compact")
+def _bench_expand_compact(corpus):
+    from services.response_schema import expand_compact
+    compact = corpus.compact_output(reviews=40)
+    return lambda: expand_compact(compact)
+
+
+@benchmark("doc.build_firestore_doc")
+def _bench_build_doc(corpus):
+    from workers.doc_builder import build_firestore_doc
+    result = corpus.gemini_result(reviews=40)
+    return lambda: build_firestore_doc(result, "text")
+
+
+@benchmark("doc.validate_review_doc")
+def _bench_validate(corpus):
+    from workers.doc_builder import build_firestore_doc
+    from workers.schema_validator import validate_review_doc
+    doc = build_firestore_doc(corpus.gemini_result(reviews=40), "text")
+    return lambda: validate_review_doc(doc)
+
+
+@benchmark("doc.map_doc_to_bq_row")
+def _bench_bq_row(corpus):
+    from workers.bq_mapper import map_doc_to_bq_row
+    from workers.doc_builder import build_firestore_doc
+    doc = build_firestore_doc(corpus.gemini_result(reviews=40), "text")
+    return lambda: map_doc_to_bq_row(doc)
+
+
+@benchmark("bq.rows_to_frame_1000")
+def _bench_bq_rows_frame(corpus):
+    # Reference for the batch mapper: per-row mapping, then a typed DataFrame built from the rows
+    import pandas as pd
+    from workers.bq_mapper import map_doc_to_bq_row
+    docs = corpus.review_docs(1000)
+
+    def run():
+        frame = pd.DataFrame([map_doc_to_bq_row(doc) for doc in docs])
+        for name in ("created_at", "processed_at"):
+            frame[name] = pd.to_datetime(frame[name], utc=True, format="ISO8601")
+        return frame.astype({"score": "Float64", "confidence": "Float64", "processing_latency_ms": "Int64"})
+    return run
+
+
+@benchmark("bq.map_docs_to_bq_frame_1000")
+def _bench_bq_frame(corpus):
+    from workers.bq_mapper import map_docs_to_bq_frame
+    docs = corpus.review_docs(1000)
+    return lambda: map_docs_to_bq_frame(docs)
+
+
+@benchmark("records.json_dump_indent_100")
+def _bench_json_indent(corpus):
+    # Reference for records.dumps: the indented json.dump the writers used before
+    import json
+    docs = corpus.review_docs(100, reviews_per_doc=10)
+    return lambda: [json.dumps(doc, indent=2, ensure_ascii=False) for doc in docs]
+
+
+@benchmark("records.dumps_100")
+def _bench_records_dumps(corpus):
+    from workers.records import dumps
+    docs = corpus.review_docs(100, reviews_per_doc=10)
+    return lambda: [dumps(doc) for doc in docs]
+
+
+@benchmark("records.round_trip_100")
+def _bench_records_round_trip(corpus):
+    from workers.records import ReviewDoc
+    docs = corpus.review_docs(100, reviews_per_doc=10)
+    return lambda: [ReviewDoc.from_dict(doc).to_dict() for doc in docs]
+
+
+# ----------------- runner --------------------------------
+def _autorange(fn: Callable[[], object], min_time: float) -> int:
+    """Smallest number of calls (1, 2, 5, 10, ...) whose total runtime exceeds min_time."""
+    number = 1
+    while True:
+        for factor in (1, 2, 5):
+            n = number * factor
+            start = time.perf_counter()
+            for _ in range(n):
+                fn()
+            if time.perf_counter() - start >= min_time:
+                return n
+        number *= 10
+
+
+def time_benchmark(fn: Callable[[], object], repeats: int = 7, min_time: float = 0.05) -> Dict[str, float]:
+    fn()  # warmup: imports, caches, lazy init
+    number = _autorange(fn, min_time)
+    samples: List[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number * 1e6)
+    median = statistics.median(samples)
+    return {
+        "median_us": round(median, 3),
+        "min_us": round(min(samples), 3),
+        "ops_per_s": round(1e6 / median, 1) if median else None,
+        "repeats": repeats,
+        "number": number,
+    }
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmarks(names: List[str], repeats: int, min_time: float, seed: int = SEED) -> Dict:
+    results = {}
+    for name in names:
+        # Fresh corpus per benchmark so adding a benchmark does not shift the others' inputs
+        fn = BENCHMARKS[name](SyntheticCorpus(seed))
+        results[name] = time_benchmark(fn, repeats=repeats, min_time=min_time)
+        print(f"  {name:<34} {results[name]['median_us']:>12.1f} us  {results[name]['ops_per_s']:>10} ops/s")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "git_rev": _git_rev(),
+            "seed": seed,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = 0.10) -> Dict[str, Dict]:
+    """Per-benchmark speedup (baseline median / current median) and regression flag."""
+    out = {}
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("median_us"):
+            out[name] = {"status": "new"}
+            continue
+        speedup = base["median_us"] / cur["median_us"] if cur["median_us"] else None
+        regressed = cur["median_us"] > base["median_us"] * (1 + threshold)
+        improved = cur["median_us"] < base["median_us"] * (1 - threshold)
+        out[name] = {
+            "baseline_us": base["median_us"],
+            "current_us": cur["median_us"],
+            "speedup": round(speedup, 3) if speedup else None,
+            "status": "regression" if regressed else ("improved" if improved else "same"),
+        }
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="CPU microbenchmarks for local pipeline stages.")
+    parser.add_argument("--output", help="write JSON results to this path")
+    parser.add_argument("--baseline", help="previous JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regression threshold (fraction)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 on any regression")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--quick", action="store_true", help="3 repeats, short autorange")
+    parser.add_argument("--list", action="store_true", help="list benchmark names and exit")
+    args = parser.parse_args(argv)
+
+    names = [n for n in BENCHMARKS if args.filter in n]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    repeats, min_time = (3, 0.02) if args.quick else (args.repeats, 0.1)
+    print(f"⏱️ Running {len(names)} benchmarks (repeats={repeats})")
+    report = run_benchmarks(names, repeats=repeats, min_time=min_time)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        report["comparison"] = compare(report, baseline, args.threshold)
+        print(f"\n📊 vs baseline {baseline.get('meta', {}).get('git_rev')}:")
+        for name, row in report["comparison"].items():
+            if row["status"] == "new":
+                print(f"  {name:<34} (new)")
+                continue
+            print(f"  {name:<34} {row['speedup']:>6.2f}x  {row['status']}")
+            if row["status"] == "regression":
+                regressions.append(name)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+    if regressions and args.fail_on_regression:
+        print(f"❌ Regressions: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
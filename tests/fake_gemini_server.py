@@ -0,0 +1,481 @@
+# tests/fake_gemini_server.py
+"""
+Local HTTP stand-in for the Gemini generateContent endpoint.
+
+Speaks enough of the REST protocol for google-genai (POST /v1beta/models/<model>:generateContent,
+resumable Files API uploads and cachedContents) to drive GeminiREST without quota, with
+configurable latency, error rates and truncation.
+
+Usage (in-process):
+    from tests.fake_gemini_server import FakeGeminiConfig, FakeGeminiServer
+
+    with FakeGeminiServer(FakeGeminiConfig(latency="lognormal:800,0.5", rate_429=0.02)) as server:
+        client = GeminiREST(api_key="fake", base_url=server.base_url)
+        client.analyze_review(text="...")
+        server.stats()   # {"requests": 1, "status": {"200": 1}, "truncated": 0, "request_bytes": ..., ...}
+
+Usage (standalone, then point the app at it with GEMINI_BASE_URL=http://127.0.0.1:8089):
+    python tests/fake_gemini_server.py --port 8089 --latency lognormal:1500,0.6 \\
+        --rate-429 0.02 --rate-500 0.01 --truncate 0.05
+
+Config (FakeGeminiConfig):
+    latency     "fixed:<ms>" | "uniform:<lo_ms>,<hi_ms>" | "lognormal:<median_ms>,<sigma>"
+    rate_429    fraction of requests answered with 429 RESOURCE_EXHAUSTED
+    rate_500    fraction of requests answered with 500 INTERNAL
+    truncate    fraction of responses cut at 40-90% of their text (finishReason MAX_TOKENS)
+    reviews     reviews per synthetic response
+    canned      list of outputs (dicts or raw strings) served round-robin instead of synthetic ones
+    seed        RNG seed, so a run is reproducible
+    cache_min_tokens  cachedContents.create rejects smaller contents (400), like the real API
+
+Notes:
+- Without canned outputs, requests with a responseSchema get compact-schema JSON
+  (services/response_schema.py); others get the verbose format.
+- Errors are drawn before the latency sleep is applied, like a real frontend that sheds load.
+- Uploaded files are kept in memory (size only); generateContent answers 400 for a fileData
+  part whose URI was never uploaded. stats() counts uploads, file references and request bytes.
+- cachedContents (create / get / patch ttl / delete) are kept in memory with their expiry;
+  generateContent answers 403 for an unknown or expired cachedContent, and reports
+  cachedContentTokenCount otherwise. expire_cache() ends caches early for tests.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tests.synthetic_corpus import SyntheticCorpus
+
+_GENERATE_PATH = re.compile(r"^/v1(?:beta|alpha)?/models/(?P<model>[^/:]+):generateContent$")
+_UPLOAD_PATH = re.compile(r"^/upload/v1(?:beta|alpha)?/files$")
+_CACHE_PATH = re.compile(r"^/v1(?:beta|alpha)?/cachedContents(?:/(?P<id>[^/]+))?$")
+
+
+class FakeGeminiConfig:
+    def __init__(self, latency: str = "fixed:0", rate_429: float = 0.0, rate_500: float = 0.0,
+                 truncate: float = 0.0, reviews: int = 8,
+                 canned: Optional[List[Union[Dict[str, Any], str]]] = None, seed: int = 0,
+                 cache_min_tokens: int = 0):
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.truncate = truncate
+        self.reviews = reviews
+        self.canned = list(canned or [])
+        self.seed = seed
+        self.cache_min_tokens = cache_min_tokens
+        self._kind, self._params = self._parse_latency(latency)
+
+    @staticmethod
+    def _parse_latency(spec: str):
+        kind, _, args = spec.partition(":")
+        params = [float(x) for x in args.split(",") if x.strip()]
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(f"Bad latency spec {spec!r} (fixed:<ms> | uniform:<lo>,<hi> | lognormal:<median>,<sigma>)")
+        return kind, params
+
+    def sample_latency_s(self, rng: random.Random) -> float:
+        if self._kind == "fixed":
+            ms = self._params[0]
+        elif self._kind == "uniform":
+            ms = rng.uniform(*self._params)
+        else:
+            median, sigma = self._params
+            ms = rng.lognormvariate(math.log(max(median, 0.001)), sigma)
+        return max(0.0, ms) / 1000.0
+
+    @classmethod
+    def load_canned(cls, directory: str) -> List[Union[Dict[str, Any], str]]:
+        """Every *.json file in `directory`, parsed if possible (raw text otherwise), by name."""
+        outputs = []
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".json"):
+                with open(os.path.join(directory, name), "r", encoding="utf-8") as fh:
+                    raw = fh.read()
+                try:
+                    outputs.append(json.loads(raw))
+                except ValueError:
+                    outputs.append(raw)
+        return outputs
+
+
+class FakeGeminiServer:
+    def __init__(self, config: Optional[FakeGeminiConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeGeminiConfig()
+        self._rng = random.Random(self.config.seed)
+        self._corpus = SyntheticCorpus(self.config.seed)
+        self._lock = threading.Lock()
+        self._canned_index = 0
+        self._uploads: Dict[str, Dict[str, Any]] = {}   # upload id -> pending file
+        self.files: Dict[str, Dict[str, Any]] = {}      # uri -> file resource
+        self.caches: Dict[str, Dict[str, Any]] = {}     # name -> cached content (+ "_expires_at", "_tokens")
+        self._stats = self._empty_stats()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, Any]:
+        return {"requests": 0, "status": {}, "truncated": 0, "in_flight": 0, "max_in_flight": 0,
+                "request_bytes": 0, "files_uploaded": 0, "file_refs": 0, "caches_created": 0,
+                "caches_refreshed": 0, "cached_requests": 0, "cached_tokens": 0, "system_instruction_requests": 0}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeGeminiServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True, name="fake-gemini")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeGeminiServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = self._empty_stats()
+
+    # ---------------- request handling ----------------
+    def plan(self) -> Dict[str, Any]:
+        """Draw this request's outcome: status, latency, truncation."""
+        cfg = self.config
+        with self._lock:
+            roll = self._rng.random()
+            status = 429 if roll < cfg.rate_429 else (500 if roll < cfg.rate_429 + cfg.rate_500 else 200)
+            truncate_at = self._rng.uniform(0.4, 0.9) if self._rng.random() < cfg.truncate else None
+            latency = cfg.sample_latency_s(self._rng)
+            self._stats["requests"] += 1
+            self._stats["status"][str(status)] = self._stats["status"].get(str(status), 0) + 1
+            self._stats["in_flight"] += 1
+            self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._stats["in_flight"])
+            if status == 200 and truncate_at is not None:
+                self._stats["truncated"] += 1
+        return {"status": status, "latency_s": latency, "truncate_at": truncate_at}
+
+    def count_request(self, nbytes: int, file_refs: int):
+        with self._lock:
+            self._stats["request_bytes"] += nbytes
+            self._stats["file_refs"] += file_refs
+
+    def unknown_files(self, request: Dict[str, Any]) -> List[str]:
+        uris = [part["fileData"].get("fileUri") or part["fileData"].get("file_uri") for content in request.get("contents") or []
+                for part in content.get("parts") or [] if "fileData" in part]
+        with self._lock:
+            return [uri for uri in uris if uri not in self.files]
+
+    # ---------------- Files API (resumable upload) ----------------
+    def start_upload(self, metadata: Dict[str, Any]) -> str:
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = {"meta": metadata.get("file") or {}, "received": 0}
+        return f"{self.base_url}/upload/v1beta/files?upload_id={upload_id}"
+
+    def append_upload(self, upload_id: str, nbytes: int, finalize: bool) -> Optional[Dict[str, Any]]:
+        """Record a chunk; returns the file resource once finalized, {} while active, None if unknown."""
+        with self._lock:
+            pending = self._uploads.get(upload_id)
+            if pending is None:
+                return None
+            pending["received"] += nbytes
+            if not finalize:
+                return {}
+            del self._uploads[upload_id]
+            meta, now = pending["meta"], datetime.now(timezone.utc)
+            name = f"files/{upload_id[:12]}"
+            resource = {
+                "name": name,
+                "displayName": meta.get("displayName", ""),
+                "mimeType": meta.get("mimeType", "application/octet-stream"),
+                "sizeBytes": str(pending["received"]),
+                "createTime": now.isoformat().replace("+00:00", "Z"),
+                "expirationTime": (now + timedelta(hours=48)).isoformat().replace("+00:00", "Z"),
+                "uri": f"{self.base_url}/v1beta/{name}",
+                "state": "ACTIVE",
+            }
+            self.files[resource["uri"]] = resource
+            self._stats["files_uploaded"] += 1
+            return resource
+
+    # ---------------- cachedContents ----------------
+    @staticmethod
+    def _stamp(ts: float) -> str:
+        return datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z")
+
+    @staticmethod
+    def _ttl_s(body: Dict[str, Any]) -> float:
+        return float(str(body.get("ttl") or "3600s").rstrip("s"))
+
+    def _public(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in entry.items() if not k.startswith("_")}
+
+    def create_cache(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        parts = [p for c in [body.get("systemInstruction") or {}, *(body.get("contents") or [])]
+                 for p in c.get("parts") or []]
+        tokens = sum(len(p.get("text") or "") for p in parts) // 4
+        if tokens < self.config.cache_min_tokens:
+            return 400, {"error": {"code": 400, "status": "INVALID_ARGUMENT",
+                                   "message": f"Cached content is too small. total_token_count={tokens}, "
+                                              f"min_total_token_count={self.config.cache_min_tokens}"}}
+        now = time.time()
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        entry = {"name": name, "model": body.get("model"), "displayName": body.get("displayName", ""),
+                 "createTime": self._stamp(now), "updateTime": self._stamp(now),
+                 "expireTime": self._stamp(now + self._ttl_s(body)),
+                 "usageMetadata": {"totalTokenCount": tokens},
+                 "_expires_at": now + self._ttl_s(body), "_tokens": tokens}
+        with self._lock:
+            self.caches[name] = entry
+            self._stats["caches_created"] += 1
+        return 200, self._public(entry)
+
+    def live_cache(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self.caches.get(name)
+            return entry if entry and entry["_expires_at"] > time.time() else None
+
+    def update_cache(self, name: str, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        entry = self.live_cache(name)
+        if entry is None:
+            return None
+        now = time.time()
+        with self._lock:
+            entry.update(_expires_at=now + self._ttl_s(body), expireTime=self._stamp(now + self._ttl_s(body)),
+                         updateTime=self._stamp(now))
+            self._stats["caches_refreshed"] += 1
+        return self._public(entry)
+
+    def delete_cache(self, name: str) -> bool:
+        with self._lock:
+            return self.caches.pop(name, None) is not None
+
+    def expire_cache(self, name: Optional[str] = None):
+        """End one cache (or all) now, as if its TTL had run out."""
+        with self._lock:
+            for key, entry in self.caches.items():
+                if name is None or key == name:
+                    entry["_expires_at"] = 0.0
+
+    def count_prompt(self, request: Dict[str, Any]) -> Optional[str]:
+        """Record how the request carried its prompt; the error message for a dead cache, else None."""
+        name = request.get("cachedContent")
+        if name:
+            entry = self.live_cache(name)
+            if entry is None:
+                return f"CachedContent not found (or permission denied): {name}"
+            with self._lock:
+                self._stats["cached_requests"] += 1
+                self._stats["cached_tokens"] += entry["_tokens"]
+        elif request.get("systemInstruction"):
+            with self._lock:
+                self._stats["system_instruction_requests"] += 1
+        return None
+
+    def done(self):
+        with self._lock:
+            self._stats["in_flight"] -= 1
+
+    def output_text(self, request: Dict[str, Any]) -> str:
+        with self._lock:
+            if self.config.canned:
+                output = self.config.canned[self._canned_index % len(self.config.canned)]
+                self._canned_index += 1
+                return output if isinstance(output, str) else json.dumps(output)
+            generation = request.get("generationConfig") or {}
+            if generation.get("responseSchema") or generation.get("responseJsonSchema"):
+                return json.dumps(self._corpus.compact_output(self.config.reviews))
+            return json.dumps(self._corpus.model_output(self.config.reviews))
+
+
+def _error_body(status: int) -> Dict[str, Any]:
+    if status == 429:
+        return {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED",
+                          "message": "Resource has been exhausted (e.g. check quota)."}}
+    return {"error": {"code": status, "status": "INTERNAL", "message": "An internal error has occurred."}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=UTF-8")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up (deadline / hedge loser)
+
+    def do_POST(self):
+        fake: FakeGeminiServer = self.server.fake
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        path, _, query = self.path.partition("?")
+        if _UPLOAD_PATH.match(path):
+            self._upload(fake, raw, query)
+            return
+        if _CACHE_PATH.match(path):
+            self._send(*fake.create_cache(json.loads(raw or b"{}")))
+            return
+        match = _GENERATE_PATH.match(path)
+        if not match:
+            self._send(404, {"error": {"code": 404, "status": "NOT_FOUND", "message": f"No route {self.path}"}})
+            return
+        try:
+            request = json.loads(raw or b"{}")
+        except ValueError:
+            self._send(400, {"error": {"code": 400, "status": "INVALID_ARGUMENT", "message": "Bad JSON"}})
+            return
+        missing = fake.unknown_files(request)
+        if missing:
+            self._send(400, {"error": {"code": 400, "status": "INVALID_ARGUMENT",
+                                       "message": f"File {missing[0]} does not exist or has expired."}})
+            return
+        dead_cache = fake.count_prompt(request)
+        if dead_cache:
+            self._send(403, {"error": {"code": 403, "status": "PERMISSION_DENIED", "message": dead_cache}})
+            return
+        fake.count_request(length, sum(1 for c in request.get("contents") or []
+                                       for p in c.get("parts") or [] if "fileData" in p))
+
+        plan = fake.plan()
+        try:
+            if plan["status"] != 200:
+                self._send(plan["status"], _error_body(plan["status"]))
+                return
+            time.sleep(plan["latency_s"])
+            cache = fake.live_cache(request["cachedContent"]) if request.get("cachedContent") else None
+            cached_tokens = cache["_tokens"] if cache else 0
+            text = fake.output_text(request)
+            finish = "STOP"
+            if plan["truncate_at"] is not None:
+                text = text[: int(len(text) * plan["truncate_at"])]
+                finish = "MAX_TOKENS"
+            self._send(200, {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": finish}],
+                "usageMetadata": {"promptTokenCount": length // 4 + cached_tokens,
+                                  "cachedContentTokenCount": cached_tokens,
+                                  "candidatesTokenCount": max(1, len(text) // 4),
+                                  "totalTokenCount": length // 4 + cached_tokens + max(1, len(text) // 4)},
+                "modelVersion": match.group("model"),
+            })
+        finally:
+            fake.done()
+
+    def _cache_resource(self, fake: "FakeGeminiServer", method: str):
+        path = self.path.partition("?")[0]
+        match = _CACHE_PATH.match(path)
+        if not match or not match.group("id"):
+            self._send(404, {"error": {"code": 404, "status": "NOT_FOUND", "message": f"No route {self.path}"}})
+            return
+        name = f"cachedContents/{match.group('id')}"
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        if method == "DELETE":
+            found = fake.delete_cache(name)
+            resource = {} if found else None
+        elif method == "PATCH":
+            resource = fake.update_cache(name, body)
+        else:
+            entry = fake.live_cache(name)
+            resource = fake._public(entry) if entry else None
+        if resource is None:
+            self._send(404, {"error": {"code": 404, "status": "NOT_FOUND",
+                                       "message": f"CachedContent not found (or permission denied): {name}"}})
+        else:
+            self._send(200, resource)
+
+    def do_GET(self):
+        self._cache_resource(self.server.fake, "GET")
+
+    def do_PATCH(self):
+        self._cache_resource(self.server.fake, "PATCH")
+
+    def do_DELETE(self):
+        self._cache_resource(self.server.fake, "DELETE")
+
+    def _upload(self, fake: "FakeGeminiServer", raw: bytes, query: str):
+        upload_id = dict(p.partition("=")[::2] for p in query.split("&") if p).get("upload_id")
+        if not upload_id:
+            # Start of a resumable upload: metadata in, upload URL out
+            try:
+                metadata = json.loads(raw or b"{}")
+            except ValueError:
+                metadata = {}
+            self._send(200, {}, {"x-goog-upload-url": fake.start_upload(metadata),
+                                 "x-goog-upload-status": "active"})
+            return
+        command = (self.headers.get("X-Goog-Upload-Command") or "").lower()
+        resource = fake.append_upload(upload_id, len(raw), "finalize" in command)
+        if resource is None:
+            self._send(404, {"error": {"code": 404, "status": "NOT_FOUND", "message": "Unknown upload"}})
+        elif resource:
+            self._send(200, {"file": resource}, {"x-goog-upload-status": "final"})
+        else:
+            self._send(200, {}, {"x-goog-upload-status": "active"})
+
+    def log_message(self, *args):
+        pass
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini generateContent endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default="lognormal:1500,0.5")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-500", type=float, default=0.0)
+    parser.add_argument("--truncate", type=float, default=0.0)
+    parser.add_argument("--reviews", type=int, default=8)
+    parser.add_argument("--canned", help="directory of *.json outputs to serve round-robin")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    config = FakeGeminiConfig(
+        latency=args.latency, rate_429=args.rate_429, rate_500=args.rate_500, truncate=args.truncate,
+        reviews=args.reviews, canned=FakeGeminiConfig.load_canned(args.canned) if args.canned else None,
+        seed=args.seed,
+    )
+    server = FakeGeminiServer(config, host=args.host, port=args.port).start()
+    print(f"🧪 Fake Gemini on {server.base_url} (set GEMINI_BASE_URL to use it). Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"   {server.stats()}")
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
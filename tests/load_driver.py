@@ -0,0 +1,189 @@
+# tests/load_driver.py
+"""
+Concurrency sweep against the real pipeline entry points, backed by the fake Gemini server.
+
+For each entry point and concurrency level, runs a fixed number of requests from that many
+threads (one shared client, as in the app) and reports throughput, latency percentiles and
+error / degraded rates.
+
+Entry points:
+    ui     services.gemini_client.analyze_text(text)       -- what app.py calls for text/URL input
+    batch  services.gemini_client.analyze_image([pngs...]) -- multi-screenshot upload
+    api    GeminiREST.analyze_review(text=...)              -- the client used directly
+
+Usage:
+    python tests/load_driver.py --concurrency 1,2,4,8,16 --requests 40 \\
+        --latency lognormal:800,0.5 --rate-429 0.02 --truncate 0.05 --output load.json
+    python tests/load_driver.py --base-url http://127.0.0.1:8089 --entry api   # external fake
+
+Notes:
+- With no --base-url an in-process FakeGeminiServer is started; the real GEMINI_API_KEY is
+  never sent anywhere.
+- --degraded-mode defaults to "off" so Gemini errors are counted as errors instead of being
+  absorbed by the offline engine; use "auto" to measure the breaker itself.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tests.fake_gemini_server import FakeGeminiConfig, FakeGeminiServer
+from tests.synthetic_corpus import SyntheticCorpus
+
+ENTRY_POINTS = ("ui", "batch", "api")
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round((pct / 100.0) * (len(ordered) - 1)))))
+    return round(ordered[k], 1)
+
+
+def build_entry(entry: str, client, corpus: SyntheticCorpus) -> Callable[[int], Dict[str, Any]]:
+    """Returns fn(i) -> pipeline result for request i."""
+    from services import gemini_client
+
+    texts = [corpus.review_text(5) for _ in range(16)]
+    if entry == "ui":
+        return lambda i: gemini_client.analyze_text(texts[i % len(texts)])
+    if entry == "batch":
+        shots = [corpus.screenshot(400, 600) for _ in range(3)]
+        return lambda i: gemini_client.analyze_image(shots)
+    if entry == "api":
+        return lambda i: client.analyze_review(text=texts[i % len(texts)])
+    raise ValueError(f"Unknown entry point {entry!r} (expected one of {ENTRY_POINTS})")
+
+
+def run_level(fn: Callable[[int], Dict[str, Any]], concurrency: int, requests: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    outcomes = {"ok": 0, "error": 0, "degraded": 0}
+
+    def one(i: int):
+        start = time.perf_counter()
+        try:
+            result = fn(i)
+            if result.get("error"):
+                kind = "error"
+            elif str(result.get("model", "")).startswith("local-"):
+                kind = "degraded"
+            else:
+                kind = "ok"
+        except Exception:
+            kind = "error"
+        return (time.perf_counter() - start) * 1000, kind
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, kind in pool.map(one, range(requests)):
+            latencies.append(latency)
+            outcomes[kind] += 1
+    wall = time.perf_counter() - wall_start
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(requests / wall, 2) if wall else None,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "p99_ms": _percentile(latencies, 99),
+        "max_ms": round(max(latencies), 1) if latencies else None,
+        "error_rate": round(outcomes["error"] / requests, 4),
+        "degraded_rate": round(outcomes["degraded"] / requests, 4),
+    }
+
+
+def sweep(entries: List[str], levels: List[int], requests: int, base_url: str,
+          degraded_mode: str = "off", seed: int = 0, server: Optional[FakeGeminiServer] = None,
+          quiet: bool = True) -> Dict[str, Any]:
+    from services import gemini_client
+    from services.gemini_rest import GeminiREST
+
+    client = GeminiREST(api_key="fake-load-test-key", base_url=base_url)
+    client.review_store = None  # measure the upstream path, not stored results
+    gemini_client.set_gemini_client(client)
+    previous_mode, gemini_client.DEGRADED_MODE = gemini_client.DEGRADED_MODE, degraded_mode
+    report: Dict[str, Any] = {"base_url": base_url, "degraded_mode": degraded_mode, "results": {}}
+    try:
+        for entry in entries:
+            fn = build_entry(entry, client, SyntheticCorpus(seed))
+            rows = []
+            for level in levels:
+                gemini_client.reset_overload()
+                if server:
+                    server.reset_stats()
+                # The pipeline logs every call; keep the report readable
+                with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+                    row = run_level(fn, level, requests)
+                if server:
+                    stats = server.stats()
+                    row["upstream_status"] = stats["status"]
+                    row["upstream_truncated"] = stats["truncated"]
+                    row["upstream_max_in_flight"] = stats["max_in_flight"]
+                rows.append(row)
+                print(f"  {entry:<6} c={level:<4} {row['throughput_rps']:>8} req/s  p50={row['p50_ms']}ms "
+                      f"p95={row['p95_ms']}ms p99={row['p99_ms']}ms  err={row['error_rate']:.1%} "
+                      f"degraded={row['degraded_rate']:.1%}")
+            report["results"][entry] = rows
+    finally:
+        gemini_client.DEGRADED_MODE = previous_mode
+        gemini_client.set_gemini_client(None)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Concurrency sweep against the pipeline entry points.")
+    parser.add_argument("--entry", default="ui,batch,api", help=f"comma list of {', '.join(ENTRY_POINTS)}")
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="comma list of levels")
+    parser.add_argument("--requests", type=int, default=40, help="requests per level")
+    parser.add_argument("--base-url", help="use an already running endpoint instead of an in-process fake")
+    parser.add_argument("--latency", default="lognormal:800,0.5")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-500", type=float, default=0.0)
+    parser.add_argument("--truncate", type=float, default=0.0)
+    parser.add_argument("--reviews", type=int, default=8)
+    parser.add_argument("--degraded-mode", default="off", choices=("off", "auto", "force"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="keep pipeline log output")
+    parser.add_argument("--output", help="write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    entries = [e.strip() for e in args.entry.split(",") if e.strip()]
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server = FakeGeminiServer(FakeGeminiConfig(
+            latency=args.latency, rate_429=args.rate_429, rate_500=args.rate_500,
+            truncate=args.truncate, reviews=args.reviews, seed=args.seed,
+        )).start()
+        base_url = server.base_url
+    print(f"🚦 Load sweep against {base_url}: entries={entries} concurrency={levels} x {args.requests} requests")
+    try:
+        report = sweep(entries, levels, args.requests, base_url, degraded_mode=args.degraded_mode,
+                       seed=args.seed, server=server, quiet=not args.verbose)
+    finally:
+        if server:
+            server.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"💾 Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
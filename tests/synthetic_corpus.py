@@ -0,0 +1,235 @@
+# tests/synthetic_corpus.py
+"""
+Seeded synthetic review corpus for benchmarks and load tests.
+
+Everything is generated from a random.Random(seed), so the same seed always yields
+byte-identical reviews, HTML pages, screenshots and model outputs.
+
+Usage:
+    from tests.synthetic_corpus import SyntheticCorpus
+
+    corpus = SyntheticCorpus(seed=7)
+    corpus.reviews(50)               # list of {"user", "rating", "date", "text", "sentiment", ...}
+    corpus.html_page(reviews=20)     # saved-page style HTML (nav, footer, scripts, <main>)
+    corpus.screenshot(800, 1200)     # PNG bytes of a review-page screenshot
+    corpus.model_output(reviews=20)  # analyze_content()-shaped dict (verbose keys)
+    corpus.compact_output(reviews=20) # raw model JSON under COMPACT_RESPONSE_SCHEMA
+    corpus.gemini_result(reviews=20) # analyze_review()-shaped dict
+    corpus.review_docs(1000)         # Firestore-style review documents (workers/doc_builder.py)
+"""
+
+import io
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from PIL import Image, ImageDraw
+
+FIRST_NAMES = ["Alex", "Sam", "Priya", "Chen", "Maria", "Tom", "Aisha", "Lukas", "Emma", "Kenji",
+               "Sofia", "Omar", "Grace", "Ivan", "Nora", "Diego"]
+
+PRODUCTS = ["headphones", "blender", "running shoes", "coffee maker", "phone case", "desk lamp",
+            "backpack", "air fryer", "keyboard", "water bottle"]
+
+POSITIVE = ["Absolutely love the {p}, works exactly as described.",
+            "Great build quality and the battery lasts for days.",
+            "Setup took two minutes and it has been flawless since.",
+            "Excellent value for money, would buy again.",
+            "Customer support was quick and very helpful."]
+
+NEGATIVE = ["The {p} stopped working after a week, very disappointed.",
+            "Shipping took forever and the box arrived damaged.",
+            "Way too expensive for what you get.",
+            "The instructions are confusing and the app keeps crashing.",
+            "Battery drains overnight even when switched off."]
+
+NEUTRAL = ["The {p} is okay, nothing special.",
+           "Does the job but the color is different from the photos.",
+           "Average product, delivery was on time."]
+
+REQUESTS = ["Please add a carrying case.", "Would be nice to have a dark mode in the app.",
+            "Wish it came in more sizes.", "A longer cable would help."]
+
+THEMES = ["battery life", "shipping", "price", "build quality", "customer support", "app stability",
+          "sizing", "packaging"]
+
+
+class SyntheticCorpus:
+    def __init__(self, seed: int = 42):
+        self.seed = seed
+        self.rng = random.Random(seed)
+
+    # ---------------- text ----------------
+    def review(self) -> Dict[str, Any]:
+        rng = self.rng
+        product = rng.choice(PRODUCTS)
+        sentiment = rng.choices(["Positive", "Negative", "Neutral", "Mixed"], weights=[5, 3, 2, 1])[0]
+        if sentiment == "Positive":
+            sentences, rating = [rng.choice(POSITIVE) for _ in range(rng.randint(1, 3))], rng.choice([4, 5])
+        elif sentiment == "Negative":
+            sentences, rating = [rng.choice(NEGATIVE) for _ in range(rng.randint(1, 3))], rng.choice([1, 2])
+        elif sentiment == "Neutral":
+            sentences, rating = [rng.choice(NEUTRAL) for _ in range(rng.randint(1, 2))], 3
+        else:
+            sentences, rating = [rng.choice(POSITIVE), rng.choice(NEGATIVE)], rng.choice([2, 3, 4])
+        if rng.random() < 0.3:
+            sentences.append(rng.choice(REQUESTS))
+        day = date(2025, 1, 1) + timedelta(days=rng.randint(0, 364))
+        return {
+            "user": f"{rng.choice(FIRST_NAMES)} {chr(65 + rng.randint(0, 25))}.",
+            "rating": f"{rating}/5",
+            "date": day.isoformat(),
+            "text": " ".join(s.format(p=product) for s in sentences),
+            "sentiment": sentiment,
+            "pain_points": rng.sample(THEMES, rng.randint(0, 2)) if sentiment != "Positive" else [],
+            "feature_requests": [s for s in sentences if s in REQUESTS],
+            "actionable_advice": "Follow up with the customer." if rating <= 2 else "",
+        }
+
+    def reviews(self, n: int) -> List[Dict[str, Any]]:
+        return [self.review() for _ in range(n)]
+
+    def review_text(self, n: int) -> str:
+        """Pasted-text input: reviews separated by blank lines."""
+        return "\n\n".join(f"{r['user']} ({r['rating']}): {r['text']}" for r in self.reviews(n))
+
+    # ---------------- HTML ----------------
+    def html_page(self, reviews: int = 20) -> str:
+        rng = self.rng
+        nav = "".join(f'<li><a href="/c/{i}">Category {i}</a></li>' for i in range(30))
+        footer = "".join(f"<p>Footer link {i} | Privacy | Terms | Careers</p>" for i in range(15))
+        scripts = "".join(f"<script>var tracker{i} = {{id: {rng.randint(0, 10**6)}}};</script>" for i in range(10))
+        items = "".join(
+            f'<div class="review"><span class="author">{r["user"]}</span>'
+            f'<span class="stars">{r["rating"]}</span><time>{r["date"]}</time>'
+            f"<p>{r['text']}</p><button>Helpful</button></div>"
+            for r in self.reviews(reviews)
+        )
+        return (
+            "<!DOCTYPE html><html><head><title>Product reviews</title>"
+            "<style>.review{margin:4px}</style></head><body>"
+            f'<header><nav><ul class="menu">{nav}</ul></nav></header>'
+            '<div class="sidebar"><p>Recommended for you</p></div>'
+            '<div class="cookie-banner">We use cookies to improve your experience.</div>'
+            f'<main><h1>Customer reviews</h1>{items}</main>'
+            f"<footer>{footer}</footer>{scripts}</body></html>"
+        )
+
+    # ---------------- images ----------------
+    def screenshot(self, width: int = 800, height: int = 1200, fmt: str = "PNG") -> bytes:
+        """A review-page-like screenshot: text-ish bars on a white background."""
+        rng = self.rng
+        image = Image.new("RGB", (width, height), "white")
+        draw = ImageDraw.Draw(image)
+        y = 20
+        while y < height - 40:
+            draw.rectangle([20, y, 20 + rng.randint(60, 140), y + 12], fill=(250, 180, 0))
+            y += 24
+            for _ in range(rng.randint(2, 4)):
+                draw.rectangle([20, y, rng.randint(width // 2, width - 20), y + 10], fill=(60, 60, 60))
+                y += 18
+            y += 20
+        buf = io.BytesIO()
+        image.save(buf, fmt)
+        return buf.getvalue()
+
+    # ---------------- model outputs ----------------
+    def model_output(self, reviews: int = 20) -> Dict[str, Any]:
+        """
+        analyze_content()-shaped result; also the raw model JSON of the verbose prompt
+        (GEMINI_COMPACT_SCHEMA=false).
+        """
+        from services.response_schema import expand_compact
+
+        return expand_compact(self.compact_output(reviews))
+
+    def compact_output(self, reviews: int = 20) -> Dict[str, Any]:
+        """Raw model output in the compact response schema (services/response_schema.py)."""
+        from services.response_schema import SENTIMENT_CODES
+
+        codes = {v: k for k, v in SENTIMENT_CODES.items()}
+        items = self.reviews(reviews)
+        negatives = sum(1 for r in items if r["sentiment"] == "Negative")
+        return {
+            "r": [{"u": r["user"], "rt": r["rating"], "d": r["date"], "t": r["text"],
+                   "s": codes[r["sentiment"]], "p": r["pain_points"],
+                   "f": r["feature_requests"], "a": r["actionable_advice"]}
+                  for r in items],
+            "sum": f"{len(items)} reviews, {negatives} negative.",
+            "o": {"s": "P" if negatives < len(items) / 3 else "M",
+                  "p": sorted({p for r in items for p in r["pain_points"]}),
+                  "f": sorted({f for r in items for f in r["feature_requests"]}),
+                  "a": "Improve battery life messaging and packaging."},
+        }
+
+    def gemini_result(self, reviews: int = 20) -> Dict[str, Any]:
+        """analyze_review()-shaped result, as consumed by build_firestore_doc."""
+        from services.gemini_rest import build_review_response
+
+        result = build_review_response(self.model_output(reviews), text=self.review_text(3),
+                                       model="gemini-2.5-flash")
+        result["processing_latency_ms"] = self.rng.randint(800, 6000)
+        result["stage_timings_ms"] = {"scrape": 120, "image_decode": 4, "model_wait": 2400, "json_parse": 3}
+        return result
+
+    # ---------------- stored documents ----------------
+    def review_docs(self, n: int, reviews_per_doc: int = 0) -> List[Dict[str, Any]]:
+        """
+        Review documents as read back from Firestore, including the loose shapes older
+        writers left behind: string or missing scores, a bare string for themes, no
+        metadata, missing timestamps. With reviews_per_doc, each document also carries
+        that many analysis.rich_reviews, with ratings and dates in the forms pages show.
+        """
+        rng = self.rng
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        docs = []
+        for i, review in enumerate(self.reviews(n)):
+            processed = start + timedelta(seconds=rng.randint(0, 365 * 86400), microseconds=rng.randint(0, 999999))
+            score = rng.choice([round(rng.uniform(-1, 1), 3), None, str(round(rng.uniform(-1, 1), 2)), 1])
+            themes = rng.choice([review["pain_points"], tuple(review["pain_points"]), rng.choice(THEMES), None])
+            metadata = rng.choice([
+                {"upload_method": "local_ui"},
+                {"app_version": "1.4.2", "region": rng.choice(["eu", "us"]), "upload_method": "batch",
+                 "stage_timings_ms": {"scrape": rng.randint(50, 400), "model_wait": rng.randint(800, 6000),
+                                      "json_parse": None}},
+                None,
+            ])
+            docs.append({
+                "review_id": f"synthetic-{self.seed}-{i:06d}",
+                "source": rng.choice(["manual_text", "web_url", "mobile_app_screenshot"]),
+                "raw_text": review["text"],
+                "extracted_text": review["text"] if rng.random() < 0.9 else "",
+                "analysis": {
+                    "sentiment": review["sentiment"],
+                    "score": score,
+                    "themes": themes,
+                    "action_items": rng.choice([review["feature_requests"], review["actionable_advice"], None]),
+                    "intent": rng.choice(["complaint", "praise", "question", None]),
+                    "confidence": rng.choice([round(rng.random(), 3), None]),
+                },
+                "image_gcs_path": f"gs://reviews/images/{i:06d}.png" if rng.random() < 0.2 else None,
+                "model": rng.choice(["gemini-2.5-flash", "gemini-2.5-pro", "local-engine"]),
+                "processing_latency_ms": rng.choice([rng.randint(400, 9000), rng.uniform(400, 9000), None]),
+                "created_at": processed.isoformat() if rng.random() < 0.95 else None,
+                "processed_at": processed.isoformat().replace("+00:00", "Z"),
+                "metadata": metadata,
+            })
+            if reviews_per_doc:
+                docs[-1]["analysis"]["rich_reviews"] = [self._rich_review(r) for r in self.reviews(reviews_per_doc)]
+        return docs
+
+    def _rich_review(self, review: Dict[str, Any]) -> Dict[str, Any]:
+        rng = self.rng
+        day = date.fromisoformat(review["date"])
+        stars = int(review["rating"][0])
+        return {
+            "metadata": {
+                "username": review["user"],
+                "rating": rng.choice([review["rating"], f"{stars * 2} out of 10", "★" * stars + "☆" * (5 - stars), ""]),
+                "date": rng.choice([review["date"], day.strftime("%B %d, %Y"), f"{rng.randint(2, 5)} weeks ago", ""]),
+            },
+            "text": review["text"],
+            "analysis": {"sentiment": review["sentiment"], "pain_points": review["pain_points"],
+                         "feature_requests": review["feature_requests"],
+                         "actionable_advice": review["actionable_advice"]},
+        }
@@ -0,0 +1,165 @@
+import os
+import sys
+import threading
+import unittest
+from datetime import date, datetime, timezone
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.analytics import AnalyticsService, LocalBackend
+from workers.local_warehouse import LocalWarehouse
+
+END = date(2025, 3, 10)
+
+
+def _doc(day, sentiment="Negative", themes=("battery",), model="gemini-2.5-flash", latency=1000):
+    ts = f"{day}T12:00:00+00:00"
+    return {"review_id": f"r-{day}", "source": "manual_text", "model": model, "processing_latency_ms": latency,
+            "created_at": ts, "processed_at": ts, "metadata": {},
+            "analysis": {"sentiment": sentiment, "score": 0.5, "themes": list(themes)}}
+
+
+class CountingBackend(LocalBackend):
+    def __init__(self, warehouse):
+        super().__init__(warehouse)
+        self.runs = 0
+
+    def run(self, view, start, end):
+        self.runs += 1
+        return super().run(view, start, end)
+
+
+class StreamingBackend(CountingBackend):
+    """Adds a BigQuery-style streaming buffer partition; partitions() can be held open."""
+
+    def __init__(self, warehouse):
+        super().__init__(warehouse)
+        self.buffer = "t0/0"
+        self.checks = 0
+        self.entered, self.release = threading.Event(), threading.Event()
+        self.release.set()
+
+    def partitions(self):
+        self.checks += 1
+        self.entered.set()
+        self.release.wait(5)
+        return dict(super().partitions(), __UNPARTITIONED__=self.buffer)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAnalyticsViews(unittest.TestCase):
+    def setUp(self):
+        self.wh = LocalWarehouse(":memory:")
+        for doc in (_doc("2025-03-08", "negative", ("battery", "price"), latency=800),
+                    _doc("2025-03-09", "Positive", ("battery",), model="gemini-2.5-pro", latency=3000),
+                    _doc("2025-03-09", "Negative", ("battery", "shipping"), latency=1200),
+                    _doc("2025-01-01", "Negative", ("old theme",), latency=99999)):
+            self.wh.insert_doc(doc)
+        self.clock = Clock()
+        self.backend = CountingBackend(self.wh)
+        self.analytics = AnalyticsService(self.backend, ttl_s=600, partition_check_s=30, clock=self.clock)
+
+    def tearDown(self):
+        self.wh.close()
+
+    def test_view_shapes(self):
+        trend = self.analytics.get("sentiment_trend", days=7, end=END)
+        self.assertEqual([(r["day"], r["sentiment"], r["reviews"]) for r in trend],
+                         [("2025-03-08", "Negative", 1), ("2025-03-09", "Negative", 1), ("2025-03-09", "Positive", 1)])
+        themes = self.analytics.get("top_themes", days=7, end=END)
+        self.assertEqual(themes[0], {"theme": "battery", "mentions": 3})
+        self.assertNotIn("old theme", [t["theme"] for t in themes])
+        latency = self.analytics.get("latency_by_model", days=7, end=END)
+        self.assertEqual(latency[0], {"model": "gemini-2.5-flash", "runs": 2, "avg_ms": 1000.0,
+                                      "p50_ms": 1000, "p95_ms": 1180})
+        with self.assertRaises(ValueError):
+            self.analytics.get("everything")
+
+    def test_repeat_reads_are_served_from_cache(self):
+        first = self.analytics.get("top_themes", days=7, end=END)
+        self.assertEqual(self.analytics.get("top_themes", days=7, end=END), first)
+        self.assertEqual(self.backend.runs, 1)
+        self.analytics.get("top_themes", days=30, end=END)  # another window is another entry
+        self.assertEqual(self.backend.runs, 2)
+        stats = self.analytics.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["partition_checks"]), (1, 2, 1))
+
+    def test_new_partition_in_window_invalidates(self):
+        self.analytics.get("sentiment_trend", days=7, end=END)
+        self.wh.insert_doc(_doc("2025-03-10", "Positive"))
+        self.analytics.get("sentiment_trend", days=7, end=END)
+        self.assertEqual(self.backend.runs, 1)  # partition state is re-read at most every 30 s
+        self.clock.now += 31
+        rows = self.analytics.get("sentiment_trend", days=7, end=END)
+        self.assertEqual(self.backend.runs, 2)
+        self.assertEqual(rows[-1]["day"], "2025-03-10")
+        self.assertEqual(self.analytics.get_stats()["partition_changes"], 1)
+
+    def test_partition_outside_window_keeps_cache(self):
+        self.analytics.get("top_themes", days=7, end=END)
+        self.wh.insert_doc(_doc("2025-02-01"))
+        self.clock.now += 31
+        self.analytics.get("top_themes", days=7, end=END)
+        self.assertEqual(self.backend.runs, 1)
+
+    def test_ttl_and_manual_invalidation(self):
+        self.analytics.get("top_themes", days=7, end=END)
+        self.clock.now += 601
+        self.analytics.get("top_themes", days=7, end=END)
+        self.assertEqual(self.analytics.get_stats()["expired"], 1)
+        self.analytics.invalidate("top_themes")
+        self.analytics.get("top_themes", days=7, end=END)
+        self.assertEqual(self.backend.runs, 3)
+
+
+
+class TestPartitionChecks(unittest.TestCase):
+    def setUp(self):
+        self.wh = LocalWarehouse(":memory:")
+        self.clock = Clock()
+        self.backend = StreamingBackend(self.wh)
+        self.analytics = AnalyticsService(self.backend, ttl_s=600, partition_check_s=30, clock=self.clock)
+
+    def tearDown(self):
+        self.backend.release.set()
+        self.wh.close()
+
+    def test_streaming_buffer_counts_as_today(self):
+        self.analytics.get("top_themes", days=7)  # ends today
+        self.analytics.get("top_themes", days=7, end=END)
+        self.backend.buffer = "t0/5"
+        self.clock.now += 31
+        self.analytics.get("top_themes", days=7)
+        self.analytics.get("top_themes", days=7, end=END)
+        self.assertEqual(self.backend.runs, 3)  # only the window with today is recomputed
+        today = datetime.now(timezone.utc).date()
+        self.assertIn("__UNPARTITIONED__", AnalyticsService._window({"__UNPARTITIONED__": "x"}, today, today))
+
+    def test_metadata_query_runs_outside_the_lock_once(self):
+        self.analytics.get("top_themes", days=7, end=END)
+        self.clock.now += 31
+        self.backend.entered.clear()
+        self.backend.release.clear()
+        slow = threading.Thread(target=self.analytics.get, args=("top_themes",), kwargs={"days": 7, "end": END})
+        slow.start()
+        self.assertTrue(self.backend.entered.wait(5))
+        # While the refresh is in flight: the lock is free and others reuse the previous state
+        self.assertEqual(self.analytics.get_stats()["partition_checks"], 1)
+        self.analytics.get("top_themes", days=7, end=END)
+        self.assertEqual(self.backend.checks, 2)
+        self.backend.release.set()
+        slow.join(5)
+        self.assertEqual(self.analytics.get_stats()["partition_checks"], 2)
+        self.assertEqual(self.backend.runs, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.gemini_rest import build_review_response
+from workers.backfill import Backfill, RateLimiter, build_backfill_doc, is_selected
+from workers.doc_builder import build_firestore_doc
+from workers.firestore_export import LocalSource
+
+
+def _doc(i, version, model="gemini-2.5-pro (real)", **meta):
+    return {
+        "review_id": f"local-{i:04d}", "source": "manual_text", "raw_text": f"Review {i}: the battery dies fast.",
+        "extracted_text": f"Review {i}", "analysis": {"sentiment": "Negative"}, "model": model,
+        "created_at": "2025-03-01T10:00:00+00:00", "processed_at": "2025-03-01T10:00:05+00:00",
+        "metadata": dict({"upload_method": "local_ui", "prompt_version": version}, **meta),
+    }
+
+
+def _result(text, version="c-new", model="gemini-2.5-flash (real)"):
+    return {"input_text": text, "extracted_text": text, "model": model, "prompt_version": version,
+            "processing_latency_ms": 12,
+            "analysis": {"sentiment": "Negative", "score": -0.6, "themes": ["battery"], "intent": "complaint",
+                         "confidence": 0.9}}
+
+
+class _DirWriter:
+    """Writes new versions into the collection being backfilled, as a real run does."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.written = []
+        self._lock = threading.Lock()
+
+    def __call__(self, doc):
+        with self._lock:
+            self.written.append(doc)
+            with open(os.path.join(self.directory, f"fsreal-{doc['review_id']}.json"), "w", encoding="utf-8") as fh:
+                json.dump(doc, fh)
+
+
+class _FailingSource(LocalSource):
+    def __init__(self, directory, pages):
+        super().__init__(directory)
+        self.pages = pages
+
+    def page(self, bounds, after, limit):
+        if self.pages <= 0:
+            raise ConnectionError("stream reset")
+        self.pages -= 1
+        return super().page(bounds, after, limit)
+
+
+class TestSelection(unittest.TestCase):
+    def test_selector_conditions(self):
+        doc = _doc(1, "c-old")
+        self.assertTrue(is_selected(doc, {"prompt_version": "c-old"}))
+        self.assertFalse(is_selected(doc, {"prompt_version": "c-new"}))
+        self.assertTrue(is_selected(doc, {"model": "gemini-2.5-pro (real)", "stale": True, "current_version": "c-new"}))
+        self.assertFalse(is_selected(doc, {"stale": True, "current_version": "c-old"}))
+        self.assertFalse(is_selected(doc, {"degraded": True}))
+        self.assertTrue(is_selected(_doc(2, None, needs_llm_rescore=True), {"degraded": True}))
+        self.assertFalse(is_selected(dict(doc, raw_text=" "), {}))
+        self.assertFalse(is_selected(dict(doc, raw_text="Content processed by Gemini"), {}))
+        self.assertFalse(is_selected(_doc(3, "c-old", backfill_run="r1"), {"prompt_version": "c-old"}, run_id="r1"))
+
+    def test_new_version_keeps_original_fields(self):
+        original = _doc(7, "c-old")
+        doc = build_backfill_doc(original, _result(original["raw_text"]), "run1")
+        self.assertTrue(doc["review_id"].startswith("local-0007-bf-"))
+        self.assertEqual(doc["created_at"], original["created_at"])
+        self.assertEqual(doc["raw_text"], original["raw_text"])
+        self.assertEqual(doc["metadata"]["backfill_of"], "local-0007")
+        self.assertEqual(doc["metadata"]["prompt_version"], "c-new")
+        # Same original and version -> same id, so a repeated write overwrites instead of duplicating
+        self.assertEqual(doc["review_id"], build_backfill_doc(original, _result("x"), "run1")["review_id"])
+
+    def test_gemini_documents_keep_the_submitted_text(self):
+        text = "The battery dies fast.\n\nSupport never answered."
+        doc = build_firestore_doc(build_review_response({"reviews": [], "analysis": {}}, text), "manual_text")
+        self.assertEqual(doc["raw_text"], text)
+        self.assertTrue(is_selected(doc, {}))
+        images = build_firestore_doc(build_review_response({"reviews": [], "analysis": {}}, None, [b"png"]),
+                                     "screenshot")
+        self.assertFalse(is_selected(images, {}))  # only the extraction placeholder: nothing to re-analyze
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_spacing(self):
+        now = [0.0]
+        slept = []
+
+        def sleep(s):
+            slept.append(s)
+
+        limiter = RateLimiter(4, clock=lambda: now[0], sleep=sleep)
+        for _ in range(5):
+            limiter.acquire()
+        self.assertEqual(slept, [0.25, 0.5, 0.75, 1.0])
+
+
+class TestBackfillRun(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp, "fs")
+        os.makedirs(self.src)
+        for i in range(40):
+            version = "c-old" if i % 4 else "c-new"
+            with open(os.path.join(self.src, f"fsreal-{i:04d}.json"), "w", encoding="utf-8") as fh:
+                json.dump(_doc(i, version), fh)
+        self.checkpoint = os.path.join(self.tmp, "bf.json")
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _analyze(self, text):
+        self.calls.append(text)
+        if "Review 13:" in text:
+            return {"error": "500 INTERNAL"}
+        return _result(text)
+
+    def _job(self, source=None, **kw):
+        return Backfill(source or LocalSource(self.src), {"stale": True, "current_version": "c-new"},
+                        analyze=self._analyze, write=_DirWriter(self.src), checkpoint_path=self.checkpoint,
+                        rate_per_s=0, concurrency=4, page_size=7, **kw)
+
+    def test_estimate_counts_selection(self):
+        est = self._job().estimate()
+        self.assertEqual(est["documents"], 30)
+        self.assertEqual(est["reviews"], 30)
+        self.assertGreater(est["cost_usd"], 0)
+        self.assertEqual(self.calls, [])
+
+    def test_run_writes_new_versions_side_by_side(self):
+        job = self._job()
+        stats = job.run()
+        self.assertEqual(stats["selected"], 30)
+        self.assertEqual(stats["written"], 29)
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(len(self.calls), 30)
+        # Originals untouched, new versions next to them
+        self.assertEqual(len(os.listdir(self.src)), 40 + 29)
+        with open(self.checkpoint, encoding="utf-8") as fh:
+            state = json.load(fh)
+        self.assertTrue(state["complete"])
+        self.assertEqual(state["failed"][0]["review_id"], "local-0013")
+
+    def test_resume_skips_finished_pages(self):
+        with self.assertRaises(ConnectionError):
+            self._job(source=_FailingSource(self.src, pages=3)).run()
+        first = len(self.calls)
+        self.assertGreater(first, 0)
+        stats = self._job().run()
+        self.assertEqual(len(self.calls), 30)
+        self.assertEqual(stats["selected"], 30)
+        self.assertEqual(len({c for c in self.calls}), 30)
+
+    def test_degraded_screenshots_are_reanalysed_from_stored_images(self):
+        uris = ["gs://bucket/images/a.png", "gs://bucket/images/b.png"]
+        doc = _doc(90, "c-old", model="local-lexicon-v1", needs_llm_rescore=True, image_uris=uris)
+        doc.update(raw_text="", extracted_text="", image_gcs_path=uris[0])
+        with open(os.path.join(self.src, "fsreal-0090.json"), "w", encoding="utf-8") as fh:
+            json.dump(doc, fh)
+        seen = []
+        writer = _DirWriter(self.src)
+        job = Backfill(LocalSource(self.src), {"degraded": True}, analyze=self._analyze, write=writer,
+                       analyze_images=lambda u: seen.append(u) or _result("2 Images Processed"),
+                       checkpoint_path=self.checkpoint, rate_per_s=0)
+        self.assertGreater(job.estimate()["input_tokens"], 0)
+        self.assertEqual(job.run()["written"], 1)
+        self.assertEqual((seen, self.calls), ([uris], []))
+        self.assertEqual(writer.written[0]["image_gcs_path"], uris[0])
+        self.assertEqual(writer.written[0]["metadata"]["image_uris"], uris)
+
+    def test_default_analyze_follows_test_mode(self):
+        for test_mode in (True, False):
+            with mock.patch("services.gemini_client.analyze_text", return_value={}) as analyze_text:
+                job = Backfill(LocalSource(self.src), {"degraded": True}, write=lambda doc: None,
+                               checkpoint_path=self.checkpoint, test_mode=test_mode)
+                job.analyze("Review 1: slow app")
+            analyze_text.assert_called_once_with("Review 1: slow app", test_mode=test_mode)
+
+    def test_rate_limit_paces_calls(self):
+        job = Backfill(LocalSource(self.src), {"prompt_version": "c-new"}, analyze=self._analyze,
+                       write=lambda doc: None, checkpoint_path=self.checkpoint, rate_per_s=40, concurrency=4)
+        t0 = time.perf_counter()
+        self.assertEqual(job.run()["selected"], 10)
+        self.assertGreaterEqual(time.perf_counter() - t0, 9 / 40 - 0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.batch_planner import BatchPlanner, LatencyModel, estimate_image, merge_results, run_batched
+from services.gemini_rest import GeminiREST
+from tests.fake_gemini_server import FakeGeminiConfig, FakeGeminiServer
+from tests.synthetic_corpus import SyntheticCorpus
+
+
+def _review(user, text, sentiment="Positive"):
+    return {"metadata": {"username": user}, "text": text, "analysis": {"sentiment": sentiment}}
+
+
+class TestPlanner(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        corpus = SyntheticCorpus(0)
+        cls.small = corpus.screenshot(300, 300)
+        cls.shot = corpus.screenshot(800, 1200)
+
+    def test_token_estimate_uses_tiles(self):
+        self.assertEqual(estimate_image(self.small)["tokens"], 258)
+        self.assertEqual(estimate_image(self.shot)["tokens"], 4 * 258)
+        self.assertEqual(estimate_image(b"garbage")["tokens"], 0)
+
+    def test_single_image_is_single_request(self):
+        plan = BatchPlanner().plan([self.shot])
+        self.assertEqual(plan["strategy"], "single")
+
+    def test_large_set_is_packed_up_to_parallelism(self):
+        plan = BatchPlanner(max_parallel=4).plan([self.shot] * 10)
+        self.assertEqual(plan["strategy"], "packed")
+        self.assertEqual(sorted(len(g) for g in plan["groups"]), [2, 2, 3, 3])
+        self.assertEqual(sum(plan["groups"], []), list(range(10)))  # reading order kept
+
+    def test_cheap_prompt_small_set_fans_out(self):
+        plan = BatchPlanner(max_parallel=4, base_ms=500).plan([self.shot] * 3)
+        self.assertEqual(plan["strategy"], "fanout")
+
+    def test_slow_fixed_cost_keeps_one_request(self):
+        plan = BatchPlanner(base_ms=60000, ms_per_1k_tokens=10).plan([self.shot] * 3)
+        self.assertEqual(plan["strategy"], "single")
+
+    def test_per_request_caps(self):
+        plan = BatchPlanner(max_images=2, max_parallel=1).plan([self.shot] * 6)
+        self.assertTrue(all(len(g) <= 2 for g in plan["groups"]))
+        plan = BatchPlanner(max_pixels=2_000_000, max_parallel=1).plan([self.shot] * 6)
+        self.assertTrue(all(len(g) <= 2 for g in plan["groups"]))
+
+    def test_latency_model_learns_from_observations(self):
+        model = LatencyModel(base_ms=4000, ms_per_token=1.0, min_samples=3)
+        for tokens in (258, 1032, 2064, 4128):
+            model.record(tokens, 200 + 0.5 * tokens)
+        base, slope = model.coefficients()
+        self.assertAlmostEqual(base, 200, delta=1)
+        self.assertAlmostEqual(slope, 0.5, delta=0.01)
+
+
+class TestMergeResults(unittest.TestCase):
+    def test_merge_dedups_and_ranks(self):
+        a = {"reviews": [_review("Ann", "Great app!"), _review("Bob", "Crashes a lot", "Negative")],
+             "overall_summary": "Part one.",
+             "analysis": {"pain_points": ["crashes"], "feature_requests": ["dark mode"], "actionable_advice": "Fix"}}
+        b = {"reviews": [_review("bob", "Crashes  a lot.", "Negative"), _review("Cy", "Love it")],
+             "overall_summary": "Part two.",
+             "analysis": {"pain_points": ["login", "Crashes"], "feature_requests": []}}
+        merged = merge_results([a, b])
+        self.assertEqual([r["metadata"]["username"] for r in merged["reviews"]], ["Ann", "Bob", "Cy"])
+        self.assertEqual(merged["analysis"]["pain_points"], ["crashes", "login"])
+        self.assertEqual(merged["analysis"]["sentiment"], "Positive")
+        self.assertEqual(merged["overall_summary"], "Part one. Part two.")
+        self.assertNotIn("partial", merged)
+
+    def test_failed_part_marks_partial(self):
+        ok = {"reviews": [_review("Ann", "Fine")], "overall_summary": "ok"}
+        merged = merge_results([ok, {"reviews": [], "error": "429"}])
+        self.assertTrue(merged["partial"])
+        self.assertNotIn("error", merged)
+        self.assertEqual(merge_results([{"error": "boom"}])["error"], "boom")
+
+
+class TestRunBatched(unittest.TestCase):
+    def test_groups_run_in_parallel(self):
+        shot = SyntheticCorpus(0).screenshot(800, 1200)
+        active, peak, lock = [0], [0], threading.Lock()
+
+        def analyze(images, text_input=None):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return {"reviews": [_review(f"u{id(images)}-{i}", f"review {i} of {len(images)}") for i in range(len(images))],
+                    "overall_summary": "s"}
+
+        result = run_batched(analyze, [shot] * 8, BatchPlanner(max_parallel=4))
+        self.assertEqual(result["batch"]["groups"], [2, 2, 2, 2])
+        self.assertEqual(peak[0], 4)
+
+    def test_end_to_end_against_fake_server(self):
+        corpus = SyntheticCorpus(5)
+        shots = [corpus.screenshot(800, 1200) for _ in range(3)]
+        with FakeGeminiServer(FakeGeminiConfig(latency="fixed:20", reviews=4)) as server:
+            client = GeminiREST(api_key="fake", base_url=server.base_url)
+            client.batch_planner = BatchPlanner(max_parallel=4, base_ms=500)
+            result = client.analyze_review(images=shots)
+            self.assertEqual(server.stats()["requests"], 3)
+        self.assertIsNone(result["error"])
+        self.assertGreater(len(result["analysis"]["rich_reviews"]), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tests.bench_pipeline import BENCHMARKS, compare, time_benchmark
+from tests.synthetic_corpus import SyntheticCorpus
+from services.web_scraper import extract_main_text
+
+
+class TestSyntheticCorpus(unittest.TestCase):
+    def test_same_seed_same_corpus(self):
+        self.assertEqual(SyntheticCorpus(3).html_page(5), SyntheticCorpus(3).html_page(5))
+        self.assertEqual(SyntheticCorpus(3).screenshot(100, 100), SyntheticCorpus(3).screenshot(100, 100))
+        self.assertNotEqual(SyntheticCorpus(3).review_text(5), SyntheticCorpus(4).review_text(5))
+
+    def test_extract_main_text_drops_page_chrome(self):
+        text = extract_main_text(SyntheticCorpus(1).html_page(reviews=5))
+        self.assertIn("Customer reviews", text)
+        self.assertNotIn("Footer link", text)
+        self.assertNotIn("tracker", text)
+        self.assertNotIn("cookies", text)
+
+
+class TestBenchRunner(unittest.TestCase):
+    def test_every_benchmark_runs_once(self):
+        for name, setup in BENCHMARKS.items():
+            with self.subTest(name=name):
+                setup(SyntheticCorpus(0))()
+
+    def test_time_benchmark_shape(self):
+        out = time_benchmark(lambda: sum(range(100)), repeats=3, min_time=0.001)
+        self.assertEqual(out["repeats"], 3)
+        self.assertGreater(out["ops_per_s"], 0)
+        self.assertLessEqual(out["min_us"], out["median_us"])
+
+    def test_compare_flags_regressions(self):
+        base = {"results": {"a": {"median_us": 100.0}, "b": {"median_us": 100.0}, "c": {"median_us": 100.0}}}
+        cur = {"results": {"a": {"median_us": 50.0}, "b": {"median_us": 125.0},
+                           "c": {"median_us": 105.0}, "d": {"median_us": 1.0}}}
+        out = compare(cur, base, threshold=0.10)
+        self.assertEqual(out["a"]["status"], "improved")
+        self.assertEqual(out["a"]["speedup"], 2.0)
+        self.assertEqual(out["b"]["status"], "regression")
+        self.assertEqual(out["c"]["status"], "same")
+        self.assertEqual(out["d"]["status"], "new")
+
+
+if __name__ == "__main__":
+    unittest.main()
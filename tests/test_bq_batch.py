@@ -0,0 +1,159 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+import pandas as pd
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tests.synthetic_corpus import SyntheticCorpus
+from workers import bigquery_real
+from workers.bq_mapper import BQ_COLUMNS, frame_to_bq_rows, map_doc_to_bq_row, map_docs_to_bq_frame
+
+try:
+    import pyarrow  # noqa: F401
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+try:
+    from google.cloud import bigquery
+except ImportError:
+    bigquery = None
+
+
+class TestBatchMapper(unittest.TestCase):
+    def setUp(self):
+        self.docs = SyntheticCorpus(11).review_docs(500)
+        with open(os.path.join(os.path.dirname(__file__), "..", "examples", "sample_review.json"), encoding="utf-8") as fh:
+            self.docs.append(json.load(fh))
+
+    def test_rows_identical_to_per_row_mapper(self):
+        batch = frame_to_bq_rows(map_docs_to_bq_frame(self.docs))
+        self.assertEqual(len(batch), len(self.docs))
+        now = datetime.now(timezone.utc)
+        for doc, got in zip(self.docs, batch):
+            expected = map_doc_to_bq_row(doc)
+            self.assertEqual(list(got), list(BQ_COLUMNS))
+            for name in BQ_COLUMNS:
+                if name in ("created_at", "processed_at"):
+                    got_ts = pd.Timestamp(got[name])
+                    if doc.get(name):
+                        self.assertEqual(got_ts, pd.Timestamp(expected[name]), doc["review_id"])
+                    else:
+                        self.assertLess(abs((got_ts - now).total_seconds()), 60)
+                else:
+                    self.assertEqual(got[name], expected[name], f"{doc.get('review_id')}.{name}")
+
+    def test_column_types(self):
+        frame = map_docs_to_bq_frame(self.docs)
+        self.assertEqual(list(frame.columns), list(BQ_COLUMNS))
+        self.assertEqual(str(frame["score"].dtype), "Float64")
+        self.assertEqual(str(frame["processing_latency_ms"].dtype), "Int64")
+        self.assertEqual(str(frame["processed_at"].dtype), "datetime64[us, UTC]")
+        self.assertIsInstance(frame["review_id"].dtype, pd.StringDtype)
+        self.assertTrue(all(isinstance(v, list) for v in frame["themes"]))
+
+    def test_loose_values_are_coerced_like_the_row_mapper(self):
+        doc = {"analysis": {"score": "0.5", "themes": "battery", "action_items": "", "confidence": None},
+               "processing_latency_ms": -12.9, "metadata": None}
+        row = frame_to_bq_rows(map_docs_to_bq_frame([doc]))[0]
+        self.assertEqual((row["score"], row["themes"], row["action_items"]), (0.5, ["battery"], []))
+        self.assertEqual(row["processing_latency_ms"], int(-12.9))
+        self.assertEqual(row["metadata"], {"app_version": None, "region": None, "upload_method": None})
+        self.assertIsNone(row["stage_timings_ms"])
+
+    def test_empty_batch(self):
+        frame = map_docs_to_bq_frame([])
+        self.assertEqual(list(frame.columns), list(BQ_COLUMNS))
+        self.assertEqual(str(frame["created_at"].dtype), "datetime64[us, UTC]")
+        self.assertEqual(frame_to_bq_rows(frame), [])
+
+    @unittest.skipUnless(HAVE_PYARROW, "pyarrow not installed")
+    def test_arrow_table_round_trips_through_parquet(self):
+        import pyarrow.parquet as pq
+        from workers.bq_mapper import bq_arrow_schema, write_parquet
+
+        frame = map_docs_to_bq_frame(self.docs)
+        tmp = tempfile.mkdtemp()
+        try:
+            table = pq.read_table(write_parquet(frame, os.path.join(tmp, "reviews.parquet")))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.assertTrue(table.schema.equals(bq_arrow_schema()))
+        self.assertEqual(table.num_rows, len(self.docs))
+        self.assertEqual(table.column("stage_timings_ms").to_pylist(), list(frame["stage_timings_ms"]))
+
+    def test_batch_load_test_mode_writes_ndjson(self):
+        tmp = tempfile.mkdtemp()
+        original = bigquery_real.LOCAL_BQ_DIR
+        bigquery_real.LOCAL_BQ_DIR = tmp
+        try:
+            result = bigquery_real.load_frame_to_bigquery(map_docs_to_bq_frame(self.docs[:20]), test_mode=True)
+            with open(result["path"], encoding="utf-8") as fh:
+                lines = [json.loads(line) for line in fh]
+        finally:
+            bigquery_real.LOCAL_BQ_DIR = original
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.assertEqual(result["rows"], 20)
+        self.assertEqual([r["review_id"] for r in lines], [d["review_id"] for d in self.docs[:20]])
+
+    @unittest.skipUnless(HAVE_PYARROW and bigquery, "pyarrow / google-cloud-bigquery not installed")
+    def test_batch_load_job_config(self):
+        with mock.patch.object(bigquery, "Client") as client_cls, \
+                mock.patch.dict(os.environ, {"BQ_TABLE": "proj.reviews.consumer_reviews"}):
+            client = client_cls.return_value
+            client.load_table_from_file.return_value.output_rows = 20
+            result = bigquery_real.load_frame_to_bigquery(map_docs_to_bq_frame(self.docs[:20]), test_mode=False)
+        self.assertEqual(result["inserted"], 20)
+        (_, table_id), kwargs = client.load_table_from_file.call_args
+        config = kwargs["job_config"]
+        self.assertEqual(table_id, "proj.reviews.consumer_reviews")
+        self.assertEqual(config.source_format, bigquery.SourceFormat.PARQUET)
+        self.assertEqual(config.write_disposition, bigquery.WriteDisposition.WRITE_APPEND)
+        self.assertTrue(config.parquet_options.enable_list_inference)
+
+    @unittest.skipUnless(bigquery, "google-cloud-bigquery not installed")
+    def test_fact_rows_real_mode_streams_into_fact_table(self):
+        from workers import bigquery_store
+        from workers.bq_mapper import map_doc_to_review_fact_rows
+        rows = map_doc_to_review_fact_rows(SyntheticCorpus(3).review_docs(1, reviews_per_doc=3)[0])
+        with mock.patch.object(bigquery, "Client") as client_cls, \
+                mock.patch.dict(os.environ, {"BQ_TABLE": "proj.reviews.consumer_reviews"}):
+            client = client_cls.return_value
+            client.insert_rows_json.return_value = []
+            result = bigquery_store.insert_review_facts_to_bigquery(rows, test_mode=False)
+            empty = bigquery_store.insert_review_facts_to_bigquery([], test_mode=False)
+        self.assertEqual(result, {"status": "ok", "inserted": 3})
+        self.assertEqual(empty["inserted"], 0)
+        (table_id, sent), kwargs = client.insert_rows_json.call_args
+        self.assertEqual(table_id, "proj.reviews.consumer_review_facts")
+        self.assertEqual(sent, rows)
+        self.assertEqual(kwargs["row_ids"], [f"{r['review_id']}:{r['review_index']}" for r in rows])
+        self.assertEqual(client.insert_rows_json.call_count, 1)
+
+    def test_fact_rows_test_mode_writes_json(self):
+        from workers.bq_mapper import map_doc_to_review_fact_rows
+        rows = map_doc_to_review_fact_rows(SyntheticCorpus(3).review_docs(1, reviews_per_doc=4)[0])
+        tmp = tempfile.mkdtemp()
+        original = bigquery_real.LOCAL_BQ_DIR
+        bigquery_real.LOCAL_BQ_DIR = tmp
+        try:
+            result = bigquery_real.insert_review_facts_to_bigquery(rows, test_mode=True)
+            with open(result["path"], encoding="utf-8") as fh:
+                saved = json.load(fh)
+        finally:
+            bigquery_real.LOCAL_BQ_DIR = original
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.assertEqual(result["rows"], 4)
+        self.assertEqual(saved, rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
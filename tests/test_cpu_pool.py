@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+import sys
+import unittest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.cpu_pool import CpuPool
+from services.gemini_rest import GeminiREST
+from services.image_ingest import IMAGE_MEMORY_BUDGET_MB, decode_pixels, prepare_image
+from services.web_scraper import extract_main_text
+from tests.synthetic_corpus import SyntheticCorpus
+
+
+def where_am_i(_):
+    return "worker" if multiprocessing.parent_process() is not None else "inline"
+
+
+def die_in_worker(_):
+    if multiprocessing.parent_process() is not None:
+        os._exit(1)
+    return "inline"
+
+
+def decode_budget(_):
+    from services.image_ingest import DECODE_BUDGET
+    return DECODE_BUDGET.limit
+
+
+class TestCpuPool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = CpuPool(workers=1, max_pending=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def test_small_inputs_run_inline(self):
+        self.assertEqual(self.pool.run(where_am_i, None, size=10, inline_below=100), "inline")
+        self.assertEqual(self.pool.run(where_am_i, None, size=1000, inline_below=100), "worker")
+        self.assertEqual(CpuPool(workers=0).run(where_am_i, None, size=1000), "inline")
+
+    def test_results_match_inline(self):
+        corpus = SyntheticCorpus(8)
+        html = corpus.html_page(reviews=30)
+        self.assertEqual(self.pool.run(extract_main_text, html, size=len(html)), extract_main_text(html))
+        shots = [corpus.screenshot(1600, 4000), corpus.screenshot(400, 300)]
+        self.assertGreater(decode_pixels(shots[0]), 0)
+        self.assertEqual(decode_pixels(shots[1]), 0)  # sent as-is, nothing to decode
+        self.assertEqual(self.pool.map(prepare_image, shots), [prepare_image(s) for s in shots])
+
+    def test_errors_propagate(self):
+        with self.assertRaises(Exception) as inline:
+            prepare_image(b"not an image")
+        with self.assertRaises(type(inline.exception)):
+            self.pool.run(prepare_image, b"not an image", size=1)
+        out = self.pool.map(prepare_image, [b"not an image", SyntheticCorpus(1).screenshot(100, 100)])
+        self.assertIsInstance(out[0], Exception)
+        self.assertEqual(out[1][1], "image/png")
+
+    def test_dead_worker_rebuilds_pool_and_falls_back_inline(self):
+        pool = CpuPool(workers=1)
+        try:
+            self.assertEqual(pool.run(die_in_worker, None), "inline")
+            self.assertEqual(pool.get_stats()["restarts"], 1)
+            self.assertEqual(pool.run(where_am_i, None), "worker")
+        finally:
+            pool.shutdown()
+
+    def test_workers_share_one_decode_budget(self):
+        pool = CpuPool(workers=2)
+        try:
+            self.assertEqual(pool.run(decode_budget, None), IMAGE_MEMORY_BUDGET_MB * 1024 * 1024 // 2)
+        finally:
+            pool.shutdown()
+
+    def test_failed_pool_start_releases_its_slot(self):
+        pool = CpuPool(workers=1, max_pending=1, start_method="no-such-method")
+        for _ in range(2):  # a leaked slot would block the second call forever
+            with self.assertRaises(ValueError):
+                pool.run(where_am_i, None)
+        self.assertTrue(pool._slots.acquire(blocking=False))
+
+
+class TestImagesThroughPool(unittest.TestCase):
+    def test_large_and_small_screenshots_keep_their_order(self):
+        corpus = SyntheticCorpus(6)
+        shots = [corpus.screenshot(1600, 4000), corpus.screenshot(600, 800), b"broken"]
+        client = GeminiREST(api_key="fake", base_url="http://127.0.0.1:9")
+        sent = []
+
+        def capture(contents, *args):
+            sent.extend(contents)
+            raise RuntimeError("captured")
+
+        client._generate_json = capture
+        client.analyze_content(images=shots)
+        images = [p.inline_data.data for p in sent]   # the prompt travels as system instruction
+        self.assertEqual(images, [prepare_image(shots[0])[0], shots[1]])
+
+
+if __name__ == "__main__":
+    unittest.main()
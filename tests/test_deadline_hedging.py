@@ -0,0 +1,89 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.deadline import DeadlineExceeded, deadline_scope, remaining
+from services.gemini_rest import GeminiREST
+from services.hedging import HedgePolicy, LatencyTracker, hedged_call
+
+
+def _warm_tracker(seconds=0.02, n=50):
+    tracker = LatencyTracker()
+    for _ in range(n):
+        tracker.record(seconds)
+    return tracker
+
+
+class TestDeadlines(unittest.TestCase):
+    def test_inner_scope_cannot_extend_outer(self):
+        self.assertIsNone(remaining())
+        with deadline_scope(1.0):
+            with deadline_scope(60):
+                self.assertLessEqual(remaining(), 1.0)
+            with deadline_scope(0.1):
+                self.assertLessEqual(remaining(), 0.1)
+        self.assertIsNone(remaining())
+
+    def test_deadline_reaches_gemini_http_timeout(self):
+        seen = []
+
+        def generate_content(model, contents, config):
+            seen.append(config.http_options.timeout)
+            return SimpleNamespace(text='{"r": [], "sum": "ok", "o": {"s": "U"}}', usage_metadata=None)
+
+        client = GeminiREST("test-key")
+        client.client = SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))
+        with deadline_scope(5):
+            client.analyze_content(text_input="some feedback text")
+        self.assertTrue(0 < seen[0] <= 5000)
+
+    def test_expired_deadline_skips_the_call(self):
+        client = GeminiREST("test-key")
+        client.client = None  # any model call would fail with AttributeError
+        with deadline_scope(0.001):
+            time.sleep(0.01)
+            result = client.analyze_content(text_input="some feedback text")
+        self.assertIn("Deadline exceeded", result["error"])
+
+
+class TestHedging(unittest.TestCase):
+    def test_hedge_wins_over_slow_primary(self):
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.5 if len(calls) == 1 else 0.01)
+            return len(calls)
+
+        policy = HedgePolicy(enabled=True, max_hedge_ratio=1.0, min_samples=10)
+        start = time.monotonic()
+        self.assertEqual(hedged_call(fn, _warm_tracker(), policy), 2)
+        self.assertLess(time.monotonic() - start, 0.3)
+        self.assertEqual(policy.stats()["hedge_wins"], 1)
+
+    def test_hedge_budget_is_capped(self):
+        policy = HedgePolicy(enabled=True, max_hedge_ratio=0.1, min_samples=10)
+        tracker = _warm_tracker(0.001)
+        for _ in range(20):
+            hedged_call(lambda: time.sleep(0.01), tracker, policy)
+        self.assertLessEqual(policy.stats()["hedges"], 2)
+
+    def test_unhedged_call_runs_inline(self):
+        caller = threading.current_thread()
+        for policy in (HedgePolicy(enabled=False), HedgePolicy(enabled=True, min_samples=10)):
+            self.assertIs(hedged_call(threading.current_thread, LatencyTracker(), policy, timeout=5), caller)
+
+    def test_timeout_raises_deadline_exceeded(self):
+        policy = HedgePolicy(enabled=False)
+        with self.assertRaises(DeadlineExceeded):
+            hedged_call(lambda: time.sleep(0.3), LatencyTracker(), policy, timeout=0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import unittest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import gemini_client
+from services.gemini_rest import GeminiREST
+from tests.fake_gemini_server import FakeGeminiConfig, FakeGeminiServer
+from tests.load_driver import build_entry, run_level, sweep
+from tests.synthetic_corpus import SyntheticCorpus
+
+TEXT = "The battery drains overnight and support never answered my emails about it."
+
+
+class TestFakeGeminiServer(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeGeminiServer(FakeGeminiConfig(latency="fixed:5", reviews=6)).start()
+        self.client = GeminiREST(api_key="fake", base_url=self.server.base_url)
+        self.client.review_store = None
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_compact_schema_round_trip(self):
+        result = self.client.analyze_review(text=TEXT)
+        self.assertIsNone(result["error"])
+        self.assertEqual(len(result["analysis"]["rich_reviews"]), 6)
+        self.assertEqual(self.server.stats()["status"], {"200": 1})
+
+    def test_verbose_output_when_no_schema(self):
+        self.client.compact_schema = False
+        result = self.client.analyze_content(text_input=TEXT)
+        self.assertEqual(len(result["reviews"]), 6)
+        self.assertEqual(self.client.get_stats()["verbose"]["parse_failures"], 0)
+
+    def test_429_surfaces_as_quota_error(self):
+        self.server.config.rate_429 = 1.0
+        result = self.client.analyze_review(text=TEXT)
+        self.assertIn("429", result["error"])
+
+    def test_truncated_output_is_recovered(self):
+        self.server.config.truncate = 1.0
+        result = self.client.analyze_content(text_input=TEXT)
+        self.assertTrue(result["partial"])
+        self.assertGreater(len(result["reviews"]), 0)
+        self.assertGreater(self.client.get_stats()["compact"]["continuations"], 0)
+
+    def test_canned_outputs_round_robin(self):
+        self.server.config.canned = [{"r": [{"t": "Canned review text one", "s": "N"}], "sum": "one", "o": {"s": "N"}},
+                                     {"r": [], "sum": "two", "o": {"s": "P"}}]
+        first = self.client.analyze_content(text_input=TEXT)
+        second = self.client.analyze_content(text_input=TEXT)
+        self.assertEqual(first["overall_summary"], "one")
+        self.assertEqual(second["overall_summary"], "two")
+
+    def test_bad_latency_spec(self):
+        with self.assertRaises(ValueError):
+            FakeGeminiConfig(latency="gaussian:1")
+
+
+class TestLoadDriver(unittest.TestCase):
+    def test_concurrency_overlaps_upstream_latency(self):
+        with FakeGeminiServer(FakeGeminiConfig(latency="fixed:50", reviews=2)) as server:
+            client = GeminiREST(api_key="fake", base_url=server.base_url)
+            client.review_store = None
+            fn = build_entry("api", client, SyntheticCorpus(0))
+            serial = run_level(fn, concurrency=1, requests=8)
+            parallel = run_level(fn, concurrency=8, requests=8)
+        self.assertEqual(serial["error_rate"], 0.0)
+        self.assertGreater(parallel["throughput_rps"], serial["throughput_rps"] * 2)
+
+    def test_sweep_reports_errors_and_restores_client(self):
+        with FakeGeminiServer(FakeGeminiConfig(latency="fixed:1", rate_500=1.0)) as server:
+            report = sweep(["ui"], [2], 4, server.base_url, server=server)
+        row = report["results"]["ui"][0]
+        self.assertEqual(row["error_rate"], 1.0)
+        self.assertEqual(row["upstream_status"], {"500": 4})
+        self.assertIsNone(gemini_client._gemini_client)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import glob
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import uuid
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tests.synthetic_corpus import SyntheticCorpus
+from workers.firestore_export import CHECKPOINT_NAME, FirestoreSource, LocalSource, export_collection
+
+try:
+    import pyarrow.parquet as pq
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+
+def _read_ndjson(out_dir):
+    docs = []
+    for path in sorted(glob.glob(os.path.join(out_dir, "*.ndjson.gz"))):
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            docs.extend(json.loads(line) for line in fh)
+    return docs
+
+
+class _FailingSource(LocalSource):
+    """Raises after `pages` successful pages, like a connection dropped mid-export."""
+
+    def __init__(self, directory, pages):
+        super().__init__(directory)
+        self.pages = pages
+
+    def page(self, bounds, after, limit):
+        if self.pages <= 0:
+            raise ConnectionError("stream reset")
+        self.pages -= 1
+        return super().page(bounds, after, limit)
+
+
+class TestLocalExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.src_dir = os.path.join(self.tmp, "src")
+        self.out_dir = os.path.join(self.tmp, "out")
+        os.makedirs(self.src_dir)
+        self.docs = SyntheticCorpus(46).review_docs(103, reviews_per_doc=2)
+        for i, doc in enumerate(self.docs):
+            with open(os.path.join(self.src_dir, f"fsreal-{i:04d}.json"), "w", encoding="utf-8") as fh:
+                json.dump(doc, fh)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_partitions_cover_keys_without_overlap(self):
+        bounds = LocalSource(self.src_dir).partitions(4)
+        self.assertEqual(len(bounds), 4)
+        self.assertIsNone(bounds[0][0])
+        self.assertIsNone(bounds[-1][1])
+        for (_, end), (start, _) in zip(bounds, bounds[1:]):
+            self.assertEqual(end, start)
+
+    def test_ndjson_export_has_every_document_once(self):
+        stats = export_collection(LocalSource(self.src_dir), self.out_dir, partitions=4, workers=3, page_size=10)
+        self.assertEqual(stats["documents"], len(self.docs))
+        self.assertEqual(stats["partitions"], 4)
+        exported = _read_ndjson(self.out_dir)
+        self.assertEqual(len(exported), len(self.docs))
+        self.assertEqual(len({d["_path"] for d in exported}), len(self.docs))
+        self.assertEqual(sorted(d["review_id"] for d in exported), sorted(d["review_id"] for d in self.docs))
+        with open(os.path.join(self.out_dir, CHECKPOINT_NAME), encoding="utf-8") as fh:
+            self.assertTrue(json.load(fh)["complete"])
+        self.assertEqual(glob.glob(os.path.join(self.out_dir, "*.tmp")), [])
+
+    def test_resume_after_failure_continues_without_duplicates(self):
+        with self.assertRaises(ConnectionError):
+            export_collection(_FailingSource(self.src_dir, pages=5), self.out_dir, partitions=3, workers=1,
+                              page_size=7)
+        partial = _read_ndjson(self.out_dir)
+        self.assertGreater(len(partial), 0)
+        self.assertLess(len(partial), len(self.docs))
+
+        stats = export_collection(LocalSource(self.src_dir), self.out_dir, partitions=3, workers=2, page_size=7)
+        exported = _read_ndjson(self.out_dir)
+        self.assertEqual(stats["documents"], len(self.docs))
+        self.assertEqual(len(exported), len(self.docs))
+        self.assertEqual(len({d["_path"] for d in exported}), len(self.docs))
+
+    def test_restart_removes_earlier_pages(self):
+        export_collection(LocalSource(self.src_dir), self.out_dir, partitions=4, page_size=5)
+        stats = export_collection(LocalSource(self.src_dir), self.out_dir, partitions=1, page_size=50,
+                                  resume=False)
+        self.assertEqual(len(glob.glob(os.path.join(self.out_dir, "part-*"))), stats["files"])
+        self.assertEqual(len(_read_ndjson(self.out_dir)), len(self.docs))
+
+    def test_resume_rejects_other_format(self):
+        export_collection(LocalSource(self.src_dir), self.out_dir, partitions=2, page_size=50)
+        with self.assertRaises(ValueError):
+            export_collection(LocalSource(self.src_dir), self.out_dir, fmt="parquet")
+
+    @unittest.skipUnless(HAVE_PYARROW, "pyarrow not installed")
+    def test_parquet_export_writes_bigquery_rows(self):
+        stats = export_collection(LocalSource(self.src_dir), self.out_dir, fmt="parquet", partitions=2, page_size=40)
+        files = sorted(glob.glob(os.path.join(self.out_dir, "*.parquet")))
+        self.assertEqual(len(files), stats["files"])
+        table = pq.ParquetDataset(files).read()
+        self.assertEqual(table.num_rows, len(self.docs))
+        self.assertIn("review_id", table.column_names)
+
+
+@unittest.skipUnless(os.getenv("FIRESTORE_EMULATOR_HOST"), "FIRESTORE_EMULATOR_HOST not set")
+class TestFirestoreEmulatorExport(unittest.TestCase):
+    def setUp(self):
+        from google.cloud import firestore
+        self.client = firestore.Client(project=os.getenv("GOOGLE_CLOUD_PROJECT", "demo-export"))
+        self.collection = f"export_test_{uuid.uuid4().hex[:8]}"
+        self.docs = SyntheticCorpus(7).review_docs(60)
+        batch = self.client.batch()
+        for doc in self.docs:
+            batch.set(self.client.collection(self.collection).document(doc["review_id"]), doc)
+        batch.commit()
+        self.out_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for snap in self.client.collection(self.collection).stream():
+            snap.reference.delete()
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def test_export_from_emulator(self):
+        source = FirestoreSource(self.collection, client=self.client)
+        stats = export_collection(source, self.out_dir, partitions=4, workers=2, page_size=8)
+        exported = _read_ndjson(self.out_dir)
+        self.assertEqual(stats["documents"], len(self.docs))
+        self.assertEqual(sorted(d["review_id"] for d in exported), sorted(d["review_id"] for d in self.docs))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+# Add project root to path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from PIL import Image, ImageDraw
+
+from services.image_ingest import MemoryBudget, SpooledImage, prepare_image, spooled_uploads
+from services.prefilter import is_blank_image
+from tests.synthetic_corpus import SyntheticCorpus
+
+# Runs in a fresh interpreter and reads VmHWM (peak RSS of this process image; unlike
+# ru_maxrss it is not inherited from the forking pytest process)
+_RSS_SCRIPT = r"""
+import io, json, os, sys
+sys.path.insert(0, sys.argv[1])
+from PIL import Image
+from services.image_ingest import SpooledImage, prepare_image
+def peak_kb():
+    with open("/proc/self/status") as fh:
+        return int(next(line for line in fh if line.startswith("VmHWM")).split()[1])
+paths = sys.argv[3:]
+before = peak_kb()
+if sys.argv[2] == "eager":
+    # Previous behaviour: every upload read into memory and decoded before the request
+    blobs = [open(p, "rb").read() for p in paths]
+    images = [Image.open(io.BytesIO(b)) for b in blobs]
+    for image in images:
+        image.load()
+    total = sum(image.size[0] for image in images)
+else:
+    spooled = [SpooledImage(p, os.path.getsize(p)) for p in paths]
+    parts = [prepare_image(s) for s in spooled]
+    total = sum(len(data) for data, _ in parts)
+after = peak_kb()
+print(json.dumps({"delta_mb": (after - before) / 1024.0, "total": total}))
+"""
+
+
+def _big_screenshot(path: str, width: int, height: int):
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    for y in range(0, height, 40):
+        draw.rectangle([20, y, width // 2 + (y % 700), y + 12], fill=(60, 60, 60))
+    image.save(path, "PNG", compress_level=1)
+
+
+class TestPrepareImage(unittest.TestCase):
+    def test_small_png_passes_through_untouched(self):
+        png = SyntheticCorpus(0).screenshot(400, 600)
+        data, mime = prepare_image(png)
+        self.assertEqual(mime, "image/png")
+        self.assertIs(data, png)
+
+    def test_large_image_is_downscaled(self):
+        png = SyntheticCorpus(0).screenshot(1200, 3000)
+        data, mime = prepare_image(png, max_side=1000)
+        with Image.open(io.BytesIO(data)) as image:
+            self.assertEqual(max(image.size), 1000)
+        self.assertEqual(mime, "image/png")
+
+    def test_large_jpeg_stays_jpeg(self):
+        jpg = SyntheticCorpus(0).screenshot(1600, 2400, fmt="JPEG")
+        data, mime = prepare_image(jpg, max_side=800)
+        self.assertEqual(mime, "image/jpeg")
+        with Image.open(io.BytesIO(data)) as image:
+            self.assertLessEqual(max(image.size), 800)
+
+    def test_invalid_bytes_raise(self):
+        with self.assertRaises(Exception):
+            prepare_image(b"not an image" * 200)
+
+
+class TestSpooling(unittest.TestCase):
+    def test_spooled_files_are_removed(self):
+        png = SyntheticCorpus(1).screenshot(300, 300)
+        with spooled_uploads([io.BytesIO(png), io.BytesIO(png)]) as images:
+            paths = [s.path for s in images]
+            self.assertTrue(all(os.path.exists(p) for p in paths))
+            self.assertEqual(images[0].read_bytes(), png)
+            self.assertIs(is_blank_image(images[0]), False)
+        self.assertFalse(any(os.path.exists(p) for p in paths))
+
+    def test_blank_spooled_image(self):
+        buf = io.BytesIO()
+        Image.new("RGB", (800, 800), "white").save(buf, "PNG")
+        image = SpooledImage.from_bytes(buf.getvalue() + b"\0" * 2048)
+        try:
+            self.assertTrue(is_blank_image(image))
+        finally:
+            image.cleanup()
+
+
+    def test_undecodable_images_are_not_blank(self):
+        buf = io.BytesIO()
+        Image.effect_noise((800, 800), 64).save(buf, "JPEG")
+        truncated = buf.getvalue()[:len(buf.getvalue()) // 2]
+        self.assertIs(is_blank_image(truncated), False)
+        self.assertIs(is_blank_image(b"not an image" * 200), False)
+        self.assertIs(is_blank_image(b"tiny"), True)
+
+    def test_blank_jpeg(self):
+        buf = io.BytesIO()
+        Image.new("RGB", (2000, 2000), "white").save(buf, "JPEG", quality=100)
+        self.assertGreater(len(buf.getvalue()), 1024)
+        self.assertTrue(is_blank_image(buf.getvalue()))
+
+
+class TestMemoryBudget(unittest.TestCase):
+    def test_reservations_never_exceed_limit(self):
+        budget = MemoryBudget(100)
+
+        def hold():
+            with budget.reserve(60):
+                time.sleep(0.02)
+
+        threads = [threading.Thread(target=hold) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(budget.stats()["peak_bytes"], 60)
+        self.assertEqual(budget.stats()["in_use_bytes"], 0)
+
+    def test_oversized_request_runs_alone(self):
+        budget = MemoryBudget(10)
+        with budget.reserve(1000) as granted:
+            self.assertEqual(granted, 10)
+
+
+class TestPeakRss(unittest.TestCase):
+    def test_streaming_ingestion_bounds_peak_rss(self):
+        if not os.path.exists("/proc/self/status"):
+            self.skipTest("needs /proc for peak RSS (VmHWM)")
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for i in range(6):
+                path = os.path.join(tmp, f"shot{i}.png")
+                _big_screenshot(path, 3000, 4000)   # 48 MB decoded each (PIL keeps RGB as 4 B/px)
+                paths.append(path)
+
+            def peak(mode):
+                out = subprocess.run([sys.executable, "-c", _RSS_SCRIPT, ROOT, mode] + paths,
+                                     capture_output=True, text=True, timeout=120)
+                self.assertEqual(out.returncode, 0, out.stderr)
+                return json.loads(out.stdout.strip().splitlines()[-1])["delta_mb"]
+
+            eager, streaming = peak("eager"), peak("streaming")
+            print(f"peak RSS delta: eager={eager:.0f} MB streaming={streaming:.0f} MB")
+        # Eager decoding holds all six images (~288 MB); streaming about one plus its thumbnail
+        self.assertGreater(eager, 200)
+        self.assertLess(streaming, 120)
+        self.assertLess(streaming, eager / 2.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
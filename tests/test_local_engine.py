@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import unittest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.local_engine import analyze_text_local, score_reviews, LOCAL_MODEL_NAME
+
+
+class TestLocalEngine(unittest.TestCase):
+    def test_analysis_shape(self):
+        result = analyze_text_local("The checkout crashed and I lost my cart. Terrible update.")
+        analysis = result["analysis"]
+        for key in ("sentiment", "score", "themes", "intent", "confidence", "overall_summary"):
+            self.assertIn(key, analysis)
+        self.assertEqual(analysis["sentiment"], "Negative")
+        self.assertIn("stability", analysis["themes"])
+        self.assertEqual(result["model"], LOCAL_MODEL_NAME)
+        self.assertTrue(result["needs_llm_rescore"])
+
+    def test_negation_bigrams(self):
+        plain, negated = score_reviews(["the app is good", "the app is not good"])
+        self.assertEqual(plain["sentiment"], "Positive")
+        self.assertEqual(negated["sentiment"], "Negative")
+
+    def test_intent(self):
+        rows = score_reviews(["Please add a dark mode option", "I love it, best app ever", "ok"])
+        self.assertEqual([r["intent"] for r in rows], ["feature_request", "praise", "other"])
+
+    def test_bulk_text_is_split_per_review(self):
+        text = "Great battery life, love it.\n\nShipping was late and the box arrived damaged."
+        rich = analyze_text_local(text)["analysis"]["rich_reviews"]
+        self.assertEqual(len(rich), 2)
+        self.assertEqual(rich[1]["analysis"]["sentiment"], "Negative")
+
+    def test_throughput(self):
+        corpus = [
+            "The checkout keeps crashing after the update, please fix it",
+            "Excellent quality and fast delivery, highly recommend",
+            "Battery drains too fast, not worth the price",
+        ] * 1000
+        start = time.perf_counter()
+        rows = score_reviews(corpus)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(len(rows), 3000)
+        print(f"\n   local engine: {len(corpus) / elapsed:,.0f} reviews/s")
+        self.assertGreater(len(corpus) / elapsed, 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import unittest
+import urllib.request
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.metrics import HdrHistogram, MetricsRegistry, REGISTRY, request_timings, start_metrics_server, timed
+from workers.bq_mapper import map_doc_to_bq_row
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_percentiles_within_relative_error(self):
+        hist = HdrHistogram()
+        for v in range(1, 10001):
+            hist.record(float(v))
+        self.assertAlmostEqual(hist.percentile(50), 5000, delta=5000 * 0.03)
+        self.assertAlmostEqual(hist.percentile(99), 9900, delta=9900 * 0.03)
+        self.assertLess(len(hist.counts), 600)
+
+    def test_request_timings_accumulate_and_nest(self):
+        with request_timings() as outer:
+            with timed("scrape"):
+                time.sleep(0.01)
+            with request_timings() as inner:
+                with timed("model_wait"):
+                    time.sleep(0.01)
+                with timed("model_wait"):
+                    time.sleep(0.01)
+        self.assertIs(inner, outer)
+        self.assertGreaterEqual(outer["scrape"], 9)
+        self.assertGreaterEqual(outer["model_wait"], 18)
+
+    def test_prometheus_text(self):
+        registry = MetricsRegistry()
+        registry.inc("gemini_calls_total", mode="compact")
+        registry.observe("stage_latency_ms", 42.0, stage="model_wait")
+        text = registry.render_prometheus()
+        self.assertIn('gemini_calls_total{mode="compact"} 1', text)
+        self.assertIn('stage_latency_ms_bucket{stage="model_wait",le="50"} 1', text)
+        self.assertIn('stage_latency_ms_bucket{stage="model_wait",le="25"} 0', text)
+        self.assertIn('stage_latency_ms_count{stage="model_wait"} 1', text)
+
+    def test_metrics_endpoint(self):
+        with timed("json_parse"):
+            pass
+        server = start_metrics_server(0, host="127.0.0.1")
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        body = urllib.request.urlopen(url, timeout=5).read().decode()
+        self.assertIn('stage="json_parse"', body)
+        self.assertEqual(body, REGISTRY.render_prometheus())
+
+    def test_stage_timings_reach_bigquery_row(self):
+        doc = {"review_id": "r1", "analysis": {"sentiment": "Positive", "score": 0.9},
+               "metadata": {"stage_timings_ms": {"scrape": 120, "model_wait": 900}}}
+        row = map_doc_to_bq_row(doc)
+        self.assertEqual(row["stage_timings_ms"],
+                         {"scrape": 120, "image_decode": None, "model_wait": 900, "json_parse": None})
+
+
+if __name__ == "__main__":
+    unittest.main()
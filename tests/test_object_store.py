@@ -0,0 +1,117 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.gemini_files import GeminiFileCache
+from services.gemini_rest import GeminiREST
+from services.image_ingest import SpooledImage, content_hash
+from tests.fake_gemini_server import FakeGeminiConfig, FakeGeminiServer
+from tests.synthetic_corpus import SyntheticCorpus
+from workers.bq_mapper import map_doc_to_bq_row
+from workers.doc_builder import build_firestore_doc
+from workers.object_store import LocalObjectStore, load_image, parse_gcs_uri, store_images
+
+
+class TestObjectStore(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = LocalObjectStore(bucket="test-bucket", root=self.root)
+        corpus = SyntheticCorpus(3)
+        self.a = corpus.screenshot(400, 600)
+        self.b = corpus.screenshot(400, 600)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_stored_once_per_content(self):
+        spooled = SpooledImage.from_bytes(self.a)
+        try:
+            stored = store_images([self.a, spooled, self.b], store=self.store)
+        finally:
+            spooled.cleanup()
+        self.assertEqual([s["created"] for s in stored], [True, False, True])
+        self.assertEqual(stored[0]["uri"], stored[1]["uri"])
+        self.assertEqual(stored[0]["uri"], f"gs://test-bucket/images/{content_hash(self.a)}.png")
+        self.assertEqual(stored[0]["mime"], "image/png")
+        self.assertEqual(len(os.listdir(os.path.join(self.root, "test-bucket", "images"))), 2)
+
+    def test_load_image_references_stored_file(self):
+        uri = store_images([self.a], store=self.store)[0]["uri"]
+        source = load_image(uri, store=self.store)
+        self.assertEqual(source.read_bytes(), self.a)
+        self.assertEqual(source.sha256, content_hash(self.a))
+        source.cleanup()  # not owned: the stored original survives
+        self.assertTrue(self.store.exists(parse_gcs_uri(uri)[1]))
+        with self.assertRaises(ValueError):
+            load_image("gs://other-bucket/images/x.png", store=self.store)
+
+    def test_documents_record_image_uri(self):
+        uris = [s["uri"] for s in store_images([self.a, self.b], store=self.store)]
+        doc = build_firestore_doc({"analysis": {}, "image_uris": uris}, "mobile_app_screenshot")
+        self.assertEqual(doc["image_gcs_path"], uris[0])
+        self.assertEqual(doc["metadata"]["image_uris"], uris)
+        self.assertEqual(map_doc_to_bq_row(doc)["image_gcs_path"], uris[0])
+        self.assertIsNone(build_firestore_doc({"analysis": {}}, "manual_text")["image_gcs_path"])
+
+
+class TestGeminiFileReuse(unittest.TestCase):
+    def setUp(self):
+        self.shot = SyntheticCorpus(4).screenshot(800, 1200)
+
+    def test_repeat_analysis_sends_file_uri(self):
+        with FakeGeminiServer(FakeGeminiConfig(reviews=3)) as server:
+            client = GeminiREST(api_key="fake", base_url=server.base_url)
+            sizes = []
+            for _ in range(3):
+                before = server.stats()["request_bytes"]
+                self.assertIsNone(client.analyze_content(images=[self.shot]).get("error"))
+                sizes.append(server.stats()["request_bytes"] - before)
+            stats = server.stats()
+        self.assertEqual(stats["files_uploaded"], 1)
+        self.assertEqual(stats["file_refs"], 2)
+        self.assertLess(sizes[1], sizes[0] / 2)
+        self.assertEqual(sizes[1], sizes[2])
+        self.assertEqual(client.files.get_stats()["reuses"], 1)
+
+    def test_off_mode_always_inlines(self):
+        with FakeGeminiServer(FakeGeminiConfig(reviews=2)) as server:
+            client = GeminiREST(api_key="fake", base_url=server.base_url)
+            client.files = GeminiFileCache(client.client, mode="off")
+            client.analyze_content(images=[self.shot])
+            client.analyze_content(images=[self.shot])
+            self.assertEqual(server.stats()["files_uploaded"], 0)
+
+    def test_expiring_reference_is_reuploaded(self):
+        with FakeGeminiServer() as server:
+            client = GeminiREST(api_key="fake", base_url=server.base_url)
+            files = GeminiFileCache(client.client, mode="always")
+            self.assertIsNotNone(files.part_for("k", self.shot, "image/png").file_data)
+            self.assertIsNotNone(files.lookup("k"))
+            uri, mime, _ = files._refs["k"]
+            files._refs["k"] = (uri, mime, time.time() + 60)  # inside the refresh margin
+            self.assertIsNone(files.lookup("k"))
+            files.part_for("k", self.shot, "image/png")
+            self.assertEqual(server.stats()["files_uploaded"], 2)
+
+    def test_failed_upload_falls_back_to_inline(self):
+        class BrokenFiles:
+            def upload(self, **kwargs):
+                raise ConnectionError("offline")
+
+        class Client:
+            files = BrokenFiles()
+
+        files = GeminiFileCache(Client(), mode="always")
+        part = files.part_for("k", self.shot, "image/png")
+        self.assertEqual(part.inline_data.data, self.shot)
+        self.assertEqual(files.get_stats()["upload_failures"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import io
+import os
+import sys
+import unittest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image, ImageDraw
+
+from services.prefilter import (
+    prefilter_input, prefilter_stats, reset_prefilter_stats,
+    ROUTE_MODEL, ROUTE_CANNED, ROUTE_SWOT,
+)
+
+
+def _png(draw_text: bool) -> bytes:
+    image = Image.new("RGB", (400, 300), "white")
+    if draw_text:
+        draw = ImageDraw.Draw(image)
+        for row in range(10):
+            draw.text((10, 10 + row * 25), "Great app but checkout keeps crashing " * 2, fill="black")
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class TestPrefilter(unittest.TestCase):
+    def setUp(self):
+        reset_prefilter_stats()
+
+    def test_one_word_reviews_are_canned(self):
+        good = prefilter_input(text="good")
+        bad = prefilter_input(text="  Bad  ")
+        self.assertEqual(good["route"], ROUTE_CANNED)
+        self.assertEqual(good["result"]["analysis"]["sentiment"], "Positive")
+        self.assertEqual(bad["result"]["analysis"]["sentiment"], "Negative")
+
+    def test_negated_or_unknown_short_text_goes_to_model(self):
+        self.assertEqual(prefilter_input(text="not good")["route"], ROUTE_MODEL)
+        self.assertEqual(prefilter_input(text="muy bueno")["route"], ROUTE_MODEL)
+
+    def test_empty_and_symbol_only_text(self):
+        self.assertEqual(prefilter_input(text="   ")["reason"], "empty_text")
+        self.assertEqual(prefilter_input(text="12345 ### !!! 999")["reason"], "no_language")
+
+    def test_boilerplate_routes_to_swot_fallback(self):
+        page = ("Sign in Create account Cookies We use cookies. Accept cookies Privacy Policy "
+                "Terms of Use Subscribe to our newsletter All rights reserved")
+        decision = prefilter_input(text=page)
+        self.assertEqual(decision["route"], ROUTE_SWOT)
+        self.assertEqual(decision["result"]["reviews"], [])
+
+    def test_real_review_goes_to_model(self):
+        text = ("sivakumar 4.0 out of 5 stars Decent keyboard. The real problem is the caps lock key, "
+                "there is no indication if it is on or off. Please sign in to vote.")
+        self.assertEqual(prefilter_input(text=text)["route"], ROUTE_MODEL)
+
+    def test_blank_screenshots_are_dropped(self):
+        blank, real = _png(False), _png(True)
+        only_blank = prefilter_input(images=[blank, blank])
+        self.assertEqual(only_blank["route"], ROUTE_CANNED)
+
+        mixed = prefilter_input(images=[blank, real])
+        self.assertEqual(mixed["route"], ROUTE_MODEL)
+        self.assertEqual(mixed["images"], [real])
+
+    def test_absorbed_fraction(self):
+        prefilter_input(text="great")
+        prefilter_input(text="A long and detailed review about battery life and the charger.")
+        stats = prefilter_stats()
+        self.assertEqual(stats["total"], 2)
+        self.assertEqual(stats["absorbed"], 1)
+        self.assertAlmostEqual(stats["absorbed_fraction"], 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import profiling
+
+
+def _work():
+    return sorted(str(i) * 3 for i in range(20000))
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self._dir, profiling.PROFILE_DIR = profiling.PROFILE_DIR, self.tmp.name
+
+    def tearDown(self):
+        profiling.PROFILE_DIR = self._dir
+        self.tmp.cleanup()
+
+    def test_disabled_by_default(self):
+        with profiling.profile_request("req-off") as base:
+            _work()
+        self.assertIsNone(base)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_header_selects_request(self):
+        self.assertTrue(profiling.should_profile({"X-Profile-Request": "1"}))
+        self.assertFalse(profiling.should_profile({"X-Other": "1"}))
+
+    def test_writes_cpu_and_allocation_profiles(self):
+        with profiling.profile_request("req/42", phase="analyze", force=True) as base:
+            _work()
+        self.assertIn("req_42-analyze", base)
+        for ext in (".prof", ".tracemalloc", ".txt"):
+            self.assertTrue(os.path.exists(base + ext))
+        self.assertIsInstance(tracemalloc.Snapshot.load(base + ".tracemalloc"), tracemalloc.Snapshot)
+        with open(base + ".txt", encoding="utf-8") as fh:
+            self.assertIn("_work", fh.read())
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_overlapping_requests_share_tracing(self):
+        first_done, second_started = threading.Event(), threading.Event()
+        bases, errors = {}, []
+
+        def second():
+            try:
+                with profiling.profile_request("req-b", force=True) as base:
+                    second_started.set()
+                    first_done.wait(5)  # the request that started tracing finishes first
+                    _work()
+                bases["b"] = base
+            except Exception as e:
+                errors.append(e)
+
+        worker = threading.Thread(target=second)
+        with profiling.profile_request("req-a", force=True) as base:
+            worker.start()
+            second_started.wait(5)
+        bases["a"] = base
+        first_done.set()
+        worker.join(10)
+        self.assertEqual(errors, [])
+        for base in bases.values():
+            self.assertTrue(os.path.exists(base + ".tracemalloc"))
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_rotation_keeps_newest(self):
+        keep, profiling.PROFILE_KEEP = profiling.PROFILE_KEEP, 2
+        try:
+            for i in range(4):
+                with profiling.profile_request(f"req-{i}", force=True):
+                    pass
+                time.sleep(0.01)
+        finally:
+            profiling.PROFILE_KEEP = keep
+        names = os.listdir(self.tmp.name)
+        self.assertEqual(len(names), 6)
+        self.assertTrue(all("req-2" in n or "req-3" in n for n in names))
+
+
+    def test_sampling_is_decided_once_per_request(self):
+        rate, profiling.PROFILE_SAMPLE_RATE = profiling.PROFILE_SAMPLE_RATE, 0.5
+        try:
+            for i in range(20):
+                bases = []
+                for phase in ("analyze", "firestore", "bigquery"):
+                    with profiling.profile_request(f"req-s{i}", phase=phase) as base:
+                        bases.append(base)
+                self.assertIn(sum(b is not None for b in bases), (0, 3))
+                if bases[0]:
+                    self.assertEqual(len({b.rsplit("-", 1)[0] for b in bases}), 1)
+        finally:
+            profiling.PROFILE_SAMPLE_RATE = rate
+
+    def test_rotation_counts_requests_not_phases(self):
+        keep, profiling.PROFILE_KEEP = profiling.PROFILE_KEEP, 2
+        try:
+            for i in range(3):
+                for phase in ("analyze", "firestore", "bigquery"):
+                    with profiling.profile_request(f"req-p{i}", phase=phase, force=True):
+                        pass
+                time.sleep(0.01)
+        finally:
+            profiling.PROFILE_KEEP = keep
+        names = os.listdir(self.tmp.name)
+        self.assertEqual(len(names), 2 * 3 * 3)
+        self.assertEqual({n.split("req-")[1].split("-")[0] for n in names}, {"p1", "p2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
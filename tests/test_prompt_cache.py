@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import unittest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.gemini_cache import PromptCache, is_cache_error
+from services.gemini_rest import GeminiREST
+from tests.fake_gemini_server import FakeGeminiConfig, FakeGeminiServer
+
+TEXT = "The battery drains overnight and support never answered my emails about it."
+
+
+class TestPromptCache(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeGeminiServer(FakeGeminiConfig(latency="fixed:1", reviews=2)).start()
+        self.client = GeminiREST(api_key="fake", base_url=self.server.base_url)
+        self.client.review_store = None
+        self.offset = 0.0
+        self.cache = PromptCache(self.client.client, min_tokens=0, clock=lambda: time.time() + self.offset)
+        self.client.prompt_cache = self.cache
+
+    def tearDown(self):
+        self.server.stop()
+
+    def analyze(self):
+        result = self.client.analyze_content(text_input=TEXT)
+        self.assertNotIn("error", result)
+        return result
+
+    def test_prompt_is_cached_once_and_referenced(self):
+        for _ in range(3):
+            self.analyze()
+        stats = self.server.stats()
+        self.assertEqual(stats["caches_created"], 1)
+        self.assertEqual(stats["cached_requests"], 3)
+        self.assertEqual(stats["system_instruction_requests"], 0)
+        self.assertGreater(stats["cached_tokens"], 0)
+        self.assertEqual(self.cache.get_stats()["cached"], 3)
+
+    def test_refreshes_ttl_near_expiry(self):
+        self.analyze()
+        self.offset = self.cache.ttl_s - self.cache.refresh_margin_s / 2
+        self.analyze()
+        self.assertEqual(self.server.stats()["caches_refreshed"], 1)
+        self.assertEqual(self.server.stats()["caches_created"], 1)
+        self.assertEqual(self.cache.get_stats()["refreshes"], 1)
+
+    def test_rejected_create_stays_inline_until_retry(self):
+        self.server.config.cache_min_tokens = 10 ** 6
+        self.analyze()
+        self.analyze()
+        self.assertEqual(self.cache.get_stats()["create_failures"], 1)  # not retried on every request
+        self.assertEqual(self.server.stats()["system_instruction_requests"], 2)
+        self.server.config.cache_min_tokens = 0
+        self.offset = self.cache.retry_s + 1
+        self.analyze()
+        self.assertEqual(self.server.stats()["cached_requests"], 1)
+
+    def test_expired_cache_retries_inline_then_recreates(self):
+        self.analyze()
+        self.server.expire_cache()
+        self.analyze()
+        self.assertEqual(self.cache.get_stats()["fallbacks"], 1)
+        self.assertEqual(self.server.stats()["system_instruction_requests"], 1)
+        self.analyze()
+        self.assertEqual(self.server.stats()["caches_created"], 2)
+
+    def test_short_prompt_or_off_mode_sends_system_instruction(self):
+        self.cache.min_tokens = 10 ** 6
+        self.analyze()
+        self.cache.mode = "off"
+        self.cache.min_tokens = 0
+        self.analyze()
+        stats = self.server.stats()
+        self.assertEqual((stats["caches_created"], stats["system_instruction_requests"]), (0, 2))
+
+    def test_is_cache_error(self):
+        self.assertTrue(is_cache_error(RuntimeError("403 PERMISSION_DENIED. CachedContent not found")))
+        self.assertFalse(is_cache_error(RuntimeError("429 RESOURCE_EXHAUSTED")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import json
+import os
+import pickle
+import sys
+import tracemalloc
+import unittest
+from datetime import datetime, timezone
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tests.synthetic_corpus import SyntheticCorpus
+from workers import records
+from workers.records import MISSING, Analysis, ReviewDoc, RichReview, as_record, dumps, loads
+
+
+def _retained(build):
+    # Bytes still allocated by build()'s result once it returns
+    tracemalloc.start()
+    try:
+        value = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del value
+    return size
+
+
+class TestRecordConversion(unittest.TestCase):
+    def setUp(self):
+        self.docs = SyntheticCorpus(48).review_docs(300, reviews_per_doc=4)
+        with open(os.path.join(os.path.dirname(__file__), "..", "examples", "sample_review.json"), encoding="utf-8") as fh:
+            self.docs.append(json.load(fh))
+
+    def test_round_trip_is_lossless(self):
+        for doc in self.docs:
+            self.assertEqual(ReviewDoc.from_dict(doc).to_dict(), doc)
+
+    def test_nested_records_are_typed(self):
+        rec = ReviewDoc.from_dict(self.docs[0])
+        self.assertIsInstance(rec.analysis, Analysis)
+        self.assertIsInstance(rec.analysis.rich_reviews[0], RichReview)
+        self.assertEqual(rec.analysis.rich_reviews[0].metadata.username,
+                         self.docs[0]["analysis"]["rich_reviews"][0]["metadata"]["username"])
+        self.assertFalse(hasattr(rec, "__dict__"))
+
+    def test_leaves_are_shared_not_copied(self):
+        doc = self.docs[1]
+        out = ReviewDoc.from_dict(doc).to_dict()
+        self.assertIs(out["raw_text"], doc["raw_text"])
+        self.assertIs(out["metadata"], doc["metadata"])
+        self.assertIs(out["analysis"]["rich_reviews"][0]["analysis"]["pain_points"],
+                      doc["analysis"]["rich_reviews"][0]["analysis"]["pain_points"])
+
+    def test_absent_and_unknown_keys(self):
+        doc = {"review_id": "r1", "raw_text": "ok", "analysis": {"sentiment": "Positive", "custom": 1},
+               "new_field": [1, 2]}
+        rec = ReviewDoc.from_dict(doc)
+        self.assertIs(rec.model, MISSING)
+        self.assertEqual(rec.extra, {"new_field": [1, 2]})
+        self.assertEqual(rec.analysis.extra, {"custom": 1})
+        self.assertEqual(rec.to_dict(), doc)
+        self.assertEqual(pickle.loads(pickle.dumps(rec)).to_dict(), doc)
+
+    def test_get_and_as_record(self):
+        rec = as_record(Analysis, {"sentiment": "Negative", "action_items": ["fix"]})
+        self.assertEqual((rec.get("sentiment"), rec.get("action_items"), rec.get("score", 0)), ("Negative", ["fix"], 0))
+        self.assertIs(as_record(Analysis, rec), rec)
+        self.assertEqual(as_record(ReviewDoc, None).to_dict(), {})
+
+
+class TestSerialization(unittest.TestCase):
+    def setUp(self):
+        self.docs = SyntheticCorpus(49).review_docs(200, reviews_per_doc=8)
+
+    def test_dumps_loads(self):
+        for doc in self.docs[:20]:
+            data = dumps(doc)
+            self.assertIsInstance(data, bytes)
+            self.assertNotIn(b"\n", data)
+            self.assertEqual(loads(data), json.loads(json.dumps(doc)))
+            self.assertEqual(loads(dumps(ReviewDoc.from_dict(doc)), ReviewDoc).to_dict(), json.loads(json.dumps(doc)))
+
+    def test_json_fallback_matches(self):
+        when = datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc)
+        doc = dict(self.docs[0], created_at=when, raw_text="Überraschend gut ✓")
+        fast = dumps(doc)
+        original, records.orjson = records.orjson, None
+        try:
+            slow = dumps(doc)
+        finally:
+            records.orjson = original
+        self.assertEqual(json.loads(fast), json.loads(slow))
+        self.assertEqual(json.loads(slow)["created_at"], when.isoformat())
+
+    def test_compact_output_is_smaller_than_indented(self):
+        # Speed is compared in tests/bench_pipeline.py (records.*), not asserted here
+        indented = [json.dumps(doc, indent=2, ensure_ascii=False).encode("utf-8") for doc in self.docs]
+        compact = [dumps(doc) for doc in self.docs]
+        self.assertLess(sum(map(len, compact)), 0.8 * sum(map(len, indented)))
+
+    def test_records_retain_less_memory_than_dicts(self):
+        blobs = [json.dumps(doc) for doc in self.docs]
+        as_dicts = _retained(lambda: [json.loads(b) for b in blobs])
+        as_records = _retained(lambda: [ReviewDoc.from_dict(json.loads(b)) for b in blobs])
+        self.assertLess(as_records, 0.85 * as_dicts)
+
+
+if __name__ == "__main__":
+    unittest.main()
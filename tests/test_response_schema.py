@@ -0,0 +1,98 @@
+import json
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.gemini_rest import GeminiREST
+from services.json_repair import recover_partial
+from services.response_schema import expand_compact, parse_json_response
+
+COMPACT = {
+    "r": [{"u": "sivakumar", "rt": "4.0", "d": "31 January 2025", "t": "Decent keyboard, no caps lock light.",
+           "s": "N", "p": ["No caps lock indicator"], "f": ["Add caps lock LED"], "a": "Add an indicator"}],
+    "sum": "Keyboard is fine but lacks basic indicators.",
+    "o": {"s": "M", "p": ["No caps lock indicator"], "f": [], "a": "Ship an LED revision"},
+}
+
+
+class _FakeModels:
+    """Returns the given texts in order (the last one repeats)."""
+    def __init__(self, text, tokens, *more):
+        self.texts, self.tokens, self.configs, self.contents = [text, *more], tokens, [], []
+
+    def generate_content(self, model, contents, config):
+        self.configs.append(config)
+        self.contents.append(contents)
+        text = self.texts[min(len(self.configs), len(self.texts)) - 1]
+        return SimpleNamespace(text=text, usage_metadata=SimpleNamespace(candidates_token_count=self.tokens))
+
+
+class TestResponseSchema(unittest.TestCase):
+    def test_expand_compact_matches_verbose_shape(self):
+        verbose = expand_compact(COMPACT)
+        review = verbose["reviews"][0]
+        self.assertEqual(review["metadata"], {"username": "sivakumar", "rating": "4.0", "date": "31 January 2025"})
+        self.assertEqual(review["analysis"]["sentiment"], "Negative")
+        self.assertEqual(review["analysis"]["pain_points"], ["No caps lock indicator"])
+        self.assertEqual(verbose["analysis"]["sentiment"], "Mixed")
+        self.assertEqual(verbose["overall_summary"], COMPACT["sum"])
+
+    def test_parse_json_response_is_not_greedy(self):
+        raw = 'Sure! {"extracted_text": "ok"} and also {"other": 1}'
+        self.assertEqual(parse_json_response(raw), {"extracted_text": "ok"})
+        self.assertIsNone(parse_json_response("no json here"))
+
+    def test_recover_partial_keeps_only_closed_reviews(self):
+        text = json.dumps(COMPACT)
+        cut = text[:text.index('"sum"') - 30]   # inside the first review's advice
+        rec = recover_partial('{"r": [{"t": "one", "s": "P"}, ' + cut[len('{"r": ['):], list_key="r")
+        self.assertTrue(rec["truncated"])
+        self.assertEqual(rec["items"], [{"t": "one", "s": "P"}])
+
+    def test_recover_partial_fixes_fences_and_trailing_commas(self):
+        rec = recover_partial('```json\n{"r": [{"t": "a", "s": "P",},], "sum": "x",}\n```', list_key="r")
+        self.assertFalse(rec["truncated"])
+        self.assertEqual(rec["data"], {"r": [{"t": "a", "s": "P"}], "sum": "x"})
+
+    def test_analyze_content_records_metrics(self):
+        client = GeminiREST("test-key")
+        client.client = SimpleNamespace(models=_FakeModels(json.dumps(COMPACT), tokens=120))
+        result = client.analyze_content(text_input="Decent keyboard, no caps lock light.")
+        self.assertEqual(result["reviews"][0]["metadata"]["username"], "sivakumar")
+        self.assertIsNotNone(client.client.models.configs[0].response_schema)
+
+        client.client = SimpleNamespace(models=_FakeModels('{"r": [', tokens=4096))
+        failed = client.analyze_content(text_input="x" * 50)
+        self.assertIn("error", failed)
+
+        stats = client.get_stats()["compact"]
+        self.assertEqual(stats["calls"], 2)
+        self.assertEqual(stats["parse_failures"], 1)
+        self.assertEqual(stats["output_tokens"], 120 + 4096)
+
+
+    def test_truncated_output_requests_only_the_remainder(self):
+        second = {"u": "b", "t": "Battery dies in two hours", "s": "N", "p": ["battery"], "f": [], "a": "Fix"}
+        full = json.dumps({"r": [COMPACT["r"][0], second], "sum": "s", "o": COMPACT["o"]})
+        truncated = full[:full.index('"u": "b"') + 12]
+        remainder = json.dumps({"r": [second], "sum": "Both reviews", "o": COMPACT["o"]})
+
+        client = GeminiREST("test-key")
+        client.client = SimpleNamespace(models=_FakeModels(truncated, 50, remainder))
+        result = client.analyze_content(text_input="two reviews")
+
+        self.assertEqual([r["metadata"]["username"] for r in result["reviews"]], ["sivakumar", "b"])
+        self.assertEqual(result["overall_summary"], "Both reviews")
+        self.assertNotIn("partial", result)
+        note = client.client.models.contents[1][-1]
+        self.assertIn("sivakumar", note)
+        stats = client.get_stats()["compact"]
+        self.assertEqual((stats["continuations"], stats["recovered_reviews"]), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import sys
+import unittest
+from datetime import date
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.result_index import build_review_index, select_reviews, sentiments_in
+from tests.synthetic_corpus import SyntheticCorpus
+
+
+def _review(text, sentiment, rating="", day="", pains=()):
+    return {"metadata": {"username": "u", "rating": rating, "date": day}, "text": text,
+            "analysis": {"sentiment": sentiment, "pain_points": list(pains), "feature_requests": []}}
+
+
+REVIEWS = [
+    _review("Battery died fast", "Negative", "1/5", "2025-03-01", ["battery"]),
+    _review("Love it", "positive", "5/5", "2025-03-05"),
+    _review("Okay I guess", "Neutral", "", "3 days ago"),
+    _review("Box crushed, battery weak", "Negative", "2/5", "", ["shipping", "battery"]),
+]
+
+
+class TestResultIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = build_review_index(REVIEWS, reference=date(2025, 3, 10))
+
+    def test_sorts(self):
+        def order(sort):
+            return select_reviews(self.index, sort)["positions"]
+        self.assertEqual(order("Original order"), [0, 1, 2, 3])
+        self.assertEqual(order("Rating: low to high"), [0, 3, 1, 2])
+        self.assertEqual(order("Rating: high to low"), [1, 3, 0, 2])
+        self.assertEqual(order("Newest first"), [2, 1, 0, 3])
+        self.assertEqual(order("Oldest first"), [0, 1, 2, 3])
+        self.assertEqual(order("Most pain points"), [3, 0, 1, 2])
+        with self.assertRaises(ValueError):
+            select_reviews(self.index, "Random")
+
+    def test_filters(self):
+        self.assertEqual(sentiments_in(self.index), ["Negative", "Neutral", "Positive"])
+        self.assertEqual(select_reviews(self.index, sentiments=["Negative"])["positions"], [0, 3])
+        self.assertEqual(select_reviews(self.index, query="Battery box")["positions"], [3])
+        self.assertEqual(select_reviews(self.index, query="shipping")["positions"], [3])
+
+    def test_paging_is_clamped(self):
+        index = build_review_index(SyntheticCorpus(1).model_output(reviews=60)["reviews"])
+        first = select_reviews(index, page=1, page_size=25)
+        self.assertEqual((first["matches"], first["pages"], len(first["positions"])), (60, 3, 25))
+        last = select_reviews(index, page=99, page_size=25)
+        self.assertEqual((last["page"], last["positions"]), (3, list(range(50, 60))))
+        empty = select_reviews(index, query="no such words here")
+        self.assertEqual((empty["matches"], empty["pages"], empty["positions"]), (0, 1, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
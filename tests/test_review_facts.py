@@ -0,0 +1,121 @@
+import os
+import sys
+import unittest
+from datetime import date
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tests.synthetic_corpus import SyntheticCorpus
+from workers.bq_mapper import (REVIEW_FACT_COLUMNS, frame_to_bq_rows, map_doc_to_review_fact_rows,
+                               map_docs_to_review_facts_frame, parse_rating, parse_review_date)
+from workers.local_warehouse import LocalWarehouse
+
+try:
+    import pyarrow  # noqa: F401
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+
+def _doc(*reviews, processed_at="2025-03-10T09:00:00+00:00"):
+    return {"review_id": "run-1", "source": "web_scrape", "model": "gemini-2.5-flash",
+            "processed_at": processed_at, "created_at": processed_at,
+            "metadata": {"prompt_version": "c-abc"},
+            "analysis": {"sentiment": "Mixed", "rich_reviews": [
+                {"metadata": {"username": u, "rating": r, "date": d}, "text": t,
+                 "analysis": {"sentiment": s, "pain_points": ["battery"] if s == "Negative" else [],
+                              "feature_requests": [], "actionable_advice": ""}}
+                for u, r, d, t, s in reviews]}}
+
+
+class TestFactMapping(unittest.TestCase):
+    def test_parse_rating(self):
+        cases = {"4/5": 4, "8 out of 10": 4, "4.5 stars": 4, "★★☆☆☆": 2, 5: 5, "3,5/5": 3,
+                 "": None, "great": None, "12/5": None, None: None}
+        for value, expected in cases.items():
+            self.assertEqual(parse_rating(value), expected, value)
+
+    def test_parse_review_date(self):
+        ref = date(2025, 3, 10)
+        cases = {"2025-03-01": date(2025, 3, 1), "March 3rd, 2025": date(2025, 3, 3),
+                 "Reviewed on 2 Feb 2025": date(2025, 2, 2), "2 weeks ago": date(2025, 2, 24),
+                 "a month ago": date(2025, 2, 8), "yesterday": date(2025, 3, 9), "soon": None, "": None}
+        for value, expected in cases.items():
+            self.assertEqual(parse_review_date(value, ref), expected, value)
+
+    def test_one_row_per_review(self):
+        rows = map_doc_to_review_fact_rows(_doc(
+            ("Ann", "2/5", "2025-02-01", "Battery drains overnight.", "Negative"),
+            ("Bob", "", "last spring", "Love the screen.", "Positive"),
+        ))
+        self.assertEqual([r["review_index"] for r in rows], [0, 1])
+        self.assertEqual({r["review_id"] for r in rows}, {"run-1"})
+        self.assertEqual((rows[0]["rating"], rows[0]["review_date"], rows[0]["review_date_inferred"]),
+                         (2, "2025-02-01", False))
+        self.assertEqual((rows[1]["rating"], rows[1]["rating_text"]), (None, None))
+        self.assertEqual((rows[1]["review_date"], rows[1]["review_date_inferred"]), ("2025-03-10", True))
+        self.assertEqual(rows[0]["pain_points"], ["battery"])
+        self.assertEqual(rows[0]["prompt_version"], "c-abc")
+        self.assertEqual(map_doc_to_review_fact_rows({"analysis": {}}), [])
+
+    def test_frame_matches_rows(self):
+        docs = SyntheticCorpus(5).review_docs(40, reviews_per_doc=4)
+        expected = [row for doc in docs for row in map_doc_to_review_fact_rows(doc)]
+        frame = map_docs_to_review_facts_frame(docs)
+        self.assertEqual(list(frame.columns), list(REVIEW_FACT_COLUMNS))
+        self.assertEqual(len(frame), 160)
+        for got, want in zip(frame_to_bq_rows(frame), expected):
+            for name in REVIEW_FACT_COLUMNS:
+                if name != "processed_at":
+                    self.assertEqual(got[name], want[name], name)
+
+    @unittest.skipUnless(HAVE_PYARROW, "pyarrow not installed")
+    def test_arrow_schema(self):
+        from workers.bq_mapper import review_facts_arrow_schema, to_arrow_table
+        table = to_arrow_table(map_docs_to_review_facts_frame(SyntheticCorpus(5).review_docs(5, reviews_per_doc=2)))
+        self.assertTrue(table.schema.equals(review_facts_arrow_schema()))
+
+
+class TestLocalWarehouse(unittest.TestCase):
+    def setUp(self):
+        self.wh = LocalWarehouse(":memory:")
+
+    def tearDown(self):
+        self.wh.close()
+
+    def test_insert_doc_writes_run_and_facts(self):
+        counts = self.wh.insert_doc(_doc(
+            ("Ann", "2/5", "2025-02-01", "Battery drains overnight.", "Negative"),
+            ("Bob", "5/5", "2025-03-02", "Love the screen.", "Positive"),
+        ))
+        self.assertEqual(counts, {"consumer_reviews": 1, "consumer_review_facts": 2})
+        facts = self.wh.query("SELECT username, rating, pain_points FROM consumer_review_facts "
+                              "WHERE review_date BETWEEN ? AND ? AND sentiment = ?",
+                              ("2025-02-01", "2025-02-28", "Negative"))
+        self.assertEqual(facts, [{"username": "Ann", "rating": 2, "pain_points": '["battery"]'}])
+        self.assertEqual([p["partition_id"] for p in self.wh.partitions("consumer_review_facts")],
+                         ["20250201", "20250302"])
+        self.assertEqual(self.wh.partitions("consumer_reviews")[0]["partition_id"], "20250310")
+
+    def test_partition_counts_accumulate(self):
+        docs = SyntheticCorpus(2).review_docs(30, reviews_per_doc=3)
+        for doc in docs:
+            self.wh.insert_doc(doc)
+        parts = self.wh.partitions("consumer_review_facts")
+        self.assertEqual(sum(p["total_rows"] for p in parts), 90)
+        self.assertEqual(sum(p["total_rows"] for p in self.wh.partitions("consumer_reviews")), 30)
+
+    def test_date_bounded_queries_use_the_partition_index(self):
+        self.wh.insert_doc(_doc(("Ann", "2/5", "2025-02-01", "Battery drains overnight.", "Negative")))
+        plan = self.wh.query("EXPLAIN QUERY PLAN SELECT * FROM consumer_review_facts "
+                             "WHERE review_date BETWEEN '2025-02-01' AND '2025-02-28' AND sentiment = 'Negative'")
+        self.assertIn("consumer_review_facts_partition", " ".join(row["detail"] for row in plan))
+
+    def test_unknown_table(self):
+        with self.assertRaises(ValueError):
+            self.wh.insert_rows("reviews", [{}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import os
+import sys
+import time
+import unittest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.gemini_rest import GeminiREST
+from services.review_store import (ReviewStore, match_reviews, normalize_text, residual_text, stored_result,
+                                   text_hash)
+from tests.fake_gemini_server import FakeGeminiConfig, FakeGeminiServer
+from workers.doc_builder import build_firestore_doc
+
+BATTERY = "The battery drains overnight, even with every app closed."
+LOGIN = "Login fails every morning and I have to reset my password again."
+CAMERA = "Camera is sharp but the night mode makes everything green."
+
+
+def _review(text, sentiment="Negative", pains=None):
+    return {"metadata": {"username": "u"}, "text": text,
+            "analysis": {"sentiment": sentiment, "pain_points": pains or [], "feature_requests": [],
+                         "actionable_advice": "Fix it"}}
+
+
+def _compact(*items):
+    return {"r": [{"u": "u", "t": t, "s": s, "p": [p], "f": [], "a": "Fix"} for t, s, p in items],
+            "sum": "Fresh summary.", "o": {"s": "N", "p": ["battery"], "f": [], "a": "Fix"}}
+
+
+class TestReviewStore(unittest.TestCase):
+    def setUp(self):
+        self.store = ReviewStore(":memory:", max_entries=100, ttl_days=30)
+
+    def test_normalization_shares_keys(self):
+        self.assertEqual(normalize_text("  Great   APP!! "), "great app")
+        self.assertEqual(text_hash("Great app!!"), text_hash("great  app"))
+        self.assertNotEqual(text_hash("great app"), text_hash("great apps"))
+
+    def test_keyed_by_prompt_version_and_model(self):
+        h = text_hash(BATTERY)
+        self.store.put_many([(h, _review(BATTERY))], "v1", "flash")
+        self.assertEqual(self.store.get_many([h], "v1", "flash")[h]["text"], BATTERY)
+        self.assertEqual(self.store.get_many([h], "v2", "flash"), {})
+        self.assertEqual(self.store.get_many([h], "v1", "pro"), {})
+        stats = self.store.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 2, 1))
+
+    def test_invalidate_other_versions(self):
+        for version in ("v1", "v2"):
+            self.store.put_many([(text_hash(BATTERY), _review(BATTERY))], version, "flash")
+        self.assertEqual(self.store.invalidate(keep_prompt_version="v2", model="flash"), 1)
+        self.assertEqual([v["prompt_version"] for v in self.store.stats()["versions"]], ["v2"])
+
+    def test_eviction_policies(self):
+        for policy, expected_kept in (("lru", "a"), ("lfu", "a"), ("fifo", "c")):
+            store = ReviewStore(":memory:", max_entries=2, eviction=policy)
+            store.put_many([("a", _review("a"))], "v", "m")
+            time.sleep(0.002)
+            store.put_many([("b", _review("b"))], "v", "m")
+            store.get_many(["a"], "v", "m")  # a: used most recently and most often
+            time.sleep(0.002)
+            store.put_many([("c", _review("c"))], "v", "m")
+            kept = store.get_many(["a", "b", "c"], "v", "m")
+            self.assertEqual(len(kept), 2, policy)
+            self.assertIn(expected_kept, kept, policy)
+            self.assertEqual(store.stats()["evicted"], 1)
+        with self.assertRaises(ValueError):
+            ReviewStore(":memory:", eviction="random")
+
+    def test_row_count_is_tracked_without_counting_the_table(self):
+        store = ReviewStore(":memory:", max_entries=3)
+        statements = []
+        store._db().set_trace_callback(statements.append)
+        store.put_many([("a", _review("a")), ("b", _review("b")), ("a", _review("a"))], "v", "m")
+        store.put_many([("a", _review("a")), ("c", _review("c"))], "v", "m")  # a replaced in place
+        store.put_many([("d", _review("d")), ("e", _review("e"))], "v", "m")
+        store.invalidate(model="m", prompt_version="other")
+        full_counts = [q for q in statements if q.startswith("SELECT COUNT(*) FROM review_results") and "WHERE" not in q]
+        self.assertEqual(full_counts, [])
+        self.assertEqual((store._rows, store.stats()["entries"], store.stats()["evicted"]), (3, 3, 2))
+
+    def test_default_path_is_outside_the_source_tree(self):
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        self.assertFalse(os.path.abspath(ReviewStore().path).startswith(root + os.sep))
+
+    def test_expired_rows_are_not_served(self):
+        store = ReviewStore(":memory:", ttl_days=1)
+        store.put_many([("a", _review("a"))], "v", "m")
+        store._db().execute("UPDATE review_results SET created_at = created_at - 2 * 86400")
+        self.assertEqual(store.get_many(["a"], "v", "m"), {})
+
+    def test_match_reviews_pairs_by_overlap(self):
+        returned = [_review("Camera is sharp but night mode makes everything green"),
+                    _review("Battery drains overnight even with every app closed"),
+                    _review("Totally unrelated remark about shipping")]
+        pairs = match_reviews([BATTERY, CAMERA], returned)
+        self.assertEqual({seg: r["text"][:6] for seg, r in pairs}, {BATTERY: "Batter", CAMERA: "Camera"})
+
+    def test_residual_keeps_layout(self):
+        self.assertEqual(residual_text(f"{BATTERY}\n\n{LOGIN}\n\n{CAMERA}", [LOGIN]), f"{BATTERY}\n\n{CAMERA}")
+        self.assertEqual(residual_text(f"{BATTERY}\n{LOGIN}\n{CAMERA}", [BATTERY]), f"{LOGIN}\n{CAMERA}")
+
+    def test_stored_result_shape(self):
+        result = stored_result([_review(BATTERY, pains=["battery"]), _review(LOGIN, pains=["login"])])
+        self.assertEqual(result["analysis"]["sentiment"], "Negative")
+        self.assertEqual(result["analysis"]["pain_points"], ["battery", "login"])
+
+
+class TestStoredAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeGeminiServer(FakeGeminiConfig(canned=[
+            _compact((BATTERY, "N", "battery"), (LOGIN, "N", "login")),
+            _compact((CAMERA, "M", "night mode")),
+        ])).start()
+        self.client = GeminiREST(api_key="fake", base_url=self.server.base_url)
+        self.client.review_store = ReviewStore(":memory:")
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_only_unseen_reviews_are_sent(self):
+        first = self.client.analyze_review(text=f"{BATTERY}\n\n{LOGIN}")
+        self.assertEqual(first["review_store"], {"hits": 0, "misses": 2})
+        self.assertEqual(self.client.review_store.stats()["entries"], 2)
+
+        second = self.client.analyze_review(text=f"{LOGIN.upper()}\n\n{CAMERA}\n\n{BATTERY}")
+        self.assertEqual(second["review_store"], {"hits": 2, "misses": 1})
+        self.assertEqual(self.server.stats()["requests"], 2)
+        texts = [r["text"] for r in second["analysis"]["rich_reviews"]]
+        self.assertEqual(texts, [LOGIN, BATTERY, CAMERA])  # stored (input order), then fresh
+
+        third = self.client.analyze_review(text=f"{CAMERA}\n\n{BATTERY}")
+        self.assertEqual(third["review_store"], {"hits": 2, "misses": 0})
+        self.assertEqual(self.server.stats()["requests"], 2)  # answered without a model call
+        self.assertEqual(third["analysis"]["sentiment"], "Mixed")
+
+    def test_multi_line_review_is_not_fragmented(self):
+        lines = ["Five stars", "The battery now lasts two full days.", "The update also fixed the login loop.",
+                 "Support answered within an hour.", "Would buy again."]
+        text = "\n".join(lines)
+        self.server.config.canned = [_compact((" ".join(lines), "P", "none"))]
+        first = self.client.analyze_review(text=text)
+        self.assertEqual(first["review_store"], {"hits": 0, "misses": 1})
+
+        second = self.client.analyze_review(text=text)
+        self.assertEqual(second["review_store"], {"hits": 1, "misses": 0})
+        self.assertEqual(self.server.stats()["requests"], 1)
+        self.assertEqual(len(second["analysis"]["rich_reviews"]), 1)
+
+    def test_prompt_change_invalidates(self):
+        self.client.analyze_review(text=f"{BATTERY}\n\n{LOGIN}")
+        compact_version = self.client.prompt_version
+        self.client.compact_schema = False
+        self.assertNotEqual(self.client.prompt_version, compact_version)
+        self.server.config.canned = [{"reviews": [_review(BATTERY)], "overall_summary": "v", "analysis": {}}]
+        result = self.client.analyze_review(text=f"{BATTERY}\n\n{LOGIN}")
+        self.assertEqual(result["review_store"]["hits"], 0)
+        self.assertEqual(self.server.stats()["requests"], 2)
+
+    def test_prompt_version_recorded_on_documents(self):
+        result = self.client.analyze_review(text=BATTERY)
+        doc = build_firestore_doc(result, "manual_text")
+        self.assertEqual(doc["metadata"]["prompt_version"], self.client.prompt_version)
+
+
+if __name__ == "__main__":
+    unittest.main()
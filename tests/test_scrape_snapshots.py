@@ -0,0 +1,142 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.gemini_rest import GeminiREST
+from services.scrape_snapshots import (SnapshotStore, _cut, build_snapshot, canonical_url, diff_page,
+                                      merge_reviews, page_boilerplate, snapshot_entries)
+from tests.fake_gemini_server import FakeGeminiConfig, FakeGeminiServer
+
+URL = "https://shop.example.com/phone-x/reviews/"
+TITLE = "Acme Phone X - customer reviews"
+BATTERY = "The battery drains overnight, even with every app closed."
+LOGIN = "Login fails every morning and I have to reset my password again."
+CAMERA = "Camera is sharp but the night mode makes everything green."
+CAMERA_EDIT = "Camera is sharp but the night mode makes everything look green. Update: fixed in 2.1!"
+SHIPPING = "Arrived two days late and the box was crushed on one side."
+
+
+def _compact(*items):
+    return {"r": [{"u": "u", "t": t, "s": s, "p": [p], "f": [], "a": "Fix"} for t, s, p in items],
+            "sum": f"Summary of {len(items)} review(s).", "o": {"s": "N", "p": [], "f": [], "a": "Ship fixes"}}
+
+
+class TestDiff(unittest.TestCase):
+    def test_canonical_url(self):
+        self.assertEqual(canonical_url("HTTPS://Shop.Example.com/phone-x/reviews/#top"),
+                         "https://shop.example.com/phone-x/reviews")
+
+    def test_diff_classifies_reviews(self):
+        page = "\n".join([TITLE, BATTERY, LOGIN, CAMERA])
+        reviews = [{"text": t} for t in (BATTERY, LOGIN, CAMERA)]
+        merged = merge_reviews(diff_page(None, page), reviews)
+        previous = build_snapshot(URL, snapshot_entries(page, merged), "v", "m", "",
+                                  page_boilerplate(page, reviews))
+        diff = diff_page(previous, "\n".join([TITLE, BATTERY.upper(), CAMERA_EDIT, SHIPPING]))
+        self.assertEqual([e["text"] for e in diff["unchanged"]], [BATTERY])
+        self.assertEqual(diff["residual"], f"{CAMERA_EDIT}\n{SHIPPING}")  # the title is known boilerplate
+
+        merged = merge_reviews(diff, [{"text": CAMERA_EDIT}, {"text": SHIPPING}])
+        self.assertEqual([r["text"] for r in merged["changed"]], [CAMERA_EDIT])
+        self.assertEqual([r["text"] for r in merged["new"]], [SHIPPING])
+        self.assertEqual([e["text"] for e in merged["removed"]], [LOGIN])
+
+    def test_short_reviews_are_not_cut_out_of_longer_ones(self):
+        page = "Battery life is not good enough, the goodies broke.\n\nGood"
+        self.assertEqual(_cut(page, ["Good"]), ("Battery life is not good enough, the goodies broke.\n\n\n", [True]))
+        self.assertEqual(_cut("Not great at all", ["great"]), ("Not great at all", [False]))
+        self.assertEqual(_cut("The screen is greatly improved", ["screen is great"])[1], [False])
+        rest, found = _cut("Title\nNot great!\nHelpful", ["not great"])
+        self.assertEqual((rest.split(), found), (["Title", "Helpful"], [True]))
+
+    def test_multi_line_reviews_are_found_across_lines(self):
+        review = "Great phone.\nThe battery lasts two days and the screen is bright."
+        page = "\n".join(["5.0 out of 5 stars", review, "Helpful", "Report"])
+        reviews = [{"text": review.replace("\n", " ")}]
+        self.assertEqual(diff_page(None, page)["residual"], page)
+        previous = build_snapshot(URL, snapshot_entries(page, merge_reviews(diff_page(None, page), reviews)),
+                                  "v", "m", "", page_boilerplate(page, reviews))
+        self.assertEqual(len(previous["boilerplate"]), 3)
+        diff = diff_page(previous, page)
+        self.assertEqual((len(diff["unchanged"]), diff["residual"]), (1, ""))
+
+
+class TestIncrementalScrape(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.server = FakeGeminiServer(FakeGeminiConfig(canned=[
+            _compact((BATTERY, "N", "battery"), (LOGIN, "N", "login"), (CAMERA, "M", "night mode")),
+            _compact((CAMERA_EDIT, "P", "night mode"), (SHIPPING, "N", "shipping")),
+        ])).start()
+        self.client = GeminiREST(api_key="fake", base_url=self.server.base_url)
+        self.client.review_store = None
+        self.client.snapshots = SnapshotStore(self.dir)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_rescrape_sends_only_new_and_changed_reviews(self):
+        first = self.client.analyze_scrape(URL, "\n".join([TITLE, BATTERY, LOGIN, CAMERA]))
+        self.assertEqual(first["scrape_diff"]["new"], 3)
+        self.assertEqual(len(first["analysis"]["rich_reviews"]), 3)
+        first_bytes = self.server.stats()["request_bytes"]
+
+        second = self.client.analyze_scrape(URL + "#reviews", "\n".join([TITLE, BATTERY, CAMERA_EDIT, SHIPPING]))
+        diff = second["scrape_diff"]
+        self.assertEqual((diff["new"], diff["changed"], diff["unchanged"], diff["removed"]), (1, 1, 1, 1))
+        self.assertEqual(self.server.stats()["requests"], 2)
+        self.assertLess(self.server.stats()["request_bytes"] - first_bytes, first_bytes)
+        self.assertEqual([r["text"] for r in second["analysis"]["rich_reviews"]], [BATTERY, CAMERA_EDIT, SHIPPING])
+        self.assertIn("1 new, 1 changed, 1 removed", second["analysis"]["overall_summary"])
+        self.assertEqual(second["analysis"]["top_level_advice"], "Ship fixes")
+
+        third = self.client.analyze_scrape(URL, "\n".join([TITLE, BATTERY, CAMERA_EDIT, SHIPPING]))
+        self.assertEqual(self.server.stats()["requests"], 2)  # nothing changed: no model call
+        self.assertEqual(third["scrape_diff"]["unchanged"], 3)
+        self.assertEqual(len(third["analysis"]["rich_reviews"]), 3)
+
+    def test_rescrape_sends_new_review_lines_only(self):
+        sent = []
+        analyze = self.client.analyze_content
+        self.client.analyze_content = lambda **kw: sent.append(kw["text_input"]) or analyze(**kw)
+        stars, helpful = "1.0 out of 5 stars", "Helpful"
+        login = "Login fails every morning.\nI have to reset my password again."
+        self.server.config.canned = [_compact((BATTERY, "N", "battery"), (login.replace("\n", " "), "N", "login")),
+                                     _compact((CAMERA, "M", "night mode"))]
+        self.client.analyze_scrape(URL, "\n".join([TITLE, stars, BATTERY, helpful, stars, login, helpful]))
+        self.client.analyze_scrape(URL, "\n".join([TITLE, stars, CAMERA, helpful, stars, BATTERY, helpful,
+                                                    stars, login, helpful]))
+        self.assertEqual(sent[1], CAMERA)  # no page chrome, no fragments of known reviews
+        again = self.client.analyze_scrape(URL, "\n".join([TITLE, stars, CAMERA, helpful, stars, BATTERY, helpful,
+                                                            stars, login, helpful]))
+        self.assertEqual(len(sent), 2)
+        self.assertEqual([r["text"][:5] for r in again["analysis"]["rich_reviews"]], ["Camer", "The b", "Login"])
+
+    def test_failed_rescrape_keeps_previous_baseline(self):
+        self.client.analyze_scrape(URL, "\n".join([BATTERY, LOGIN, CAMERA]))
+        self.server.config.rate_500 = 1.0
+        failed = self.client.analyze_scrape(URL, "\n".join([BATTERY, LOGIN, CAMERA, SHIPPING]))
+        self.assertEqual(len(failed["analysis"]["rich_reviews"]), 3)
+        self.assertIsNone(failed["error"])
+        self.server.config.rate_500 = 0.0
+        self.server.config.canned = [_compact((SHIPPING, "N", "shipping"))]
+        retry = self.client.analyze_scrape(URL, "\n".join([BATTERY, LOGIN, CAMERA, SHIPPING]))
+        self.assertEqual(retry["scrape_diff"]["new"], 1)
+
+    def test_prompt_change_starts_over(self):
+        self.client.analyze_scrape(URL, "\n".join([BATTERY, LOGIN, CAMERA]))
+        self.client.compact_schema = False
+        self.server.config.canned = [{"reviews": [], "overall_summary": "v", "analysis": {}}]
+        result = self.client.analyze_scrape(URL, "\n".join([BATTERY, LOGIN, CAMERA]))
+        self.assertIsNone(result["scrape_diff"]["previous_fetched_at"])
+        self.assertEqual(self.server.stats()["requests"], 2)  # the whole page again
+
+
+if __name__ == "__main__":
+    unittest.main()
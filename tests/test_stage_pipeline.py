@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import threading
+import unittest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.stage_pipeline import run_two_stage
+
+
+class TestStagePipeline(unittest.TestCase):
+    def test_results_keep_input_order(self):
+        out = run_two_stage(
+            list(range(10)),
+            lambda x: x * 2,
+            lambda x: x + 1,
+            first_workers=3,
+            second_workers=2,
+            queue_size=2,
+            stage_names=("vision", "analysis"),
+        )
+        self.assertEqual(out["results"], [x * 2 + 1 for x in range(10)])
+        self.assertEqual(out["stage_latency"]["vision"]["count"], 10)
+        self.assertEqual(out["stage_latency"]["analysis"]["count"], 10)
+
+    def test_stages_overlap(self):
+        """With one worker per stage, a 2-stage run should take ~ (n+1) steps, not 2n."""
+        n, step = 6, 0.05
+
+        def slow(x):
+            time.sleep(step)
+            return x
+
+        out = run_two_stage(list(range(n)), slow, slow, first_workers=1, second_workers=1, queue_size=1)
+        sequential_ms = 2 * n * step * 1000
+        self.assertLess(out["wall_ms"], sequential_ms * 0.8)
+
+    def test_errors_are_isolated_per_item(self):
+        def first(x):
+            if x == 2:
+                raise ValueError("bad image")
+            return x
+
+        out = run_two_stage([0, 1, 2, 3], first, lambda x: x, stage_names=("vision", "analysis"))
+        self.assertEqual(out["results"][2], {"error": "bad image", "stage": "vision"})
+        self.assertEqual(out["results"][3], 3)
+        self.assertEqual(out["stage_latency"]["vision"]["errors"], 1)
+
+    def test_bounded_queue_limits_concurrency(self):
+        active = {"now": 0, "peak": 0}
+        lock = threading.Lock()
+
+        def second(x):
+            with lock:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+            time.sleep(0.01)
+            with lock:
+                active["now"] -= 1
+            return x
+
+        run_two_stage(list(range(12)), lambda x: x, second, first_workers=4, second_workers=2, queue_size=1)
+        self.assertLessEqual(active["peak"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from workers import bigquery_real, firestore_real
+from workers.schema_validator import validate_review_doc
+from workers.stream_ingest import (StdinSource, StreamIngestor, TailSource, _default_writer, build_stream_doc,
+                                   parse_event)
+
+
+def _event(i, **extra):
+    return dict({"id": f"ticket-{i}", "text": f"Event {i}: the app logs me out every day.", "source": "web_form",
+                 "created_at": "2026-10-19T08:00:00Z", "metadata": {"region": "eu"}}, **extra)
+
+
+def _ndjson(events):
+    return "".join(json.dumps(e) + "\n" for e in events)
+
+
+def _analyze(text):
+    return {"input_text": text, "extracted_text": text, "model": "gemini-2.5-flash (real)", "prompt_version": "c-1",
+            "processing_latency_ms": 5,
+            "analysis": {"sentiment": "Negative", "score": -0.5, "themes": ["login"], "intent": "complaint",
+                         "confidence": 0.8,
+                         "rich_reviews": [{"text": text, "metadata": {"rating": 1},
+                                           "analysis": {"sentiment": "Negative"}}]}}
+
+
+class _Writer:
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, docs):
+        self.release.wait(5)
+        self.batches.append(docs)
+
+
+class _AckingSource(StdinSource):
+    """Stdin-like source with ack tokens, like Pub/Sub."""
+
+    def __init__(self, events):
+        super().__init__(io.StringIO(_ndjson(events)))
+        self.acked, self.nacked = [], []
+
+    def __iter__(self):
+        for i, (line, _, published) in enumerate(super().__iter__()):
+            yield line, f"ack-{i}", published
+
+    def ack(self, tokens):
+        self.acked.extend(tokens)
+
+    def nack(self, tokens):
+        self.nacked.extend(tokens)
+
+
+class TestEvents(unittest.TestCase):
+    def test_parse_event(self):
+        self.assertEqual(parse_event(b'{"text": "hi"}')["text"], "hi")
+        for bad in ("not json", "[1, 2]", '{"text": "  "}', '{"id": 1}'):
+            with self.assertRaises(ValueError):
+                parse_event(bad)
+
+    def test_stream_doc(self):
+        doc = build_stream_doc(_event(1, source="fax", user_id_hash="u1"), _analyze("Event 1"))
+        self.assertEqual(validate_review_doc(doc), (True, []))
+        self.assertEqual(doc["review_id"], build_stream_doc(_event(1), _analyze("x"))["review_id"])
+        self.assertEqual((doc["source"], doc["user_id_hash"]), ("other", "u1"))
+        self.assertEqual(doc["created_at"], "2026-10-19T08:00:00+00:00")
+        self.assertEqual(doc["metadata"]["region"], "eu")
+        self.assertEqual((doc["metadata"]["upload_method"], doc["metadata"]["event_id"]), ("stream", "ticket-1"))
+
+
+class TestStreamIngestor(unittest.TestCase):
+    def test_micro_batches_by_count(self):
+        writer = _Writer()
+        lines = _ndjson([_event(i) for i in range(7)]) + "garbage\n"
+        ingestor = StreamIngestor(StdinSource(io.StringIO(lines)), _analyze, writer, batch_size=3,
+                                  max_latency_s=5, concurrency=2)
+        stats = ingestor.run()
+        self.assertEqual([len(b) for b in writer.batches], [3, 3, 1])
+        self.assertEqual((stats["written"], stats["invalid"], stats["batches"]), (7, 1, 3))
+        self.assertGreater(stats["lag_s"], 0)
+        self.assertGreater(stats["throughput_per_s"], 0)
+
+    def test_partial_batch_flushed_after_latency(self):
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, "events.ndjson")
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(_ndjson([_event(0)]))  # before the consumer starts: skipped (tail starts at the end)
+        writer = _Writer()
+        ingestor = StreamIngestor(TailSource(path, poll_s=0.01), _analyze, writer, batch_size=100,
+                                  max_latency_s=0.1)
+        runner = threading.Thread(target=ingestor.run)
+        runner.start()
+        try:
+            time.sleep(0.1)
+            with open(path, "a", encoding="utf-8") as fh:
+                fh.write(_ndjson([_event(1), _event(2)]))
+                fh.write(json.dumps(_event(3))[:20])  # incomplete line: waits for its newline
+            deadline = time.time() + 5
+            while not writer.batches and time.time() < deadline:
+                time.sleep(0.01)
+            with open(path, "w", encoding="utf-8") as fh:  # truncated: read again from the top
+                fh.write(_ndjson([_event(4)]))
+            while len(writer.batches) < 2 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            ingestor.stop()
+            runner.join(5)
+            shutil.rmtree(tmp, ignore_errors=True)
+        ids = [[d["metadata"]["event_id"] for d in batch] for batch in writer.batches]
+        self.assertEqual(ids, [["ticket-1", "ticket-2"], ["ticket-4"]])
+        self.assertFalse(runner.is_alive())
+
+    def test_backpressure_pauses_the_reader(self):
+        writer = _Writer()
+        writer.release.clear()
+        source = _AckingSource([_event(i) for i in range(10)])
+        ingestor = StreamIngestor(source, _analyze, writer, batch_size=1, max_latency_s=0, queue_size=2)
+        runner = threading.Thread(target=ingestor.run)
+        runner.start()
+        try:
+            time.sleep(0.2)
+            # One batch held by the writer, two queued, one waiting to be queued: the reader stops there
+            self.assertEqual(ingestor.get_stats()["received"], 4)
+            self.assertGreaterEqual(ingestor.get_stats()["pauses"], 1)
+        finally:
+            writer.release.set()
+            runner.join(5)
+        stats = ingestor.get_stats()
+        self.assertEqual(stats["written"], 10)
+        self.assertGreater(stats["paused_s"], 0.1)
+        self.assertEqual(len(source.acked), 10)
+
+    def test_failures_are_nacked(self):
+        def analyze(text):
+            if text.startswith("Event 1:"):
+                raise TimeoutError("deadline exceeded")
+            return _analyze(text)
+
+        source = _AckingSource([_event(i) for i in range(3)])
+        stats = StreamIngestor(source, analyze, _Writer(), batch_size=3).run()
+        self.assertEqual((stats["written"], stats["failed"]), (2, 1))
+        self.assertEqual((source.acked, source.nacked), (["ack-0", "ack-2"], ["ack-1"]))
+
+        def broken_write(docs):
+            raise RuntimeError("Firestore write failed")
+
+        source = _AckingSource([_event(i) for i in range(3)])
+        stats = StreamIngestor(source, _analyze, broken_write, batch_size=3).run()
+        self.assertEqual((stats["written"], stats["failed"], len(source.nacked)), (0, 3, 3))
+
+    def test_default_writer_test_mode(self):
+        tmp = tempfile.mkdtemp()
+        originals = firestore_real.LOCAL_DIR, bigquery_real.LOCAL_BQ_DIR
+        firestore_real.LOCAL_DIR = bigquery_real.LOCAL_BQ_DIR = tmp
+        try:
+            docs = [build_stream_doc(_event(i), _analyze(f"Event {i}")) for i in range(3)]
+            _default_writer(test_mode=True)(docs)
+            names = sorted(os.listdir(tmp))
+            with open(os.path.join(tmp, next(n for n in names if n.startswith("bqbatch-"))), encoding="utf-8") as fh:
+                rows = [json.loads(line) for line in fh]
+        finally:
+            firestore_real.LOCAL_DIR, bigquery_real.LOCAL_BQ_DIR = originals
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.assertEqual(sum(n.startswith("fsreal-") for n in names), 3)
+        self.assertEqual(sum(n.startswith("bqfacts-") for n in names), 1)
+        self.assertEqual([r["review_id"] for r in rows], [d["review_id"] for d in docs])
+
+
+@unittest.skipUnless(os.getenv("PUBSUB_EMULATOR_HOST"), "PUBSUB_EMULATOR_HOST not set")
+class TestPubSubEmulator(unittest.TestCase):
+    def test_pull_and_ack(self):
+        from google.cloud import pubsub_v1
+        from workers.stream_ingest import PubSubSource
+
+        project = os.getenv("GOOGLE_CLOUD_PROJECT", "demo-project")
+        suffix = os.urandom(4).hex()
+        publisher, subscriber = pubsub_v1.PublisherClient(), pubsub_v1.SubscriberClient()
+        topic = publisher.create_topic(name=publisher.topic_path(project, f"reviews-{suffix}")).name
+        subscription = subscriber.create_subscription(
+            name=subscriber.subscription_path(project, f"reviews-{suffix}"), topic=topic).name
+        for i in range(5):
+            publisher.publish(topic, json.dumps(_event(i)).encode("utf-8")).result()
+
+        writer = _Writer()
+        ingestor = StreamIngestor(PubSubSource(subscription, pull_timeout_s=1), _analyze, writer,
+                                  batch_size=5, max_latency_s=0.5)
+        runner = threading.Thread(target=ingestor.run)
+        runner.start()
+        deadline = time.time() + 20
+        while ingestor.get_stats()["written"] < 5 and time.time() < deadline:
+            time.sleep(0.1)
+        ingestor.stop()
+        runner.join(10)
+        self.assertEqual(ingestor.get_stats()["written"], 5)
+        subscriber.delete_subscription(subscription=subscription)
+        publisher.delete_topic(topic=topic)
+
+
+if __name__ == "__main__":
+    unittest.main()
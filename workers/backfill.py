@@ -0,0 +1,346 @@
+# workers/backfill.py
+"""
+Backfill: re-analyze stored review documents after a prompt or model change.
+
+Documents are read page by page from the review collection (the sources in
+workers/firestore_export.py), selected by model and/or prompt version, and their
+raw_text (the submitted text), or for screenshots the images stored in the object store
+(workers/object_store.py), is analysed again under a request rate limit and a
+concurrency cap. Each result
+is written as a NEW document next to the original (review_id "<original>-bf-<version>",
+metadata.backfill_of = original id), so old and new scores can be compared and the
+originals stay untouched. Progress is checkpointed after every page; running the same
+backfill again with the same checkpoint continues after the last finished page.
+
+Usage:
+    from workers.backfill import Backfill
+    from workers.firestore_export import FirestoreSource
+
+    job = Backfill(FirestoreSource(), {"stale": True}, checkpoint_path="backfills/prompt-c-1a2b.json")
+    print(job.estimate())      # documents, reviews, tokens, cost_usd, duration_s: check before launching
+    job.run()                  # {"selected", "written", "failed", ...}
+
+    python -m workers.backfill --stale                          # estimate only
+    python -m workers.backfill --model "gemini-2.5-pro (real)" --rate 5 --concurrency 8 --yes
+    python -m workers.backfill --prompt-version c-0123456789ab --source local --yes
+
+Selection (all given conditions must hold):
+    model            doc["model"] equals this label
+    prompt_version   doc["metadata"]["prompt_version"] equals this version
+    stale            prompt_version differs from the current one (services/gemini_rest.py)
+    degraded         only documents the offline engine flagged needs_llm_rescore
+
+Config:
+    BACKFILL_RATE_PER_S               analysis requests started per second (default 2)
+    BACKFILL_CONCURRENCY              analyses in flight (default 4)
+    BACKFILL_PAGE_SIZE                documents read per page / checkpoint (default 200)
+    BACKFILL_CHECKPOINT_DIR           default checkpoint location (examples/backfills)
+    GEMINI_PRICE_INPUT_PER_1M         USD per 1M input tokens for the estimate (default 0.30)
+    GEMINI_PRICE_OUTPUT_PER_1M        USD per 1M output tokens for the estimate (default 2.50)
+    BACKFILL_OUTPUT_TOKENS_PER_REVIEW estimated output tokens per extracted review (default 90)
+    BACKFILL_EST_LATENCY_S            estimated seconds per analysis call (default 8)
+
+Notes:
+- Results that failed or fell back to the offline engine are recorded in the checkpoint
+  ("failed") and not written; re-run with a new checkpoint to retry them.
+- Documents written by the running backfill are never selected again by it.
+- Selection is evaluated client-side while paging, so the whole collection is read once.
+- Documents whose raw_text is empty or only the "Content processed by Gemini" placeholder
+  (saved before the submitted text was kept) are re-analysed from their stored screenshots
+  (metadata.image_uris / image_gcs_path); without either they are never selected.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from prompts.prompts import build_compact_review_prompt
+from services.local_engine import split_reviews
+from services.metrics import inc
+from workers.doc_builder import build_firestore_doc
+from workers.schema_validator import validate_review_doc
+
+BACKFILL_RATE_PER_S = float(os.getenv("BACKFILL_RATE_PER_S", "2"))
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "4"))
+BACKFILL_PAGE_SIZE = int(os.getenv("BACKFILL_PAGE_SIZE", "200"))
+BACKFILL_CHECKPOINT_DIR = os.getenv("BACKFILL_CHECKPOINT_DIR") or os.path.join(os.getcwd(), "examples", "backfills")
+GEMINI_PRICE_INPUT_PER_1M = float(os.getenv("GEMINI_PRICE_INPUT_PER_1M", "0.30"))
+GEMINI_PRICE_OUTPUT_PER_1M = float(os.getenv("GEMINI_PRICE_OUTPUT_PER_1M", "2.50"))
+BACKFILL_OUTPUT_TOKENS_PER_REVIEW = int(os.getenv("BACKFILL_OUTPUT_TOKENS_PER_REVIEW", "90"))
+BACKFILL_EST_LATENCY_S = float(os.getenv("BACKFILL_EST_LATENCY_S", "8"))
+
+# Rough text-to-token ratio for English review text
+CHARS_PER_TOKEN = 4
+
+# Input tokens Gemini bills per image
+IMAGE_TOKENS = 258
+
+# What documents saved before raw_text kept the submitted text hold instead of it
+# (services/gemini_rest.py build_review_response); nothing to re-analyze there
+PLACEHOLDER_TEXTS = {"Content processed by Gemini"}
+
+
+class RateLimiter:
+    """Spaces acquire() calls at least 1/rate seconds apart, across threads (rate <= 0: no limit)."""
+
+    def __init__(self, rate_per_s: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.interval = 1.0 / rate_per_s if rate_per_s > 0 else 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def acquire(self):
+        with self._lock:
+            now = self._clock()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            self._sleep(start - now)
+
+
+def selector_label(selector: Dict[str, Any]) -> str:
+    parts = [f"{k}={v}" for k, v in sorted(selector.items()) if v not in (None, False)]
+    return ",".join(parts) or "all"
+
+
+def source_text(doc: Dict[str, Any]) -> str:
+    """The submitted text of `doc`, or "" when it has none (placeholder or screenshots)."""
+    text = (doc.get("raw_text") or "").strip()
+    return "" if text in PLACEHOLDER_TEXTS else text
+
+
+def image_uris(doc: Dict[str, Any]) -> List[str]:
+    """gs:// URIs of the screenshots stored for `doc` (workers/doc_builder.py)."""
+    uris = (doc.get("metadata") or {}).get("image_uris")
+    if uris:
+        return list(uris)
+    return [doc["image_gcs_path"]] if doc.get("image_gcs_path") else []
+
+
+def is_selected(doc: Dict[str, Any], selector: Dict[str, Any], run_id: Optional[str] = None) -> bool:
+    """Does `doc` match the selector (see module docstring)? Docs written by run_id never do."""
+    meta = doc.get("metadata") or {}
+    if not source_text(doc) and not image_uris(doc):
+        return False
+    if run_id and meta.get("backfill_run") == run_id:
+        return False
+    if selector.get("model") and doc.get("model") != selector["model"]:
+        return False
+    if selector.get("prompt_version") and meta.get("prompt_version") != selector["prompt_version"]:
+        return False
+    if selector.get("stale") and meta.get("prompt_version") == selector.get("current_version"):
+        return False
+    if selector.get("degraded") and not meta.get("needs_llm_rescore"):
+        return False
+    return True
+
+
+def build_backfill_doc(original: Dict[str, Any], result: Dict[str, Any], run_id: str) -> Dict[str, Any]:
+    """The new-version document for `original`, from an analyze_text()-shaped result."""
+    doc = build_firestore_doc(result, original.get("source") or "other")
+    version = f"{result.get('prompt_version') or ''}|{result.get('model') or ''}"
+    doc["review_id"] = f"{original.get('review_id')}-bf-{hashlib.sha256(version.encode('utf-8')).hexdigest()[:8]}"
+    # The feedback itself is unchanged: keep when and how it arrived
+    for field in ("created_at", "user_id_hash", "image_gcs_path", "language"):
+        if original.get(field) is not None:
+            doc[field] = original[field]
+    doc["raw_text"] = original.get("raw_text")
+    if image_uris(original):
+        doc["metadata"]["image_uris"] = image_uris(original)
+    doc["metadata"].update(upload_method="backfill", backfill_of=original.get("review_id"), backfill_run=run_id)
+    return doc
+
+
+def _default_analyze(test_mode: bool) -> Callable[[str], Dict[str, Any]]:
+    from services.gemini_client import analyze_text
+    return lambda text: analyze_text(text, test_mode=test_mode)
+
+
+def _default_analyze_images(test_mode: bool) -> Callable[[List[str]], Dict[str, Any]]:
+    from services.gemini_client import analyze_image
+    from workers.object_store import load_image
+    return lambda uris: analyze_image([load_image(uri, test_mode=test_mode) for uri in uris], test_mode=test_mode)
+
+
+def _default_writer(test_mode: bool) -> Callable[[Dict[str, Any]], None]:
+    # Firestore document + BigQuery run row + fact rows, like the app's save buttons
+    if test_mode:
+        from workers.bigquery_store import insert_review_facts_to_bigquery, insert_review_to_bigquery
+    else:
+        from workers.bigquery_real import insert_review_facts_to_bigquery, insert_review_to_bigquery
+    from workers.bq_mapper import map_doc_to_bq_row, map_doc_to_review_fact_rows
+    from workers.firestore_real import save_review_to_firestore
+
+    def write(doc: Dict[str, Any]):
+        outcomes = [("Firestore", save_review_to_firestore(doc, test_mode=test_mode)),
+                    ("BigQuery", insert_review_to_bigquery(map_doc_to_bq_row(doc), test_mode=test_mode))]
+        facts = map_doc_to_review_fact_rows(doc)
+        if facts:
+            outcomes.append(("BigQuery facts", insert_review_facts_to_bigquery(facts, test_mode=test_mode)))
+        for target, outcome in outcomes:
+            if outcome.get("status") == "error":
+                raise RuntimeError(f"{target} write failed: {outcome.get('exception') or outcome.get('errors')}")
+    return write
+
+
+class Backfill:
+    def __init__(self, source, selector: Dict[str, Any], analyze: Callable[[str], Dict[str, Any]] = None,
+                 write: Callable[[Dict[str, Any]], None] = None, checkpoint_path: Optional[str] = None,
+                 rate_per_s: float = BACKFILL_RATE_PER_S, concurrency: int = BACKFILL_CONCURRENCY,
+                 page_size: int = BACKFILL_PAGE_SIZE, test_mode: bool = False,
+                 analyze_images: Callable[[List[str]], Dict[str, Any]] = None):
+        self.source = source
+        self.selector = dict(selector)
+        if self.selector.get("stale") and not self.selector.get("current_version"):
+            from services.gemini_rest import prompt_version
+            self.selector["current_version"] = prompt_version()
+        self.analyze = analyze or _default_analyze(test_mode)
+        self.analyze_images = analyze_images or _default_analyze_images(test_mode)
+        self.write = write or _default_writer(test_mode)
+        self.run_id = hashlib.sha256(selector_label(self.selector).encode("utf-8")).hexdigest()[:10]
+        self.checkpoint_path = checkpoint_path or os.path.join(BACKFILL_CHECKPOINT_DIR, f"backfill-{self.run_id}.json")
+        self.limiter = RateLimiter(rate_per_s)
+        self.rate_per_s = rate_per_s
+        self.concurrency = max(1, concurrency)
+        self.page_size = page_size
+
+    def _pages(self, after: Optional[str] = None):
+        while True:
+            page = self.source.page((None, None), after, self.page_size)
+            if page:
+                yield page
+                after = page[-1][0]
+            if len(page) < self.page_size:
+                return
+
+    def estimate(self) -> Dict[str, Any]:
+        """Scan the selection (no model calls): volume, token and cost estimate, expected duration."""
+        docs = reviews = chars = images = 0
+        for page in self._pages():
+            for _, doc in page:
+                if is_selected(doc, self.selector, self.run_id):
+                    text = source_text(doc)
+                    docs += 1
+                    chars += len(text)
+                    images += 0 if text else len(image_uris(doc))
+                    reviews += max(1, len(split_reviews(text)))
+        prompt_tokens = len(build_compact_review_prompt()) // CHARS_PER_TOKEN
+        input_tokens = docs * prompt_tokens + chars // CHARS_PER_TOKEN + images * IMAGE_TOKENS
+        output_tokens = reviews * BACKFILL_OUTPUT_TOKENS_PER_REVIEW
+        cost = (input_tokens * GEMINI_PRICE_INPUT_PER_1M + output_tokens * GEMINI_PRICE_OUTPUT_PER_1M) / 1e6
+        # Whichever binds: the request rate or the concurrency cap at the typical call latency
+        by_rate = docs / self.rate_per_s if self.rate_per_s > 0 else 0.0
+        by_concurrency = docs * BACKFILL_EST_LATENCY_S / self.concurrency
+        return {
+            "selector": selector_label(self.selector),
+            "documents": docs,
+            "reviews": reviews,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": round(cost, 4),
+            "duration_s": round(max(by_rate, by_concurrency), 1),
+            "rate_per_s": self.rate_per_s,
+            "concurrency": self.concurrency,
+        }
+
+    def _load_state(self) -> Dict[str, Any]:
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r", encoding="utf-8") as fh:
+                state = json.load(fh)
+            print(f"↩️ Resuming backfill {state['run_id']} after {state['last']!r}")
+            return state
+        return {"run_id": self.run_id, "selector": self.selector, "started_at": datetime.now().astimezone().isoformat(),
+                "last": None, "scanned": 0, "selected": 0, "written": 0, "failed": [], "complete": False}
+
+    def _save_state(self, state: Dict[str, Any]):
+        os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint_path)), exist_ok=True)
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(state, fh, indent=2)
+        os.replace(tmp, self.checkpoint_path)
+
+    def _process(self, item: Tuple[str, Dict[str, Any]]) -> Optional[str]:
+        """Re-analyze one document and write its new version; the error message, or None."""
+        _, original = item
+        self.limiter.acquire()
+        try:
+            text = source_text(original)
+            result = self.analyze(text) if text else self.analyze_images(image_uris(original))
+            if result.get("error") or result.get("needs_llm_rescore"):
+                return result.get("error") or f"offline engine ({result.get('degraded_reason')})"
+            doc = build_backfill_doc(original, result, self.run_id)
+            ok, errs = validate_review_doc(doc)
+            if not ok:
+                return f"schema: {errs}"
+            self.write(doc)
+        except Exception as e:
+            return str(e)
+        return None
+
+    def run(self) -> Dict[str, Any]:
+        state = self._load_state()
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="backfill") as pool:
+            for page in self._pages(state["last"]):
+                picked = [(key, doc) for key, doc in page if is_selected(doc, self.selector, self.run_id)]
+                for (key, doc), error in zip(picked, pool.map(self._process, picked)):
+                    if error:
+                        state["failed"].append({"key": key, "review_id": doc.get("review_id"), "error": error[:300]})
+                    inc("backfill_docs_total", outcome="failed" if error else "written")
+                state["scanned"] += len(page)
+                state["selected"] += len(picked)
+                state["written"] = state["selected"] - len(state["failed"])
+                state["last"] = page[-1][0]
+                self._save_state(state)
+        state["complete"] = True
+        state["finished_at"] = datetime.now().astimezone().isoformat()
+        self._save_state(state)
+        stats = {k: state[k] for k in ("run_id", "scanned", "selected", "written")}
+        stats.update(failed=len(state["failed"]), elapsed_s=round(time.perf_counter() - t0, 3),
+                     checkpoint=self.checkpoint_path)
+        return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    from workers.firestore_export import FirestoreSource, LocalSource
+
+    parser = argparse.ArgumentParser(description="Re-analyze stored reviews and write new versions side by side.")
+    parser.add_argument("--model", help="select documents analysed by this model label")
+    parser.add_argument("--prompt-version", help="select documents analysed with this prompt version")
+    parser.add_argument("--stale", action="store_true", help="select documents not on the current prompt version")
+    parser.add_argument("--degraded", action="store_true", help="only documents flagged needs_llm_rescore")
+    parser.add_argument("--source", choices=("firestore", "local"), default="firestore",
+                        help="local reads examples/fs_real_mock and writes the local mocks")
+    parser.add_argument("--rate", type=float, default=BACKFILL_RATE_PER_S)
+    parser.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY)
+    parser.add_argument("--checkpoint", help=f"checkpoint file (default under {BACKFILL_CHECKPOINT_DIR})")
+    parser.add_argument("--yes", action="store_true", help="launch after printing the estimate")
+    args = parser.parse_args()
+    if not (args.model or args.prompt_version or args.stale or args.degraded):
+        parser.error("give at least one of --model, --prompt-version, --stale, --degraded")
+
+    local = args.source == "local"
+    job = Backfill(LocalSource() if local else FirestoreSource(),
+                   {"model": args.model, "prompt_version": args.prompt_version, "stale": args.stale,
+                    "degraded": args.degraded},
+                   checkpoint_path=args.checkpoint, rate_per_s=args.rate, concurrency=args.concurrency,
+                   test_mode=local)
+    est = job.estimate()
+    print(f"🧮 {est['documents']} document(s), ~{est['reviews']} review(s) selected by {est['selector']}")
+    print(f"   ~{est['input_tokens']} input / ~{est['output_tokens']} output tokens ≈ ${est['cost_usd']}, "
+          f"~{est['duration_s'] / 60:.1f} min at {args.rate}/s x {args.concurrency}")
+    if not args.yes:
+        print("ℹ️ Estimate only; re-run with --yes to launch.")
+        sys.exit(0)
+    stats = job.run()
+    print(f"✅ Backfill {stats['run_id']}: {stats['written']} written, {stats['failed']} failed "
+          f"of {stats['selected']} selected ({stats['elapsed_s']} s); checkpoint {stats['checkpoint']}")
@@ -11,14 +11,26 @@ Usage:
     # real mode (requires google-cloud-bigquery and valid credentials)
     insert_review_to_bigquery(row, test_mode=False)
 
+    # per-review fact rows (workers/bq_mapper.map_doc_to_review_fact_rows)
+    insert_review_facts_to_bigquery(fact_rows, test_mode=False)
+
+    # several documents' rows in one streaming insert (workers/stream_ingest.py micro-batches)
+    insert_reviews_to_bigquery(rows, test_mode=False)
+
+    # batches: one load job for a whole frame (map_docs_to_bq_frame / map_docs_to_review_facts_frame)
+    load_frame_to_bigquery(frame, test_mode=False)
+
 Environment & config:
     - BQ_TABLE: required for real mode. Format: project.dataset.table
       e.g. my-project.my_dataset.consumer_reviews
+    - BQ_FACTS_TABLE: per-review fact table (infra/create_bigquery_review_facts_table.sql);
+      defaults to consumer_review_facts in the dataset of BQ_TABLE.
     - GOOGLE_APPLICATION_CREDENTIALS or Workload Identity (recommended) must provide
       authentication to BigQuery when test_mode=False.
 
 Install real dependency when switching to real mode:
     pip install google-cloud-bigquery
+    pip install pyarrow              # batch loads (Parquet)
 
 Notes on production:
     - For high throughput, use the Storage Write API or batch loads (GCS -> load job).
@@ -26,15 +38,35 @@ Notes on production:
     - Use Workload Identity on Cloud Run to avoid service account JSON keys.
 """
 
-import json
+import io
 import os
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, List
+
+import pandas as pd
+
+from services.metrics import timed
+from workers.bq_mapper import frame_to_bq_rows, to_arrow_table
+from workers.records import dumps
 
 # Local mock directory for test_mode (no GCP calls)
 LOCAL_BQ_DIR = os.path.join(os.getcwd(), "examples", "bq_real_mock")
 os.makedirs(LOCAL_BQ_DIR, exist_ok=True)
 
+# insert_rows_json request size
+INSERT_CHUNK_ROWS = 500
+
+
+def _table_id(facts: bool = False) -> str:
+    BQ_TABLE = os.getenv("BQ_TABLE")
+    if facts and os.getenv("BQ_FACTS_TABLE"):
+        return os.getenv("BQ_FACTS_TABLE")
+    if not BQ_TABLE:
+        raise RuntimeError("Environment variable BQ_TABLE is required in real mode (project.dataset.table).")
+    return f"{BQ_TABLE.rsplit('.', 1)[0]}.consumer_review_facts" if facts else BQ_TABLE
+
+
+@timed("bigquery_write")
 def insert_review_to_bigquery(row: Dict[str, Any], test_mode: bool = True) -> Dict[str, Any]:
     """
     Insert a row into BigQuery or save locally in test mode.
@@ -49,8 +81,8 @@ def insert_review_to_bigquery(row: Dict[str, Any], test_mode: bool = True) -> Di
     if test_mode:
         fname = f"bqreal-{uuid.uuid4().hex[:8]}.json"
         path = os.path.join(LOCAL_BQ_DIR, fname)
-        with open(path, "w", encoding="utf-8") as fh:
-            json.dump(row, fh, indent=2, ensure_ascii=False)
+        with open(path, "wb") as fh:
+            fh.write(dumps(row))
         return {"status": "mock_saved", "path": path}
 
     # ---------- Real BigQuery insertion ----------
@@ -82,3 +114,114 @@ def insert_review_to_bigquery(row: Dict[str, Any], test_mode: bool = True) -> Di
         # Catch and return exception message (caller can log or raise)
         return {"status": "error", "exception": str(exc)}
 
+
+def _insert_rows_json(table_id: str, rows: List[Dict[str, Any]], row_ids: List[str]) -> Dict[str, Any]:
+    try:
+        from google.cloud import bigquery
+    except Exception as e:
+        raise RuntimeError(
+            "google-cloud-bigquery is required for real BigQuery inserts. "
+            "Install with: pip install google-cloud-bigquery"
+        ) from e
+
+    client = bigquery.Client()
+    try:
+        errors = []
+        for i in range(0, len(rows), INSERT_CHUNK_ROWS):
+            # row_ids let BigQuery drop a re-sent row (best effort, about a minute)
+            errors.extend(client.insert_rows_json(table_id, rows[i:i + INSERT_CHUNK_ROWS],
+                                                  row_ids=row_ids[i:i + INSERT_CHUNK_ROWS]))
+        if errors:
+            return {"status": "error", "errors": errors}
+        return {"status": "ok", "inserted": len(rows)}
+    except Exception as exc:
+        return {"status": "error", "exception": str(exc)}
+
+
+@timed("bigquery_write")
+def insert_review_facts_to_bigquery(rows: List[Dict[str, Any]], test_mode: bool = True) -> Dict[str, Any]:
+    """
+    Insert per-review fact rows (map_doc_to_review_fact_rows, one or more documents) into
+    the fact table, or save them locally in test mode.
+    """
+    if test_mode:
+        path = os.path.join(LOCAL_BQ_DIR, f"bqfacts-{uuid.uuid4().hex[:8]}.json")
+        with open(path, "wb") as fh:
+            fh.write(dumps(rows))
+        return {"status": "mock_saved", "path": path, "rows": len(rows)}
+
+    if not rows:
+        return {"status": "ok", "inserted": 0}  # a document without extracted reviews
+    # review_id:review_index is stable per document, so a retried write is deduplicated
+    row_ids = [f"{row.get('review_id')}:{row.get('review_index')}" for row in rows]
+    return _insert_rows_json(_table_id(facts=True), rows, row_ids)
+
+
+@timed("bigquery_write")
+def insert_reviews_to_bigquery(rows: List[Dict[str, Any]], test_mode: bool = True) -> Dict[str, Any]:
+    """
+    Insert several review rows (map_doc_to_bq_row) with one streaming insert per
+    INSERT_CHUNK_ROWS rows. Test mode writes them as one NDJSON file.
+
+    Prefer this to load_frame_to_bigquery for small, frequent batches: load jobs are
+    limited per table per day, streaming inserts are not.
+    """
+    if test_mode:
+        path = os.path.join(LOCAL_BQ_DIR, f"bqbatch-{uuid.uuid4().hex[:8]}.ndjson")
+        with open(path, "wb") as fh:
+            for row in rows:
+                fh.write(dumps(row) + b"\n")
+        return {"status": "mock_saved", "path": path, "rows": len(rows)}
+
+    return _insert_rows_json(_table_id(), rows, [str(row.get("review_id")) for row in rows])
+
+
+@timed("bigquery_write")
+def load_frame_to_bigquery(frame: pd.DataFrame, test_mode: bool = True) -> Dict[str, Any]:
+    """
+    Append a batch of rows with a single load job: a map_docs_to_bq_frame frame goes to
+    BQ_TABLE, a map_docs_to_review_facts_frame frame to the fact table.
+
+    Test mode writes the rows as one NDJSON file in examples/bq_real_mock/. Real mode
+    sends the frame as Parquet with the table's column types, so arrays and structs
+    load without a schema round-trip (load jobs do not use the streaming-insert quota).
+    List inference is on: without it BigQuery reads a Parquet list column as a
+    RECORD<list ARRAY<RECORD<element>>> and the load into REPEATED columns fails.
+    """
+    if test_mode:
+        path = os.path.join(LOCAL_BQ_DIR, f"bqbatch-{uuid.uuid4().hex[:8]}.ndjson")
+        with open(path, "wb") as fh:
+            for row in frame_to_bq_rows(frame):
+                fh.write(dumps(row) + b"\n")
+        return {"status": "mock_saved", "path": path, "rows": len(frame)}
+
+    try:
+        from google.cloud import bigquery
+        import pyarrow.parquet as pq
+    except Exception as e:
+        raise RuntimeError(
+            "google-cloud-bigquery and pyarrow are required for batch loads. "
+            "Install with: pip install google-cloud-bigquery pyarrow"
+        ) from e
+
+    table_id = _table_id(facts="review_index" in frame.columns)
+    if frame.empty:
+        return {"status": "ok", "inserted": 0}
+
+    buf = io.BytesIO()
+    pq.write_table(to_arrow_table(frame), buf)
+    buf.seek(0)
+    client = bigquery.Client()
+    parquet_options = bigquery.ParquetOptions()
+    parquet_options.enable_list_inference = True
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        parquet_options=parquet_options,
+    )
+    try:
+        job = client.load_table_from_file(buf, table_id, job_config=job_config)
+        job.result()
+        return {"status": "ok", "inserted": job.output_rows, "job_id": job.job_id}
+    except Exception as exc:
+        return {"status": "error", "exception": str(exc)}
@@ -1,34 +1,81 @@
 # workers/bigquery_store.py
 """
-Local stub for BigQuery insertion.
-Later we will replace the stub with actual BigQuery client calls.
+Local stub for BigQuery insertion. With test_mode=False the calls are passed
+to workers/bigquery_real.py, which talks to BigQuery.
 
 Functions:
 - insert_review_to_bigquery(row: dict, test_mode=True)
+- insert_review_facts_to_bigquery(rows: list, test_mode=True)
+
+Rows saved in test mode are also appended to the local warehouse
+(workers/local_warehouse.py), so the analytics views have data to show.
 """
 
-import json
 import os
 import uuid
 from datetime import datetime, timezone
 
+from services.metrics import timed
+from workers.local_warehouse import LocalWarehouse
+from workers.records import dumps
+
+_warehouse = None
+
+
+def _mirror(table: str, rows: list):
+    # Best effort: the JSON file is the mock's record of the insert
+    global _warehouse
+    if _warehouse is None:
+        _warehouse = LocalWarehouse.from_env()
+    if _warehouse is None:
+        return
+    try:
+        _warehouse.insert_rows(table, rows)
+    except Exception as e:
+        print(f"⚠️ Local warehouse write failed: {e}")
+
+
 def insert_review_to_bigquery(row: dict, test_mode: bool = True):
     """
     In test_mode, simply save the row to local folder:
     examples/bq_mock/<uuid>.json
     This lets us simulate BigQuery insertion during development.
     """
-    if test_mode:
+    if not test_mode:
+        # Timed by bigquery_real itself
+        from workers.bigquery_real import insert_review_to_bigquery as insert_real
+        return insert_real(row, test_mode=False)
+
+    with timed("bigquery_write"):
         dirpath = os.path.join(os.getcwd(), "examples", "bq_mock")
         os.makedirs(dirpath, exist_ok=True)
 
         fname = f"bqrow-{uuid.uuid4().hex[:8]}.json"
         path = os.path.join(dirpath, fname)
 
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(row, f, indent=2, ensure_ascii=False)
+        with open(path, "wb") as f:
+            f.write(dumps(row))
+        _mirror("consumer_reviews", [row])
 
         return {"status": "mock_saved", "path": path}
 
-    # Actual BigQuery code will be added later
-    raise NotImplementedError("BigQuery real insert not implemented yet.")
+
+def insert_review_facts_to_bigquery(rows: list, test_mode: bool = True):
+    """
+    In test_mode, save the per-review fact rows of one document to
+    examples/bq_mock/bqfacts-<uuid>.json.
+    """
+    if not test_mode:
+        from workers.bigquery_real import insert_review_facts_to_bigquery as insert_real
+        return insert_real(rows, test_mode=False)
+
+    with timed("bigquery_write"):
+        dirpath = os.path.join(os.getcwd(), "examples", "bq_mock")
+        os.makedirs(dirpath, exist_ok=True)
+
+        path = os.path.join(dirpath, f"bqfacts-{uuid.uuid4().hex[:8]}.json")
+        with open(path, "wb") as f:
+            f.write(dumps(rows))
+        _mirror("consumer_review_facts", rows)
+
+        return {"status": "mock_saved", "path": path, "rows": len(rows)}
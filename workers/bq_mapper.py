@@ -1,6 +1,37 @@
 # workers/bq_mapper.py
-from datetime import datetime, timezone
-from typing import Dict, Any, List, Optional
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from services.review_store import text_hash
+from workers.records import Analysis, ReviewDoc, as_record
+
+# Stages recorded in doc["metadata"]["stage_timings_ms"] (see services/metrics.py). Validation
+# and the store writes run after the document is built, so they only reach the histograms.
+STAGE_TIMING_FIELDS = ("scrape", "image_decode", "model_wait", "json_parse")
+
+# Column order of infra/create_bigquery_table.sql
+BQ_COLUMNS = ("review_id", "text", "sentiment", "score", "themes", "action_items", "intent", "confidence",
+              "source", "model", "created_at", "processed_at", "processing_latency_ms", "image_gcs_path",
+              "metadata", "stage_timings_ms")
+METADATA_FIELDS = ("app_version", "region", "upload_method")
+_STRING_COLUMNS = ("review_id", "text", "sentiment", "intent", "source", "model", "image_gcs_path")
+_TIMESTAMP_COLUMNS = ("created_at", "processed_at")
+
+# Column order of infra/create_bigquery_review_facts_table.sql (one row per extracted review)
+REVIEW_FACT_COLUMNS = ("review_id", "review_index", "review_hash", "username", "rating", "rating_text",
+                       "review_date", "review_date_inferred", "text", "sentiment", "pain_points",
+                       "feature_requests", "actionable_advice", "source", "model", "prompt_version",
+                       "processed_at")
+
+def _stage_timings(metadata: Dict[str, Any]) -> Optional[Dict[str, Optional[int]]]:
+    timings = metadata.get("stage_timings_ms")
+    if not timings:
+        return None
+    return {k: int(timings[k]) if timings.get(k) is not None else None for k in STAGE_TIMING_FIELDS}
 
 def _ensure_ts(value: Optional[str]) -> Optional[str]:
     """
@@ -11,9 +42,9 @@ def _ensure_ts(value: Optional[str]) -> Optional[str]:
         return value
     return datetime.now(timezone.utc).isoformat()
 
-def map_doc_to_bq_row(doc: Dict[str, Any]) -> Dict[str, Any]:
+def map_doc_to_bq_row(doc: Union[Dict[str, Any], ReviewDoc]) -> Dict[str, Any]:
     """
-    Convert a Firestore-style document into a BigQuery row dict.
+    Convert a Firestore-style document (dict or ReviewDoc record) into a BigQuery row dict.
 
     Expected input (example fields):
       - review_id
@@ -24,33 +55,288 @@ def map_doc_to_bq_row(doc: Dict[str, Any]) -> Dict[str, Any]:
     Output schema keys (matching infra/create_bigquery_table.sql):
       review_id, text, sentiment, score, themes, action_items,
       intent, confidence, source, model, created_at, processed_at,
-      processing_latency_ms, metadata
+      processing_latency_ms, image_gcs_path, metadata, stage_timings_ms
     """
-    analysis = doc.get("analysis", {}) or {}
+    rec = as_record(ReviewDoc, doc)
+    analysis = as_record(Analysis, rec.get("analysis"))
+    meta = rec.get("metadata") or {}
 
     # normalize arrays
     themes = analysis.get("themes") or []
     action_items = analysis.get("action_items") or []
+    score, confidence, latency = analysis.get("score"), analysis.get("confidence"), rec.get("processing_latency_ms")
 
     row = {
-        "review_id": doc.get("review_id"),
-        "text": doc.get("extracted_text") or doc.get("raw_text") or "",
+        "review_id": rec.get("review_id"),
+        "text": rec.extracted_text or rec.raw_text or "",
         "sentiment": analysis.get("sentiment"),
-        "score": float(analysis.get("score")) if analysis.get("score") is not None else None,
+        "score": float(score) if score is not None else None,
         "themes": list(themes) if isinstance(themes, (list, tuple)) else [str(themes)],
         "action_items": list(action_items) if isinstance(action_items, (list, tuple)) else [str(action_items)] if action_items else [],
         "intent": analysis.get("intent"),
-        "confidence": float(analysis.get("confidence")) if analysis.get("confidence") is not None else None,
-        "source": doc.get("source"),
-        "model": doc.get("model"),
-        "created_at": _ensure_ts(doc.get("created_at")),
-        "processed_at": _ensure_ts(doc.get("processed_at")),
-        "processing_latency_ms": int(doc.get("processing_latency_ms")) if doc.get("processing_latency_ms") is not None else None,
+        "confidence": float(confidence) if confidence is not None else None,
+        "source": rec.get("source"),
+        "model": rec.get("model"),
+        "created_at": _ensure_ts(rec.get("created_at")),
+        "processed_at": _ensure_ts(rec.get("processed_at")),
+        "processing_latency_ms": int(latency) if latency is not None else None,
+        "image_gcs_path": rec.get("image_gcs_path"),
         "metadata": {
-            "app_version": (doc.get("metadata") or {}).get("app_version"),
-            "region": (doc.get("metadata") or {}).get("region"),
-            "upload_method": (doc.get("metadata") or {}).get("upload_method")
-        }
+            "app_version": meta.get("app_version"),
+            "region": meta.get("region"),
+            "upload_method": meta.get("upload_method")
+        },
+        "stage_timings_ms": _stage_timings(meta)
     }
 
     return row
+
+
+# ---------------- per-review fact rows ----------------
+_DATE_FORMATS = ("%B %d, %Y", "%b %d, %Y", "%d %B %Y", "%d %b %Y", "%m/%d/%Y", "%d.%m.%Y", "%Y/%m/%d")
+_RELATIVE_DATE = re.compile(r"\b(\d+|a|an|one)\s+(day|week|month|year)s?\s+ago\b")
+_RELATIVE_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+
+def parse_review_date(value: Any, reference: date) -> Optional[date]:
+    """
+    Review date as shown on the page ("2025-03-01", "March 3rd, 2025", "2 weeks ago"),
+    relative forms counted back from `reference`. None when unreadable.
+    """
+    text = str(value or "").strip()
+    if not text:
+        return None
+    try:
+        return date.fromisoformat(text[:10])
+    except ValueError:
+        pass
+    cleaned = re.sub(r"^(reviewed|posted)\s+(on\s+)?", "", text, flags=re.IGNORECASE)
+    cleaned = re.sub(r"(?<=\d)(st|nd|rd|th)\b", "", cleaned)
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(cleaned, fmt).date()
+        except ValueError:
+            continue
+    lower = text.lower()
+    if lower == "today":
+        return reference
+    if lower == "yesterday":
+        return reference - timedelta(days=1)
+    match = _RELATIVE_DATE.search(lower)
+    if match:
+        count = 1 if match.group(1) in ("a", "an", "one") else int(match.group(1))
+        return reference - timedelta(days=count * _RELATIVE_DAYS[match.group(2)])
+    return None
+
+
+def parse_rating(value: Any) -> Optional[int]:
+    """Whole stars on a 5-point scale from "4/5", "8 out of 10", "4.5 stars", "★★★★☆" or 4."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        score, scale = float(value), 5.0
+    else:
+        text = str(value)
+        if "★" in text:
+            return text.count("★")
+        match = re.search(r"(\d+(?:[.,]\d+)?)\s*(?:/|out of|of)\s*(\d+)", text)
+        if match:
+            score, scale = float(match.group(1).replace(",", ".")), float(match.group(2))
+        else:
+            match = re.search(r"\d+(?:[.,]\d+)?", text)
+            if not match:
+                return None
+            score, scale = float(match.group(0).replace(",", ".")), 5.0
+    if scale <= 0:
+        return None
+    score = score * 5 / scale
+    return int(score) if 0 <= score <= 5 else None
+
+
+def map_doc_to_review_fact_rows(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    One row per review in doc["analysis"]["rich_reviews"] for the child fact table
+    (review_id links back to the consumer_reviews row of the same run).
+
+    review_date is the date shown on the review; when it cannot be read, the
+    processing date is used and review_date_inferred is set, so every row lands
+    in a dated partition.
+    """
+    analysis = doc.get("analysis") or {}
+    reviews = analysis.get("rich_reviews") or []
+    if not reviews:
+        return []
+    metadata = doc.get("metadata") or {}
+    processed_at = _ensure_ts(doc.get("processed_at"))
+    processed_date = datetime.fromisoformat(processed_at).astimezone(timezone.utc).date()
+
+    rows = []
+    for index, review in enumerate(reviews):
+        meta = review.get("metadata") or {}
+        block = review.get("analysis") or {}
+        text = review.get("text") or ""
+        review_date = parse_review_date(meta.get("date"), processed_date)
+        rows.append({
+            "review_id": doc.get("review_id"),
+            "review_index": index,
+            "review_hash": text_hash(text),
+            "username": meta.get("username") or None,
+            "rating": parse_rating(meta.get("rating")),
+            "rating_text": str(meta["rating"]) if meta.get("rating") not in (None, "") else None,
+            "review_date": (review_date or processed_date).isoformat(),
+            "review_date_inferred": review_date is None,
+            "text": text,
+            "sentiment": block.get("sentiment"),
+            "pain_points": _str_list(block.get("pain_points")),
+            "feature_requests": _str_list(block.get("feature_requests")),
+            "actionable_advice": block.get("actionable_advice") or None,
+            "source": doc.get("source"),
+            "model": doc.get("model"),
+            "prompt_version": metadata.get("prompt_version"),
+            "processed_at": processed_at,
+        })
+    return rows
+
+
+# ---------------- batch (columnar) mapping ----------------
+def _str_list(value: Any) -> List[Any]:
+    # Same normalisation as the themes / action_items fields above
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [str(value)] if value else []
+
+
+def _floats(values: List[Any]) -> pd.arrays.FloatingArray:
+    return pd.array(pd.to_numeric(pd.Series(values, dtype=object)).to_numpy(dtype=float), dtype="Float64")
+
+
+def _ints(values: List[Any]) -> pd.arrays.IntegerArray:
+    # int() truncates toward zero; so does np.trunc
+    numbers = pd.to_numeric(pd.Series(values, dtype=object)).to_numpy(dtype=float)
+    return pd.array(np.trunc(numbers), dtype="Float64").astype("Int64")
+
+
+def map_docs_to_bq_frame(docs: Iterable[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Columnar counterpart of map_doc_to_bq_row for batches of documents.
+
+    Returns one DataFrame row per document, columns in BQ_COLUMNS order:
+      - STRING columns: pandas "string" dtype
+      - score / confidence: nullable Float64; processing_latency_ms: nullable Int64
+      - created_at / processed_at: UTC timestamps (missing values get one "now" per batch)
+      - themes / action_items: lists of strings; metadata / stage_timings_ms: dicts (or None)
+
+    Values are the ones map_doc_to_bq_row produces for each document; see to_arrow_table()
+    for Parquet / load-job output and frame_to_bq_rows() for insert_rows_json.
+    """
+    docs = docs if isinstance(docs, list) else list(docs)
+    now = datetime.now(timezone.utc).isoformat()
+    analyses = [doc.get("analysis") or {} for doc in docs]
+    metas = [doc.get("metadata") or {} for doc in docs]
+
+    columns: Dict[str, Any] = {
+        "review_id": [doc.get("review_id") for doc in docs],
+        "text": [doc.get("extracted_text") or doc.get("raw_text") or "" for doc in docs],
+        "sentiment": [a.get("sentiment") for a in analyses],
+        "score": _floats([a.get("score") for a in analyses]),
+        "themes": [_str_list(a.get("themes")) for a in analyses],
+        "action_items": [_str_list(a.get("action_items")) for a in analyses],
+        "intent": [a.get("intent") for a in analyses],
+        "confidence": _floats([a.get("confidence") for a in analyses]),
+        "source": [doc.get("source") for doc in docs],
+        "model": [doc.get("model") for doc in docs],
+        "created_at": [doc.get("created_at") or now for doc in docs],
+        "processed_at": [doc.get("processed_at") or now for doc in docs],
+        "processing_latency_ms": _ints([doc.get("processing_latency_ms") for doc in docs]),
+        "image_gcs_path": [doc.get("image_gcs_path") for doc in docs],
+        "metadata": [{k: m.get(k) for k in METADATA_FIELDS} for m in metas],
+        "stage_timings_ms": [_stage_timings(m) for m in metas],
+    }
+    for name in _STRING_COLUMNS:
+        columns[name] = pd.array(columns[name], dtype="string")
+    for name in _TIMESTAMP_COLUMNS:
+        columns[name] = pd.to_datetime(columns[name], utc=True, format="ISO8601").as_unit("us")
+    for name in ("themes", "action_items", "metadata", "stage_timings_ms"):
+        columns[name] = pd.Series(columns[name], dtype=object)
+    return pd.DataFrame(columns, columns=list(BQ_COLUMNS))
+
+
+def map_docs_to_review_facts_frame(docs: Iterable[Dict[str, Any]]) -> pd.DataFrame:
+    """Fact rows of a batch of documents as a typed DataFrame (REVIEW_FACT_COLUMNS order)."""
+    rows = [row for doc in docs for row in map_doc_to_review_fact_rows(doc)]
+    columns: Dict[str, Any] = {name: [row[name] for row in rows] for name in REVIEW_FACT_COLUMNS}
+    for name in ("review_id", "review_hash", "username", "rating_text", "text", "sentiment",
+                 "actionable_advice", "source", "model", "prompt_version"):
+        columns[name] = pd.array(columns[name], dtype="string")
+    for name in ("review_index", "rating"):
+        columns[name] = pd.array(columns[name], dtype="Int64")
+    columns["review_date_inferred"] = pd.array(columns["review_date_inferred"], dtype="boolean")
+    columns["review_date"] = pd.Series([date.fromisoformat(d) for d in columns["review_date"]], dtype=object)
+    columns["processed_at"] = pd.to_datetime(columns["processed_at"], utc=True, format="ISO8601").as_unit("us")
+    for name in ("pain_points", "feature_requests"):
+        columns[name] = pd.Series(columns[name], dtype=object)
+    return pd.DataFrame(columns, columns=list(REVIEW_FACT_COLUMNS))
+
+
+def frame_to_bq_rows(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    JSON-ready row dicts (insert_rows_json / NDJSON) from map_docs_to_bq_frame or
+    map_docs_to_review_facts_frame output.
+    """
+    names = list(frame.columns)
+    values = []
+    for name in names:
+        column = frame[name]
+        if isinstance(column.dtype, pd.DatetimeTZDtype):
+            values.append([None if pd.isna(ts) else ts.isoformat() for ts in column])
+        elif column.dtype == object:
+            values.append([v.isoformat() if isinstance(v, date) else v for v in column])
+        else:
+            values.append(column.to_numpy(dtype=object, na_value=None).tolist())
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def bq_arrow_schema():
+    """pyarrow schema equivalent to infra/create_bigquery_table.sql."""
+    try:
+        import pyarrow as pa
+    except Exception as e:
+        raise RuntimeError("pyarrow is required for Arrow / Parquet output. Install with: pip install pyarrow") from e
+    ts = pa.timestamp("us", tz="UTC")
+    return pa.schema([
+        ("review_id", pa.string()), ("text", pa.string()), ("sentiment", pa.string()),
+        ("score", pa.float64()), ("themes", pa.list_(pa.string())), ("action_items", pa.list_(pa.string())),
+        ("intent", pa.string()), ("confidence", pa.float64()), ("source", pa.string()), ("model", pa.string()),
+        ("created_at", ts), ("processed_at", ts), ("processing_latency_ms", pa.int64()),
+        ("image_gcs_path", pa.string()),
+        ("metadata", pa.struct([(k, pa.string()) for k in METADATA_FIELDS])),
+        ("stage_timings_ms", pa.struct([(k, pa.int64()) for k in STAGE_TIMING_FIELDS])),
+    ])
+
+
+def review_facts_arrow_schema():
+    """pyarrow schema equivalent to infra/create_bigquery_review_facts_table.sql."""
+    bq_arrow_schema()  # raises the install hint when pyarrow is missing
+    import pyarrow as pa
+
+    types = {"review_index": pa.int64(), "rating": pa.int64(), "review_date": pa.date32(),
+             "review_date_inferred": pa.bool_(), "pain_points": pa.list_(pa.string()),
+             "feature_requests": pa.list_(pa.string()), "processed_at": pa.timestamp("us", tz="UTC")}
+    return pa.schema([(name, types.get(name, pa.string())) for name in REVIEW_FACT_COLUMNS])
+
+
+def to_arrow_table(frame: pd.DataFrame):
+    """Arrow table with the BigQuery column types of either table (requires pyarrow)."""
+    schema = review_facts_arrow_schema() if "review_index" in frame.columns else bq_arrow_schema()
+    import pyarrow as pa
+
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+def write_parquet(frame: pd.DataFrame, path: str) -> str:
+    """Write the frame as a Parquet file for a BigQuery load job (requires pyarrow)."""
+    table = to_arrow_table(frame)
+    import pyarrow.parquet as pq
+
+    pq.write_table(table, path)
+    return path
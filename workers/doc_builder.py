@@ -0,0 +1,54 @@
+# workers/doc_builder.py
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Any
+
+from workers.records import Analysis, ReviewDoc, as_record
+
+
+def build_firestore_doc(gemini_result: Dict[str, Any], source_type: str) -> Dict[str, Any]:
+    """
+    Build the Firestore review document for one analysis result
+    (validated by workers/schema_validator.py, mapped by workers/bq_mapper.py).
+    Built as a ReviewDoc record (workers/records.py); the analysis may be a dict or an
+    Analysis record.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    review_id = f"local-{uuid.uuid4().hex[:8]}"
+    analysis = as_record(Analysis, gemini_result.get("analysis"))
+    extracted_text = gemini_result.get("extracted_text") or ""
+    # The submitted text when the result carries it (Gemini results only hold a placeholder
+    # in extracted_text); backfills re-analyze raw_text
+    raw_text = gemini_result.get("raw_text") or extracted_text
+    model = gemini_result.get("model", "mock")
+    image_uris = gemini_result.get("image_uris") or []
+    metadata = {"upload_method": "local_ui"}
+    if gemini_result.get("prompt_version"):
+        # Lets backfills select documents produced by an older prompt
+        metadata["prompt_version"] = gemini_result["prompt_version"]
+    if gemini_result.get("scrape_diff"):
+        metadata["scrape_diff"] = gemini_result["scrape_diff"]
+    if len(image_uris) > 1:
+        metadata["image_uris"] = image_uris
+    if gemini_result.get("stage_timings_ms"):
+        metadata["stage_timings_ms"] = gemini_result["stage_timings_ms"]
+    if gemini_result.get("needs_llm_rescore"):
+        # Produced by the offline engine; picked up later for Gemini re-scoring
+        metadata["needs_llm_rescore"] = True
+        metadata["degraded_reason"] = gemini_result.get("degraded_reason")
+    doc = ReviewDoc(
+        review_id=review_id,
+        source=source_type,
+        user_id_hash=None,
+        raw_text=raw_text,
+        extracted_text=extracted_text,
+        analysis=analysis,
+        image_gcs_path=image_uris[0] if image_uris else None,
+        language="en",
+        model=model,
+        processing_latency_ms=gemini_result.get("processing_latency_ms", None),
+        created_at=now,
+        processed_at=now,
+        metadata=metadata,
+    )
+    return doc.to_dict()
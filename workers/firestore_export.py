@@ -0,0 +1,261 @@
+# workers/firestore_export.py
+"""
+Parallel, resumable export of the Firestore review collection.
+
+The collection is split into key-range partitions (Firestore partition cursors), each
+partition is paged through with cursors on a worker thread, and every page is written
+straight to its own output file, so at most `workers x page_size` documents are in
+memory at once. A checkpoint records, per partition, the last exported document; an
+interrupted export started again with the same output directory continues from there.
+
+Usage:
+    from workers.firestore_export import FirestoreSource, LocalSource, export_collection
+
+    export_collection(FirestoreSource(), "exports/reviews", fmt="ndjson", partitions=16, workers=8)
+    export_collection(LocalSource(), "exports/mock", fmt="parquet")     # examples/fs_real_mock
+
+    python -m workers.firestore_export exports/reviews --format ndjson --partitions 16 --workers 8
+    python -m workers.firestore_export exports/mock --source local
+
+Output (in the output directory):
+    part-<partition>-<page>.ndjson.gz   one document per line (Firestore fields + "_path")
+    part-<partition>-<page>.parquet     consumer_reviews rows (workers/bq_mapper.py), ready for a load job
+    _checkpoint.json                    partition bounds and progress; "complete": true when done
+
+Config:
+    FIRESTORE_COLLECTION   collection to export (default consumer_reviews)
+    FIRESTORE_EMULATOR_HOST  honoured by google-cloud-firestore (export from the emulator)
+
+Notes:
+- Partitioning uses a collection-group query, so subcollections with the same id are
+  included. If the backend cannot partition, the export runs as one partition.
+- A page file is written to a temp name and renamed before the checkpoint moves past
+  it; a crash never leaves a half-written file that the checkpoint counts.
+- An export that starts over (resume=False / --restart, or no checkpoint) first deletes
+  the part-* files and checkpoint of an earlier export in the directory, so old pages
+  never mix into the new export.
+- Parquet output requires pyarrow.
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.metrics import inc
+
+FIRESTORE_COLLECTION = os.getenv("FIRESTORE_COLLECTION", "consumer_reviews")
+LOCAL_EXPORT_SOURCE = os.path.join(os.getcwd(), "examples", "fs_real_mock")
+
+FORMATS = ("ndjson", "parquet")
+CHECKPOINT_NAME = "_checkpoint.json"
+
+Bounds = Tuple[Optional[str], Optional[str]]
+Page = List[Tuple[str, Dict[str, Any]]]
+
+
+def _json_default(value: Any) -> Any:
+    # Firestore timestamps come back as datetime subclasses
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+# ---------------- sources ----------------
+class FirestoreSource:
+    """Documents of FIRESTORE_COLLECTION, keyed by their full document path."""
+
+    def __init__(self, collection: str = FIRESTORE_COLLECTION, client=None):
+        if client is None:
+            try:
+                from google.cloud import firestore
+            except Exception as e:
+                raise RuntimeError(
+                    "google-cloud-firestore is required to export from Firestore. "
+                    "Install with: pip install google-cloud-firestore"
+                ) from e
+            client = firestore.Client()
+        self.client = client
+        self.collection = collection
+
+    def partitions(self, count: int) -> List[Bounds]:
+        if count <= 1:
+            return [(None, None)]
+        try:
+            parts = list(self.client.collection_group(self.collection).get_partitions(count))
+        except Exception as e:
+            print(f"⚠️ Firestore partitioning unavailable ({e}); exporting as one partition")
+            return [(None, None)]
+        bounds = [(p.start_at.path if p.start_at else None, p.end_at.path if p.end_at else None) for p in parts]
+        return bounds or [(None, None)]
+
+    def page(self, bounds: Bounds, after: Optional[str], limit: int) -> Page:
+        from google.cloud.firestore_v1.base_query import QueryPartition
+
+        start, end = (self.client.document(p) if p else None for p in bounds)
+        query = QueryPartition(self.client.collection_group(self.collection), start, end).query()
+        if after:
+            query = query.start_after({"__name__": self.client.document(after)})
+        return [(snap.reference.path, snap.to_dict()) for snap in query.limit(limit).stream()]
+
+
+class LocalSource:
+    """The local mock collection (one JSON file per document, as written in test mode)."""
+
+    def __init__(self, directory: str = LOCAL_EXPORT_SOURCE):
+        self.directory = directory
+
+    def _keys(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+
+    def partitions(self, count: int) -> List[Bounds]:
+        keys = self._keys()
+        count = max(1, min(count, len(keys)))
+        splits = [keys[i * len(keys) // count] for i in range(1, count)]
+        return list(zip([None] + splits, splits + [None]))
+
+    def page(self, bounds: Bounds, after: Optional[str], limit: int) -> Page:
+        start, end = bounds
+        keys = [k for k in self._keys()
+                if (start is None or k >= start) and (end is None or k < end) and (after is None or k > after)]
+        out = []
+        for key in keys[:limit]:
+            with open(os.path.join(self.directory, key), "r", encoding="utf-8") as fh:
+                out.append((key, json.load(fh)))
+        return out
+
+
+# ---------------- output ----------------
+def _write_page(path: str, page: Page, fmt: str) -> int:
+    tmp = f"{path}.tmp"
+    if fmt == "ndjson":
+        with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+            for key, doc in page:
+                fh.write(json.dumps(dict(doc, _path=key), ensure_ascii=False, default=_json_default) + "\n")
+    else:
+        from workers.bq_mapper import map_docs_to_bq_frame, write_parquet
+        write_parquet(map_docs_to_bq_frame([doc for _, doc in page]), tmp)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+class _Checkpoint:
+    def __init__(self, path: str, state: Dict[str, Any]):
+        self.path = path
+        self.state = state
+        self._lock = threading.Lock()
+
+    def save(self):
+        # Called with self._lock held
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.state, fh, indent=2)
+        os.replace(tmp, self.path)
+
+    def update(self, index: int, **fields):
+        with self._lock:
+            self.state["partitions"][index].update(fields)
+            self.save()
+
+
+def _export_partition(source, checkpoint: _Checkpoint, index: int, out_dir: str, fmt: str, page_size: int):
+    part = dict(checkpoint.state["partitions"][index])
+    bounds = (part["start"], part["end"])
+    ext = "ndjson.gz" if fmt == "ndjson" else "parquet"
+    while not part["done"]:
+        page = source.page(bounds, part["last"], page_size)
+        if page:
+            name = f"part-{index:05d}-{part['files']:05d}.{ext}"
+            size = _write_page(os.path.join(out_dir, name), page, fmt)
+            part.update(last=page[-1][0], docs=part["docs"] + len(page), files=part["files"] + 1,
+                        bytes=part["bytes"] + size)
+            inc("firestore_export_docs_total", len(page), format=fmt)
+        part["done"] = len(page) < page_size
+        checkpoint.update(index, **part)
+
+
+def _clear_output(out_dir: str):
+    """Delete an earlier export's page files and checkpoint (and their temp files)."""
+    stale = [n for n in os.listdir(out_dir) if n.startswith("part-") or n.startswith(CHECKPOINT_NAME)]
+    for name in stale:
+        os.remove(os.path.join(out_dir, name))
+    if stale:
+        print(f"🧹 Removed {len(stale)} file(s) of an earlier export from {out_dir}")
+
+
+def export_collection(source, out_dir: str, fmt: str = "ndjson", partitions: int = 8, workers: int = 4,
+                      page_size: int = 1000, resume: bool = True) -> Dict[str, Any]:
+    """
+    Export every document of `source` into `out_dir`. With resume=True an existing
+    checkpoint in out_dir is continued (same partitions and format); otherwise the
+    export starts over, deleting the earlier export's part-* files first.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r} ({' | '.join(FORMATS)})")
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, CHECKPOINT_NAME)
+    state = None
+    if resume and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as fh:
+            state = json.load(fh)
+        if state.get("format") != fmt:
+            raise ValueError(f"{out_dir} holds a {state.get('format')} export; use another directory or resume=False")
+        print(f"↩️ Resuming export into {out_dir}")
+    if state is None:
+        _clear_output(out_dir)
+        state = {
+            "format": fmt,
+            "started_at": datetime.now().astimezone().isoformat(),
+            "complete": False,
+            "partitions": [{"start": s, "end": e, "last": None, "docs": 0, "files": 0, "bytes": 0, "done": False}
+                           for s, e in source.partitions(partitions)],
+        }
+    checkpoint = _Checkpoint(path, state)
+    with checkpoint._lock:
+        checkpoint.save()
+
+    t0 = time.perf_counter()
+    todo = [i for i, p in enumerate(state["partitions"]) if not p["done"]]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(todo) or 1)), thread_name_prefix="fs-export") as pool:
+        for future in [pool.submit(_export_partition, source, checkpoint, i, out_dir, fmt, page_size) for i in todo]:
+            future.result()
+    elapsed = time.perf_counter() - t0
+
+    with checkpoint._lock:
+        state["complete"] = True
+        state["finished_at"] = datetime.now().astimezone().isoformat()
+        checkpoint.save()
+    docs = sum(p["docs"] for p in state["partitions"])
+    return {
+        "documents": docs,
+        "files": sum(p["files"] for p in state["partitions"]),
+        "bytes": sum(p["bytes"] for p in state["partitions"]),
+        "partitions": len(state["partitions"]),
+        "elapsed_s": round(elapsed, 3),
+        "out_dir": out_dir,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export the Firestore review collection to NDJSON or Parquet.")
+    parser.add_argument("out_dir", help="Output directory (an existing checkpoint there is resumed)")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--source", choices=("firestore", "local"), default="firestore",
+                        help="local reads examples/fs_real_mock")
+    parser.add_argument("--collection", default=FIRESTORE_COLLECTION)
+    parser.add_argument("--partitions", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    src = LocalSource() if args.source == "local" else FirestoreSource(args.collection)
+    stats = export_collection(src, args.out_dir, fmt=args.format, partitions=args.partitions,
+                              workers=args.workers, page_size=args.page_size, resume=not args.restart)
+    print(f"✅ Exported {stats['documents']} document(s) into {stats['files']} file(s) "
+          f"({stats['bytes']} bytes) in {stats['elapsed_s']} s")
@@ -11,6 +11,9 @@ Usage:
     # real mode (requires google-cloud-firestore and credentials / Workload Identity)
     save_review_to_firestore(doc, test_mode=False)
 
+    # several documents in batched commits (workers/stream_ingest.py micro-batches)
+    save_reviews_to_firestore(docs, test_mode=False)
+
 Notes:
 - For production prefer Workload Identity / Application Default Credentials.
 - To use service account JSON locally, set GOOGLE_APPLICATION_CREDENTIALS env var to the key file path.
@@ -18,14 +21,20 @@ Notes:
     pip install google-cloud-firestore
 """
 
-import json
 import os
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, List
+
+from services.metrics import timed
+from workers.records import dumps
 
 LOCAL_DIR = os.path.join(os.getcwd(), "examples", "fs_real_mock")
 os.makedirs(LOCAL_DIR, exist_ok=True)
 
+# Firestore accepts at most 500 writes per batch commit
+BATCH_WRITE_LIMIT = 500
+
+@timed("firestore_write")
 def save_review_to_firestore(doc: Dict[str, Any], test_mode: bool = True) -> Dict[str, Any]:
     """
     Save review document to Firestore (real) or to local mock folder (test_mode).
@@ -37,8 +46,8 @@ def save_review_to_firestore(doc: Dict[str, Any], test_mode: bool = True) -> Dic
     if test_mode:
         fname = f"fsreal-{uuid.uuid4().hex[:8]}.json"
         path = os.path.join(LOCAL_DIR, fname)
-        with open(path, "w", encoding="utf-8") as fh:
-            json.dump(doc, fh, indent=2, ensure_ascii=False)
+        with open(path, "wb") as fh:
+            fh.write(dumps(doc))
         return {"status": "mock_saved", "path": path}
 
     # ---------- Real Firestore insertion ----------
@@ -65,3 +74,42 @@ def save_review_to_firestore(doc: Dict[str, Any], test_mode: bool = True) -> Dic
         return {"status": "ok", "doc_id": doc_id}
     except Exception as exc:
         return {"status": "error", "exception": str(exc)}
+
+
+@timed("firestore_write")
+def save_reviews_to_firestore(docs: List[Dict[str, Any]], test_mode: bool = True) -> Dict[str, Any]:
+    """
+    Save several review documents with one batched commit per BATCH_WRITE_LIMIT documents
+    (documents are keyed by review_id, so saving one again overwrites it).
+
+    Returns:
+      - test_mode: {"status":"mock_saved", "paths": [...]} (one mock file per document)
+      - real mode: {"status":"ok", "written": n} or {"status":"error", "exception": ...}
+    """
+    if test_mode:
+        paths = []
+        for doc in docs:
+            paths.append(os.path.join(LOCAL_DIR, f"fsreal-{uuid.uuid4().hex[:8]}.json"))
+            with open(paths[-1], "wb") as fh:
+                fh.write(dumps(doc))
+        return {"status": "mock_saved", "paths": paths}
+
+    try:
+        from google.cloud import firestore
+    except Exception as e:
+        raise RuntimeError(
+            "google-cloud-firestore is required for real Firestore saves. "
+            "Install with: pip install google-cloud-firestore"
+        ) from e
+
+    client = firestore.Client()
+    col_ref = client.collection(os.getenv("FIRESTORE_COLLECTION", "consumer_reviews"))
+    try:
+        for i in range(0, len(docs), BATCH_WRITE_LIMIT):
+            batch = client.batch()
+            for doc in docs[i:i + BATCH_WRITE_LIMIT]:
+                batch.set(col_ref.document(doc.get("review_id") or str(uuid.uuid4())), doc)
+            batch.commit()
+        return {"status": "ok", "written": len(docs)}
+    except Exception as exc:
+        return {"status": "error", "exception": str(exc)}
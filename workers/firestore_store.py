@@ -12,11 +12,12 @@ Notes:
     pip install google-cloud-firestore
 """
 
-import json
 import os
 import uuid
 from typing import Dict, Any
 
+from workers.records import dumps
+
 LOCAL_DIR = os.path.join(os.getcwd(), "examples", "fs_mock")
 os.makedirs(LOCAL_DIR, exist_ok=True)
 
@@ -31,8 +32,8 @@ def save_review(doc: Dict[str, Any], test_mode: bool = True) -> Dict[str, Any]:
     if test_mode:
         fname = f"fsdoc-{uuid.uuid4().hex[:8]}.json"
         path = os.path.join(LOCAL_DIR, fname)
-        with open(path, "w", encoding="utf-8") as fh:
-            json.dump(doc, fh, indent=2, ensure_ascii=False)
+        with open(path, "wb") as fh:
+            fh.write(dumps(doc))
         return {"status": "mock_saved", "path": path}
 
     # --------- Real Firestore implementation (uncomment when using) ----------
@@ -0,0 +1,179 @@
+# workers/local_warehouse.py
+"""
+Local stand-in for the BigQuery dataset (sqlite).
+
+Holds the same two tables as infra/ (consumer_reviews, consumer_review_facts) so
+analytics code can run and be tested without GCP. Partitioning is emulated: every row
+carries its partition date, each table has an index leading with it (so date-bounded
+queries only read the matching rows), and a `partitions` table mirrors
+INFORMATION_SCHEMA.PARTITIONS (partition_id, total_rows, last_modified_time).
+
+Partition filters: review_date on consumer_review_facts (as in BigQuery), and the
+`_partition_date` column (UTC DATE(processed_at)) on consumer_reviews.
+
+Usage:
+    from workers.local_warehouse import LocalWarehouse
+
+    wh = LocalWarehouse()                       # examples/warehouse.sqlite3
+    wh.insert_doc(doc)                          # run row + one fact row per extracted review
+    wh.insert_rows("consumer_review_facts", rows)
+    wh.query("SELECT sentiment, COUNT(*) AS n FROM consumer_review_facts "
+             "WHERE review_date BETWEEN ? AND ? GROUP BY sentiment", ("2025-03-01", "2025-03-31"))
+    wh.partitions("consumer_reviews")
+
+Config:
+    LOCAL_WAREHOUSE_PATH  sqlite file (default examples/warehouse.sqlite3)
+
+Notes:
+- ARRAY and STRUCT columns are stored as JSON text; query them with json_each() /
+  json_extract().
+- TIMESTAMP columns are stored as UTC "YYYY-MM-DD HH:MM:SS.ffffff" text, so they sort
+  and compare as strings; DATE columns as "YYYY-MM-DD".
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from workers.bq_mapper import BQ_COLUMNS, REVIEW_FACT_COLUMNS, map_doc_to_bq_row, map_doc_to_review_fact_rows
+
+LOCAL_WAREHOUSE_PATH = os.getenv("LOCAL_WAREHOUSE_PATH") or os.path.join(os.getcwd(), "examples", "warehouse.sqlite3")
+
+# table -> (columns, partition column, timestamp columns, JSON columns)
+TABLES = {
+    "consumer_reviews": (BQ_COLUMNS, "processed_at", ("created_at", "processed_at"),
+                         ("themes", "action_items", "metadata", "stage_timings_ms")),
+    "consumer_review_facts": (REVIEW_FACT_COLUMNS, "review_date", ("processed_at",),
+                              ("pain_points", "feature_requests")),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS consumer_reviews (
+    review_id TEXT, text TEXT, sentiment TEXT, score REAL, themes TEXT, action_items TEXT,
+    intent TEXT, confidence REAL, source TEXT, model TEXT, created_at TEXT, processed_at TEXT,
+    processing_latency_ms INTEGER, image_gcs_path TEXT, metadata TEXT, stage_timings_ms TEXT,
+    _partition_date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS consumer_reviews_partition
+    ON consumer_reviews (_partition_date, sentiment, model);
+
+CREATE TABLE IF NOT EXISTS consumer_review_facts (
+    review_id TEXT, review_index INTEGER, review_hash TEXT, username TEXT, rating INTEGER,
+    rating_text TEXT, review_date TEXT, review_date_inferred INTEGER, text TEXT, sentiment TEXT,
+    pain_points TEXT, feature_requests TEXT, actionable_advice TEXT, source TEXT, model TEXT,
+    prompt_version TEXT, processed_at TEXT,
+    _partition_date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS consumer_review_facts_partition
+    ON consumer_review_facts (review_date, sentiment, rating);
+
+CREATE TABLE IF NOT EXISTS partitions (
+    table_name         TEXT NOT NULL,
+    partition_id       TEXT NOT NULL,
+    total_rows         INTEGER NOT NULL,
+    last_modified_time TEXT NOT NULL,
+    PRIMARY KEY (table_name, partition_id)
+);
+"""
+
+
+def _utc_text(value: Any) -> Optional[str]:
+    if not value:
+        return None
+    ts = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+class LocalWarehouse:
+    def __init__(self, path: str = LOCAL_WAREHOUSE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        # Called with self._lock held
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            conn.row_factory = sqlite3.Row
+            self._conn = conn
+        return self._conn
+
+    @classmethod
+    def from_env(cls) -> Optional["LocalWarehouse"]:
+        try:
+            return cls()
+        except Exception as e:
+            print(f"⚠️ Local warehouse unavailable ({e})")
+            return None
+
+    def insert_rows(self, table: str, rows: Iterable[Dict[str, Any]]) -> int:
+        """Append BigQuery-shaped rows (bq_mapper output) to `table`."""
+        if table not in TABLES:
+            raise ValueError(f"Unknown table {table!r} ({' | '.join(TABLES)})")
+        columns, partition_col, ts_cols, json_cols = TABLES[table]
+        values, touched = [], {}
+        for row in rows:
+            record = dict(row)
+            for name in ts_cols:
+                record[name] = _utc_text(record.get(name))
+            for name in json_cols:
+                if record.get(name) is not None:
+                    record[name] = json.dumps(record[name], ensure_ascii=False)
+            partition = str(record[partition_col])[:10]
+            touched[partition] = touched.get(partition, 0) + 1
+            values.append([record.get(name) for name in columns] + [partition])
+        if not values:
+            return 0
+
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+        marks = ",".join("?" * (len(columns) + 1))
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            try:
+                db.executemany(f"INSERT INTO {table} ({','.join(columns)}, _partition_date) VALUES ({marks})", values)
+                db.executemany(
+                    "INSERT INTO partitions (table_name, partition_id, total_rows, last_modified_time) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT (table_name, partition_id) DO UPDATE SET "
+                    "total_rows = total_rows + excluded.total_rows, last_modified_time = excluded.last_modified_time",
+                    [(table, day.replace("-", ""), n, now) for day, n in touched.items()],
+                )
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        return len(values)
+
+    def insert_doc(self, doc: Dict[str, Any]) -> Dict[str, int]:
+        """Write one review document: its run row and its per-review fact rows."""
+        return {
+            "consumer_reviews": self.insert_rows("consumer_reviews", [map_doc_to_bq_row(doc)]),
+            "consumer_review_facts": self.insert_rows("consumer_review_facts", map_doc_to_review_fact_rows(doc)),
+        }
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(row) for row in self._db().execute(sql, params).fetchall()]
+
+    def partitions(self, table: str) -> List[Dict[str, Any]]:
+        """Partitions of `table`, like INFORMATION_SCHEMA.PARTITIONS (partition_id is YYYYMMDD)."""
+        return self.query(
+            "SELECT partition_id, total_rows, last_modified_time FROM partitions "
+            "WHERE table_name = ? ORDER BY partition_id", (table,)
+        )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,200 @@
+# workers/object_store.py
+"""
+Content-addressed screenshot storage.
+
+Each uploaded image is stored once, keyed by the sha256 of its bytes, so retries,
+re-analyses and duplicate uploads never store (or upload) the same screenshot twice.
+
+Usage:
+    from workers.object_store import store_images
+
+    # test mode (local folder laid out like the bucket)
+    stored = store_images(images, test_mode=True)
+    stored[0]   # {"uri": "gs://<bucket>/images/<sha256>.png", "sha256": ..., "size": ..., "created": True}
+
+    # real mode (requires google-cloud-storage and credentials / Workload Identity)
+    stored = store_images(images, test_mode=False)
+
+Environment & config:
+    - IMAGE_BUCKET: bucket name (default "consumer-sense-ai-images")
+    - IMAGE_PREFIX: object prefix (default "images")
+    - STORAGE_EMULATOR_HOST: e.g. http://localhost:4443 (fake-gcs-server); real mode then
+      talks to the emulator with anonymous credentials.
+
+Install real dependency when switching to real mode:
+    pip install google-cloud-storage
+
+Notes:
+- Local mode returns the same gs:// URIs; they resolve under examples/gcs_mock/<bucket>/.
+- Uploads are create-only (if_generation_match=0), so concurrent writers of the same
+  content cannot clobber each other.
+"""
+
+import mimetypes
+import os
+import shutil
+from typing import Any, Dict, List, Optional, Sequence
+
+from services.image_ingest import ImageSource, SpooledImage, content_hash, open_image
+from services.metrics import timed
+
+IMAGE_BUCKET = os.getenv("IMAGE_BUCKET", "consumer-sense-ai-images")
+IMAGE_PREFIX = os.getenv("IMAGE_PREFIX", "images").strip("/")
+
+# Local mock directory for test_mode (no GCP calls)
+LOCAL_GCS_DIR = os.path.join(os.getcwd(), "examples", "gcs_mock")
+
+_EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp", "GIF": ".gif"}
+
+
+def object_key(sha256: str, ext: str = "") -> str:
+    return f"{IMAGE_PREFIX}/{sha256}{ext}"
+
+
+def parse_gcs_uri(uri: str):
+    """'gs://bucket/key' -> ('bucket', 'key')."""
+    if not uri.startswith("gs://"):
+        raise ValueError(f"Not a gs:// URI: {uri}")
+    bucket, _, key = uri[5:].partition("/")
+    return bucket, key
+
+
+def _describe(source: ImageSource) -> Dict[str, Any]:
+    try:
+        with open_image(source) as image:
+            fmt = image.format
+    except Exception:
+        fmt = None
+    ext = _EXTENSIONS.get(fmt, "")
+    return {
+        "sha256": content_hash(source),
+        "ext": ext,
+        "mime": mimetypes.types_map.get(ext, "application/octet-stream"),
+        "size": source.size if isinstance(source, SpooledImage) else len(source),
+    }
+
+
+class LocalObjectStore:
+    """Bucket stand-in on the local filesystem (examples/gcs_mock/<bucket>/<key>)."""
+
+    def __init__(self, bucket: str = IMAGE_BUCKET, root: str = LOCAL_GCS_DIR):
+        self.bucket = bucket
+        self.root = os.path.join(root, bucket)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put(self, key: str, source: ImageSource, mime: str) -> bool:
+        """Store the object unless it exists. Returns True if it was written."""
+        path = self._path(key)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        if isinstance(source, SpooledImage):
+            shutil.copyfile(source.path, tmp)
+        else:
+            with open(tmp, "wb") as fh:
+                fh.write(source)
+        os.replace(tmp, path)  # atomic: readers never see a half-written object
+        return True
+
+    def get(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as fh:
+            return fh.read()
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+
+class GCSObjectStore:
+    def __init__(self, bucket: str = IMAGE_BUCKET):
+        # Lazy import to avoid adding dependency during mock mode
+        try:
+            from google.cloud import storage
+        except Exception as e:
+            raise RuntimeError(
+                "google-cloud-storage is required for real image storage. "
+                "Install with: pip install google-cloud-storage"
+            ) from e
+
+        if os.getenv("STORAGE_EMULATOR_HOST"):
+            from google.auth.credentials import AnonymousCredentials
+            client = storage.Client(project=os.getenv("GOOGLE_CLOUD_PROJECT", "local"),
+                                    credentials=AnonymousCredentials())
+        else:
+            # Uses ADC / Workload Identity if available
+            client = storage.Client()
+        self.bucket = bucket
+        self._bucket = client.bucket(bucket)
+
+    def exists(self, key: str) -> bool:
+        return self._bucket.blob(key).exists()
+
+    def put(self, key: str, source: ImageSource, mime: str) -> bool:
+        from google.api_core.exceptions import PreconditionFailed
+
+        blob = self._bucket.blob(key)
+        if blob.exists():
+            return False
+        try:
+            if isinstance(source, SpooledImage):
+                blob.upload_from_filename(source.path, content_type=mime, if_generation_match=0)
+            else:
+                blob.upload_from_string(source, content_type=mime, if_generation_match=0)
+        except PreconditionFailed:
+            return False  # another writer stored the same content first
+        return True
+
+    def get(self, key: str) -> bytes:
+        return self._bucket.blob(key).download_as_bytes()
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+
+_stores: Dict[bool, Any] = {}
+
+
+def get_object_store(test_mode: bool = True):
+    if test_mode not in _stores:
+        _stores[test_mode] = LocalObjectStore() if test_mode else GCSObjectStore()
+    return _stores[test_mode]
+
+
+@timed("image_upload")
+def store_images(images: Sequence[ImageSource], test_mode: bool = True, store=None) -> List[Dict[str, Any]]:
+    """
+    Store each image once under images/<sha256><ext>.
+
+    Returns one entry per input image, in order:
+      {"uri": "gs://bucket/key", "sha256": ..., "mime": ..., "size": ..., "created": bool}
+    """
+    store = store or get_object_store(test_mode)
+    out = []
+    for source in images:
+        info = _describe(source)
+        key = object_key(info["sha256"], info["ext"])
+        created = store.put(key, source, info["mime"])
+        out.append({"uri": f"gs://{store.bucket}/{key}", "sha256": info["sha256"], "mime": info["mime"],
+                    "size": info["size"], "created": created})
+    return out
+
+
+def load_image(uri: str, test_mode: bool = True, store=None) -> ImageSource:
+    """
+    Resolve a stored gs:// URI back to an image source for re-analysis.
+    Local objects are referenced in place (no copy); GCS objects are downloaded.
+    """
+    store = store or get_object_store(test_mode)
+    bucket, key = parse_gcs_uri(uri)
+    if bucket != store.bucket:
+        raise ValueError(f"{uri} is not in bucket {store.bucket}")
+    path = store.local_path(key)
+    if path:
+        sha = os.path.basename(key).split(".")[0]
+        return SpooledImage(path, os.path.getsize(path), sha256=sha, owned=False)
+    return store.get(key)
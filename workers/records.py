@@ -0,0 +1,225 @@
+# workers/records.py
+"""
+Typed, slotted records for review documents, and a compact serialization path.
+
+A review document (workers/doc_builder.py) is a tree of dicts: the document, its
+analysis block, and one dict per extracted review with its own metadata and analysis.
+Each dict pays for a hash table, so a batch of documents in flight costs several times
+its payload. The records here keep the same fields in __slots__ instead.
+
+Conversion is zero-copy for the leaves: from_dict() and to_dict() move references to the
+same strings, lists and free-form dicts (doc.metadata), they never copy them, so a
+round trip costs one small object per record. Keys the record does not know are kept
+in `extra`, and keys that were absent stay absent (their attribute holds MISSING), so
+to_dict(from_dict(d)) == d for any document, including the loose shapes older writers
+left behind.
+
+Usage:
+    from workers.records import ReviewDoc, dumps, loads
+
+    rec = ReviewDoc.from_dict(doc)
+    rec.analysis.rich_reviews[0].metadata.rating
+    rec.to_dict() == doc                       # True
+
+    data = dumps(rec)                          # minified UTF-8 JSON bytes (dict or record)
+    loads(data)                                # -> dict
+    loads(data, ReviewDoc)                     # -> ReviewDoc
+
+    analysis = as_record(Analysis, doc["analysis"])   # a record, or the dict converted
+    analysis.get("action_items", [])                 # dict-style read of fields and extra keys
+
+Notes:
+- dumps() uses orjson when installed (several times faster than json) and falls back to
+  json with compact separators; both produce the same JSON. Datetimes (e.g. Firestore
+  timestamps) become ISO 8601 strings.
+- Records share leaves with the dict they came from: mutate a copy, not both.
+- The pipeline builds its results as records (services/gemini_rest.build_review_response,
+  workers/doc_builder.build_firestore_doc) and reads documents through them
+  (workers/bq_mapper.map_doc_to_bq_row); dicts remain the shape at API boundaries.
+"""
+
+import json
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+from typing import Any, ClassVar, Dict, List, Optional, Type, TypeVar, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class _Missing:
+    """Attribute value for a key the source dict did not have."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return "MISSING"
+
+    def __bool__(self):
+        return False
+
+    def __reduce__(self):
+        return "MISSING"
+
+
+MISSING: Any = _Missing()
+
+R = TypeVar("R", bound="_Record")
+
+
+class _Record:
+    __slots__ = ()
+    # key -> record class for a nested dict / for each dict in a nested list
+    _NESTED: ClassVar[Dict[str, type]] = {}
+    _LISTS: ClassVar[Dict[str, type]] = {}
+    # Set by @_record: the dict keys this record has a slot for, in field order
+    _KEYS: ClassVar[frozenset] = frozenset()
+    _KEYS_ORDER: ClassVar[tuple] = ()
+
+    @classmethod
+    def from_dict(cls: Type[R], data: Dict[str, Any]) -> R:
+        values: Dict[str, Any] = {}
+        extra = None
+        for key, value in data.items():
+            if key not in cls._KEYS:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+            elif key in cls._NESTED and isinstance(value, dict):
+                values[key] = cls._NESTED[key].from_dict(value)
+            elif key in cls._LISTS and isinstance(value, list):
+                item_cls = cls._LISTS[key]
+                values[key] = [item_cls.from_dict(v) if isinstance(v, dict) else v for v in value]
+            else:
+                values[key] = value
+        return cls(**values, extra=extra)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """dict.get() over the record's fields and its extra keys."""
+        if key in self._KEYS:
+            value = getattr(self, key)
+            return default if value is MISSING else value
+        return (self.extra or {}).get(key, default)
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for key in self._KEYS_ORDER:
+            value = getattr(self, key)
+            if value is MISSING:
+                continue
+            if isinstance(value, _Record):
+                value = value.to_dict()
+            elif key in self._LISTS and isinstance(value, list):
+                value = [v.to_dict() if isinstance(v, _Record) else v for v in value]
+            out[key] = value
+        if self.extra:
+            out.update(self.extra)
+        return out
+
+
+def _record(cls):
+    cls = dataclass(slots=True)(cls)
+    cls._KEYS_ORDER = tuple(f.name for f in fields(cls) if f.name != "extra")
+    cls._KEYS = frozenset(cls._KEYS_ORDER)
+    return cls
+
+
+# ---------------- records ----------------
+@_record
+class ReviewMeta(_Record):
+    """rich_reviews[i]["metadata"]"""
+    username: Optional[str] = MISSING
+    rating: Union[str, int, float, None] = MISSING
+    date: Optional[str] = MISSING
+    extra: Optional[Dict[str, Any]] = None
+
+
+@_record
+class ReviewAnalysis(_Record):
+    """rich_reviews[i]["analysis"]"""
+    sentiment: Optional[str] = MISSING
+    pain_points: Optional[List[str]] = MISSING
+    feature_requests: Optional[List[str]] = MISSING
+    actionable_advice: Optional[str] = MISSING
+    extra: Optional[Dict[str, Any]] = None
+
+
+@_record
+class RichReview(_Record):
+    """One review extracted from the input (analysis["rich_reviews"][i])."""
+    _NESTED = {"metadata": ReviewMeta, "analysis": ReviewAnalysis}
+    text: Optional[str] = MISSING
+    metadata: Optional[ReviewMeta] = MISSING
+    analysis: Optional[ReviewAnalysis] = MISSING
+    extra: Optional[Dict[str, Any]] = None
+
+
+@_record
+class Analysis(_Record):
+    """doc["analysis"] (services/gemini_rest.build_review_response)."""
+    _LISTS = {"rich_reviews": RichReview}
+    sentiment: Optional[str] = MISSING
+    themes: Optional[List[str]] = MISSING
+    intent: Optional[str] = MISSING
+    score: Union[float, str, None] = MISSING
+    confidence: Optional[float] = MISSING
+    overall_summary: Optional[str] = MISSING
+    rich_reviews: Optional[List[RichReview]] = MISSING
+    top_level_advice: Optional[str] = MISSING
+    top_level_pains: Optional[List[str]] = MISSING
+    top_level_features: Optional[List[str]] = MISSING
+    extra: Optional[Dict[str, Any]] = None
+
+
+@_record
+class ReviewDoc(_Record):
+    """A review document (workers/doc_builder.build_firestore_doc). metadata stays a plain dict."""
+    _NESTED = {"analysis": Analysis}
+    review_id: Optional[str] = MISSING
+    source: Optional[str] = MISSING
+    user_id_hash: Optional[str] = MISSING
+    raw_text: Optional[str] = MISSING
+    extracted_text: Optional[str] = MISSING
+    analysis: Optional[Analysis] = MISSING
+    image_gcs_path: Optional[str] = MISSING
+    language: Optional[str] = MISSING
+    model: Optional[str] = MISSING
+    processing_latency_ms: Optional[int] = MISSING
+    created_at: Optional[str] = MISSING
+    processed_at: Optional[str] = MISSING
+    metadata: Optional[Dict[str, Any]] = MISSING
+    extra: Optional[Dict[str, Any]] = None
+
+
+def as_record(cls: Type[R], value: Union[R, Dict[str, Any], None]) -> R:
+    """`value` as a `cls` record: records pass through, dicts are converted, None is empty."""
+    if isinstance(value, cls):
+        return value
+    return cls.from_dict(value or {})
+
+
+# ---------------- serialization ----------------
+def _json_default(value: Any) -> Any:
+    if isinstance(value, _Record):
+        return value.to_dict()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, tuple, frozenset)):
+        return list(value)
+    return str(value)
+
+
+def dumps(value: Union[_Record, Dict[str, Any], List[Any]]) -> bytes:
+    """Minified UTF-8 JSON for a record, a dict or a list of either."""
+    if isinstance(value, _Record):
+        value = value.to_dict()
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+def loads(data: Union[bytes, str], record: Optional[Type[R]] = None) -> Any:
+    """Parse dumps() output; with `record`, build that record from the parsed dict."""
+    value = orjson.loads(data) if orjson is not None else json.loads(data)
+    return record.from_dict(value) if record is not None else value
@@ -5,6 +5,8 @@ import json
 import os
 from jsonschema import Draft7Validator, FormatChecker
 
+from services.metrics import timed
+
 SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "schemas", "firestore_review_schema.json")
 
 def load_schema(path=SCHEMA_PATH):
@@ -14,6 +16,7 @@ def load_schema(path=SCHEMA_PATH):
 SCHEMA = load_schema()
 VALIDATOR = Draft7Validator(SCHEMA, format_checker=FormatChecker())
 
+@timed("schema_validation")
 def validate_review_doc(doc: dict):
     errors = []
     for err in VALIDATOR.iter_errors(doc):
@@ -25,6 +28,7 @@ def validate_review_doc(doc: dict):
 
 if __name__ == "__main__":
     import argparse
+    # Run from the repo root: python -m workers.schema_validator file.json
     parser = argparse.ArgumentParser(description="Validate a JSON file against Firestore review schema.")
     parser.add_argument("jsonfile", help="Path to the JSON file to validate")
     args = parser.parse_args()
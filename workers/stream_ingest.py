@@ -0,0 +1,533 @@
+# workers/stream_ingest.py
+"""
+Streaming ingestion: a long-running consumer for review events.
+
+Events are read from NDJSON on stdin, from a file that is tailed as it grows, or from a
+Pub/Sub subscription (PUBSUB_EMULATOR_HOST works too). They are grouped into micro-batches
+of up to batch_size events, or fewer when the oldest event has waited max_latency_s.
+Each event is analysed (concurrency analyses in flight), and each batch is then written
+in one go: one Firestore batch commit, one BigQuery streaming insert for the run rows and
+one for the fact rows.
+
+A reader thread feeds a bounded queue. When analysis or the writes fall behind, the
+queue fills and the reader stops reading (the pipe or file stays unread, Pub/Sub is not
+pulled) until there is room again.
+
+Usage:
+    from workers.stream_ingest import StdinSource, StreamIngestor
+
+    ingestor = StreamIngestor(StdinSource(), batch_size=20, max_latency_s=2.0)
+    ingestor.run()             # until EOF / stop(); returns get_stats()
+    ingestor.get_stats()       # received, written, failed, lag_s, throughput_per_s, queue_depth, ...
+
+    python -m workers.stream_ingest --stdin --test-mode < events.ndjson
+    python -m workers.stream_ingest --tail /var/log/support/feedback.ndjson
+    PUBSUB_EMULATOR_HOST=localhost:8085 python -m workers.stream_ingest --pubsub review-events
+
+Event (one JSON object per line / message):
+    {"text": "...",                        required (or "raw_text")
+     "id": "ticket-123",                   stable id: the same event is written to the same review_id
+     "source": "web_form",                 schema source enum, else "other"
+     "created_at": "2026-10-19T08:00:00Z", when the feedback was given (lag is measured from it)
+     "user_id_hash": "...", "language": "en", "metadata": {"app_version": "...", "region": "..."}}
+
+Config:
+    STREAM_BATCH_SIZE        events per micro-batch (default 20)
+    STREAM_BATCH_LATENCY_S   flush a partial batch once its oldest event waited this long (default 2)
+    STREAM_QUEUE_SIZE        events buffered between reader and batcher (default 200)
+    STREAM_CONCURRENCY       analyses in flight (default 4)
+    STREAM_REPORT_S          progress line interval (default 30)
+    STREAM_TAIL_POLL_S       how often a tailed file is checked for new lines (default 0.5)
+    GOOGLE_CLOUD_PROJECT     project of a short Pub/Sub subscription name
+    METRICS_PORT             serve /metrics (stream_* gauges and counters) while running
+
+Notes:
+- Delivery is at least once. Pub/Sub messages are acked only after their batch is
+  written. Failed events are nacked for redelivery; configure a dead-letter topic on the
+  subscription to park poison messages. Events with an "id" are rewritten in place on
+  redelivery (Firestore document id; BigQuery row_ids, best effort).
+- Events wait at most queue_size / throughput in the queue before they are processed;
+  keep the subscription's ack deadline above that.
+- Lines that are not a JSON object with text are counted as invalid and skipped.
+- A tailed file is followed across rotation and truncation; it starts at the end unless
+  from_start is set.
+"""
+
+import hashlib
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from services.metrics import inc, record_stage, set_gauge
+from workers.doc_builder import build_firestore_doc
+from workers.records import loads
+from workers.schema_validator import SCHEMA, validate_review_doc
+
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "20"))
+STREAM_BATCH_LATENCY_S = float(os.getenv("STREAM_BATCH_LATENCY_S", "2"))
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "200"))
+STREAM_CONCURRENCY = int(os.getenv("STREAM_CONCURRENCY", "4"))
+STREAM_REPORT_S = float(os.getenv("STREAM_REPORT_S", "30"))
+STREAM_TAIL_POLL_S = float(os.getenv("STREAM_TAIL_POLL_S", "0.5"))
+
+SOURCES = frozenset(SCHEMA["properties"]["source"]["enum"])
+# Window for the throughput figure
+THROUGHPUT_WINDOW_S = 60.0
+
+# (raw event, ack token or None, publish time as epoch seconds or None)
+RawEvent = Tuple[Any, Any, Optional[float]]
+
+_EOF = object()
+
+
+def _epoch(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+
+
+# ---------------- sources ----------------
+class StdinSource:
+    """NDJSON lines from a text stream (default sys.stdin); ends at EOF."""
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdin
+
+    def __iter__(self) -> Iterator[RawEvent]:
+        for line in self.stream:
+            if line.strip():
+                yield line, None, None
+
+    def ack(self, tokens: List[Any]):
+        pass
+
+    def nack(self, tokens: List[Any]):
+        pass
+
+    def close(self):
+        pass
+
+
+class TailSource:
+    """NDJSON lines appended to a file, like `tail -F`; runs until close()."""
+
+    def __init__(self, path: str, from_start: bool = False, poll_s: float = STREAM_TAIL_POLL_S):
+        self.path = path
+        self.from_start = from_start
+        self.poll_s = poll_s
+        self._stop = threading.Event()
+
+    def __iter__(self) -> Iterator[RawEvent]:
+        fh, inode, partial = None, None, b""
+        seek_end = not self.from_start
+        try:
+            while not self._stop.is_set():
+                if fh is None:
+                    try:
+                        fh = open(self.path, "rb")
+                    except FileNotFoundError:
+                        self._stop.wait(self.poll_s)
+                        continue
+                    inode = os.fstat(fh.fileno()).st_ino
+                    if seek_end:
+                        fh.seek(0, os.SEEK_END)
+                    # A rotated or recreated file is read from its first line
+                    seek_end = False
+                line = fh.readline()
+                if line:
+                    partial += line
+                    if partial.endswith(b"\n"):
+                        if partial.strip():
+                            yield partial, None, None
+                        partial = b""
+                    continue
+                try:
+                    st = os.stat(self.path)
+                except FileNotFoundError:
+                    st = None
+                if st is None or st.st_ino != inode or st.st_size < fh.tell():
+                    # Rotated, removed or truncated: the old handle is drained, reopen
+                    fh.close()
+                    fh, partial = None, b""
+                    continue
+                self._stop.wait(self.poll_s)
+        finally:
+            if fh is not None:
+                fh.close()
+
+    def ack(self, tokens: List[Any]):
+        pass
+
+    def nack(self, tokens: List[Any]):
+        pass
+
+    def close(self):
+        self._stop.set()
+
+
+class PubSubSource:
+    """Synchronous pulls from a Pub/Sub subscription; messages are acked per batch."""
+
+    def __init__(self, subscription: str, max_messages: int = 100, pull_timeout_s: float = 10.0):
+        try:
+            from google.cloud import pubsub_v1
+        except Exception as e:
+            raise RuntimeError(
+                "google-cloud-pubsub is required for the Pub/Sub source. "
+                "Install with: pip install google-cloud-pubsub"
+            ) from e
+        self.client = pubsub_v1.SubscriberClient()
+        if "/" not in subscription:
+            project = os.getenv("GOOGLE_CLOUD_PROJECT")
+            if not project:
+                raise RuntimeError("GOOGLE_CLOUD_PROJECT is required with a short subscription name.")
+            subscription = self.client.subscription_path(project, subscription)
+        self.subscription = subscription
+        self.max_messages = max_messages
+        self.pull_timeout_s = pull_timeout_s
+        self._stop = threading.Event()
+
+    def __iter__(self) -> Iterator[RawEvent]:
+        from google.api_core import exceptions as gexc
+
+        while not self._stop.is_set():
+            try:
+                response = self.client.pull(
+                    request={"subscription": self.subscription, "max_messages": self.max_messages},
+                    timeout=self.pull_timeout_s)
+            except gexc.DeadlineExceeded:
+                continue
+            except Exception as e:
+                print(f"⚠️ Pub/Sub pull failed ({e}); retrying")
+                self._stop.wait(self.pull_timeout_s)
+                continue
+            for received in response.received_messages:
+                yield received.message.data, received.ack_id, _epoch(received.message.publish_time)
+
+    def _chunks(self, tokens: List[Any]) -> Iterator[List[Any]]:
+        for i in range(0, len(tokens), 1000):
+            yield tokens[i:i + 1000]
+
+    def ack(self, tokens: List[Any]):
+        for chunk in self._chunks(tokens):
+            self.client.acknowledge(request={"subscription": self.subscription, "ack_ids": chunk})
+
+    def nack(self, tokens: List[Any]):
+        # Deadline 0: redeliver now rather than after the ack deadline
+        for chunk in self._chunks(tokens):
+            self.client.modify_ack_deadline(request={"subscription": self.subscription, "ack_ids": chunk,
+                                                     "ack_deadline_seconds": 0})
+
+    def close(self):
+        self._stop.set()
+
+
+# ---------------- events and documents ----------------
+@dataclass(slots=True)
+class StreamEvent:
+    payload: Dict[str, Any]
+    token: Any
+    event_time: float      # epoch seconds: created_at, else publish time, else arrival
+    received_at: float     # time.monotonic() on arrival
+
+
+def parse_event(data: Any) -> Dict[str, Any]:
+    """The event object of one NDJSON line / message body; ValueError if it is not usable."""
+    try:
+        payload = loads(data)
+    except Exception as e:
+        raise ValueError(f"not JSON: {e}") from None
+    if not isinstance(payload, dict):
+        raise ValueError("not a JSON object")
+    text = payload.get("text") or payload.get("raw_text")
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("no text")
+    return payload
+
+
+def build_stream_doc(event: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    """The review document for one event, from an analyze_text()-shaped result."""
+    source = event.get("source") if event.get("source") in SOURCES else "other"
+    doc = build_firestore_doc(result, source)
+    if event.get("id") is not None:
+        # A redelivered event overwrites its document instead of adding a second one
+        doc["review_id"] = f"stream-{hashlib.sha256(str(event['id']).encode('utf-8')).hexdigest()[:16]}"
+    doc["raw_text"] = event.get("text") or event.get("raw_text")
+    created = _epoch(event.get("created_at"))
+    if created is not None:
+        doc["created_at"] = datetime.fromtimestamp(created, timezone.utc).isoformat()
+    for field in ("user_id_hash", "language"):
+        if isinstance(event.get(field), str):
+            doc[field] = event[field]
+    if isinstance(event.get("metadata"), dict):
+        doc["metadata"] = {**event["metadata"], **doc["metadata"]}
+    doc["metadata"]["upload_method"] = "stream"
+    if event.get("id") is not None:
+        doc["metadata"]["event_id"] = str(event["id"])
+    return doc
+
+
+def _default_analyze(test_mode: bool) -> Callable[[str], Dict[str, Any]]:
+    from services.gemini_client import analyze_text
+    return lambda text: analyze_text(text, test_mode=test_mode)
+
+
+def _default_writer(test_mode: bool) -> Callable[[List[Dict[str, Any]]], None]:
+    # One Firestore batch commit + one BigQuery streaming insert per table for the whole batch
+    from workers.bigquery_real import insert_review_facts_to_bigquery, insert_reviews_to_bigquery
+    from workers.bq_mapper import map_doc_to_bq_row, map_doc_to_review_fact_rows
+    from workers.firestore_real import save_reviews_to_firestore
+
+    def write(docs: List[Dict[str, Any]]):
+        outcomes = [("Firestore", save_reviews_to_firestore(docs, test_mode=test_mode)),
+                    ("BigQuery", insert_reviews_to_bigquery([map_doc_to_bq_row(d) for d in docs],
+                                                            test_mode=test_mode))]
+        facts = [row for doc in docs for row in map_doc_to_review_fact_rows(doc)]
+        if facts:
+            outcomes.append(("BigQuery facts", insert_review_facts_to_bigquery(facts, test_mode=test_mode)))
+        for target, outcome in outcomes:
+            if outcome.get("status") == "error":
+                raise RuntimeError(f"{target} write failed: {outcome.get('exception') or outcome.get('errors')}")
+    return write
+
+
+# ---------------- consumer ----------------
+class StreamIngestor:
+    def __init__(self, source, analyze: Callable[[str], Dict[str, Any]] = None,
+                 write: Callable[[List[Dict[str, Any]]], None] = None, batch_size: int = STREAM_BATCH_SIZE,
+                 max_latency_s: float = STREAM_BATCH_LATENCY_S, queue_size: int = STREAM_QUEUE_SIZE,
+                 concurrency: int = STREAM_CONCURRENCY, report_s: float = STREAM_REPORT_S, test_mode: bool = False):
+        self.source = source
+        self.analyze = analyze or _default_analyze(test_mode)
+        self.write = write or _default_writer(test_mode)
+        self.batch_size = max(1, batch_size)
+        self.max_latency_s = max_latency_s
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self.concurrency = max(1, concurrency)
+        self.report_s = report_s
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._completed: deque = deque()   # (monotonic time, events) per finished batch
+        self._started = None
+        self._last_report = 0.0
+        self.stats = {"received": 0, "invalid": 0, "processed": 0, "written": 0, "failed": 0, "batches": 0,
+                      "pauses": 0, "paused_s": 0.0, "lag_s": None, "max_lag_s": 0.0}
+
+    def _bump(self, name: str, amount: float = 1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def stop(self):
+        """Stop reading; events already queued are still processed, then run() returns."""
+        self._stop.set()
+        self.source.close()
+
+    # ---- reader thread ----
+    def _put(self, item: Any):
+        try:
+            self.queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        # Backpressure: stop consuming the source until the batcher makes room
+        self._bump("pauses")
+        set_gauge("stream_paused", 1)
+        start = time.monotonic()
+        self.queue.put(item)
+        paused = time.monotonic() - start
+        set_gauge("stream_paused", 0)
+        self._bump("paused_s", paused)
+        inc("stream_paused_seconds_total", paused)
+
+    def _read(self):
+        try:
+            for data, token, published in self.source:
+                now = time.time()
+                try:
+                    payload = parse_event(data)
+                except ValueError as e:
+                    print(f"⚠️ Skipping invalid event ({e}): {str(data)[:80]!r}")
+                    self._bump("invalid")
+                    inc("stream_events_total", outcome="invalid")
+                    if token is not None:
+                        self.source.ack([token])  # it will never parse; do not redeliver
+                    continue
+                self._bump("received")
+                event_time = _epoch(payload.get("created_at")) or published or now
+                self._put(StreamEvent(payload, token, min(event_time, now), time.monotonic()))
+                if self._stop.is_set():
+                    break
+        except Exception as e:
+            print(f"❌ Stream source failed: {e}")
+        finally:
+            self.queue.put(_EOF)
+
+    # ---- batcher ----
+    def _next_batch(self) -> Tuple[List[StreamEvent], bool]:
+        """Up to batch_size events, or fewer once the first has waited max_latency_s; (batch, eof)."""
+        batch: List[StreamEvent] = []
+        while len(batch) < self.batch_size:
+            if batch:
+                timeout = batch[0].received_at + self.max_latency_s - time.monotonic()
+                if timeout <= 0:
+                    break
+            else:
+                timeout = min(self.report_s, 1.0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                if batch:
+                    break
+                if self._stop.is_set():
+                    return batch, True   # reader is blocked on an idle source
+                return batch, False
+            if item is _EOF:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _process(self, event: StreamEvent) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Analyze one event; (document, None) or (None, error message)."""
+        try:
+            result = self.analyze(event.payload.get("text") or event.payload.get("raw_text"))
+            if result.get("error"):
+                return None, result["error"]
+            doc = build_stream_doc(event.payload, result)
+            ok, errs = validate_review_doc(doc)
+            if not ok:
+                return None, f"schema: {errs}"
+            return doc, None
+        except Exception as e:
+            return None, str(e)
+
+    def _process_batch(self, pool: ThreadPoolExecutor, batch: List[StreamEvent]):
+        start = time.perf_counter()
+        results = list(pool.map(self._process, batch))
+        docs = [doc for doc, _ in results if doc is not None]
+        write_error = None
+        if docs:
+            try:
+                self.write(docs)
+            except Exception as e:
+                write_error = str(e)
+                print(f"❌ Batch write failed ({len(docs)} document(s)): {write_error[:200]}")
+        acks, nacks = [], []
+        for event, (doc, error) in zip(batch, results):
+            error = error or write_error
+            if error and doc is None:
+                print(f"⚠️ Event {event.payload.get('id', '?')} failed: {error[:200]}")
+            (nacks if error else acks).append(event.token)
+            inc("stream_events_total", outcome="failed" if error else "written")
+        self.source.ack([t for t in acks if t is not None])
+        self.source.nack([t for t in nacks if t is not None])
+
+        now = time.time()
+        lag = max(now - event.event_time for event in batch)
+        record_stage("stream_batch", (time.perf_counter() - start) * 1000)
+        set_gauge("stream_lag_seconds", lag)
+        set_gauge("stream_queue_depth", self.queue.qsize())
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["processed"] += len(batch)
+            self.stats["written"] += len(acks)
+            self.stats["failed"] += len(nacks)
+            self.stats["lag_s"] = round(lag, 3)
+            self.stats["max_lag_s"] = round(max(self.stats["max_lag_s"], lag), 3)
+            self._completed.append((time.monotonic(), len(batch)))
+        set_gauge("stream_throughput_per_s", self._throughput())
+
+    def _throughput(self) -> float:
+        """Events per second over the last THROUGHPUT_WINDOW_S (or since start, if shorter)."""
+        now = time.monotonic()
+        with self._lock:
+            while self._completed and self._completed[0][0] < now - THROUGHPUT_WINDOW_S:
+                self._completed.popleft()
+            events = sum(n for _, n in self._completed)
+        span = min(THROUGHPUT_WINDOW_S, now - self._started) if self._started else 0.0
+        return round(events / span, 2) if span > 0 else 0.0
+
+    def _report(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_report < self.report_s:
+            return
+        self._last_report = now
+        s = self.get_stats()
+        print(f"📈 Stream: {s['written']} written, {s['failed']} failed, {s['invalid']} invalid; "
+              f"{s['throughput_per_s']}/s, lag {s['lag_s']}s, queue {s['queue_depth']}/{s['queue_size']}, "
+              f"paused {s['pauses']}x ({s['paused_s']}s)")
+
+    def run(self) -> Dict[str, Any]:
+        self._started = self._last_report = time.monotonic()
+        reader = threading.Thread(target=self._read, name="stream-reader", daemon=True)
+        reader.start()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="stream") as pool:
+            while True:
+                batch, eof = self._next_batch()
+                if batch:
+                    self._process_batch(pool, batch)
+                self._report()
+                if eof:
+                    break
+        self._report(force=True)
+        return self.get_stats()
+
+    def get_stats(self) -> Dict[str, Any]:
+        throughput = self._throughput()
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update(paused_s=round(stats["paused_s"], 3), throughput_per_s=throughput,
+                     queue_depth=self.queue.qsize(), queue_size=self.queue.maxsize,
+                     uptime_s=round(time.monotonic() - self._started, 3) if self._started else 0.0)
+        return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    import signal
+    from services.metrics import maybe_start_metrics_server
+
+    parser = argparse.ArgumentParser(description="Consume review events continuously: analyse and persist them.")
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument("--stdin", action="store_true", help="NDJSON events on stdin (until EOF)")
+    source_group.add_argument("--tail", metavar="PATH", help="follow an NDJSON file as it grows")
+    source_group.add_argument("--pubsub", metavar="SUBSCRIPTION", help="pull from a Pub/Sub subscription")
+    parser.add_argument("--from-start", action="store_true", help="with --tail, read existing lines first")
+    parser.add_argument("--batch-size", type=int, default=STREAM_BATCH_SIZE)
+    parser.add_argument("--max-latency", type=float, default=STREAM_BATCH_LATENCY_S,
+                        help="seconds before a partial batch is flushed")
+    parser.add_argument("--queue-size", type=int, default=STREAM_QUEUE_SIZE)
+    parser.add_argument("--concurrency", type=int, default=STREAM_CONCURRENCY)
+    parser.add_argument("--test-mode", action="store_true", help="mock analysis and local mock writers")
+    args = parser.parse_args()
+
+    if args.stdin:
+        source = StdinSource()
+    elif args.tail:
+        source = TailSource(args.tail, from_start=args.from_start)
+    else:
+        source = PubSubSource(args.pubsub)
+    ingestor = StreamIngestor(source, batch_size=args.batch_size, max_latency_s=args.max_latency,
+                              queue_size=args.queue_size, concurrency=args.concurrency, test_mode=args.test_mode)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: ingestor.stop())
+    maybe_start_metrics_server()
+    print(f"🚰 Streaming from {args.tail or args.pubsub or 'stdin'} "
+          f"(batch {args.batch_size} / {args.max_latency}s, queue {args.queue_size})")
+    stats = ingestor.run()
+    print(f"✅ Stream stopped: {stats['written']} written, {stats['failed']} failed, "
+          f"{stats['invalid']} invalid in {stats['uptime_s']} s")